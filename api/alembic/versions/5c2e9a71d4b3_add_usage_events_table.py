@@ -0,0 +1,45 @@
+"""add usage_events table
+
+Revision ID: 5c2e9a71d4b3
+Revises: 04b67afe490d
+Create Date: 2026-10-19 10:12:41.204518
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5c2e9a71d4b3'
+down_revision = '04b67afe490d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_events',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('scene', sa.String(length=64), nullable=False),
+    sa.Column('model_key', sa.String(length=100), nullable=False),
+    sa.Column('period_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('period_end', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('input_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('cached_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('output_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('reasoning_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('total_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_usage_events_period', 'usage_events', ['period_start'], unique=False)
+    op.create_index('idx_usage_events_user_period', 'usage_events', ['user_id', 'period_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_usage_events_user_period', table_name='usage_events')
+    op.drop_index('idx_usage_events_period', table_name='usage_events')
+    op.drop_table('usage_events')
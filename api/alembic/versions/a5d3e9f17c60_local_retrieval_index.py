@@ -0,0 +1,72 @@
+"""local retrieval: notebook retrieval_mode, retrieval_chunks and retrieval_postings
+
+Revision ID: a5d3e9f17c60
+Revises: f2c6a0d4e718
+Create Date: 2026-10-19 22:14:05.663817
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a5d3e9f17c60'
+down_revision = 'f2c6a0d4e718'
+branch_labels = None
+depends_on = None
+
+retrieval_mode_enum = postgresql.ENUM(
+    'file_search',
+    'bm25',
+    'hybrid',
+    name='notebook_retrieval_mode',
+    create_type=False,
+)
+
+
+def upgrade() -> None:
+    retrieval_mode_enum.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        'notebooks',
+        sa.Column('retrieval_mode', retrieval_mode_enum, server_default='file_search', nullable=False),
+    )
+
+    op.create_table(
+        'retrieval_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('notebook_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source', sa.String(length=16), nullable=False),
+        sa.Column('source_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source_updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('length', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['notebook_id'], ['notebooks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('notebook_id', 'source', 'source_id', 'seq', name='uq_retrieval_chunks_seq'),
+    )
+
+    op.create_table(
+        'retrieval_postings',
+        sa.Column('notebook_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('term', sa.String(length=64), nullable=False),
+        sa.Column('chunk_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tf', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['notebook_id'], ['notebooks.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['chunk_id'], ['retrieval_chunks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('notebook_id', 'term', 'chunk_id'),
+    )
+    op.create_index('idx_retrieval_postings_chunk', 'retrieval_postings', ['chunk_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_retrieval_postings_chunk', table_name='retrieval_postings')
+    op.drop_table('retrieval_postings')
+    op.drop_table('retrieval_chunks')
+    op.drop_column('notebooks', 'retrieval_mode')
+    retrieval_mode_enum.drop(op.get_bind(), checkfirst=True)
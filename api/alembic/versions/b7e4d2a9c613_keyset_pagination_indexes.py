@@ -0,0 +1,52 @@
+"""keyset pagination indexes for flashcards, quiz questions and mind maps
+
+Revision ID: b7e4d2a9c613
+Revises: 5c2e9a71d4b3
+Create Date: 2026-10-19 14:05:12.381940
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d2a9c613'
+down_revision = '5c2e9a71d4b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The (user_id, notebook_id) indexes are prefixes of the new notebook-scoped ones.
+    op.create_index('idx_flashcards_user_id', 'flashcards', ['user_id', 'id'], unique=False)
+    op.create_index('idx_flashcards_user_nb_id', 'flashcards', ['user_id', 'notebook_id', 'id'], unique=False)
+    op.drop_index('idx_flashcards_user_nb', table_name='flashcards')
+
+    op.create_index('idx_quiz_questions_user_created', 'quiz_questions', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index(
+        'idx_quiz_questions_user_nb_created',
+        'quiz_questions',
+        ['user_id', 'notebook_id', 'created_at', 'id'],
+        unique=False,
+    )
+    op.drop_index('idx_quiz_questions_user_nb', table_name='quiz_questions')
+
+    op.create_index('idx_mindmaps_user_updated', 'mindmaps', ['user_id', 'updated_at', 'id'], unique=False)
+    op.create_index(
+        'idx_mindmaps_user_nb_updated', 'mindmaps', ['user_id', 'notebook_id', 'updated_at', 'id'], unique=False
+    )
+    op.drop_index('idx_mindmaps_user_nb', table_name='mindmaps')
+
+
+def downgrade() -> None:
+    op.create_index('idx_mindmaps_user_nb', 'mindmaps', ['user_id', 'notebook_id'], unique=False)
+    op.drop_index('idx_mindmaps_user_nb_updated', table_name='mindmaps')
+    op.drop_index('idx_mindmaps_user_updated', table_name='mindmaps')
+
+    op.create_index('idx_quiz_questions_user_nb', 'quiz_questions', ['user_id', 'notebook_id'], unique=False)
+    op.drop_index('idx_quiz_questions_user_nb_created', table_name='quiz_questions')
+    op.drop_index('idx_quiz_questions_user_created', table_name='quiz_questions')
+
+    op.create_index('idx_flashcards_user_nb', 'flashcards', ['user_id', 'notebook_id'], unique=False)
+    op.drop_index('idx_flashcards_user_nb_id', table_name='flashcards')
+    op.drop_index('idx_flashcards_user_id', table_name='flashcards')
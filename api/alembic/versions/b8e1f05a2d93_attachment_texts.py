@@ -0,0 +1,36 @@
+"""attachment_texts: locally extracted attachment text, keyed by sha256
+
+Revision ID: b8e1f05a2d93
+Revises: a5d3e9f17c60
+Create Date: 2026-10-19 23:05:41.208116
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f05a2d93'
+down_revision = 'a5d3e9f17c60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'attachment_texts',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('chunks', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('pages', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('attachment_texts')
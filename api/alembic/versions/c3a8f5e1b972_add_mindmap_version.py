@@ -0,0 +1,25 @@
+"""add version to mindmaps for JSON Patch preconditions
+
+Revision ID: c3a8f5e1b972
+Revises: b7e4d2a9c613
+Create Date: 2026-10-19 16:42:07.512334
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8f5e1b972'
+down_revision = 'b7e4d2a9c613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('mindmaps', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('mindmaps', 'version')
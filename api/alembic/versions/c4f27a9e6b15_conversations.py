@@ -0,0 +1,63 @@
+"""conversations: server-side AI chat threads and their messages
+
+Revision ID: c4f27a9e6b15
+Revises: b8e1f05a2d93
+Create Date: 2026-10-20 09:41:27.553102
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c4f27a9e6b15'
+down_revision = 'b8e1f05a2d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('notebook_id', sa.UUID(), nullable=True),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('last_response_id', sa.String(length=128), nullable=True),
+        sa.Column('message_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['notebook_id'], ['notebooks.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'idx_conversations_user_updated', 'conversations', ['user_id', 'updated_at', 'id'], unique=False
+    )
+    op.create_index(
+        'idx_conversations_user_nb_updated',
+        'conversations',
+        ['user_id', 'notebook_id', 'updated_at', 'id'],
+        unique=False,
+    )
+    op.create_table(
+        'conversation_messages',
+        sa.Column('conversation_id', sa.UUID(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=16), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('response_id', sa.String(length=128), nullable=True),
+        sa.Column('meta', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('conversation_id', 'seq'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('conversation_messages')
+    op.drop_index('idx_conversations_user_nb_updated', table_name='conversations')
+    op.drop_index('idx_conversations_user_updated', table_name='conversations')
+    op.drop_table('conversations')
@@ -0,0 +1,33 @@
+"""add created_at/updated_at to flashcards for ETag fingerprints
+
+Revision ID: d91f6b3c0e24
+Revises: c3a8f5e1b972
+Create Date: 2026-10-19 18:20:44.093127
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd91f6b3c0e24'
+down_revision = 'c3a8f5e1b972'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'flashcards',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.add_column(
+        'flashcards',
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('flashcards', 'updated_at')
+    op.drop_column('flashcards', 'created_at')
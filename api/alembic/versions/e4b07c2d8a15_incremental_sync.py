@@ -0,0 +1,63 @@
+"""incremental sync: note timestamps, updated_at indexes and tombstones
+
+Revision ID: e4b07c2d8a15
+Revises: d91f6b3c0e24
+Create Date: 2026-10-19 20:11:36.784205
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e4b07c2d8a15'
+down_revision = 'd91f6b3c0e24'
+branch_labels = None
+depends_on = None
+
+_UPDATED_INDEXES = [
+    ('idx_attachments_user_updated', 'attachments'),
+    ('idx_notebook_folders_user_updated', 'notebook_folders'),
+    ('idx_flashcard_folders_user_updated', 'flashcard_folders'),
+    ('idx_flashcards_user_updated', 'flashcards'),
+    ('idx_quiz_folders_user_updated', 'quiz_folders'),
+    ('idx_quiz_questions_user_updated', 'quiz_questions'),
+]
+
+
+def upgrade() -> None:
+    op.add_column(
+        'notes',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.add_column(
+        'notes',
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_notes_notebook_updated', 'notes', ['notebook_id', 'updated_at'], unique=False)
+    for name, table in _UPDATED_INDEXES:
+        op.create_index(name, table, ['user_id', 'updated_at'], unique=False)
+
+    op.create_table(
+        'sync_tombstones',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('entity', sa.String(length=64), nullable=False),
+        sa.Column('entity_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_sync_tombstones_user_deleted', 'sync_tombstones', ['user_id', 'deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_sync_tombstones_user_deleted', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    for name, table in reversed(_UPDATED_INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_index('idx_notes_notebook_updated', table_name='notes')
+    op.drop_column('notes', 'updated_at')
+    op.drop_column('notes', 'created_at')
@@ -0,0 +1,64 @@
+"""full-text search: search_tsvector() and generated search_vector columns
+
+Revision ID: f2c6a0d4e718
+Revises: e4b07c2d8a15
+Create Date: 2026-10-19 21:02:47.519306
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a0d4e718'
+down_revision = 'e4b07c2d8a15'
+branch_labels = None
+depends_on = None
+
+# 'simple' lexemes for the non-CJK words, plus every CJK character and adjacent pair.
+# The character class must match CJK_CHARS in api/services/search.py.
+_SEARCH_TSVECTOR = r"""
+CREATE OR REPLACE FUNCTION search_tsvector(doc text) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT to_tsvector('simple'::regconfig, regexp_replace(coalesce(doc, ''), '[\u3400-\u9fff\uf900-\ufaff]+', ' ', 'g'))
+        || coalesce((
+            SELECT array_to_tsvector(array_agg(DISTINCT g.gram))
+            FROM regexp_matches(coalesce(doc, ''), '[\u3400-\u9fff\uf900-\ufaff]+', 'g') AS m(run),
+                 generate_series(1, char_length(m.run[1])) AS i,
+                 LATERAL (VALUES (substr(m.run[1], i, 1)), (substr(m.run[1], i, 2))) AS g(gram)
+        ), ''::tsvector)
+$$
+"""
+
+_SEARCHABLE = [
+    ('notes', 'idx_notes_search', ['title', 'content']),
+    ('flashcards', 'idx_flashcards_search', ['question', 'answer']),
+    ('quiz_questions', 'idx_quiz_questions_search', ['question']),
+    ('attachments', 'idx_attachments_search', ['filename', 'summary']),
+    ('transcription_segments', 'idx_ts_segments_search', ['text']),
+]
+
+
+def upgrade() -> None:
+    op.execute(_SEARCH_TSVECTOR)
+    for table, index, columns in _SEARCHABLE:
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+        op.add_column(
+            table,
+            sa.Column(
+                'search_vector',
+                postgresql.TSVECTOR(),
+                sa.Computed(f'search_tsvector({document})', persisted=True),
+                nullable=True,
+            ),
+        )
+        op.create_index(index, table, ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    for table, index, _ in reversed(_SEARCHABLE):
+        op.drop_index(index, table_name=table, postgresql_using='gin')
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION IF EXISTS search_tsvector(text)')
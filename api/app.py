@@ -1,6 +1,9 @@
 import os
+import re
+import time
+import uuid
 from pathlib import Path
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
@@ -16,11 +19,44 @@ from .routes import notebook_folders as notebook_folders_router
 from .routes import flashcards as flashcards_router
 from .routes import quizzes as quizzes_router
 from .routes import mindmaps as mindmaps_router
+from .routes import conversations as conversations_router
+from .routes import sync as sync_router
+from .routes import search as search_router
+from .routes import retrieval as retrieval_router
+from .routes import metrics as metrics_router
+from .routes import admin as admin_router
+from .db.instrumentation import query_budget, server_timing, track_queries
+from .services import ai_registry, conversations, extraction, metrics, usage
+from .settings import settings
+from .services.app_logging import get_logger, request_id_var, setup_logging, shutdown_logging
+from .services.pagination import NEXT_CURSOR_HEADER
+
+setup_logging()
+logger = get_logger(__name__)
+access_logger = get_logger("api.access")
+
+# Accept caller-supplied request ids only if they are short and header-safe.
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
 
 SERVE_SPA = os.getenv("SERVE_SPA", "false").lower() == "true"
 
 app = FastAPI(title="AI Web API", docs_url="/docs", redoc_url=None)
 
+@app.on_event("startup")
+def build_ai_registry():
+    ai_registry.load_registry()
+
+@app.on_event("startup")
+async def start_background_flushers():
+    usage.start_usage_flusher()
+
+@app.on_event("shutdown")
+async def stop_background_flushers():
+    await usage.stop_usage_flusher()
+    await conversations.drain()
+    extraction.shutdown_pool()
+    shutdown_logging()
+
 @app.middleware("http")
 async def catch_exceptions_middleware(request: Request, call_next):
     try:
@@ -33,6 +69,7 @@ async def catch_exceptions_middleware(request: Request, call_next):
         )
     except Exception as exc:
         # Only unexpected exceptions fall back to a 500.
+        logger.exception("Unhandled error on %s %s", request.method, request.url.path)
         return JSONResponse(
             status_code=500,
             content={"error": {"message": f"{type(exc).__name__}: {exc}"}},
@@ -50,12 +87,92 @@ async def no_cache_middleware(request: Request, call_next):
         resp.headers["Expires"] = "0"
     return resp
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    method = request.method
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc(method)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        resp: Response = await call_next(request)
+        status_code = resp.status_code
+        return resp
+    finally:
+        # Label by route template (not raw path) to keep cardinality bounded.
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "<unmatched>"
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, method, route_path, str(status_code)
+        )
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec(method)
+
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    if not settings.DB_QUERY_STATS:
+        return await call_next(request)
+    with track_queries(settings.DB_QUERY_BUDGET_DEFAULT) as stats:
+        resp: Response = await call_next(request)
+    if stats.count == 0:
+        return resp
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "<unmatched>"
+    metrics.DB_QUERIES_PER_REQUEST.observe(stats.count, route_path)
+    metrics.DB_TIME_PER_REQUEST.observe(stats.seconds, route_path)
+    resp.headers.append("Server-Timing", server_timing(stats))
+
+    repeated = stats.repeated(settings.DB_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        statement, times = repeated[0]
+        logger.warning(
+            "Possible N+1: statement ran %d times on %s %s",
+            times,
+            request.method,
+            route_path,
+            extra={"route": route_path, "statement": statement[:500], "query_count": stats.count},
+        )
+    if stats.over_budget():
+        metrics.DB_QUERY_BUDGET_EXCEEDED.inc(route_path)
+        message = f"Query budget exceeded on {request.method} {route_path}: {stats.count} > {stats.budget}"
+        if settings.DB_QUERY_BUDGET_STRICT:
+            return JSONResponse(status_code=500, content={"error": {"message": message}})
+        logger.warning(message, extra={"route": route_path, "query_count": stats.count})
+    return resp
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    # Registered last so it is outermost: everything below logs with this request id.
+    incoming = request.headers.get("X-Request-ID", "")
+    request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        resp: Response = await call_next(request)
+        status_code = resp.status_code
+        resp.headers["X-Request-ID"] = request_id
+        return resp
+    finally:
+        access_logger.info(
+            "%s %s %s",
+            request.method,
+            request.url.path,
+            status_code,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+        request_id_var.reset(token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Important: include router objects, not the modules.
@@ -70,16 +187,22 @@ app.include_router(notebook_folders_router.router, prefix="/api")
 app.include_router(flashcards_router.router, prefix="/api")
 app.include_router(quizzes_router.router, prefix="/api")
 app.include_router(mindmaps_router.router, prefix="/api")
+app.include_router(conversations_router.router, prefix="/api")
+app.include_router(sync_router.router, prefix="/api")
+app.include_router(search_router.router, prefix="/api")
+app.include_router(retrieval_router.router, prefix="/api")
+app.include_router(admin_router.router, prefix="/api")
+app.include_router(metrics_router.router)
 
 if SERVE_SPA:
     FRONTEND_DIST = (Path(__file__).resolve().parent.parent / "web" / "dist").resolve()
     app.mount("/", StaticFiles(directory=str(FRONTEND_DIST), html=True), name="spa")
 else:
-    @app.get("/")
+    @app.get("/", dependencies=[Depends(query_budget(2))])
     async def root():
         return {"status": "ok", "message": "API only (dev). Frontend runs on Vite :5173."}
 
-@app.get("/health")
+@app.get("/health", dependencies=[Depends(query_budget(2))])
 async def health():
     return {"status": "ok"}
 
@@ -0,0 +1,326 @@
+"""Set-based writes for flashcards, quiz questions and folder membership.
+
+Rows go in through `INSERT ... RETURNING` (batched into multi-row VALUES by
+SQLAlchemy's insertmanyvalues), so callers build response schemas straight from the
+returned rows without loading or refreshing ORM objects. A generated batch costs one
+INSERT for the items and one for their folder-item links, whatever its size.
+
+Returned rows are plain tuples, so they stay readable after commit (unlike expired
+ORM instances). Every membership change bumps the folders' `updated_at`, which the
+ETag fingerprints of folder-linked listings rely on (see api.services.http_cache).
+"""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from api.db import models
+
+FLASHCARD_COLUMNS = (
+    models.Flashcard.id,
+    models.Flashcard.notebook_id,
+    models.Flashcard.question,
+    models.Flashcard.answer,
+    models.Flashcard.meta,
+)
+QUIZ_QUESTION_COLUMNS = (
+    models.QuizQuestion.id,
+    models.QuizQuestion.notebook_id,
+    models.QuizQuestion.question,
+    models.QuizQuestion.options,
+    models.QuizQuestion.correct_index,
+    models.QuizQuestion.hint,
+    models.QuizQuestion.explaination,
+    models.QuizQuestion.meta,
+    models.QuizQuestion.is_favorite,
+    models.QuizQuestion.created_at,
+    models.QuizQuestion.updated_at,
+)
+FLASHCARD_FOLDER_COLUMNS = (
+    models.FlashcardFolder.id,
+    models.FlashcardFolder.notebook_id,
+    models.FlashcardFolder.name,
+    models.FlashcardFolder.description,
+    models.FlashcardFolder.created_at,
+    models.FlashcardFolder.updated_at,
+)
+QUIZ_FOLDER_COLUMNS = (
+    models.QuizFolder.id,
+    models.QuizFolder.notebook_id,
+    models.QuizFolder.name,
+    models.QuizFolder.created_at,
+    models.QuizFolder.updated_at,
+)
+
+
+def insert_returning(db: Session, model: Any, rows: Sequence[Dict[str, Any]], columns: Sequence[Any]) -> List[Row]:
+    """INSERT `rows` and return `columns` for each, in input order."""
+    if not rows:
+        return []
+    for row in rows:
+        row.setdefault("id", uuid.uuid4())
+    stmt = insert(model).returning(*columns, sort_by_parameter_order=True)
+    return list(db.execute(stmt, list(rows)))
+
+
+def insert_one_returning(db: Session, model: Any, values: Dict[str, Any], columns: Sequence[Any]) -> Row:
+    """Single-row `insert_returning`."""
+    return insert_returning(db, model, [values], columns)[0]
+
+
+def next_seq(db: Session, item_model: Any, folder_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, int]:
+    """Next free `seq` per folder for `item_model` (a folder-item join model); empty folders start at 0."""
+    ids = list(dict.fromkeys(folder_ids))
+    if not ids:
+        return {}
+    rows = db.execute(
+        select(item_model.folder_id, func.max(item_model.seq))
+        .where(item_model.folder_id.in_(ids))
+        .group_by(item_model.folder_id)
+    )
+    return {folder_id: (top + 1 if top is not None else 0) for folder_id, top in rows}
+
+
+def _links(
+    created: Sequence[Row],
+    folder_ids: Sequence[Sequence[uuid.UUID]],
+    seqs: Dict[uuid.UUID, int],
+) -> Iterator[Tuple[uuid.UUID, uuid.UUID, int]]:
+    """Pair each created row with its folders, appending to the end of each folder."""
+    for row, folders in zip(created, folder_ids):
+        for folder_id in dict.fromkeys(folders):
+            seq = seqs.get(folder_id, 0)
+            seqs[folder_id] = seq + 1
+            yield folder_id, row.id, seq
+
+
+def insert_flashcards(
+    db: Session,
+    rows: Sequence[Dict[str, Any]],
+    folder_ids: Sequence[Sequence[uuid.UUID]] = (),
+    *,
+    seqs: Optional[Dict[uuid.UUID, int]] = None,
+) -> List[Row]:
+    """Insert flashcards and their folder links; `folder_ids[i]` are the folders of `rows[i]`.
+
+    `seqs` is the next position per folder (see `next_seq`); folders missing from it
+    are treated as empty.
+    """
+    created = insert_returning(db, models.Flashcard, rows, FLASHCARD_COLUMNS)
+    links = [
+        {"folder_id": folder_id, "flashcard_id": item_id, "seq": seq}
+        for folder_id, item_id, seq in _links(created, folder_ids, dict(seqs or {}))
+    ]
+    if links:
+        db.execute(insert(models.FlashcardFolderItem), links)
+        touch_folders(db, models.FlashcardFolderItem, {link["folder_id"] for link in links})
+    return created
+
+
+def insert_quiz_questions(
+    db: Session,
+    rows: Sequence[Dict[str, Any]],
+    folder_ids: Sequence[Sequence[uuid.UUID]] = (),
+    *,
+    seqs: Optional[Dict[uuid.UUID, int]] = None,
+) -> List[Row]:
+    """Insert quiz questions and their folder links; same contract as `insert_flashcards`."""
+    created = insert_returning(db, models.QuizQuestion, rows, QUIZ_QUESTION_COLUMNS)
+    links = [
+        {"folder_id": folder_id, "question_id": item_id, "seq": seq}
+        for folder_id, item_id, seq in _links(created, folder_ids, dict(seqs or {}))
+    ]
+    if links:
+        db.execute(insert(models.QuizFolderItem), links)
+        touch_folders(db, models.QuizFolderItem, {link["folder_id"] for link in links})
+    return created
+
+
+def owned_notebooks(db: Session, model: Any, user_id: uuid.UUID, ids: Collection[uuid.UUID]) -> Dict[uuid.UUID, uuid.UUID]:
+    """Map id -> notebook_id for the rows of `model` among `ids` that belong to the user."""
+    if not ids:
+        return {}
+    rows = db.execute(select(model.id, model.notebook_id).where(model.user_id == user_id, model.id.in_(ids)))
+    return {row_id: notebook_id for row_id, notebook_id in rows}
+
+
+def relink(
+    db: Session,
+    item_model: Any,
+    item_ids: Sequence[uuid.UUID],
+    *,
+    add: Sequence[uuid.UUID] = (),
+    remove: Sequence[uuid.UUID] = (),
+) -> None:
+    """Drop the links of `item_ids` to `remove` folders, then append them to `add` folders.
+
+    `item_model` is the folder-item join model. Items already in an `add` folder keep
+    their position; moving between folders is `remove=[old], add=[new]`.
+    """
+    if not item_ids:
+        return
+    item_column = _item_column(item_model)
+    touch_folders(db, item_model, [*add, *remove])
+    if remove:
+        db.execute(
+            delete(item_model)
+            .where(item_model.folder_id.in_(remove), item_column.in_(item_ids))
+            .execution_options(synchronize_session=False)
+        )
+    if not add:
+        return
+    existing = {
+        (folder_id, item_id)
+        for folder_id, item_id in db.execute(
+            select(item_model.folder_id, item_column).where(
+                item_model.folder_id.in_(add), item_column.in_(item_ids)
+            )
+        )
+    }
+    seqs = next_seq(db, item_model, add)
+    rows: List[Dict[str, Any]] = []
+    for folder_id in add:
+        seq = seqs.get(folder_id, 0)
+        for item_id in item_ids:
+            if (folder_id, item_id) not in existing:
+                rows.append({"folder_id": folder_id, item_column.key: item_id, "seq": seq})
+                seq += 1
+    if rows:
+        db.execute(insert(item_model), rows)
+
+
+def delete_owned(db: Session, model: Any, user_id: uuid.UUID, ids: Collection[uuid.UUID]) -> Set[uuid.UUID]:
+    """DELETE the user's rows among `ids` in one statement; returns the ids actually deleted.
+
+    Folder-item links go with them through the `ON DELETE CASCADE` foreign keys. The
+    deletions are recorded as sync tombstones.
+    """
+    if not ids:
+        return set()
+    stmt = (
+        delete(model)
+        .where(model.user_id == user_id, model.id.in_(ids))
+        .returning(model.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = set(db.scalars(stmt))
+    record_deletions(db, user_id, model, deleted)
+    return deleted
+
+
+def record_deletions(db: Session, user_id: uuid.UUID, model: Any, ids: Iterable[uuid.UUID]) -> None:
+    """Write a sync tombstone for each deleted row of `model` (one INSERT), in the deleting transaction."""
+    rows = [{"user_id": user_id, "entity": model.__tablename__, "entity_id": row_id} for row_id in ids]
+    if rows:
+        db.execute(insert(models.SyncTombstone), rows)
+
+
+def member_ids(db: Session, item_model: Any, folder_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, List[uuid.UUID]]:
+    """Member ids per folder in `seq` order, read from the join table alone.
+
+    One query for any number of folders, and none of the member rows themselves are
+    loaded.
+    """
+    members: Dict[uuid.UUID, List[uuid.UUID]] = {folder_id: [] for folder_id in folder_ids}
+    if not members:
+        return members
+    item_column = _item_column(item_model)
+    rows = db.execute(
+        select(item_model.folder_id, item_column)
+        .where(item_model.folder_id.in_(members))
+        .order_by(item_model.folder_id, item_model.seq, item_column)
+    )
+    for folder_id, item_id in rows:
+        members[folder_id].append(item_id)
+    return members
+
+
+def folder_ids_of(db: Session, item_model: Any, item_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, List[uuid.UUID]]:
+    """The reverse of `member_ids`: folder ids per item, from one join-table query."""
+    folders: Dict[uuid.UUID, List[uuid.UUID]] = {item_id: [] for item_id in item_ids}
+    if not folders:
+        return folders
+    item_column = _item_column(item_model)
+    rows = db.execute(
+        select(item_column, item_model.folder_id)
+        .where(item_column.in_(folders))
+        .order_by(item_column, item_model.folder_id)
+    )
+    for item_id, folder_id in rows:
+        folders[item_id].append(folder_id)
+    return folders
+
+
+def replace_members(db: Session, item_model: Any, folder_id: uuid.UUID, item_ids: Sequence[uuid.UUID]) -> List[uuid.UUID]:
+    """Make `item_ids` the folder's members, in that order; returns them deduplicated.
+
+    Diffs against the current join rows: removed links are deleted, new ones inserted
+    and kept ones re-sequenced only when their position changed. Unchanged links are
+    not touched.
+    """
+    item_column = _item_column(item_model)
+    wanted = {item_id: seq for seq, item_id in enumerate(dict.fromkeys(item_ids))}
+    current = {
+        item_id: seq
+        for item_id, seq in db.execute(select(item_column, item_model.seq).where(item_model.folder_id == folder_id))
+    }
+    removed = [item_id for item_id in current if item_id not in wanted]
+    if removed:
+        db.execute(
+            delete(item_model)
+            .where(item_model.folder_id == folder_id, item_column.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+    added = [
+        {"folder_id": folder_id, item_column.key: item_id, "seq": seq}
+        for item_id, seq in wanted.items()
+        if item_id not in current
+    ]
+    if added:
+        db.execute(insert(item_model), added)
+    moved = [
+        {"folder_id": folder_id, item_column.key: item_id, "seq": seq}
+        for item_id, seq in wanted.items()
+        if item_id in current and current[item_id] != seq
+    ]
+    if moved:
+        # ORM bulk UPDATE by primary key: one executemany.
+        db.execute(update(item_model), moved)
+    if removed or added or moved:
+        touch_folders(db, item_model, [folder_id])
+    return list(wanted)
+
+
+def touch_folders(db: Session, item_model: Any, folder_ids: Collection[uuid.UUID]) -> None:
+    """Bump `updated_at` on the folders behind `item_model` whose membership changed."""
+    if not folder_ids:
+        return
+    folder_model = _FOLDER_MODELS[item_model]
+    db.execute(
+        update(folder_model)
+        .where(folder_model.id.in_(folder_ids))
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+_FOLDER_MODELS = {
+    models.FlashcardFolderItem: models.FlashcardFolder,
+    models.QuizFolderItem: models.QuizFolder,
+    models.NotebookFolderItem: models.NotebookFolder,
+}
+
+
+def _item_column(item_model: Any) -> Any:
+    if item_model is models.FlashcardFolderItem:
+        return models.FlashcardFolderItem.flashcard_id
+    if item_model is models.QuizFolderItem:
+        return models.QuizFolderItem.question_id
+    if item_model is models.NotebookFolderItem:
+        return models.NotebookFolderItem.notebook_id
+    raise ValueError(f"Not a folder-item model: {item_model!r}")
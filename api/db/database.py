@@ -9,6 +9,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 from sqlalchemy.pool import NullPool
 
+from api.db.instrumentation import instrument_engine
 from api.settings import settings
 
 
@@ -25,6 +26,9 @@ engine = create_engine(
     future=True,
 )
 
+if settings.DB_QUERY_STATS:
+    instrument_engine(engine)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
@@ -0,0 +1,115 @@
+"""Per-request SQL query counting, DB time, N+1 hints and query budgets.
+
+Engine events add to a `QueryStats` held in a contextvar. FastAPI runs sync routes and
+dependencies in worker threads with a copy of the request context, so those threads
+all update the same stats object that the HTTP middleware created.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    budget: Optional[int] = None
+    statements: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least `threshold` times: the usual N+1 signature."""
+        return sorted(
+            ((statement, n) for statement, n in self.statements.items() if n >= threshold),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries(budget: Optional[int] = None, *, strict: bool = False) -> Iterator[QueryStats]:
+    """Collect stats for the enclosed block; with `strict`, raise if the budget is exceeded."""
+    stats = QueryStats(budget=budget)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if strict and stats.over_budget():
+        raise QueryBudgetExceeded(f"{stats.count} queries executed, budget is {stats.budget}")
+
+
+def query_budget(limit: int) -> Callable[[], None]:
+    """Route dependency declaring the maximum number of queries the handler may issue.
+
+    Usage: `dependencies=[Depends(query_budget(3))]`.
+    """
+
+    def _declare() -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = limit
+
+    _declare.query_budget = limit  # type: ignore[attr-defined]
+    return _declare
+
+
+def declared_budget(dependant: Any) -> Optional[int]:
+    """The `query_budget` declared anywhere in a route's dependency tree (`route.dependant`)."""
+    for sub in dependant.dependencies:
+        limit = getattr(sub.call, "query_budget", None)
+        if limit is None:
+            limit = declared_budget(sub)
+        if limit is not None:
+            return limit
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and _current.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    if stats is None:
+        return
+    started = getattr(context, "_query_started", None)
+    stats.record(statement, time.perf_counter() - started if started is not None else 0.0)
+
+
+def instrument_engine(target: Engine) -> None:
+    if event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+
+def server_timing(stats: QueryStats) -> str:
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
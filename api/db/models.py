@@ -5,27 +5,42 @@ from __future__ import annotations
 import enum
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
+    Computed,
     DateTime,
     Enum,
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     Numeric,
     String,
     Text,
     UniqueConstraint,
 )
-from sqlalchemy.dialects.postgresql import CITEXT, JSONB, UUID
+from sqlalchemy.dialects.postgresql import CITEXT, JSONB, TSVECTOR, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
 from api.db.database import Base
 
 
+def search_vector(*columns: str) -> Mapped[Any]:
+    """Generated, deferred tsvector over `columns` for GET /search (see api.services.search).
+
+    `search_tsvector()` is created by migration f2c6a0d4e718: 'simple' word lexemes plus
+    CJK unigrams and bigrams.
+    """
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return mapped_column(
+        TSVECTOR, Computed(f"search_tsvector({document})", persisted=True), nullable=True, deferred=True
+    )
+
+
 def enum_values(enum_cls: type[enum.Enum]) -> list[str]:
     """Return the enum values as strings for SQLAlchemy Enum columns."""
     return [member.value for member in enum_cls]
@@ -92,6 +107,11 @@ class User(Base, TimestampMixin):
         "MindMap", back_populates="user", cascade="all, delete-orphan"
     )
 
+    # AI chat threads.
+    conversations: Mapped[List["Conversation"]] = relationship(
+        "Conversation", back_populates="user", cascade="all, delete-orphan"
+    )
+
 
 class MembershipStatus(str, enum.Enum):
     ACTIVE = "active"
@@ -129,6 +149,14 @@ class Membership(Base):
     __table_args__ = (Index("idx_memberships_user", "user_id"),)
 
 
+class RetrievalMode(str, enum.Enum):
+    """Where notebook chat gets its context from (see api.services.retrieval)."""
+
+    FILE_SEARCH = "file_search"
+    BM25 = "bm25"
+    HYBRID = "hybrid"
+
+
 class Notebook(Base, TimestampMixin):
     __tablename__ = "notebooks"
 
@@ -148,7 +176,17 @@ class Notebook(Base, TimestampMixin):
 
     vector_store_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    # TODO: add relation to AI chat messages.
+    # Hosted file_search over the vector store, or the local index in retrieval_chunks.
+    retrieval_mode: Mapped[RetrievalMode] = mapped_column(
+        Enum(
+            RetrievalMode,
+            name="notebook_retrieval_mode",
+            values_callable=enum_values,
+            validate_strings=True,
+        ),
+        nullable=False,
+        server_default=RetrievalMode.FILE_SEARCH.value,
+    )
 
     user: Mapped["User"] = relationship("User", back_populates="notebooks")
     notes: Mapped[List["Note"]] = relationship(
@@ -185,12 +223,17 @@ class Notebook(Base, TimestampMixin):
         "MindMap", back_populates="notebook", cascade="all, delete-orphan"
     )
 
+    # AI chat threads about this notebook.
+    conversations: Mapped[List["Conversation"]] = relationship(
+        "Conversation", back_populates="notebook", cascade="all, delete-orphan"
+    )
+
     __table_args__ = (
         Index("idx_notebooks_user_updated", "user_id", "updated_at"),
     )
 
 
-class Note(Base):
+class Note(Base, TimestampMixin):
     __tablename__ = "notes"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -200,12 +243,15 @@ class Note(Base):
     title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    search_vector: Mapped[Any] = search_vector("title", "content")
 
     notebook: Mapped["Notebook"] = relationship("Notebook", back_populates="notes")
 
     __table_args__ = (
         UniqueConstraint("notebook_id", "seq", name="uq_notes_seq"),
         Index("idx_notes_notebook", "notebook_id"),
+        Index("idx_notes_notebook_updated", "notebook_id", "updated_at"),
+        Index("idx_notes_search", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -269,6 +315,8 @@ class Attachment(Base, TimestampMixin):
     transcription_lang: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     transcription_duration_sec: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
+    search_vector: Mapped[Any] = search_vector("filename", "summary")
+
     # Relationships
     notebook: Mapped["Notebook"] = relationship("Notebook", back_populates="attachments")
     user: Mapped["User"] = relationship("User", back_populates="attachments")
@@ -284,6 +332,8 @@ class Attachment(Base, TimestampMixin):
     __table_args__ = (
         Index("idx_attachments_notebook", "notebook_id"),
         Index("idx_attachments_user", "user_id"),
+        Index("idx_attachments_user_updated", "user_id", "updated_at"),
+        Index("idx_attachments_search", "search_vector", postgresql_using="gin"),
         Index("idx_attachments_sha", "sha256"),
         Index("idx_attachments_openai_file_id", "openai_file_id"),
     )
@@ -366,12 +416,14 @@ class TranscriptionSegment(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+    search_vector: Mapped[Any] = search_vector("text")
 
     session: Mapped["TranscriptionSession"] = relationship("TranscriptionSession", back_populates="segments")
 
     __table_args__ = (
         UniqueConstraint("session_id", "seq", name="uq_ts_segments_seq"),
         Index("idx_ts_segments_session", "session_id", "seq"),
+        Index("idx_ts_segments_search", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -399,11 +451,13 @@ class NotebookFolder(Base, TimestampMixin):
         "Notebook",
         secondary="notebook_folder_items",
         back_populates="folders",
+        passive_deletes=True,
     )
 
     __table_args__ = (
         UniqueConstraint("user_id", "name", name="uq_notebook_folders_user_name"),
         Index("idx_notebook_folders_user", "user_id"),
+        Index("idx_notebook_folders_user_updated", "user_id", "updated_at"),
     )
 
 
@@ -455,6 +509,7 @@ class FlashcardFolder(Base, TimestampMixin):
         secondary="flashcard_folder_items",
         back_populates="folders",
         order_by="FlashcardFolderItem.seq",
+        passive_deletes=True,
     )
 
     __table_args__ = (
@@ -462,10 +517,11 @@ class FlashcardFolder(Base, TimestampMixin):
             "user_id", "notebook_id", "name", name="uq_flashcard_folders_user_nb_name"
         ),
         Index("idx_flashcard_folders_user_nb", "user_id", "notebook_id"),
+        Index("idx_flashcard_folders_user_updated", "user_id", "updated_at"),
     )
 
 
-class Flashcard(Base):
+class Flashcard(Base, TimestampMixin):
     """Flashcard storing only question and answer, scoped to a Notebook."""
 
     __tablename__ = "flashcards"
@@ -482,6 +538,7 @@ class Flashcard(Base):
     answer: Mapped[str] = mapped_column(Text, nullable=False)
 
     meta: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    search_vector: Mapped[Any] = search_vector("question", "answer")
 
     user: Mapped["User"] = relationship("User", back_populates="flashcards")
     notebook: Mapped["Notebook"] = relationship("Notebook", back_populates="flashcards")
@@ -492,7 +549,11 @@ class Flashcard(Base):
     )
 
     __table_args__ = (
-        Index("idx_flashcards_user_nb", "user_id", "notebook_id"),
+        # Keyset pagination order for GET /flashcards (see api.services.pagination).
+        Index("idx_flashcards_user_id", "user_id", "id"),
+        Index("idx_flashcards_user_nb_id", "user_id", "notebook_id", "id"),
+        Index("idx_flashcards_user_updated", "user_id", "updated_at"),
+        Index("idx_flashcards_search", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -543,6 +604,7 @@ class QuizFolder(Base, TimestampMixin):
         secondary="quiz_folder_items",
         back_populates="folders",
         order_by="QuizFolderItem.seq",
+        passive_deletes=True,
     )
     # One-to-one: latest attempt for this folder.
     latest_attempt: Mapped[Optional["QuizAttempt"]] = relationship(
@@ -557,6 +619,7 @@ class QuizFolder(Base, TimestampMixin):
             "user_id", "notebook_id", "name", name="uq_quiz_folders_user_nb_name"
         ),
         Index("idx_quiz_folders_user_nb", "user_id", "notebook_id"),
+        Index("idx_quiz_folders_user_updated", "user_id", "updated_at"),
     )
 
 
@@ -592,6 +655,7 @@ class QuizQuestion(Base, TimestampMixin):
     meta: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
 
     is_favorite: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    search_vector: Mapped[Any] = search_vector("question")
 
     user: Mapped["User"] = relationship("User", back_populates="quiz_questions")
     notebook: Mapped["Notebook"] = relationship("Notebook", back_populates="quiz_questions")
@@ -602,7 +666,11 @@ class QuizQuestion(Base, TimestampMixin):
     )
 
     __table_args__ = (
-        Index("idx_quiz_questions_user_nb", "user_id", "notebook_id"),
+        # Keyset pagination order for GET /quizzes (see api.services.pagination).
+        Index("idx_quiz_questions_user_created", "user_id", "created_at", "id"),
+        Index("idx_quiz_questions_user_nb_created", "user_id", "notebook_id", "created_at", "id"),
+        Index("idx_quiz_questions_user_updated", "user_id", "updated_at"),
+        Index("idx_quiz_questions_search", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -678,12 +746,237 @@ class MindMap(Base, TimestampMixin):
 
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     data: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # Bumped by the ORM on every UPDATE, which is also guarded by `WHERE version = :old`;
+    # clients send it back as the precondition for PUT/PATCH.
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     user: Mapped["User"] = relationship("User", back_populates="mindmaps")
     notebook: Mapped["Notebook"] = relationship("Notebook", back_populates="mindmaps")
 
     __table_args__ = (
-        Index("idx_mindmaps_user_nb", "user_id", "notebook_id"),
+        # Keyset pagination order for GET /mindmaps (see api.services.pagination).
+        Index("idx_mindmaps_user_updated", "user_id", "updated_at", "id"),
+        Index("idx_mindmaps_user_nb_updated", "user_id", "notebook_id", "updated_at", "id"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+# ---------------------------------------------------------------------------
+# AI chat conversations
+# ---------------------------------------------------------------------------
+
+
+class Conversation(Base, TimestampMixin):
+    """An AI chat thread; the server owns its `previous_response_id` chain.
+
+    `last_response_id` is the newest recorded response, sent upstream as
+    `previous_response_id` for the next turn, so the model sees the whole thread
+    without the history being replayed (see api.services.conversations).
+    """
+
+    __tablename__ = "conversations"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    notebook_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("notebooks.id", ondelete="CASCADE"), nullable=True
+    )
+    title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_response_id: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    # Also the `seq` of the newest message.
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+    user: Mapped["User"] = relationship("User", back_populates="conversations")
+    notebook: Mapped[Optional["Notebook"]] = relationship("Notebook", back_populates="conversations")
+    messages: Mapped[List["ConversationMessage"]] = relationship(
+        "ConversationMessage", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    __table_args__ = (
+        # Keyset pagination order for GET /conversations (see api.services.pagination).
+        Index("idx_conversations_user_updated", "user_id", "updated_at", "id"),
+        Index("idx_conversations_user_nb_updated", "user_id", "notebook_id", "updated_at", "id"),
+    )
+
+
+class ConversationMessage(Base):
+    """One chat message, stored compactly: its plain text plus a small `meta` object.
+
+    The primary key `(conversation_id, seq)` is also the history pagination order.
+    `meta` keeps what the client renders besides the text: attachment names and image
+    count for user messages; status, model, usage and file citations for replies.
+    """
+
+    __tablename__ = "conversation_messages"
+
+    conversation_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # "user" | "assistant"
+    role: Mapped[str] = mapped_column(String(16), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    # Set on assistant messages.
+    response_id: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    meta: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    conversation: Mapped["Conversation"] = relationship("Conversation", back_populates="messages")
+
+
+# ---------------------------------------------------------------------------
+# Incremental sync
+# ---------------------------------------------------------------------------
+
+
+class SyncTombstone(Base):
+    """A deleted row, kept so GET /sync can report the deletion.
+
+    `entity` is the deleted row's table name. Rows deleted by cascade (everything
+    under a deleted notebook) get no tombstone of their own.
+    """
+
+    __tablename__ = "sync_tombstones"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    entity: Mapped[str] = mapped_column(String(64), nullable=False)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        Index("idx_sync_tombstones_user_deleted", "user_id", "deleted_at"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Local retrieval index
+# ---------------------------------------------------------------------------
+
+
+class RetrievalChunk(Base):
+    """A passage of notebook material, cut from a note, attachment or transcript.
+
+    Chunks are derived data: they are rebuilt whenever the source's `updated_at`
+    differs from `source_updated_at` (see api.services.retrieval).
+    """
+
+    __tablename__ = "retrieval_chunks"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    notebook_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("notebooks.id", ondelete="CASCADE"), nullable=False
+    )
+    # "note" | "attachment" | "transcript" (source_id is the transcription session).
+    source: Mapped[str] = mapped_column(String(16), nullable=False)
+    source_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    source_updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    # Number of index terms, for BM25 length normalisation.
+    length: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Hashed character n-gram embedding: float32, L2-normalised.
+    vector: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        UniqueConstraint("notebook_id", "source", "source_id", "seq", name="uq_retrieval_chunks_seq"),
+    )
+
+
+class RetrievalPosting(Base):
+    """BM25 inverted index entry: `term` occurs `tf` times in `chunk_id`."""
+
+    __tablename__ = "retrieval_postings"
+
+    notebook_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("notebooks.id", ondelete="CASCADE"), primary_key=True
+    )
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    chunk_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("retrieval_chunks.id", ondelete="CASCADE"), primary_key=True
+    )
+    tf: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_retrieval_postings_chunk", "chunk_id"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Extracted attachment text
+# ---------------------------------------------------------------------------
+
+
+class AttachmentText(Base):
+    """Text extracted locally from an attachment file, shared by every attachment with the same bytes.
+
+    `chunks` holds [start, end) character offsets into `text`, cut at paragraph and
+    sentence breaks (see api.services.extraction). A row with `error` set records a
+    file that could not be read, so it is not downloaded and parsed again.
+    """
+
+    __tablename__ = "attachment_texts"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # "pdf" | "docx" | "pptx" | "text"
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    chunks: Mapped[List[List[int]]] = mapped_column(JSONB, nullable=False, default=list)
+    # PDF pages / PPTX slides; None for flowing text.
+    pages: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+# ---------------------------------------------------------------------------
+# AI usage accounting (aggregated per flush window)
+# ---------------------------------------------------------------------------
+
+
+class UsageEvent(Base):
+    """Token usage aggregated per user/scene/model over one flush window."""
+
+    __tablename__ = "usage_events"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Nullable: internal-token callers have no user; keep rows when a user is deleted.
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True
+    )
+    scene: Mapped[str] = mapped_column(String(64), nullable=False)
+    model_key: Mapped[str] = mapped_column(String(100), nullable=False)
+
+    period_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    period_end: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    requests: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    input_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    cached_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    output_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    reasoning_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        Index("idx_usage_events_user_period", "user_id", "period_start"),
+        Index("idx_usage_events_period", "period_start"),
     )
 
 
@@ -692,8 +985,10 @@ __all__ = [
     "Membership",
     "MembershipStatus",
     "Notebook",
+    "RetrievalMode",
     "Note",
     "Attachment",
+    "AttachmentText",
     "TranscriptionSession",
     "TranscriptionSegment",
     "TranscriptionSource",
@@ -707,4 +1002,10 @@ __all__ = [
     "QuizFolderItem",
     "QuizAttempt",
     "MindMap",
+    "Conversation",
+    "ConversationMessage",
+    "SyncTombstone",
+    "RetrievalChunk",
+    "RetrievalPosting",
+    "UsageEvent",
 ]
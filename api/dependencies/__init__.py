@@ -1,3 +1,3 @@
-from .auth import get_current_user, get_optional_user, require_csrf
+from .auth import get_current_user, get_optional_user, require_admin, require_csrf, user_from_session_token
 
-__all__ = ["get_current_user", "get_optional_user", "require_csrf"]
+__all__ = ["get_current_user", "get_optional_user", "require_admin", "require_csrf", "user_from_session_token"]
@@ -13,9 +13,8 @@ from api.security import decode_token, verify_csrf_token
 from api.settings import settings
 
 
-def get_optional_user(request: Request, db: Session = Depends(get_db)) -> models.User | None:
-    """Resolve the current user from the session cookie, or return None."""
-    token = request.cookies.get(settings.SESSION_COOKIE_NAME)
+def user_from_session_token(token: str | None, db: Session) -> models.User | None:
+    """Resolve an active user from a raw session token, or return None."""
     if not token:
         return None
     try:
@@ -36,12 +35,26 @@ def get_optional_user(request: Request, db: Session = Depends(get_db)) -> models
     return user
 
 
+def get_optional_user(request: Request, db: Session = Depends(get_db)) -> models.User | None:
+    """Resolve the current user from the session cookie, or return None."""
+    return user_from_session_token(request.cookies.get(settings.SESSION_COOKIE_NAME), db)
+
+
 def get_current_user(user: models.User | None = Depends(get_optional_user)) -> models.User:
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return user
 
 
+def require_admin(request: Request, user: models.User | None = Depends(get_optional_user)) -> None:
+    """Allow internal callers (X-API-KEY) or signed-in users listed in ADMIN_EMAILS."""
+    if settings.INTERNAL_TOKEN and request.headers.get("X-API-KEY") == settings.INTERNAL_TOKEN:
+        return
+    if user is not None and user.email.lower() in {email.lower() for email in settings.ADMIN_EMAILS}:
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+
 def require_csrf(request: Request) -> None:
     cookie_token = request.cookies.get(settings.CSRF_COOKIE_NAME)
     header_token = request.headers.get(settings.CSRF_HEADER_NAME)
@@ -0,0 +1,58 @@
+"""Operator-only endpoints (usage reporting, AI registry reload)."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from api.dependencies import require_admin
+from api.db.instrumentation import query_budget
+from api.services import ai_registry, usage
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/usage", dependencies=[Depends(query_budget(4))])
+def usage_summary(
+    since: Optional[datetime] = Query(default=None, description="Defaults to the last 24 hours"),
+    user_id: Optional[uuid.UUID] = Query(default=None),
+    scene: Optional[str] = Query(default=None),
+) -> Dict[str, Any]:
+    """Token usage and estimated cost per (user, scene, model), including the unflushed window."""
+    if since is None:
+        since = datetime.now(timezone.utc) - timedelta(hours=24)
+    elif since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    rows = usage.usage_report(since=since, user_id=user_id, scene=scene)
+    totals = {field: sum(row[field] for row in rows) for field in usage.USAGE_FIELDS}
+    costs = [row["cost_usd"] for row in rows if row["cost_usd"] is not None]
+    totals["cost_usd"] = round(sum(costs), 6) if costs else None
+    return {"since": since.isoformat(), "totals": totals, "items": rows}
+
+
+@router.post("/usage/flush", dependencies=[Depends(query_budget(3))])
+def flush_usage_now() -> Dict[str, Any]:
+    """Persist the in-memory usage window immediately."""
+    try:
+        rows = usage.flush_usage()
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Usage flush failed: {exc}")
+    return {"flushed_rows": rows}
+
+
+@router.post("/ai-registry/reload", dependencies=[Depends(query_budget(3))])
+def reload_ai_registry() -> Dict[str, Any]:
+    """Re-read AI_MODELS/AI_TOOLS (and their defaults) from the environment and swap the registry."""
+    try:
+        registry = ai_registry.reload_registry()
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"AI registry reload failed: {exc}")
+    return {
+        "version": registry.version,
+        "loaded_at": registry.loaded_at.isoformat(),
+        "models": len(registry.models),
+        "tools": len(registry.tools),
+    }
@@ -6,12 +6,13 @@ import re
 import unicodedata
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from api.dependencies import get_current_user, require_csrf
-from api.db import models
+from api.db import bulk, models
 from api.db.database import get_db
+from api.db.instrumentation import query_budget
 from api.schemas import (
     AttachmentLinkOpenAI,
     AttachmentUpdate,
@@ -19,7 +20,7 @@ from api.schemas import (
     PresignUploadRequest,
     PresignUploadResponse,
 )
-from api.services import openai_client
+from api.services import extraction, openai_client
 from api.services.s3_client import create_presigned_download, create_presigned_upload, delete_object
 
 
@@ -43,7 +44,7 @@ def _get_notebook_owned(notebook_id: uuid.UUID, user: models.User, db: Session)
     return notebook
 
 
-@router.post("/presign-upload", response_model=PresignUploadResponse, dependencies=[Depends(require_csrf)])
+@router.post("/presign-upload", response_model=PresignUploadResponse, dependencies=[Depends(require_csrf), Depends(query_budget(6))])
 def presign_upload(
     payload: PresignUploadRequest,
     user: models.User = Depends(get_current_user),
@@ -89,7 +90,7 @@ def presign_upload(
     )
 
 
-@router.get("/{attachment_id}/download-url", response_model=PresignDownloadResponse)
+@router.get("/{attachment_id}/download-url", response_model=PresignDownloadResponse, dependencies=[Depends(query_budget(4))])
 def attachment_download_url(
     attachment_id: uuid.UUID,
     user: models.User = Depends(get_current_user),
@@ -116,7 +117,7 @@ def attachment_download_url(
 
 @router.put(
     "/{attachment_id}",
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def update_attachment_metadata(
     attachment_id: uuid.UUID,
@@ -141,15 +142,19 @@ def update_attachment_metadata(
 
 @router.post(
     "/{attachment_id}/link-openai",
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(10))],
 )
 def attach_openai_file(
     attachment_id: uuid.UUID,
     payload: AttachmentLinkOpenAI,
+    background: BackgroundTasks,
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> dict[str, str]:
-    """Link an uploaded OpenAI file to this attachment, creating a vector store if needed."""
+    """Link an uploaded OpenAI file to this attachment, creating a vector store if needed.
+
+    The upload is complete by now, so local text extraction starts after the response.
+    """
     attachment = db.get(models.Attachment, attachment_id)
     if not attachment or attachment.user_id != user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
@@ -174,6 +179,7 @@ def attach_openai_file(
         db.rollback()
         raise
 
+    background.add_task(extraction.extract_attachment, attachment.id)
     return {
         "id": str(attachment.id),
         "openai_file_id": attachment.openai_file_id,
@@ -184,7 +190,7 @@ def attach_openai_file(
 @router.delete(
     "/{attachment_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(8))],
 )
 def delete_attachment(
     attachment_id: uuid.UUID,
@@ -229,6 +235,7 @@ def delete_attachment(
                 ) from exc
 
         db.delete(attachment)
+        bulk.record_deletions(db, user.id, models.Attachment, [attachment.id])
         db.commit()
     except HTTPException:
         db.rollback()
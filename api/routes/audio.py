@@ -3,15 +3,25 @@ import asyncio
 import json
 import math
 import mimetypes
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+import time
+import uuid
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, select
 from api.settings import settings
-from api.services import openai_client
+from api.db import models
+from api.db.database import session_scope
+from api.dependencies import user_from_session_token
+from api.services import openai_client, realtime_sessions
 from api.services.ai_registry import resolve_model_key
+from api.services.app_logging import get_logger
+from api.services.realtime_sessions import RealtimeSession
+from api.db.instrumentation import query_budget
 import websockets
 from starlette.websockets import WebSocketState
 
 router = APIRouter(prefix="/audio", tags=["audio"])
+logger = get_logger(__name__)
 
 # --- Default Settings ---
 DEFAULT_RESPONSE_FORMAT = "json"
@@ -164,7 +174,7 @@ async def _prepare_audio_upload(file: UploadFile) -> tuple[str, bytes, str]:
 
 
 # --- Core Endpoint: Audio Transcription ---
-@router.post("/transcriptions")
+@router.post("/transcriptions", dependencies=[Depends(query_budget(2))])
 async def create_transcription(
     request: Request,
     file: UploadFile = File(...),
@@ -197,11 +207,7 @@ async def create_transcription(
             prompt=prompt.strip() if prompt else None,
         )
     except RuntimeError as exc:
-        # Print upstream error for easier debugging in terminal
-        try:
-            print("[Transcription error]", str(exc))
-        except Exception:
-            pass
+        logger.warning("Transcription failed: %s", exc, extra={"model": clean_model})
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
     # --- Confidence filtering ---
@@ -243,7 +249,7 @@ async def create_transcription(
 
 
 # --- Streaming (SSE) Transcription ---
-@router.post("/transcriptions/stream")
+@router.post("/transcriptions/stream", dependencies=[Depends(query_budget(2))])
 async def stream_transcriptions(
     request: Request,
     file: UploadFile = File(...),
@@ -284,64 +290,312 @@ async def stream_transcriptions(
 
 
 # --- Realtime WebSocket Transcription ---
-async def _relay_realtime_transcription(client_ws: WebSocket, openai_ws: Any) -> None:
-    async def forward_client_to_openai() -> None:
+_AUDIO_APPEND_MARKER = '"input_audio_buffer.append"'
+_COMMITTED_MARKER = '"input_audio_buffer.committed"'
+_COMPLETED_MARKER = '"conversation.item.input_audio_transcription.completed"'
+# Upstream handshakes rejected with these codes will not succeed on retry.
+_FATAL_UPSTREAM_STATUS = {400, 401, 403, 404}
+# The browser closes with 1000 when the user stops recording; drops and unloads use other codes.
+_CLIENT_FINISHED_CODE = 1000
+# A connection that survives this long resets the reconnect budget.
+_STABLE_CONNECTION_SECONDS = 10.0
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn_background(func: Any, *args: Any, tasks: set[asyncio.Task] = _background_tasks) -> None:
+    # Keep a reference so fire-and-forget DB writes are not garbage collected mid-flight.
+    task = asyncio.create_task(asyncio.to_thread(func, *args))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+def _maybe_uuid(value: Optional[str]) -> Optional[uuid.UUID]:
+    if not value:
+        return None
+    try:
+        return uuid.UUID(value.strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_timestamp(seconds: int) -> str:
+    mins, secs = divmod(max(0, seconds), 60)
+    return f"{mins:02d}:{secs:02d}"
+
+
+def _logprob_confidence(payload: Dict[str, Any]) -> Optional[float]:
+    transcript = payload.get("transcript")
+    if isinstance(transcript, dict):
+        direct = _normalize_confidence(transcript.get("confidence"))
+        if direct is not None:
+            return direct
+    logprobs = payload.get("logprobs")
+    if not isinstance(logprobs, list):
+        return None
+    probs: list[float] = []
+    for entry in logprobs:
+        value = entry.get("logprob") if isinstance(entry, dict) else None
+        if isinstance(value, (int, float)):
+            try:
+                probs.append(math.exp(float(value)))
+            except OverflowError:
+                continue
+    if not probs:
+        return None
+    return _normalize_confidence(sum(probs) / len(probs))
+
+
+def _resolve_ws_user(token: Optional[str]) -> Optional[uuid.UUID]:
+    with session_scope() as db:
+        user = user_from_session_token(token, db)
+        return user.id if user else None
+
+
+def _open_transcription_record(session: RealtimeSession, notebook_id: Optional[uuid.UUID]) -> None:
+    """Attach the bridge to the attachment's TranscriptionSession so segments can be appended.
+
+    Without `session.attachment_id`, a transcript attachment is created in `notebook_id`.
+    """
+    with session_scope() as db:
+        if session.attachment_id is not None:
+            attachment = db.get(models.Attachment, session.attachment_id)
+        else:
+            notebook = db.get(models.Notebook, notebook_id)
+            attachment = None
+            if notebook is not None and notebook.user_id == session.user_id:
+                attachment = models.Attachment(
+                    notebook_id=notebook.id,
+                    user_id=notebook.user_id,
+                    filename=f"Live transcript {time.strftime('%Y-%m-%d %H:%M')}",
+                    mime="text/plain",
+                    enable_file_search=False,
+                    meta={"source": "realtime"},
+                )
+                db.add(attachment)
+                db.flush()
+        if attachment is None or attachment.user_id != session.user_id:
+            session.attachment_id = None
+            return
+        session.attachment_id = attachment.id
+        record = (
+            db.execute(
+                select(models.TranscriptionSession).where(
+                    models.TranscriptionSession.attachment_id == attachment.id
+                )
+            )
+            .scalars()
+            .first()
+        )
+        if record is None:
+            record = models.TranscriptionSession(
+                user_id=attachment.user_id,
+                notebook_id=attachment.notebook_id,
+                attachment_id=attachment.id,
+                source=models.TranscriptionSource.REALTIME,
+                lang=session.language,
+                sample_rate=session.sample_rate,
+            )
+            db.add(record)
+            db.flush()
+        last_seq = db.execute(
+            select(func.max(models.TranscriptionSegment.seq)).where(
+                models.TranscriptionSegment.session_id == record.id
+            )
+        ).scalar()
+        attachment.transcription_status = models.AttachmentTranscriptionStatus.PENDING
+        record_id = record.id
+
+    session.transcription_session_id = record_id
+    session.next_seq = last_seq + 1 if last_seq is not None else 0
+
+
+def _persist_segment(
+    record_id: uuid.UUID,
+    seq: int,
+    item_id: Optional[str],
+    content_index: Optional[int],
+    ts_seconds: int,
+    text: str,
+    confidence: Optional[float],
+) -> None:
+    try:
+        with session_scope() as db:
+            db.add(
+                models.TranscriptionSegment(
+                    session_id=record_id,
+                    seq=seq,
+                    item_id=item_id,
+                    content_index=content_index,
+                    ts_seconds=ts_seconds,
+                    timestamp=_format_timestamp(ts_seconds),
+                    text=text,
+                    confidence=confidence,
+                )
+            )
+    except Exception:
+        logger.exception("Realtime segment persist failed", extra={"transcription_session_id": str(record_id)})
+
+
+def _finalize_transcription_record(record_id: uuid.UUID, duration_sec: int, complete: bool) -> None:
+    """Rebuild full_text from the stored segments; with `complete`, mark the attachment transcribed.
+
+    A detached session can still be resumed, so its attachment stays PENDING until the
+    session is discarded or expires.
+    """
+    try:
+        with session_scope() as db:
+            record = db.get(models.TranscriptionSession, record_id)
+            if record is None:
+                return
+            texts = db.execute(
+                select(models.TranscriptionSegment.text)
+                .where(models.TranscriptionSegment.session_id == record_id)
+                .order_by(models.TranscriptionSegment.seq)
+            ).scalars().all()
+            record.full_text = "\n".join(texts)
+            record.duration_sec = max(record.duration_sec or 0, duration_sec)
+            attachment = db.get(models.Attachment, record.attachment_id)
+            if attachment is not None:
+                if complete:
+                    attachment.transcription_status = models.AttachmentTranscriptionStatus.COMPLETED
+                attachment.transcription_lang = record.lang
+                attachment.transcription_duration_sec = record.duration_sec
+    except Exception:
+        logger.exception("Realtime finalize failed", extra={"transcription_session_id": str(record_id)})
+
+
+async def _finalize_after_writes(session: RealtimeSession, duration_sec: int, complete: bool) -> None:
+    # Segments still being written must be committed before full_text is rebuilt from them.
+    if session.pending_writes:
+        await asyncio.gather(*list(session.pending_writes), return_exceptions=True)
+    await asyncio.to_thread(_finalize_transcription_record, session.transcription_session_id, duration_sec, complete)
+
+
+def _schedule_finalize(session: RealtimeSession, *, complete: bool) -> None:
+    task = asyncio.create_task(_finalize_after_writes(session, session.elapsed_seconds(), complete))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _handle_upstream_event(session: RealtimeSession, message: str) -> None:
+    # Cheap substring checks keep JSON parsing off the hot path for delta events.
+    if _COMMITTED_MARKER in message:
+        # Committed audio is owned by upstream now; it must not be replayed.
+        session.buffer.clear()
+        return
+    if _COMPLETED_MARKER not in message or session.transcription_session_id is None:
+        return
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        return
+    transcript = payload.get("transcript")
+    text = transcript if isinstance(transcript, str) else (transcript or {}).get("text")
+    if not isinstance(text, str) or not text.strip():
+        return
+    item_id = payload.get("item_id")
+    content_index = payload.get("content_index")
+    dedupe_key = f"{item_id}:{content_index}"
+    if item_id and dedupe_key in session.persisted_items:
+        return
+    session.persisted_items.add(dedupe_key)
+    _spawn_background(
+        _persist_segment,
+        session.transcription_session_id,
+        session.claim_seq(),
+        item_id,
+        content_index if isinstance(content_index, int) else None,
+        session.elapsed_seconds(),
+        text.strip(),
+        _logprob_confidence(payload),
+        tasks=session.pending_writes,
+    )
+
+
+async def _relay_realtime_transcription(client_ws: WebSocket, openai_ws: Any, session: RealtimeSession) -> str:
+    """Relay frames both ways; return "finished", "client" or "upstream" depending on which side ended.
+
+    "finished" is a normal close from the browser (recording stopped); "client" is any
+    other disconnect, after which the session stays resumable.
+    """
+
+    async def forward_client_to_openai() -> str:
         try:
             while True:
                 message = await client_ws.receive()
                 if message.get("type") == "websocket.disconnect":
-                    await openai_ws.close()
-                    break
-                if message.get("text") is not None:
-                    print("[CLIENT→OPENAI] TEXT:", message["text"][:300])
-                    await openai_ws.send(message["text"])
+                    return "finished" if message.get("code") == _CLIENT_FINISHED_CODE else "client"
+                text = message.get("text")
+                if text is not None:
+                    if _AUDIO_APPEND_MARKER in text:
+                        # Buffer before sending so a failed send is still replayed.
+                        session.buffer.append(text)
+                        logger.debug(
+                            "audio frame",
+                            extra={"event": "audio_frame", "realtime_session_id": session.id, "bytes": len(text)},
+                        )
+                    await openai_ws.send(text)
                 elif message.get("bytes") is not None:
-                    print("[CLIENT→OPENAI] BYTES:", len(message["bytes"]))
                     await openai_ws.send(message["bytes"])
-        except WebSocketDisconnect:
-            await openai_ws.close()
-        except Exception:
-            await openai_ws.close()
+        except WebSocketDisconnect as exc:
+            return "finished" if exc.code == _CLIENT_FINISHED_CODE else "client"
+        except websockets.exceptions.ConnectionClosed:
+            return "upstream"
 
-    async def forward_openai_to_client() -> None:
+    async def forward_openai_to_client() -> str:
         try:
             async for message in openai_ws:
                 if client_ws.application_state != WebSocketState.CONNECTED:
-                    break
-                if isinstance(message, bytes):
-                    try:
-                        print("[OPENAI→CLIENT] BYTES:", len(message))
+                    return "client"
+                try:
+                    if isinstance(message, bytes):
                         await client_ws.send_bytes(message)
-                    except RuntimeError:
-                        break
-                else:
-                    try:
-                        print("[OPENAI→CLIENT] TEXT:", str(message)[:])
+                    else:
+                        _handle_upstream_event(session, message)
                         await client_ws.send_text(message)
-                    except RuntimeError:
-                        break
+                except RuntimeError:
+                    return "client"
         except websockets.exceptions.ConnectionClosed:
             pass
-        finally:
-            if client_ws.application_state == WebSocketState.CONNECTED:
-                try:
-                    await client_ws.close()
-                except RuntimeError:
-                    # Ignore race where Starlette has already issued websocket.close
-                    pass
-
-    await asyncio.wait(
-        [
-            asyncio.create_task(forward_client_to_openai()),
-            asyncio.create_task(forward_openai_to_client()),
-        ],
-        return_when=asyncio.FIRST_COMPLETED,
-    )
+        return "upstream"
+
+    tasks = [
+        asyncio.create_task(forward_client_to_openai()),
+        asyncio.create_task(forward_openai_to_client()),
+    ]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    outcome = "upstream"
+    for task in done:
+        if task.cancelled() or task.exception() is not None:
+            continue
+        if task.result() != "upstream":
+            outcome = task.result()
+    return outcome
+
+
+async def _close_client(websocket: WebSocket, code: int) -> None:
+    if websocket.application_state == WebSocketState.CONNECTED:
+        try:
+            await websocket.close(code=code)
+        except RuntimeError:
+            # Ignore race where Starlette has already issued websocket.close
+            pass
 
 
 @router.websocket("/transcriptions/live")
 async def realtime_transcriptions(websocket: WebSocket):
-    """Full-duplex realtime transcription bridge between client WS and OpenAI realtime API."""
+    """Full-duplex realtime transcription bridge that survives upstream drops and browser reconnects.
+
+    Pass `session_id` (from the `session_started` event) to resume a session after the
+    browser reconnects. Signed-in clients persist completed segments as they arrive:
+    to an existing attachment with `attachment_id`, or to a new transcript attachment
+    in `notebook_id`.
+    """
     await websocket.accept()
     try:
         await _ensure_ws_auth(websocket)
@@ -409,27 +663,98 @@ async def realtime_transcriptions(websocket: WebSocket):
         }
     }
 
-
+    for expired in realtime_sessions.purge_expired():
+        if expired.transcription_session_id is not None:
+            _schedule_finalize(expired, complete=True)
+
+    user_id = await asyncio.to_thread(_resolve_ws_user, websocket.cookies.get(settings.SESSION_COOKIE_NAME))
+    session = realtime_sessions.resume_session(query.get("session_id"), user_id=user_id)
+    resumed = session is not None
+    if session is None:
+        session = realtime_sessions.create_session(
+            session_update=session_update,
+            model=model,
+            sample_rate=sample_rate,
+            language=language or None,
+        )
+        session.user_id = user_id
+        session.attachment_id = _maybe_uuid(query.get("attachment_id")) if user_id else None
+        notebook_id = _maybe_uuid(query.get("notebook_id")) if user_id else None
+        if session.attachment_id is not None or notebook_id is not None:
+            try:
+                await asyncio.to_thread(_open_transcription_record, session, notebook_id)
+            except Exception:
+                logger.exception("Realtime persist setup failed", extra={"realtime_session_id": session.id})
+                session.attachment_id = None
+
+    announced = False
+    reconnects = 0
+    outcome = "upstream"
     try:
-        async with websockets.connect(openai_client.OPENAI_REALTIME_TRANSCRIBE_URL, extra_headers=headers, max_size=None) as openai_ws:
-            # 1) Wait for OpenAI to acknowledge session creation.
-            created = await openai_ws.recv()
-            # 2) Send the post-creation session update (session_update above).
-            await openai_ws.send(json.dumps(session_update))
-            # 3) Notify the client that the session is ready (optional).
-            await websocket.send_text(json.dumps({
-                "event": "session_started",
-                "model": model,
-                "sample_rate": sample_rate,
-                "min_confidence": confidence_threshold,
-            }))
-            # 4) Start bidirectional relaying.
-            await _relay_realtime_transcription(websocket, openai_ws)
-
-    except websockets.exceptions.InvalidStatusCode as exc:
-        await websocket.send_text(json.dumps({"event": "error", "message": f"HTTP {exc.status_code}"}))
-        await websocket.close(code=1011)
+        while True:
+            connected_at: Optional[float] = None
+            try:
+                async with websockets.connect(openai_client.realtime_transcribe_url(), extra_headers=headers, max_size=None) as openai_ws:
+                    # 1) Wait for OpenAI to acknowledge session creation.
+                    await openai_ws.recv()
+                    # 2) Re-apply the original session update, then replay audio upstream never committed.
+                    await openai_ws.send(json.dumps(session.session_update))
+                    for frame in session.buffer.snapshot():
+                        await openai_ws.send(frame)
+                    connected_at = time.monotonic()
+                    # 3) Notify the client that the session is ready (or back).
+                    await websocket.send_text(json.dumps({
+                        "event": "session_reconnected" if announced else "session_started",
+                        "session_id": session.id,
+                        "resumed": resumed,
+                        "persisting": session.transcription_session_id is not None,
+                        "attachment_id": str(session.attachment_id) if session.attachment_id else None,
+                        "model": session.model,
+                        "sample_rate": session.sample_rate,
+                        "min_confidence": confidence_threshold,
+                    }))
+                    announced = True
+                    # 4) Start bidirectional relaying.
+                    outcome = await _relay_realtime_transcription(websocket, openai_ws, session)
+            except websockets.exceptions.InvalidStatusCode as exc:
+                if exc.status_code in _FATAL_UPSTREAM_STATUS:
+                    await websocket.send_text(json.dumps({"event": "error", "message": f"HTTP {exc.status_code}"}))
+                    outcome = "fatal"
+                else:
+                    outcome = "upstream"
+            except (websockets.exceptions.ConnectionClosed, OSError, asyncio.TimeoutError):
+                outcome = "upstream"
+            except WebSocketDisconnect as exc:
+                outcome = "finished" if exc.code == _CLIENT_FINISHED_CODE else "client"
+
+            if outcome != "upstream" or websocket.application_state != WebSocketState.CONNECTED:
+                break
+            if connected_at is not None and time.monotonic() - connected_at >= _STABLE_CONNECTION_SECONDS:
+                reconnects = 0
+            reconnects += 1
+            if reconnects > settings.REALTIME_MAX_RECONNECTS:
+                await websocket.send_text(json.dumps({"event": "error", "message": "Realtime upstream unavailable"}))
+                outcome = "fatal"
+                break
+            logger.warning(
+                "Realtime upstream dropped; reconnecting",
+                extra={"realtime_session_id": session.id, "attempt": reconnects},
+            )
+            await asyncio.sleep(min(0.25 * 2 ** (reconnects - 1), 4.0))
     except Exception as exc:
-        await websocket.send_text(json.dumps({"event": "error", "message": str(exc)}))
-        if websocket.application_state == WebSocketState.CONNECTED:
-            await websocket.close(code=1011)
+        outcome = "fatal"
+        logger.exception("Realtime bridge failed", extra={"realtime_session_id": session.id})
+        try:
+            await websocket.send_text(json.dumps({"event": "error", "message": str(exc)}))
+        except RuntimeError:
+            pass
+    finally:
+        # A stopped or failed session is over; any other disconnect may still be resumed.
+        finished = outcome in ("fatal", "finished")
+        if finished:
+            realtime_sessions.discard_session(session)
+        else:
+            realtime_sessions.detach_session(session)
+        if session.transcription_session_id is not None:
+            _schedule_finalize(session, complete=finished)
+        await _close_client(websocket, 1011 if outcome == "fatal" else 1000)
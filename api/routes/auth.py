@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from api.dependencies import get_current_user, require_csrf
 from api.db.database import get_db
+from api.db.instrumentation import query_budget
 from api.db import models
 from api.schemas import MembershipOut, SessionInfo, UserCreate, UserLogin, UserOut
 from api.security import create_access_token, generate_csrf_token, hash_password, verify_password
@@ -80,14 +81,14 @@ def _session_info(user: models.User, db: Session) -> SessionInfo:
     )
 
 
-@router.get('/csrf')
+@router.get('/csrf', dependencies=[Depends(query_budget(2))])
 def get_csrf_token(response: Response) -> dict[str, str]:
     """Issue a fresh CSRF token cookie and return it for subsequent form submissions."""
     token = _set_csrf_cookie(response)
     return {"csrf_token": token}
 
 
-@router.post("/register", response_model=SessionInfo, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_csrf)])
+@router.post("/register", response_model=SessionInfo, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_csrf), Depends(query_budget(6))])
 def register_user(payload: UserCreate, response: Response, db: Session = Depends(get_db)) -> SessionInfo:
     """Create a new user, set session/CSRF cookies, and return the session payload."""
     existing = db.execute(select(models.User).where(models.User.email == payload.email)).scalar_one_or_none()
@@ -109,7 +110,7 @@ def register_user(payload: UserCreate, response: Response, db: Session = Depends
     return _session_info(user, db)
 
 
-@router.post("/login", response_model=SessionInfo, dependencies=[Depends(require_csrf)])
+@router.post("/login", response_model=SessionInfo, dependencies=[Depends(require_csrf), Depends(query_budget(4))])
 def login_user(payload: UserLogin, response: Response, db: Session = Depends(get_db)) -> SessionInfo:
     """Authenticate a user, refresh session/CSRF cookies, and return session info."""
     user = db.execute(select(models.User).where(models.User.email == payload.email)).scalar_one_or_none()
@@ -124,7 +125,7 @@ def login_user(payload: UserLogin, response: Response, db: Session = Depends(get
     return _session_info(user, db)
 
 
-@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_csrf)])
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_csrf), Depends(query_budget(2))])
 def logout_user(response: Response) -> Response:
     """Clear the session cookie and refresh CSRF cookie."""
     _clear_session_cookie(response)
@@ -133,7 +134,7 @@ def logout_user(response: Response) -> Response:
     return response
 
 
-@router.get("/me", response_model=SessionInfo)
+@router.get("/me", response_model=SessionInfo, dependencies=[Depends(query_budget(4))])
 def get_current_session(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)) -> SessionInfo:
     """Return the current authenticated session details."""
     return _session_info(user, db)
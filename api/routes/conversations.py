@@ -0,0 +1,144 @@
+"""Routes for AI chat conversations and their message history.
+
+Turns are written by POST /responses[/stream] when the request names a
+`conversation_id` (see api.services.conversations); these routes create, list and
+delete conversations and read their history.
+"""
+
+from __future__ import annotations
+
+import uuid
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.dependencies import get_current_user, require_csrf
+from api.db import models
+from api.db.database import get_db
+from api.db.instrumentation import query_budget
+from api.schemas import ConversationCreate, ConversationMessageOut, ConversationOut
+from api.services.pagination import NEXT_CURSOR_HEADER, Keyset
+from api.settings import settings
+
+
+router = APIRouter(prefix="/conversations", tags=["conversations"])
+
+# Backed by idx_conversations_user_updated / idx_conversations_user_nb_updated.
+_CONVERSATION_KEYSET = Keyset((models.Conversation.updated_at, models.Conversation.id), descending=True)
+# Backed by the (conversation_id, seq) primary key; newest first.
+_MESSAGE_KEYSET = Keyset((models.ConversationMessage.seq,), descending=True)
+
+MESSAGE_PAGE_DEFAULT = 50
+
+
+def _get_conversation(conversation_id: uuid.UUID, user: models.User, db: Session) -> models.Conversation:
+    conversation = db.get(models.Conversation, conversation_id)
+    if not conversation or conversation.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return conversation
+
+
+@router.get("", response_model=List[ConversationOut], dependencies=[Depends(query_budget(4))])
+def list_conversations(
+    response: Response,
+    notebook_id: uuid.UUID | None = Query(default=None),
+    limit: int | None = Query(default=None, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: str | None = Query(default=None),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[ConversationOut]:
+    """List the user's conversations, most recently active first, optionally for one notebook.
+
+    With `limit`, one page is returned and the next page's cursor is sent in the
+    `X-Next-Cursor` header.
+    """
+    query = select(models.Conversation).where(models.Conversation.user_id == user.id)
+    if notebook_id is not None:
+        query = query.where(models.Conversation.notebook_id == notebook_id)
+    rows, next_cursor = _CONVERSATION_KEYSET.page(
+        db.execute(_CONVERSATION_KEYSET.apply(query, cursor, limit)).scalars().all(), limit
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [ConversationOut.model_validate(row) for row in rows]
+
+
+@router.post(
+    "",
+    response_model=ConversationOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
+)
+def create_conversation(
+    payload: ConversationCreate,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ConversationOut:
+    """Start a conversation, optionally about a notebook; send its id with chat requests."""
+    if payload.notebook_id is not None:
+        notebook = db.get(models.Notebook, payload.notebook_id)
+        if not notebook or notebook.user_id != user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found")
+    conversation = models.Conversation(user_id=user.id, notebook_id=payload.notebook_id, title=payload.title)
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return ConversationOut.model_validate(conversation)
+
+
+@router.get("/{conversation_id}", response_model=ConversationOut, dependencies=[Depends(query_budget(4))])
+def get_conversation(
+    conversation_id: uuid.UUID,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ConversationOut:
+    return ConversationOut.model_validate(_get_conversation(conversation_id, user, db))
+
+
+@router.get("/{conversation_id}/messages", response_model=List[ConversationMessageOut], dependencies=[Depends(query_budget(5))])
+def list_messages(
+    conversation_id: uuid.UUID,
+    response: Response,
+    limit: int = Query(default=MESSAGE_PAGE_DEFAULT, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: str | None = Query(default=None),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[ConversationMessageOut]:
+    """One page of history, newest message first; `X-Next-Cursor` pages back in time.
+
+    The ownership check is joined into the page query, so a page is one range scan of
+    the primary key. Only an empty page looks the conversation up, to tell an empty
+    thread from one that does not exist.
+    """
+    query = (
+        select(models.ConversationMessage)
+        .join(models.Conversation, models.Conversation.id == models.ConversationMessage.conversation_id)
+        .where(models.ConversationMessage.conversation_id == conversation_id, models.Conversation.user_id == user.id)
+    )
+    rows, next_cursor = _MESSAGE_KEYSET.page(
+        db.execute(_MESSAGE_KEYSET.apply(query, cursor, limit)).scalars().all(), limit
+    )
+    if not rows:
+        _get_conversation(conversation_id, user, db)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [ConversationMessageOut.model_validate(row) for row in rows]
+
+
+@router.delete(
+    "/{conversation_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_csrf), Depends(query_budget(5))],
+)
+def delete_conversation(
+    conversation_id: uuid.UUID,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Response:
+    """Delete a conversation and its messages."""
+    conversation = _get_conversation(conversation_id, user, db)
+    db.delete(conversation)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
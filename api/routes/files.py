@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Form, Query
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Form, Query
 from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Dict, Any
 from api.settings import settings
 from api.services import openai_client
+from api.db.instrumentation import query_budget
 import mimetypes
 
 router = APIRouter(prefix="/files", tags=["files"])
@@ -21,7 +22,7 @@ def _validate_file_id(file_id: str) -> None:
         raise HTTPException(status_code=500, detail="Upload ok but missing file id")
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(query_budget(2))])
 async def upload_file(
     request: Request,
     file: UploadFile = File(...),
@@ -79,7 +80,7 @@ async def upload_file(
     return JSONResponse(payload)
 
 
-@router.get("")
+@router.get("", dependencies=[Depends(query_budget(2))])
 async def list_files(
     request: Request,
     after: str | None = Query(default=None),
@@ -114,7 +115,7 @@ async def list_files(
     return JSONResponse(content=content)
 
 
-@router.get("/{file_id}")
+@router.get("/{file_id}", dependencies=[Depends(query_budget(2))])
 async def get_file_metadata(request: Request, file_id: str):
     """Fetch metadata for a specific OpenAI file id."""
     _check_auth(request)
@@ -125,7 +126,7 @@ async def get_file_metadata(request: Request, file_id: str):
     return JSONResponse(content=data)
 
 
-@router.delete("/{file_id}")
+@router.delete("/{file_id}", dependencies=[Depends(query_budget(2))])
 async def delete_file(request: Request, file_id: str):
     """Delete an OpenAI file by id."""
     _check_auth(request)
@@ -136,7 +137,7 @@ async def delete_file(request: Request, file_id: str):
     return JSONResponse(content=data)
 
 
-@router.get("/{file_id}/content")
+@router.get("/{file_id}/content", dependencies=[Depends(query_budget(2))])
 async def get_file_content(request: Request, file_id: str):
     """Stream the raw bytes of an OpenAI file."""
     _check_auth(request)
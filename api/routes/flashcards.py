@@ -3,27 +3,39 @@
 from __future__ import annotations
 
 import uuid
-from typing import Iterable, List
+from typing import Collection, Dict, Iterable, List, Literal, Optional, Sequence, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session, selectinload
 
 from api.dependencies import get_current_user, require_csrf
-from api.db import models
+from api.db import bulk, models
 from api.db.database import get_db
+from api.db.instrumentation import query_budget
 from api.schemas import (
+    BatchItemResult,
+    BatchResult,
+    FlashcardBatchUpdate,
+    FlashcardBulkCreate,
     FlashcardCreate,
     FlashcardOut,
+    FlashcardSummaryOut,
     FlashcardUpdate,
     FlashcardFolderCreate,
     FlashcardFolderOut,
     FlashcardFolderUpdate,
 )
+from api.services.http_cache import PRIVATE_REVALIDATE, cache_control, conditional, etag
+from api.services.pagination import NEXT_CURSOR_HEADER, Keyset, text_filter
+from api.settings import settings
 
 
 router = APIRouter(prefix="/flashcards", tags=["flashcards"])
 
+# Backed by idx_flashcards_user_id / idx_flashcards_user_nb_id.
+_CARD_KEYSET = Keyset((models.Flashcard.id,))
+
 
 def _ensure_notebook_owned(db: Session, user: models.User, notebook_id: uuid.UUID) -> models.Notebook:
     notebook = db.get(models.Notebook, notebook_id)
@@ -32,18 +44,19 @@ def _ensure_notebook_owned(db: Session, user: models.User, notebook_id: uuid.UUI
     return notebook
 
 
-def _card_to_schema(card: models.Flashcard) -> FlashcardOut:
+def _card_to_schema(card: models.Flashcard, folder_ids: Optional[Sequence[uuid.UUID]] = None) -> FlashcardOut:
+    """Accepts an ORM card, or a `bulk.FLASHCARD_COLUMNS` row together with its `folder_ids`."""
     return FlashcardOut(
         id=card.id,
         notebook_id=card.notebook_id,
         question=card.question,
         answer=card.answer,
         meta=card.meta,
-        folder_ids=[folder.id for folder in card.folders],
+        folder_ids=list(folder_ids) if folder_ids is not None else [folder.id for folder in card.folders],
     )
 
 
-def _folder_to_schema(folder: models.FlashcardFolder) -> FlashcardFolderOut:
+def _folder_to_schema(folder: models.FlashcardFolder, flashcard_ids: Sequence[uuid.UUID]) -> FlashcardFolderOut:
     return FlashcardFolderOut(
         id=folder.id,
         notebook_id=folder.notebook_id,
@@ -51,7 +64,7 @@ def _folder_to_schema(folder: models.FlashcardFolder) -> FlashcardFolderOut:
         description=folder.description,
         created_at=folder.created_at,
         updated_at=folder.updated_at,
-        flashcard_ids=[card.id for card in folder.flashcards],
+        flashcard_ids=list(flashcard_ids),
     )
 
 
@@ -71,15 +84,7 @@ def _get_card(card_id: uuid.UUID, user: models.User, db: Session) -> models.Flas
 
 
 def _get_folder(folder_id: uuid.UUID, user: models.User, db: Session) -> models.FlashcardFolder:
-    folder = (
-        db.execute(
-            select(models.FlashcardFolder)
-            .where(models.FlashcardFolder.id == folder_id)
-            .options(selectinload(models.FlashcardFolder.flashcards))
-        )
-        .scalars()
-        .first()
-    )
+    folder = db.get(models.FlashcardFolder, folder_id)
     if not folder or folder.user_id != user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flashcard folder not found")
     return folder
@@ -120,39 +125,90 @@ def _get_folders(
     return folders
 
 
-def _get_flashcards(
+def _check_bulk_size(count: int) -> None:
+    if count > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BULK_MAX_ITEMS} items per request",
+        )
+
+
+def _ensure_notebooks_owned(db: Session, user: models.User, notebook_ids: Collection[uuid.UUID]) -> None:
+    owned = set(
+        db.scalars(
+            select(models.Notebook.id).where(
+                models.Notebook.user_id == user.id,
+                models.Notebook.id.in_(notebook_ids),
+            )
+        )
+    )
+    if len(owned) != len(notebook_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found")
+
+
+def _folder_notebooks(db: Session, user: models.User, folder_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, uuid.UUID]:
+    """Map folder id -> notebook id; 400 if any folder is missing or not the user's."""
+    notebook_of = bulk.owned_notebooks(db, models.FlashcardFolder, user.id, folder_ids)
+    missing = [str(folder_id) for folder_id in folder_ids if folder_id not in notebook_of]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Flashcard folders not found: {', '.join(missing)}",
+        )
+    return notebook_of
+
+
+def _batch_result(ids: Sequence[uuid.UUID], errors: Dict[uuid.UUID, str]) -> BatchResult:
+    results = [BatchItemResult(id=item_id, ok=item_id not in errors, error=errors.get(item_id)) for item_id in ids]
+    return BatchResult(succeeded=len(ids) - len(errors), failed=len(errors), results=results)
+
+
+def _check_folder_links(
+    db: Session,
+    user: models.User,
+    links: Sequence[Tuple[uuid.UUID, Sequence[uuid.UUID]]],
+) -> Dict[uuid.UUID, int]:
+    """Validate (notebook_id, folder_ids) pairs in one query; returns the next seq per folder."""
+    ids = list(dict.fromkeys(folder_id for _, folder_ids in links for folder_id in folder_ids))
+    if not ids:
+        return {}
+    notebook_of = _folder_notebooks(db, user, ids)
+    invalid = {
+        str(folder_id)
+        for notebook_id, folder_ids in links
+        for folder_id in folder_ids
+        if notebook_of[folder_id] != notebook_id
+    }
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Folders belong to a different notebook: {', '.join(sorted(invalid))}",
+        )
+    return bulk.next_seq(db, models.FlashcardFolderItem, ids)
+
+
+def _check_flashcard_ids(
     db: Session,
     user: models.User,
     notebook_id: uuid.UUID,
     flashcard_ids: Iterable[uuid.UUID],
-) -> List[models.Flashcard]:
+) -> List[uuid.UUID]:
+    """Deduplicated `flashcard_ids`, checked to be the user's cards in `notebook_id` (ids only, no card bodies)."""
     ids = list(dict.fromkeys(flashcard_ids))
-    if not ids:
-        return []
-    cards = (
-        db.execute(
-            select(models.Flashcard).where(
-                models.Flashcard.user_id == user.id,
-                models.Flashcard.id.in_(ids),
-            )
-        )
-        .scalars()
-        .all()
-    )
-    found = {card.id for card in cards}
-    missing = [str(card_id) for card_id in ids if card_id not in found]
+    notebook_of = bulk.owned_notebooks(db, models.Flashcard, user.id, ids)
+    missing = [str(card_id) for card_id in ids if card_id not in notebook_of]
     if missing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Flashcards not found: {', '.join(missing)}",
         )
-    invalid_notebook = [str(card.id) for card in cards if card.notebook_id != notebook_id]
+    invalid_notebook = [str(card_id) for card_id in ids if notebook_of[card_id] != notebook_id]
     if invalid_notebook:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Flashcards belong to a different notebook: {', '.join(invalid_notebook)}",
         )
-    return cards
+    return ids
 
 
 # ---------------------------------------------------------------------------
@@ -160,7 +216,7 @@ def _get_flashcards(
 # ---------------------------------------------------------------------------
 
 
-@router.get("/folders", response_model=List[FlashcardFolderOut])
+@router.get("/folders", response_model=List[FlashcardFolderOut], dependencies=[Depends(query_budget(5))])
 def list_flashcard_folders(
     notebook_id: uuid.UUID | None = Query(default=None),
     user: models.User = Depends(get_current_user),
@@ -170,21 +226,21 @@ def list_flashcard_folders(
     query = (
         select(models.FlashcardFolder)
         .where(models.FlashcardFolder.user_id == user.id)
-        .options(selectinload(models.FlashcardFolder.flashcards))
         .order_by(models.FlashcardFolder.created_at.desc())
     )
     if notebook_id is not None:
         query = query.where(models.FlashcardFolder.notebook_id == notebook_id)
 
-    folders = db.execute(query).scalars().unique().all()
-    return [_folder_to_schema(folder) for folder in folders]
+    folders = db.execute(query).scalars().all()
+    members = bulk.member_ids(db, models.FlashcardFolderItem, [folder.id for folder in folders])
+    return [_folder_to_schema(folder, members[folder.id]) for folder in folders]
 
 
 @router.post(
     "/folders",
     response_model=FlashcardFolderOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(10))],
 )
 def create_flashcard_folder(
     payload: FlashcardFolderCreate,
@@ -199,17 +255,19 @@ def create_flashcard_folder(
         name=payload.name,
         description=payload.description,
     )
-    folder.flashcards = _get_flashcards(db, user, folder.notebook_id, payload.flashcard_ids)
+    card_ids = _check_flashcard_ids(db, user, folder.notebook_id, payload.flashcard_ids)
     db.add(folder)
+    db.flush()
+    bulk.replace_members(db, models.FlashcardFolderItem, folder.id, card_ids)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    return _folder_to_schema(folder, card_ids)
 
 
 @router.put(
     "/folders/{folder_id}",
     response_model=FlashcardFolderOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(10))],
 )
 def update_flashcard_folder(
     folder_id: uuid.UUID,
@@ -223,19 +281,23 @@ def update_flashcard_folder(
         folder.name = payload.name
     if payload.description is not None:
         folder.description = payload.description
+    card_ids = None
     if payload.flashcard_ids is not None:
-        folder.flashcards = _get_flashcards(db, user, folder.notebook_id, payload.flashcard_ids)
+        card_ids = _check_flashcard_ids(db, user, folder.notebook_id, payload.flashcard_ids)
+        bulk.replace_members(db, models.FlashcardFolderItem, folder.id, card_ids)
 
     db.add(folder)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    if card_ids is None:
+        card_ids = bulk.member_ids(db, models.FlashcardFolderItem, [folder.id])[folder.id]
+    return _folder_to_schema(folder, card_ids)
 
 
 @router.delete(
     "/folders/{folder_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def delete_flashcard_folder(
     folder_id: uuid.UUID,
@@ -245,6 +307,7 @@ def delete_flashcard_folder(
     """Delete a flashcard folder (cards remain)."""
     folder = _get_folder(folder_id, user, db)
     db.delete(folder)
+    bulk.record_deletions(db, user.id, models.FlashcardFolder, [folder.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -254,31 +317,83 @@ def delete_flashcard_folder(
 # ---------------------------------------------------------------------------
 
 
-@router.get("", response_model=List[FlashcardOut])
+def _list_etag(request: Request, db: Session, user: models.User, notebook_id: Optional[uuid.UUID]) -> str:
+    """ETag for a flashcards listing: count and latest update of the items and of their folders.
+
+    Folder membership changes bump the folders' `updated_at` (see api.db.bulk), so the
+    links in full responses are covered too. Other filters only narrow the result,
+    and the query string is part of the tag.
+    """
+    items = select(models.Flashcard).where(models.Flashcard.user_id == user.id)
+    folders = select(models.FlashcardFolder).where(models.FlashcardFolder.user_id == user.id)
+    if notebook_id is not None:
+        items = items.where(models.Flashcard.notebook_id == notebook_id)
+        folders = folders.where(models.FlashcardFolder.notebook_id == notebook_id)
+    fingerprint = db.execute(
+        select(
+            items.with_only_columns(func.count()).scalar_subquery(),
+            items.with_only_columns(func.max(models.Flashcard.updated_at)).scalar_subquery(),
+            folders.with_only_columns(func.count()).scalar_subquery(),
+            folders.with_only_columns(func.max(models.FlashcardFolder.updated_at)).scalar_subquery(),
+        )
+    ).one()
+    return etag(str(request.url.query), *fingerprint)
+
+
+@router.get(
+    "",
+    response_model=List[Union[FlashcardOut, FlashcardSummaryOut]],
+    dependencies=[Depends(cache_control(PRIVATE_REVALIDATE)), Depends(query_budget(6))],
+)
 def list_flashcards(
+    request: Request,
+    response: Response,
     notebook_id: uuid.UUID | None = Query(default=None),
+    folder_id: uuid.UUID | None = Query(default=None),
+    q: str | None = Query(default=None, max_length=200),
+    fields: Literal["full", "summary"] = Query(default="full"),
+    limit: int | None = Query(default=None, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: str | None = Query(default=None),
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> List[FlashcardOut]:
-    """List flashcards for the user; optionally filter by notebook id."""
-    query = (
-        select(models.Flashcard)
-        .where(models.Flashcard.user_id == user.id)
-        .options(selectinload(models.Flashcard.folders))
-        .order_by(models.Flashcard.id)
-    )
+) -> List[FlashcardOut] | List[FlashcardSummaryOut]:
+    """List the user's flashcards by id, filtered by notebook, folder and text (`q`).
+
+    With `limit`, one page is returned and the next page's cursor is sent in the
+    `X-Next-Cursor` header. `fields=summary` returns only id, notebook and question.
+    """
+    cached = conditional(request, response, _list_etag(request, db, user, notebook_id))
+    if cached:
+        return cached
+
+    if fields == "summary":
+        query = select(models.Flashcard.id, models.Flashcard.notebook_id, models.Flashcard.question)
+    else:
+        query = select(models.Flashcard).options(selectinload(models.Flashcard.folders))
+    query = query.where(models.Flashcard.user_id == user.id)
     if notebook_id is not None:
         query = query.where(models.Flashcard.notebook_id == notebook_id)
-
-    cards = db.execute(query).scalars().unique().all()
-    return [_card_to_schema(card) for card in cards]
+    if folder_id is not None:
+        query = query.join(
+            models.FlashcardFolderItem, models.FlashcardFolderItem.flashcard_id == models.Flashcard.id
+        ).where(models.FlashcardFolderItem.folder_id == folder_id)
+    if q and q.strip():
+        query = query.where(text_filter([models.Flashcard.question, models.Flashcard.answer], q.strip()))
+
+    result = db.execute(_CARD_KEYSET.apply(query, cursor, limit))
+    rows, next_cursor = _CARD_KEYSET.page(result.all() if fields == "summary" else result.scalars().all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fields == "summary":
+        return [FlashcardSummaryOut.model_validate(row) for row in rows]
+    return [_card_to_schema(card) for card in rows]
 
 
 @router.post(
     "",
     response_model=FlashcardOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
 )
 def create_flashcard(
     payload: FlashcardCreate,
@@ -301,10 +416,103 @@ def create_flashcard(
     return _card_to_schema(card)
 
 
+@router.post(
+    "/bulk",
+    response_model=List[FlashcardOut],
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_csrf), Depends(query_budget(5))],
+)
+def bulk_create_flashcards(
+    payload: FlashcardBulkCreate,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[FlashcardOut]:
+    """Create many flashcards (and their folder links) with set-based inserts in one transaction."""
+    _check_bulk_size(len(payload.items))
+    _ensure_notebooks_owned(db, user, {item.notebook_id for item in payload.items})
+    folder_ids = [list(dict.fromkeys(item.folder_ids)) for item in payload.items]
+    seqs = _check_folder_links(db, user, [(item.notebook_id, ids) for item, ids in zip(payload.items, folder_ids)])
+    rows = bulk.insert_flashcards(
+        db,
+        [
+            {
+                "user_id": user.id,
+                "notebook_id": item.notebook_id,
+                "question": item.question,
+                "answer": item.answer,
+                "meta": item.meta,
+            }
+            for item in payload.items
+        ],
+        folder_ids,
+        seqs=seqs,
+    )
+    db.commit()
+    return [_card_to_schema(row, ids) for row, ids in zip(rows, folder_ids)]
+
+
+@router.patch(
+    "/batch",
+    response_model=BatchResult,
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
+)
+def batch_update_flashcards(
+    payload: FlashcardBatchUpdate,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> BatchResult:
+    """Add/remove many flashcards to/from folders in one transaction, reporting the outcome per id.
+
+    Unknown ids and cards from another notebook than an added folder are skipped and
+    reported; the rest are applied.
+    """
+    ids = list(dict.fromkeys(payload.ids))
+    _check_bulk_size(len(ids))
+    add = list(dict.fromkeys(payload.add_folder_ids))
+    remove = list(dict.fromkeys(payload.remove_folder_ids))
+    notebook_of = bulk.owned_notebooks(db, models.Flashcard, user.id, ids)
+    folder_notebooks = _folder_notebooks(db, user, list(dict.fromkeys([*add, *remove])))
+
+    errors: Dict[uuid.UUID, str] = {}
+    for card_id in ids:
+        notebook_id = notebook_of.get(card_id)
+        if notebook_id is None:
+            errors[card_id] = "Flashcard not found"
+        elif any(folder_notebooks[folder_id] != notebook_id for folder_id in add):
+            errors[card_id] = "Folder belongs to a different notebook"
+    bulk.relink(
+        db,
+        models.FlashcardFolderItem,
+        [card_id for card_id in ids if card_id not in errors],
+        add=add,
+        remove=remove,
+    )
+    db.commit()
+    return _batch_result(ids, errors)
+
+
+@router.delete(
+    "/batch",
+    response_model=BatchResult,
+    dependencies=[Depends(require_csrf), Depends(query_budget(5))],
+)
+def batch_delete_flashcards(
+    ids: List[uuid.UUID] = Query(min_length=1),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> BatchResult:
+    """Delete many flashcards with one statement (`?ids=...&ids=...`), reporting the outcome per id."""
+    ids = list(dict.fromkeys(ids))
+    _check_bulk_size(len(ids))
+    deleted = bulk.delete_owned(db, models.Flashcard, user.id, ids)
+    db.commit()
+    return _batch_result(ids, {card_id: "Flashcard not found" for card_id in ids if card_id not in deleted})
+
+
 @router.put(
     "/{card_id}",
     response_model=FlashcardOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
 )
 def update_flashcard(
     card_id: uuid.UUID,
@@ -323,6 +531,8 @@ def update_flashcard(
         card.meta = payload.meta
     if payload.folder_ids is not None:
         card.folders = _get_folders(db, user, card.notebook_id, payload.folder_ids)
+        # Links are not columns of the card; bump it so listing ETags change.
+        card.updated_at = func.now()
 
     db.add(card)
     db.commit()
@@ -333,7 +543,7 @@ def update_flashcard(
 @router.delete(
     "/{card_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(8))],
 )
 def delete_flashcard(
     card_id: uuid.UUID,
@@ -343,5 +553,6 @@ def delete_flashcard(
     """Delete a flashcard owned by the user."""
     card = _get_card(card_id, user, db)
     db.delete(card)
+    bulk.record_deletions(db, user.id, models.Flashcard, [card.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+
+from api.db.instrumentation import query_budget
+from api.services import metrics
+from api.settings import settings
+
+router = APIRouter(tags=["metrics"])
+
+
+def _check_auth(request: Request):
+    if settings.INTERNAL_TOKEN and request.headers.get("X-API-KEY") != settings.INTERNAL_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(query_budget(2))])
+def metrics_endpoint(request: Request) -> Response:
+    """Expose request, upstream and DB pool metrics in Prometheus text format."""
+    _check_auth(request)
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
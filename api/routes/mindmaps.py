@@ -3,20 +3,29 @@
 from __future__ import annotations
 
 import uuid
-from typing import List
+from typing import List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 from api.dependencies import get_current_user, require_csrf
-from api.db import models
+from api.db import bulk, models
 from api.db.database import get_db
-from api.schemas import MindMapCreate, MindMapOut, MindMapUpdate
+from api.db.instrumentation import query_budget
+from api.schemas import MindMapCreate, MindMapOut, MindMapPatch, MindMapPatchOut, MindMapSummaryOut, MindMapUpdate
+from api.services.http_cache import PRIVATE_REVALIDATE, cache_control, conditional, etag
+from api.services.json_patch import apply_patch
+from api.services.pagination import NEXT_CURSOR_HEADER, Keyset, text_filter
+from api.settings import settings
 
 
 router = APIRouter(prefix="/mindmaps", tags=["mindmaps"])
 
+# Backed by idx_mindmaps_user_updated / idx_mindmaps_user_nb_updated.
+_MINDMAP_KEYSET = Keyset((models.MindMap.updated_at, models.MindMap.id), descending=True)
+
 
 def _ensure_notebook_owned(db: Session, user: models.User, notebook_id: uuid.UUID) -> models.Notebook:
     notebook = db.get(models.Notebook, notebook_id)
@@ -31,6 +40,7 @@ def _mindmap_to_schema(mindmap: models.MindMap) -> MindMapOut:
         notebook_id=mindmap.notebook_id,
         title=mindmap.title,
         data=mindmap.data,
+        version=mindmap.version,
         created_at=mindmap.created_at,
         updated_at=mindmap.updated_at,
     )
@@ -43,32 +53,104 @@ def _get_mindmap(mindmap_id: uuid.UUID, user: models.User, db: Session) -> model
     return mindmap
 
 
-@router.get("", response_model=List[MindMapOut])
+def _check_version(mindmap: models.MindMap, version: int) -> None:
+    if mindmap.version != version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Mind map was modified (current version {mindmap.version})",
+        )
+
+
+def _commit_versioned(db: Session, mindmap: models.MindMap, attribute_names: Optional[List[str]] = None) -> None:
+    """Commit an edit and refresh `attribute_names` (all by default).
+
+    The ORM's UPDATE only matches the version that was read, so a concurrent edit is a 409.
+    """
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Mind map was modified concurrently")
+    db.refresh(mindmap, attribute_names)
+
+
+@router.get(
+    "",
+    response_model=List[Union[MindMapOut, MindMapSummaryOut]],
+    dependencies=[Depends(cache_control(PRIVATE_REVALIDATE)), Depends(query_budget(5))],
+)
 def list_mindmaps(
+    request: Request,
+    response: Response,
     notebook_id: uuid.UUID | None = Query(default=None),
+    q: str | None = Query(default=None, max_length=200),
+    fields: Literal["full", "summary"] = Query(default="full"),
+    limit: int | None = Query(default=None, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: str | None = Query(default=None),
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> List[MindMapOut]:
-    """List mind maps for the user; optionally filter by notebook id."""
-    query = (
-        select(models.MindMap)
-        .where(models.MindMap.user_id == user.id)
-        .order_by(models.MindMap.updated_at.desc())
-    )
+) -> List[MindMapOut] | List[MindMapSummaryOut]:
+    """List the user's mind maps, most recently updated first, filtered by notebook and title (`q`).
+
+    With `limit`, one page is returned and the next page's cursor is sent in the
+    `X-Next-Cursor` header. `fields=summary` leaves out the JSONB `data` column.
+    The ETag covers every map in scope (count, version sum, latest update), so a 304
+    costs one aggregate over the `(user_id[, notebook_id], updated_at)` index.
+    """
+    scope = [models.MindMap.user_id == user.id]
     if notebook_id is not None:
-        query = query.where(models.MindMap.notebook_id == notebook_id)
+        scope.append(models.MindMap.notebook_id == notebook_id)
+    fingerprint = db.execute(
+        select(func.count(), func.sum(models.MindMap.version), func.max(models.MindMap.updated_at)).where(*scope)
+    ).one()
+    cached = conditional(request, response, etag(str(request.url.query), *fingerprint))
+    if cached:
+        return cached
 
-    items = db.execute(query).scalars().all()
-    return [_mindmap_to_schema(item) for item in items]
+    if fields == "summary":
+        query = select(
+            models.MindMap.id,
+            models.MindMap.notebook_id,
+            models.MindMap.title,
+            models.MindMap.created_at,
+            models.MindMap.updated_at,
+        )
+    else:
+        query = select(models.MindMap)
+    query = query.where(*scope)
+    if q and q.strip():
+        query = query.where(text_filter([models.MindMap.title], q.strip()))
 
+    result = db.execute(_MINDMAP_KEYSET.apply(query, cursor, limit))
+    rows, next_cursor = _MINDMAP_KEYSET.page(result.all() if fields == "summary" else result.scalars().all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fields == "summary":
+        return [MindMapSummaryOut.model_validate(row) for row in rows]
+    return [_mindmap_to_schema(item) for item in rows]
 
-@router.get("/{mindmap_id}", response_model=MindMapOut)
+
+@router.get(
+    "/{mindmap_id}",
+    response_model=MindMapOut,
+    dependencies=[Depends(cache_control(PRIVATE_REVALIDATE)), Depends(query_budget(5))],
+)
 def get_mindmap(
     mindmap_id: uuid.UUID,
+    request: Request,
+    response: Response,
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> MindMapOut:
-    """Fetch a single mind map by id."""
+    """Fetch a single mind map by id; the ETag is its `version`, checked without loading `data`."""
+    version = db.scalar(
+        select(models.MindMap.version).where(models.MindMap.id == mindmap_id, models.MindMap.user_id == user.id)
+    )
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mind map not found")
+    cached = conditional(request, response, etag(mindmap_id, version))
+    if cached:
+        return cached
     mindmap = _get_mindmap(mindmap_id, user, db)
     return _mindmap_to_schema(mindmap)
 
@@ -77,7 +159,7 @@ def get_mindmap(
     "",
     response_model=MindMapOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def create_mindmap(
     payload: MindMapCreate,
@@ -101,7 +183,7 @@ def create_mindmap(
 @router.put(
     "/{mindmap_id}",
     response_model=MindMapOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def update_mindmap(
     mindmap_id: uuid.UUID,
@@ -109,8 +191,13 @@ def update_mindmap(
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> MindMapOut:
-    """Update a mind map’s notebook, title, or data payload."""
+    """Update a mind map’s notebook, title, or data payload.
+
+    With `version`, the update is rejected with 409 unless the stored version matches.
+    """
     mindmap = _get_mindmap(mindmap_id, user, db)
+    if payload.version is not None:
+        _check_version(mindmap, payload.version)
 
     if payload.notebook_id is not None and payload.notebook_id != mindmap.notebook_id:
         _ensure_notebook_owned(db, user, payload.notebook_id)
@@ -121,15 +208,42 @@ def update_mindmap(
         mindmap.data = payload.data
 
     db.add(mindmap)
-    db.commit()
-    db.refresh(mindmap)
+    _commit_versioned(db, mindmap)
     return _mindmap_to_schema(mindmap)
 
 
+@router.patch(
+    "/{mindmap_id}",
+    response_model=MindMapPatchOut,
+    dependencies=[Depends(require_csrf), Depends(query_budget(7))],
+)
+def patch_mindmap(
+    mindmap_id: uuid.UUID,
+    payload: MindMapPatch,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> MindMapPatchOut:
+    """Apply RFC 6902 JSON Patch ops to the mind map's `data`.
+
+    `version` must match the stored version (409 otherwise). The ops are applied
+    all-or-nothing; a failed `test` op is a 409 and an op that does not apply is a 422.
+    Only the new version is returned, so an edit never downloads the document.
+    """
+    mindmap = _get_mindmap(mindmap_id, user, db)
+    _check_version(mindmap, payload.version)
+    data = apply_patch(mindmap.data, [op.model_dump(by_alias=True, exclude_unset=True) for op in payload.ops])
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Mind map data must stay an object")
+
+    mindmap.data = data
+    _commit_versioned(db, mindmap, ["version", "updated_at"])
+    return MindMapPatchOut(id=mindmap.id, version=mindmap.version, updated_at=mindmap.updated_at)
+
+
 @router.delete(
     "/{mindmap_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def delete_mindmap(
     mindmap_id: uuid.UUID,
@@ -139,5 +253,6 @@ def delete_mindmap(
     """Delete a mind map owned by the user."""
     mindmap = _get_mindmap(mindmap_id, user, db)
     db.delete(mindmap)
+    bulk.record_deletions(db, user.id, models.MindMap, [mindmap.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -3,28 +3,29 @@
 from __future__ import annotations
 
 import uuid
-from typing import Iterable, List
+from typing import Iterable, List, Sequence
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy import select
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 
 from api.dependencies import get_current_user, require_csrf
-from api.db import models
+from api.db import bulk, models
 from api.db.database import get_db
+from api.db.instrumentation import query_budget
 from api.schemas import NotebookFolderCreate, NotebookFolderOut, NotebookFolderUpdate
 
 
 router = APIRouter(prefix="/notebook-folders", tags=["notebook-folders"])
 
 
-def _folder_to_schema(folder: models.NotebookFolder) -> NotebookFolderOut:
+def _folder_to_schema(folder: models.NotebookFolder, notebook_ids: Sequence[uuid.UUID]) -> NotebookFolderOut:
     return NotebookFolderOut(
         id=folder.id,
         name=folder.name,
         description=folder.description,
         color=folder.color,
-        notebook_ids=[notebook.id for notebook in folder.notebooks],
+        notebook_ids=list(notebook_ids),
         created_at=folder.created_at,
         updated_at=folder.updated_at,
     )
@@ -37,31 +38,28 @@ def _get_folder(folder_id: uuid.UUID, user: models.User, db: Session) -> models.
     return folder
 
 
-def _get_notebooks(db: Session, user: models.User, notebook_ids: Iterable[uuid.UUID]) -> List[models.Notebook]:
+def _check_notebook_ids(db: Session, user: models.User, notebook_ids: Iterable[uuid.UUID]) -> List[uuid.UUID]:
     ids = list(dict.fromkeys(notebook_ids))
     if not ids:
         return []
-    notebooks = (
-        db.execute(
-            select(models.Notebook).where(
+    found = set(
+        db.scalars(
+            select(models.Notebook.id).where(
                 models.Notebook.user_id == user.id,
                 models.Notebook.id.in_(ids),
             )
         )
-        .scalars()
-        .all()
     )
-    found = {notebook.id for notebook in notebooks}
     missing = [str(notebook_id) for notebook_id in ids if notebook_id not in found]
     if missing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Notebooks not found or not owned: {', '.join(missing)}",
         )
-    return notebooks
+    return ids
 
 
-@router.get("", response_model=List[NotebookFolderOut])
+@router.get("", response_model=List[NotebookFolderOut], dependencies=[Depends(query_budget(5))])
 def list_notebook_folders(
     notebook_id: uuid.UUID | None = Query(default=None),
     user: models.User = Depends(get_current_user),
@@ -71,21 +69,23 @@ def list_notebook_folders(
     query = (
         select(models.NotebookFolder)
         .where(models.NotebookFolder.user_id == user.id)
-        .options(selectinload(models.NotebookFolder.notebooks))
         .order_by(models.NotebookFolder.created_at.desc())
     )
     if notebook_id is not None:
-        query = query.join(models.NotebookFolder.notebooks).where(models.Notebook.id == notebook_id)
+        query = query.join(
+            models.NotebookFolderItem, models.NotebookFolderItem.folder_id == models.NotebookFolder.id
+        ).where(models.NotebookFolderItem.notebook_id == notebook_id)
 
-    folders = db.execute(query).scalars().unique().all()
-    return [_folder_to_schema(folder) for folder in folders]
+    folders = db.execute(query).scalars().all()
+    members = bulk.member_ids(db, models.NotebookFolderItem, [folder.id for folder in folders])
+    return [_folder_to_schema(folder, members[folder.id]) for folder in folders]
 
 
 @router.post(
     "",
     response_model=NotebookFolderOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
 )
 def create_notebook_folder(
     payload: NotebookFolderCreate,
@@ -99,17 +99,19 @@ def create_notebook_folder(
         description=payload.description,
         color=payload.color,
     )
-    folder.notebooks = _get_notebooks(db, user, payload.notebook_ids)
+    notebook_ids = _check_notebook_ids(db, user, payload.notebook_ids)
     db.add(folder)
+    db.flush()
+    bulk.replace_members(db, models.NotebookFolderItem, folder.id, notebook_ids)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    return _folder_to_schema(folder, notebook_ids)
 
 
 @router.put(
     "/{folder_id}",
     response_model=NotebookFolderOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
 )
 def update_notebook_folder(
     folder_id: uuid.UUID,
@@ -126,19 +128,23 @@ def update_notebook_folder(
         folder.description = payload.description
     if payload.color is not None:
         folder.color = payload.color
+    notebook_ids = None
     if payload.notebook_ids is not None:
-        folder.notebooks = _get_notebooks(db, user, payload.notebook_ids)
+        notebook_ids = _check_notebook_ids(db, user, payload.notebook_ids)
+        bulk.replace_members(db, models.NotebookFolderItem, folder.id, notebook_ids)
 
     db.add(folder)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    if notebook_ids is None:
+        notebook_ids = bulk.member_ids(db, models.NotebookFolderItem, [folder.id])[folder.id]
+    return _folder_to_schema(folder, notebook_ids)
 
 
 @router.delete(
     "/{folder_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(6))],
 )
 def delete_notebook_folder(
     folder_id: uuid.UUID,
@@ -148,5 +154,6 @@ def delete_notebook_folder(
     """Delete a notebook folder (notebooks remain)."""
     folder = _get_folder(folder_id, user, db)
     db.delete(folder)
+    bulk.record_deletions(db, user.id, models.NotebookFolder, [folder.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
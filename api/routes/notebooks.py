@@ -2,24 +2,31 @@
 
 from __future__ import annotations 
 
+import asyncio 
 import uuid 
-from typing import Any ,Dict ,List ,Sequence 
+from typing import Any ,AsyncIterator ,Callable ,List ,Optional ,Sequence ,TypeVar 
 
-from fastapi import APIRouter ,Depends ,HTTPException ,Response ,status 
-from pydantic import ValidationError 
-from sqlalchemy import Select ,select 
+from fastapi import APIRouter ,Depends ,HTTPException ,Request ,Response ,status 
+from fastapi .responses import StreamingResponse 
+from sqlalchemy import Select ,func ,select 
 from sqlalchemy .orm import Session ,selectinload 
 from api .dependencies import get_current_user ,require_csrf 
-from api .db .database import get_db 
-from api .db import models 
-from api .services import openai_client 
+from api .db .database import get_db ,session_scope 
+from api .db import bulk ,models 
+from api .db .instrumentation import query_budget 
+from api .services import extraction ,openai_client ,structured_outputs ,usage 
+from api .services .fanout import Partition 
+from api .services .generation import GenerationRun ,GenerationSource ,sse_event 
+from api .services .http_cache import PRIVATE_REVALIDATE ,cache_control ,conditional ,etag 
 from api .services .ai_registry import resolve_model_key 
 import api .schemas as schemas 
 from api .settings import settings 
-from api .services .openai_utils import build_responses_payload ,extract_structured_output ,extract_text_from_response 
+from api .services .openai_utils import extract_text_from_response 
 
 router =APIRouter (prefix ="/notebooks",tags =["notebooks"])
 
+PlanT =TypeVar ("PlanT",bound =tuple )
+
 
 def _notebook_query (user_id :uuid .UUID )->Select [tuple [models .Notebook ]]:
     return (
@@ -79,6 +86,7 @@ def _notebook_to_schema (notebook :models .Notebook )->schemas.NotebookOut :
     color =notebook .color ,
     openai_vector_store_id =notebook .openai_vector_store_id ,
     vector_store_expires_at =notebook .vector_store_expires_at ,
+    retrieval_mode =notebook .retrieval_mode .value ,
     notes =[_note_to_schema (n )for n in sorted (notebook .notes ,key =lambda n :n .seq )],
     attachments =[_attachment_to_schema (a )for a in notebook .attachments ],
     folders =[_folder_to_schema (folder )for folder in notebook .folders ],
@@ -112,7 +120,8 @@ def _load_folders (db :Session ,user :models .User ,folder_ids :Sequence [uuid .
     return folders 
 
 
-def _flashcard_folder_to_schema (folder :models .FlashcardFolder )->schemas.FlashcardFolderOut :
+def _flashcard_folder_to_schema (folder :Any ,flashcard_ids :Sequence [uuid .UUID ])->schemas.FlashcardFolderOut :
+    """`folder` is a row carrying `bulk.FLASHCARD_FOLDER_COLUMNS`."""
     return schemas.FlashcardFolderOut (
     id =folder .id ,
     notebook_id =folder .notebook_id ,
@@ -120,29 +129,30 @@ def _flashcard_folder_to_schema (folder :models .FlashcardFolder )->schemas.Flas
     description =folder .description ,
     created_at =folder .created_at ,
     updated_at =folder .updated_at ,
-    flashcard_ids =[card .id for card in folder .flashcards ],
+    flashcard_ids =list (flashcard_ids ),
     )
 
 
-def _flashcard_to_schema (card :models .Flashcard )->schemas.FlashcardOut :
+def _flashcard_to_schema (card :Any ,folder_ids :Sequence [uuid .UUID ])->schemas.FlashcardOut :
+    """`card` is a row carrying `bulk.FLASHCARD_COLUMNS`."""
     return schemas.FlashcardOut (
     id =card .id ,
     notebook_id =card .notebook_id ,
     question =card .question ,
     answer =card .answer ,
     meta =card .meta ,
-    folder_ids =[folder .id for folder in card .folders ],
+    folder_ids =list (folder_ids ),
     )
 
 
-@router .get ("",response_model =List [schemas.NotebookOut ])
+@router .get ("",response_model =List [schemas.NotebookOut ],dependencies =[Depends (query_budget (6 ))])
 def list_notebooks (user :models .User =Depends (get_current_user ),db :Session =Depends (get_db ))->List [schemas.NotebookOut ]:
     """List all notebooks for the user, including notes, attachments, and folders."""
     notebooks =db .execute (_notebook_query (user .id )).scalars ().unique ().all ()
     return [_notebook_to_schema (notebook )for notebook in notebooks ]
 
 
-@router .post ("",response_model =schemas.NotebookOut ,status_code =status .HTTP_201_CREATED ,dependencies =[Depends (require_csrf )])
+@router .post ("",response_model =schemas.NotebookOut ,status_code =status .HTTP_201_CREATED ,dependencies =[Depends (require_csrf ),Depends (query_budget (9 ))])
 def create_notebook (payload :schemas.NotebookCreate ,user :models .User =Depends (get_current_user ),db :Session =Depends (get_db ))->schemas.NotebookOut :
     """Create a notebook with optional nested notes and folder memberships."""
     notebook =models .Notebook (
@@ -153,6 +163,7 @@ def create_notebook (payload :schemas.NotebookCreate ,user :models .User =Depend
     color =payload .color ,
     openai_vector_store_id =payload .openai_vector_store_id ,
     vector_store_expires_at =payload .vector_store_expires_at ,
+    retrieval_mode =models .RetrievalMode (payload .retrieval_mode or models .RetrievalMode .FILE_SEARCH .value ),
     )
 
     for note_payload in payload .notes :
@@ -186,16 +197,52 @@ def _get_notebook_for_user (notebook_id :uuid .UUID ,user :models .User ,db :Ses
     return notebook 
 
 
-@router .get ("/{notebook_id}",response_model =schemas.NotebookOut )
+def _notebook_etag (notebook_id :uuid .UUID ,user :models .User ,db :Session )->str :
+    """ETag from one row of timestamps and counts; note edits are covered because they bump the notebook."""
+    attachments =select (models .Attachment ).where (models .Attachment .notebook_id ==models .Notebook .id )
+    folder_items =(
+    select (models .NotebookFolderItem )
+    .join (models .NotebookFolder ,models .NotebookFolder .id ==models .NotebookFolderItem .folder_id )
+    .where (models .NotebookFolderItem .notebook_id ==models .Notebook .id )
+    )
+    row =db .execute (
+    select (
+    models .Notebook .updated_at ,
+    attachments .with_only_columns (func .count ()).scalar_subquery (),
+    attachments .with_only_columns (func .max (models .Attachment .updated_at )).scalar_subquery (),
+    folder_items .with_only_columns (func .count ()).scalar_subquery (),
+    folder_items .with_only_columns (func .max (models .NotebookFolder .updated_at )).scalar_subquery (),
+    ).where (models .Notebook .id ==notebook_id ,models .Notebook .user_id ==user .id )
+    ).one_or_none ()
+    if row is None :
+        raise HTTPException (status_code =status .HTTP_404_NOT_FOUND ,detail ="Notebook not found")
+    return etag (notebook_id ,*row )
+
+
+@router .get (
+"/{notebook_id}",
+response_model =schemas.NotebookOut ,
+dependencies =[Depends (cache_control (PRIVATE_REVALIDATE )),Depends (query_budget (8 ))],
+)
 def get_notebook (
-notebook_id :uuid .UUID ,user :models .User =Depends (get_current_user ),db :Session =Depends (get_db )
+notebook_id :uuid .UUID ,
+request :Request ,
+response :Response ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
 )->schemas.NotebookOut :
-    """Fetch a single notebook by id, including nested relationships."""
+    """Fetch a single notebook by id, including nested relationships.
+
+    Answers `If-None-Match` with a 304 after one fingerprint query, without loading the notebook.
+    """
+    cached =conditional (request ,response ,_notebook_etag (notebook_id ,user ,db ))
+    if cached :
+        return cached 
     notebook =_get_notebook_for_user (notebook_id ,user ,db )
     return _notebook_to_schema (notebook )
 
 
-@router .put ("/{notebook_id}",response_model =schemas.NotebookOut ,dependencies =[Depends (require_csrf )])
+@router .put ("/{notebook_id}",response_model =schemas.NotebookOut ,dependencies =[Depends (require_csrf ),Depends (query_budget (15 ))])
 def update_notebook (
 notebook_id :uuid .UUID ,payload :schemas.NotebookUpdate ,user :models .User =Depends (get_current_user ),db :Session =Depends (get_db )
 )->schemas.NotebookOut :
@@ -209,6 +256,8 @@ notebook_id :uuid .UUID ,payload :schemas.NotebookUpdate ,user :models .User =De
     notebook .color =payload .color 
     notebook .openai_vector_store_id =payload .openai_vector_store_id 
     notebook .vector_store_expires_at =payload .vector_store_expires_at 
+    if payload .retrieval_mode is not None :
+        notebook .retrieval_mode =models .RetrievalMode (payload .retrieval_mode )
 
     if payload .notes is not None :
         existing_notes ={str (note .id ):note for note in notebook .notes }
@@ -241,11 +290,17 @@ notebook_id :uuid .UUID ,payload :schemas.NotebookUpdate ,user :models .User =De
         for i ,note in enumerate (updated_notes ):
             note .seq =i 
 
+        removed_ids =[note .id for note in notebook .notes if str (note .id )not in incoming_ids ]
+        bulk .record_deletions (db ,user .id ,models .Note ,removed_ids )
+
         notebook .notes [:]=sorted (updated_notes ,key =lambda n :n .seq )
 
     if payload .folder_ids is not None :
         notebook .folders =_load_folders (db ,user ,payload .folder_ids )
 
+        # The ETag fingerprint does not read notes or folder links; bump the notebook so it changes.
+    notebook .updated_at =func .now ()
+
     db .add (notebook )
     db .commit ()
     db .refresh (notebook )
@@ -253,207 +308,261 @@ notebook_id :uuid .UUID ,payload :schemas.NotebookUpdate ,user :models .User =De
     return _notebook_to_schema (notebook )
 
 
-@router .delete ("/{notebook_id}",status_code =status .HTTP_204_NO_CONTENT ,dependencies =[Depends (require_csrf )])
+@router .delete ("/{notebook_id}",status_code =status .HTTP_204_NO_CONTENT ,dependencies =[Depends (require_csrf ),Depends (query_budget (17 ))])
 def delete_notebook (
 notebook_id :uuid .UUID ,user :models .User =Depends (get_current_user ),db :Session =Depends (get_db )
 )->Response :
     """Delete a notebook and its dependent entities."""
     notebook =_get_notebook_for_user (notebook_id ,user ,db )
     db .delete (notebook )
+    bulk .record_deletions (db ,user .id ,models .Notebook ,[notebook .id ])
     db .commit ()
     return Response (status_code =status .HTTP_204_NO_CONTENT )
 
 
-def enforce_no_additional_properties (schema :dict ):
-    """Recursively set additionalProperties=False for every object schema, and ensure required lists are present."""
-    def walk (node :object ):
-        if isinstance (node ,dict ):
-            if node .get ("type")=="object":
-                node .setdefault ("additionalProperties",False )
-                props =node .get ("properties")
-                if isinstance (props ,dict ):
-                    node ["required"]=list (props .keys ())
-                    # Recurse into common schema containers
-            for key ,val in list (node .items ()):
-                if isinstance (val ,(dict ,list )):
-                    walk (val )
-        elif isinstance (node ,list ):
-            for item in node :
-                walk (item )
+async def _run_plan (plan :Callable [...,PlanT ],*args :Any )->PlanT :
+    """Run a `_plan_*` step in a worker thread, then start extraction for attachments it found unparsed.
 
-    walk (schema )
+    Planning loads extracted attachment texts and packs them into the prompt budget,
+    which can take a while for large files and must not stall the event loop.
+    """
+    planned =await asyncio .to_thread (plan ,*args )
+    source :GenerationSource =planned [1 ]
+    extraction .schedule (source .unextracted )
+    return planned 
 
 
-@router .post (
-"/{notebook_id}/flashcards/generate",
-response_model =schemas.FlashcardGenerateResponse ,
-status_code =status .HTTP_201_CREATED ,
-dependencies =[Depends (require_csrf )],
-)
-async def generate_flashcards_from_openai (
+def _flashcard_rows (
+user_id :uuid .UUID ,notebook_id :uuid .UUID ,items :Sequence [schemas.StructuredFlashcard ]
+)->list [dict [str ,Any ]]:
+    return [
+    {
+    "user_id":user_id ,
+    "notebook_id":notebook_id ,
+    "question":item .question .strip (),
+    "answer":item .answer .strip (),
+    "meta":{"sources":item .sources }if item .sources else None ,
+    }
+    for item in items 
+    ]
+
+
+def _plan_flashcards (
 notebook_id :uuid .UUID ,
 payload :schemas.FlashcardGenerateRequest ,
-user :models .User =Depends (get_current_user ),
-db :Session =Depends (get_db ),
-)->schemas.FlashcardGenerateResponse :
-    """Use OpenAI Responses API + selected attachments to generate flashcards into a folder."""
-    notebook =_get_notebook_for_user (notebook_id ,user ,db )
+user :models .User ,
+db :Session ,
+)->tuple [GenerationRun [schemas.StructuredFlashcardSet ],GenerationSource ,Any ,List [Partition ],List [dict ]]:
+    """Resolve sources, check the target folder and build one request per partition (see `_run_plan`)."""
+    run :GenerationRun [schemas.StructuredFlashcardSet ]=GenerationRun (
+    structured_outputs .FLASHCARDS ,user =user ,db =db ,model_key =payload .model_key 
+    )
+    source =run .resolve_sources (notebook_id ,payload .attachment_ids ,payload .note_ids )
 
     target_folder =None 
     if payload .folder_id :
-        target_folder =(
-        db .execute (
-        select (models .FlashcardFolder )
-        .where (
+        target_folder =db .execute (
+        select (*bulk .FLASHCARD_FOLDER_COLUMNS ).where (
         models .FlashcardFolder .id ==payload .folder_id ,
         models .FlashcardFolder .user_id ==user .id ,
         )
-        .options (selectinload (models .FlashcardFolder .flashcards ))
-        )
-        .scalars ()
-        .first ()
-        )
+        ).one_or_none ()
         if target_folder is None :
             raise HTTPException (status_code =status .HTTP_404_NOT_FOUND ,detail ="Flashcard folder not found")
-        if target_folder .notebook_id !=notebook .id :
+        if target_folder .notebook_id !=source .notebook_id :
             raise HTTPException (
             status_code =status .HTTP_400_BAD_REQUEST ,
             detail ="目标闪卡合集不属于当前笔记本",
             )
 
-    attachment_map ={att .id :att for att in notebook .attachments }
-    requested_ids =payload .attachment_ids or [att .id for att in notebook .attachments if att .openai_file_id ]
-    selected :list [models .Attachment ]=[]
-
-    for att_id in requested_ids :
-        att =attachment_map .get (att_id )
-        if not att :
-            raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail =f"附件不存在或不属于该笔记本: {att_id}")
-        if not att .openai_file_id :
-            raise HTTPException (
-            status_code =status .HTTP_400_BAD_REQUEST ,
-            detail =f"附件 {att.filename or att.id} 尚未同步到 OpenAI（缺少 openai_file_id）",
-            )
-        selected .append (att )
-
-    if not selected :
-        raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail ="至少需要一个已上传到 OpenAI 的附件")
-
-    file_blocks =[{"type":"input_file","file_id":att .openai_file_id }for att in selected if att .openai_file_id ]
-
-    model_info =resolve_model_key (payload .model_key ,default_key =settings .AI_MODEL_DEFAULTS .get ("flashcard"))
-    model_name =model_info .model
-    desired_count =payload .count 
     focus_text =(payload .focus or "").strip ()
-
-    system_prompt =(
-    "You are a bilingual study coach that creates concise Q/A flashcards in Chinese. "
-    "Use the provided files (input_file) to ground every card. "
-    "Each question should be clear and the answer compact (1-3 sentences). "
-    "Prefer high-yield concepts, formulas, or definitions. "
-    "If a count is provided, generate exactly that many cards; otherwise choose a balanced set. "
-    "Always fill the structured output schema precisely."
-    )
-
     focus_line =f"重点/Focus: {focus_text}"if focus_text else "重点/Focus: 自动选择最重要的知识点。"
-    count_line =f"生成数量: {desired_count} 张"if desired_count else "生成数量: 模型自行决定。"
-    file_names =", ".join (filter (None ,[att .filename or ""for att in selected ]))or "已选资料"
-
-    user_prompt ="\n".join (
+    parts =run .partitions (source ,count =payload .count ,fan_out =payload .fan_out )
+    openai_payloads =[
+    run .build_payload (
     [
-    f"Notebook: {notebook.title or '未命名笔记本'}",
-    f"资料文件: {file_names}",
-    count_line ,
+    f"Notebook: {source.notebook_title or '未命名笔记本'}",
+    f"资料文件: {part.file_names}",
+    f"生成数量: {part.count} 张"if part .count else "生成数量: 模型自行决定。",
     focus_line ,
     "输出语言: 中文。",
-    ]
+    ],
+    part ,
+    focus =focus_text or None ,
+    count =part .count ,
     )
+    for part in parts 
+    ]
+    return run ,source ,target_folder ,parts ,openai_payloads 
 
-    user_content =[{"type":"input_text","text":user_prompt },*file_blocks ]
-    schema =schemas.StructuredFlashcardSet .model_json_schema ()
-    enforce_no_additional_properties (schema )
 
-    openai_payload :Dict [str ,Any ]=build_responses_payload (
-    {
-    "model":model_name ,
-    "input":[
-    {"role":"system","content":[{"type":"input_text","text":system_prompt }]},
-    {"role":"user","content":user_content },
-    ],
-    "max_output_tokens":2048 ,
-    "text":{
-    "format":{
-    "type":"json_schema",
-    "name":"StructuredFlashcardSet",
-    "strict":True ,
-    "schema":schema ,
-    }
+def _flashcard_items (
+run :GenerationRun [schemas.StructuredFlashcardSet ],
+payload :schemas.FlashcardGenerateRequest ,
+source :GenerationSource ,
+target_folder :Any ,
+parts :List [Partition ],
+openai_payloads :List [dict ],
+)->AsyncIterator [tuple [Optional [schemas.StructuredFlashcardSet ],List [schemas.StructuredFlashcard ]]]:
+    return run .gather_items (
+    parts ,
+    openai_payloads ,
+    items ="flashcards",
+    key =lambda item :item .question ,
+    total =payload .count ,
+    defaults ={
+    "folder_name":payload .folder_name 
+    or (target_folder .name if target_folder else None )
+    or source .notebook_title 
+    or "AI 闪卡"
     },
-    }
+    required ="flashcards",
+    empty_detail ="生成闪卡失败：模型未返回任何闪卡内容，请重试",
+    invalid_detail ="解析闪卡结构化输出失败",
     )
 
-    if model_info .supports_temperature :
-        openai_payload ["temperature"]=float (0.2 )
 
-    try :
-        data =await openai_client .responses_complete (openai_payload ,timeout =60.0 )
-    except RuntimeError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =str (exc ))
+def _generated_folder_name (requested :Optional [str ],generated :Optional [str ],fallback :str )->str :
+    return (requested or generated or fallback ).strip ()[:255 ]
 
-    structured_payload =extract_structured_output (data )
 
-    if not isinstance (structured_payload ,dict ):
-        structured_payload ={}
+@router .post (
+"/{notebook_id}/flashcards/generate",
+response_model =schemas.FlashcardGenerateResponse ,
+status_code =status .HTTP_201_CREATED ,
+dependencies =[Depends (require_csrf ),Depends (query_budget (12 ))],
+)
+async def generate_flashcards_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.FlashcardGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->schemas.FlashcardGenerateResponse :
+    """Use OpenAI Responses API + selected attachments to generate flashcards into a folder."""
+    run ,source ,target_folder ,parts ,openai_payloads =await _run_plan (_plan_flashcards ,notebook_id ,payload ,user ,db )
 
-    if not structured_payload .get ("folder_name"):
-        structured_payload ["folder_name"]=(
-        payload .folder_name 
-        or (target_folder .name if target_folder else None )
-        or notebook .title 
-        or "AI 闪卡"
+    generated_name =None 
+    items :list [schemas.StructuredFlashcard ]=[]
+    async for result ,batch in _flashcard_items (run ,payload ,source ,target_folder ,parts ,openai_payloads ):
+        if result is not None :
+            generated_name =generated_name or result .folder_name 
+        items .extend (batch )
+
+    folder_name =_generated_folder_name (payload .folder_name ,generated_name ,source .notebook_title or "AI 闪卡")
+    focus_text =(payload .focus or "").strip ()
+    card_rows =_flashcard_rows (user .id ,source .notebook_id ,items )
+
+    def write ()->schemas.FlashcardGenerateResponse :
+        folder =target_folder 
+        existing_ids :list [uuid .UUID ]=[]
+        seqs :dict [uuid .UUID ,int ]={}
+        if folder is None :
+            folder =bulk .insert_one_returning (
+            db ,
+            models .FlashcardFolder ,
+            {
+            "user_id":user .id ,
+            "notebook_id":source .notebook_id ,
+            "name":folder_name ,
+            "description":focus_text or None ,
+            },
+            bulk .FLASHCARD_FOLDER_COLUMNS ,
+            )
+        else :
+            existing_ids =bulk .member_ids (db ,models .FlashcardFolderItem ,[folder .id ])[folder .id ]
+            seqs =bulk .next_seq (db ,models .FlashcardFolderItem ,[folder .id ])
+        cards =bulk .insert_flashcards (db ,card_rows ,[[folder .id ]]*len (card_rows ),seqs =seqs )
+        return schemas.FlashcardGenerateResponse (
+        folder =_flashcard_folder_to_schema (folder ,[*existing_ids ,*(card .id for card in cards )]),
+        flashcards =[_flashcard_to_schema (card ,[folder .id ])for card in cards ],
         )
 
-    if not structured_payload .get ("flashcards"):
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail ="生成闪卡失败：模型未返回任何闪卡内容，请重试")
+    response =run .persist (write )
+    run .finish ()
+    return response 
 
-    try :
-        result :schemas.StructuredFlashcardSet =schemas.StructuredFlashcardSet .model_validate (structured_payload )
-    except ValidationError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =f"解析闪卡结构化输出失败: {exc}")
 
-    folder_name =(payload .folder_name or result .folder_name or notebook .title or "AI 闪卡").strip ()
-    if len (folder_name )>255 :
-        folder_name =folder_name [:255 ]
+def _append_flashcards (
+folder :Any ,new_folder :dict [str ,Any ],rows :list [dict [str ,Any ]]
+)->tuple [Any ,List [Any ]]:
+    """Append `rows` to `folder`, creating it from `new_folder` first when it is None; one transaction."""
+    with session_scope ()as db :
+        if folder is None :
+            folder =bulk .insert_one_returning (db ,models .FlashcardFolder ,new_folder ,bulk .FLASHCARD_FOLDER_COLUMNS )
+        seqs =bulk .next_seq (db ,models .FlashcardFolderItem ,[folder .id ])
+        cards =bulk .insert_flashcards (db ,rows ,[[folder .id ]]*len (rows ),seqs =seqs )
+    return folder ,cards 
 
-    target_folder =target_folder or models .FlashcardFolder (
-    user_id =user .id ,
-    notebook_id =notebook .id ,
-    name =folder_name ,
-    description =focus_text or None ,
-    )
 
-    new_cards :list [models .Flashcard ]=[]
-    for item in result .flashcards :
-        card =models .Flashcard (
-        user_id =user .id ,
-        notebook_id =notebook .id ,
-        question =item .question .strip (),
-        answer =item .answer .strip (),
-        meta ={"sources":item .sources }if item .sources else None ,
-        )
-        new_cards .append (card )
-        target_folder .flashcards .append (card )
+def _flashcard_folder_members (folder_id :uuid .UUID )->schemas.FlashcardFolderOut :
+    with session_scope ()as db :
+        folder =db .execute (
+        select (*bulk .FLASHCARD_FOLDER_COLUMNS ).where (models .FlashcardFolder .id ==folder_id )
+        ).one ()
+        return _flashcard_folder_to_schema (folder ,bulk .member_ids (db ,models .FlashcardFolderItem ,[folder_id ])[folder_id ])
 
-    db .add (target_folder )
-    db .commit ()
-    db .refresh (target_folder )
-    for card in new_cards :
-        db .refresh (card )
 
-    return schemas.FlashcardGenerateResponse (
-    folder =_flashcard_folder_to_schema (target_folder ),
-    flashcards =[_flashcard_to_schema (card )for card in new_cards ],
-    )
+@router .post ("/{notebook_id}/flashcards/generate/stream",dependencies =[Depends (require_csrf ),Depends (query_budget (6 ))])
+async def stream_flashcards_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.FlashcardGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->StreamingResponse :
+    """Server-sent-event variant of flashcard generation.
+
+    The reply is streamed and parsed as it arrives; each card is saved and sent
+    (`generation.items`) as soon as the model has finished writing it, then the folder
+    with all its cards follows (`generation.completed`). Errors after the stream has
+    started arrive as a `generation.error` event instead of an HTTP status.
+    """
+    run ,source ,target_folder ,parts ,openai_payloads =await _run_plan (_plan_flashcards ,notebook_id ,payload ,user ,db )
+    # Checked before the stream starts; afterwards a 429 can no longer be sent.
+    await usage .enforce_quota (user .id )
+    user_id =user .id 
+    focus_text =(payload .focus or "").strip ()
+
+    async def events ()->AsyncIterator [str ]:
+        folder =target_folder 
+        generated_name =None 
+        yield sse_event ({"type":"generation.started","partitions":len (parts ),"count":payload .count })
+        try :
+            async for path ,value in run .stream_items (
+            openai_payloads ,
+            fields =("$.folder_name",),
+            quotas =[part .quota for part in parts ],
+            key =lambda item :item .question ,
+            total =payload .count ,
+            invalid_detail ="解析闪卡结构化输出失败",
+            ):
+                if path =="$.folder_name":
+                    generated_name =generated_name or value 
+                    continue 
+                new_folder ={
+                "user_id":user_id ,
+                "notebook_id":source .notebook_id ,
+                "name":_generated_folder_name (payload .folder_name ,generated_name ,source .notebook_title or "AI 闪卡"),
+                "description":focus_text or None ,
+                }
+                rows =_flashcard_rows (user_id ,source .notebook_id ,[value ])
+                with run .stage ("persist"):
+                    folder ,cards =await asyncio .to_thread (_append_flashcards ,folder ,new_folder ,rows )
+                yield sse_event (
+                {
+                "type":"generation.items",
+                "folder_id":folder .id ,
+                "flashcards":[_flashcard_to_schema (card ,[folder .id ]).model_dump (mode ="json")for card in cards ],
+                }
+                )
+            if folder is None :
+                raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail ="生成闪卡失败：模型未返回任何闪卡内容，请重试")
+            summary =await asyncio .to_thread (_flashcard_folder_members ,folder .id )
+            yield sse_event ({"type":"generation.completed","folder":summary .model_dump (mode ="json")})
+        except HTTPException as exc :
+            yield sse_event ({"type":"generation.error","status":exc .status_code ,"detail":exc .detail })
+        run .finish ()
+
+    return StreamingResponse (events (),media_type ="text/event-stream")
 
 
 def _build_mind_elixir_node (node :schemas.StructuredMindMapNode ,*,is_root :bool =False )->dict :
@@ -486,132 +595,171 @@ def _structured_mindmap_to_data (mindmap :schemas.StructuredMindMap ,sources :li
     }
 
 
-@router .post (
-"/{notebook_id}/mindmaps/generate",
-response_model =schemas.MindMapOut ,
-status_code =status .HTTP_201_CREATED ,
-dependencies =[Depends (require_csrf )],
-)
-async def generate_mindmap_from_openai (
+def _plan_mindmap (
 notebook_id :uuid .UUID ,
 payload :schemas.MindMapGenerateRequest ,
-user :models .User =Depends (get_current_user ),
-db :Session =Depends (get_db ),
-)->schemas.MindMapOut :
-    """Use OpenAI Responses API to build a structured mind map from notebook attachments."""
-    notebook =_get_notebook_for_user (notebook_id ,user ,db )
-
-    attachment_map ={att .id :att for att in notebook .attachments }
-    requested_ids =payload .attachment_ids or [att .id for att in notebook .attachments if att .openai_file_id ]
-    selected :list [models .Attachment ]=[]
-
-    for att_id in requested_ids :
-        att =attachment_map .get (att_id )
-        if not att :
-            raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail =f"附件不存在或不属于该笔记本: {att_id}")
-        if not att .openai_file_id :
-            raise HTTPException (
-            status_code =status .HTTP_400_BAD_REQUEST ,
-            detail =f"附件 {att.filename or att.id} 尚未同步到 OpenAI（缺少 openai_file_id）",
-            )
-        selected .append (att )
-
-    if not selected :
-        raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail ="至少需要一个已上传到 OpenAI 的附件")
-
-    file_blocks =[{"type":"input_file","file_id":att .openai_file_id }for att in selected if att .openai_file_id ]
-
-    model_info =resolve_model_key (payload .model_key ,default_key =settings .AI_MODEL_DEFAULTS .get ("mindmap"))
-    model_name =model_info .model
-    focus_text =(payload .focus or "").strip ()
-    user_title =(payload .title or notebook .title or "AI 思维导图").strip ()
-
-    system_prompt =(
-    "You are a bilingual study assistant that creates concise mind maps in Chinese. "
-    "Use the provided files (input_file) as sources. "
-    "Return a clean hierarchical structure with a single root and 3-8 main branches, depth 2-3. "
-    "Keep titles short, add optional summaries when helpful, and avoid markdown. "
-    "Always follow the JSON schema strictly."
+user :models .User ,
+db :Session ,
+)->tuple [GenerationRun [schemas.StructuredMindMap ],GenerationSource ,dict ]:
+    """Resolve sources and build the request (see `_run_plan`)."""
+    run :GenerationRun [schemas.StructuredMindMap ]=GenerationRun (
+    structured_outputs .MINDMAP ,user =user ,db =db ,model_key =payload .model_key 
     )
+    source =run .resolve_sources (notebook_id ,payload .attachment_ids ,payload .note_ids )
 
+    focus_text =(payload .focus or "").strip ()
+    user_title =(payload .title or source .notebook_title or "AI 思维导图").strip ()
     focus_line =f"聚焦/Focus: {focus_text}"if focus_text else "聚焦/Focus: 课程的关键概念、关系和步骤。"
-    file_names =", ".join (filter (None ,[att .filename or ""for att in selected ]))or "已选资料"
 
-    user_prompt ="\n".join (
+    openai_payload =run .build_payload (
     [
-    f"Notebook: {notebook.title or '未命名笔记本'}",
+    f"Notebook: {source.notebook_title or '未命名笔记本'}",
     f"Mind map title: {user_title}",
-    f"资料文件: {file_names}",
+    f"资料文件: {source.file_names}",
     focus_line ,
     "输出语言: 中文。",
-    ]
-    )
-
-    user_content =[{"type":"input_text","text":user_prompt },*file_blocks ]
-    schema =schemas.StructuredMindMap .model_json_schema ()
-    enforce_no_additional_properties (schema )
-
-    openai_payload :Dict [str ,Any ]=build_responses_payload (
-    {
-    "model":model_name ,
-    "input":[
-    {"role":"system","content":[{"type":"input_text","text":system_prompt }]},
-    {"role":"user","content":user_content },
     ],
-    "max_output_tokens":2048 ,
-    "text":{
-    "format":{
-    "type":"json_schema",
-    "name":"StructuredMindMap",
-    "strict":True ,
-    "schema":schema ,
-    }
-    },
-    }
+    source ,
+    focus =focus_text or None ,
     )
+    return run ,source ,openai_payload 
 
-    if model_info .supports_temperature :
-        openai_payload ["temperature"]=float (0.2 )
 
-    try :
-        data =await openai_client .responses_complete (openai_payload ,timeout =60.0 )
-    except RuntimeError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =str (exc ))
-
-    structured_payload =extract_structured_output (data )or {}
-
-    try :
-        result :schemas.StructuredMindMap =schemas.StructuredMindMap .model_validate (structured_payload )
-    except ValidationError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =f"解析思维导图结构化输出失败: {exc}")
+@router .post (
+"/{notebook_id}/mindmaps/generate",
+response_model =schemas.MindMapOut ,
+status_code =status .HTTP_201_CREATED ,
+dependencies =[Depends (require_csrf ),Depends (query_budget (12 ))],
+)
+async def generate_mindmap_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.MindMapGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->schemas.MindMapOut :
+    """Use OpenAI Responses API to build a structured mind map from notebook attachments."""
+    run ,source ,openai_payload =await _run_plan (_plan_mindmap ,notebook_id ,payload ,user ,db )
+    data =await run .dispatch (openai_payload )
+    result =run .validate (data ,invalid_detail ="解析思维导图结构化输出失败")
 
-    title =(payload .title or result .title or notebook .title or "AI 思维导图").strip ()
+    title =(payload .title or result .title or source .notebook_title or "AI 思维导图").strip ()
     if len (title )>255 :
         title =title [:255 ]
-    sources =[
-    att .filename or getattr (att ,"s3_object_key",None )or str (att .id )
-    for att in selected 
-    ]
-    data_payload =_structured_mindmap_to_data (result ,sources )
+    data_payload =_structured_mindmap_to_data (result ,source .source_labels )
 
     mindmap =models .MindMap (
     user_id =user .id ,
-    notebook_id =notebook .id ,
+    notebook_id =source .notebook_id ,
     title =title ,
     data =data_payload ,
     )
 
-    db .add (mindmap )
-    db .commit ()
-    db .refresh (mindmap )
+    run .persist (lambda :db .add (mindmap ))
+    run .finish ()
 
     return schemas.MindMapOut .model_validate (mindmap )
 
 
+def _save_streamed_mindmap (
+mindmap_id :Optional [uuid .UUID ],version :Optional [int ],values :dict [str ,Any ]
+)->schemas.MindMapOut :
+    """Create the mind map, or replace its title and data if it is still at `version`."""
+    with session_scope ()as db :
+        if mindmap_id is None :
+            mindmap =models .MindMap (**values )
+            db .add (mindmap )
+        else :
+            mindmap =db .get (models .MindMap ,mindmap_id )
+            if mindmap is None or mindmap .version !=version :
+                raise HTTPException (status_code =status .HTTP_409_CONFLICT ,detail ="思维导图在生成过程中被修改，已停止写入")
+            mindmap .title =values ["title"]
+            mindmap .data =values ["data"]
+        db .flush ()
+        return schemas.MindMapOut .model_validate (mindmap )
+
+
+@router .post ("/{notebook_id}/mindmaps/generate/stream",dependencies =[Depends (require_csrf ),Depends (query_budget (6 ))])
+async def stream_mindmap_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.MindMapGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->StreamingResponse :
+    """Server-sent-event variant of mind map generation.
+
+    The map is saved when its first main branch is complete and updated as each
+    further branch arrives; every branch is sent as a `generation.items` event with
+    the map's id and new version. `generation.completed` carries the finished map.
+    """
+    run ,source ,openai_payload =await _run_plan (_plan_mindmap ,notebook_id ,payload ,user ,db )
+    await usage .enforce_quota (user .id )
+    user_id =user .id 
+    sources =source .source_labels 
+
+    async def events ()->AsyncIterator [str ]:
+        fields :dict [str ,Any ]={}
+        mindmap :Optional [schemas.MindMapOut ]=None 
+        data_payload :dict [str ,Any ]={}
+        # A title or root field that arrives after the map was saved is written at the end.
+        stale =False 
+
+        def values ()->dict [str ,Any ]:
+            title =(payload .title or fields .get ("$.title")or source .notebook_title or "AI 思维导图").strip ()[:255 ]
+            data_payload ["meta"]["title"]=fields .get ("$.title")or title 
+            data_payload ["nodeData"]["topic"]=(fields .get ("$.root.title")or title ).strip ()or "未命名节点"
+            if fields .get ("$.root.summary"):
+                data_payload ["nodeData"]["note"]=fields ["$.root.summary"].strip ()
+            return {"user_id":user_id ,"notebook_id":source .notebook_id ,"title":title ,"data":dict (data_payload )}
+
+        async def save ()->schemas.MindMapOut :
+            with run .stage ("persist"):
+                return await asyncio .to_thread (
+                _save_streamed_mindmap ,
+                mindmap .id if mindmap else None ,
+                mindmap .version if mindmap else None ,
+                values (),
+                )
+
+        yield sse_event ({"type":"generation.started","partitions":1 ,"count":None })
+        try :
+            async for path ,value in run .stream_items (
+            [openai_payload ],
+            fields =("$.title","$.root.title","$.root.summary"),
+            invalid_detail ="解析思维导图结构化输出失败",
+            ):
+                if path !=run .template .item_path :
+                    fields [path ]=value 
+                    stale =mindmap is not None 
+                    continue 
+                if not data_payload :
+                    data_payload .update (
+                    _structured_mindmap_to_data (
+                    schemas.StructuredMindMap (title ="",root =schemas.StructuredMindMapNode (title ="")),sources 
+                    )
+                    )
+                node =_build_mind_elixir_node (value )
+                data_payload ["nodeData"].setdefault ("children",[]).append (node )
+                mindmap =await save ()
+                stale =False 
+                yield sse_event (
+                {"type":"generation.items","mindmap_id":mindmap .id ,"version":mindmap .version ,"nodes":[node ]}
+                )
+            if mindmap is None :
+                raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail ="生成思维导图失败：模型未返回任何分支，请重试")
+            if stale :
+                mindmap =await save ()
+            yield sse_event ({"type":"generation.completed","mindmap":mindmap .model_dump (mode ="json")})
+        except HTTPException as exc :
+            yield sse_event ({"type":"generation.error","status":exc .status_code ,"detail":exc .detail })
+        run .finish ()
+
+    return StreamingResponse (events (),media_type ="text/event-stream")
+
+
 @router .post (
 "/title",
 response_model =schemas.TitleGenerateResponse ,
-dependencies =[Depends (require_csrf )],
+dependencies =[Depends (require_csrf ),Depends (query_budget (3 ))],
 )
 async def generate_note_title (
 payload :schemas.TitleGenerateRequest ,
@@ -647,8 +795,12 @@ user :models .User =Depends (get_current_user ),
             payload ["temperature"]=0.3 
         data =await openai_client .responses_complete (
         timeout =20.0 ,
+        scene ="title",
+        user_id =user .id ,
         **payload ,
         )
+    except HTTPException :
+        raise 
     except Exception as exc :# pragma: no cover - fallback when network errors occur
         raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =f"请求标题生成失败：{exc}")
 
@@ -665,7 +817,8 @@ user :models .User =Depends (get_current_user ),
     return schemas.TitleGenerateResponse (title =title )
 
 
-def _quiz_question_to_schema (q :models .QuizQuestion )->schemas.QuizQuestionOut :
+def _quiz_question_to_schema (q :Any ,folder_ids :Sequence [uuid .UUID ])->schemas.QuizQuestionOut :
+    """`q` is a row carrying `bulk.QUIZ_QUESTION_COLUMNS`."""
     return schemas.QuizQuestionOut (
     id =q .id ,
     notebook_id =q .notebook_id ,
@@ -678,170 +831,203 @@ def _quiz_question_to_schema (q :models .QuizQuestion )->schemas.QuizQuestionOut
     is_favorite =q .is_favorite ,
     created_at =q .created_at ,
     updated_at =q .updated_at ,
-    folder_ids =[folder .id for folder in q .folders ],
+    folder_ids =list (folder_ids ),
     )
 
 
-def _quiz_folder_to_schema (folder :models .QuizFolder )->schemas.QuizFolderOut :
+def _quiz_folder_to_schema (folder :Any ,question_ids :Sequence [uuid .UUID ])->schemas.QuizFolderOut :
+    """`folder` is a row carrying `bulk.QUIZ_FOLDER_COLUMNS`."""
     return schemas.QuizFolderOut (
     id =folder .id ,
     notebook_id =folder .notebook_id ,
     name =folder .name ,
     created_at =folder .created_at ,
     updated_at =folder .updated_at ,
-    question_ids =[q .id for q in folder .questions ],
+    question_ids =list (question_ids ),
     )
 
 
-@router .post (
-"/{notebook_id}/quizzes/generate",
-response_model =schemas.QuizGenerateResponse ,
-status_code =status .HTTP_201_CREATED ,
-dependencies =[Depends (require_csrf )],
-)
-async def generate_quizzes_from_openai (
-notebook_id :uuid .UUID ,
-payload :schemas.QuizGenerateRequest ,
-user :models .User =Depends (get_current_user ),
-db :Session =Depends (get_db ),
-)->schemas.QuizGenerateResponse :
-    """Use OpenAI Responses API + selected attachments to generate quiz questions into a folder."""
-    notebook =_get_notebook_for_user (notebook_id ,user ,db )
-
-    attachment_map ={att .id :att for att in notebook .attachments }
-    requested_ids =payload .attachment_ids or [att .id for att in notebook .attachments if att .openai_file_id ]
-    selected :list [models .Attachment ]=[]
-
-    for att_id in requested_ids :
-        att =attachment_map .get (att_id )
-        if not att :
-            raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail =f"附件不存在或不属于该笔记本: {att_id}")
-        if not att .openai_file_id :
-            raise HTTPException (
-            status_code =status .HTTP_400_BAD_REQUEST ,
-            detail =f"附件 {att.filename or att.id} 尚未同步到 OpenAI（缺少 openai_file_id）",
-            )
-        selected .append (att )
-
-    if not selected :
-        raise HTTPException (status_code =status .HTTP_400_BAD_REQUEST ,detail ="至少需要一个已上传到 OpenAI 的附件")
-
-    file_blocks =[{"type":"input_file","file_id":att .openai_file_id }for att in selected if att .openai_file_id ]
+def _quiz_rows (
+user_id :uuid .UUID ,notebook_id :uuid .UUID ,items :Sequence [schemas.StructuredQuizQuestion ]
+)->list [dict [str ,Any ]]:
+    return [
+    {
+    "user_id":user_id ,
+    "notebook_id":notebook_id ,
+    "question":item .question .strip (),
+    "options":[opt .text for opt in item .options ],
+    "correct_index":next ((i for i ,opt in enumerate (item .options )if opt .is_correct ),0 ),
+    "hint":(item .hint or "").strip ()or None ,
+    "explaination":(item .explaination or "").strip ()or None ,
+    "meta":{"sources":item .sources }if item .sources else None ,
+    "is_favorite":False ,
+    }
+    for item in items 
+    ]
 
-    model_info =resolve_model_key (payload .model_key ,default_key =settings .AI_MODEL_DEFAULTS .get ("quiz"))
-    model_name =model_info .model
-    desired_count =payload .count or 10 
-    focus_text =(payload .focus or "").strip ()
 
-    system_prompt =(
-    "You are a bilingual quiz generator that creates multiple-choice questions in Chinese. "
-    "Use the provided files (input_file) to ground every question. "
-    "Each question should be clear and have exactly 4 options (A, B, C, D) with only one correct answer. "
-    "Options should be plausible but only one should be definitively correct based on the source material. "
-    "Prefer high-yield concepts, definitions, formulas, or key relationships. "
-    "Generate exactly the requested number of questions. "
-    "Always fill the structured output schema precisely."
+def _plan_quizzes (
+notebook_id :uuid .UUID ,
+payload :schemas.QuizGenerateRequest ,
+user :models .User ,
+db :Session ,
+)->tuple [GenerationRun [schemas.StructuredQuizSet ],GenerationSource ,List [Partition ],List [dict ]]:
+    """Resolve sources and build one request per partition (see `_run_plan`)."""
+    run :GenerationRun [schemas.StructuredQuizSet ]=GenerationRun (
+    structured_outputs .QUIZZES ,user =user ,db =db ,model_key =payload .model_key 
     )
+    source =run .resolve_sources (notebook_id ,payload .attachment_ids ,payload .note_ids )
 
+    focus_text =(payload .focus or "").strip ()
     focus_line =f"重点/Focus: {focus_text}"if focus_text else "重点/Focus: 自动选择最重要的知识点。"
-    count_line =f"生成数量: {desired_count} 道题"
-    file_names =", ".join (filter (None ,[att .filename or ""for att in selected ]))or "已选资料"
-
-    user_prompt ="\n".join (
+    parts =run .partitions (source ,count =payload .count or 10 ,fan_out =payload .fan_out )
+    openai_payloads =[
+    run .build_payload (
     [
-    f"Notebook: {notebook.title or '未命名笔记本'}",
-    f"资料文件: {file_names}",
-    count_line ,
+    f"Notebook: {source.notebook_title or '未命名笔记本'}",
+    f"资料文件: {part.file_names}",
+    f"生成数量: {part.count} 道题",
     focus_line ,
     "输出语言: 中文。",
     "要求: 每道题必须有4个选项，只有1个正确答案。",
-    ]
-    )
-
-    user_content =[{"type":"input_text","text":user_prompt },*file_blocks ]
-    schema =schemas.StructuredQuizSet .model_json_schema ()
-    enforce_no_additional_properties (schema )
-
-    openai_payload :Dict [str ,Any ]=build_responses_payload (
-    {
-    "model":model_name ,
-    "input":[
-    {"role":"system","content":[{"type":"input_text","text":system_prompt }]},
-    {"role":"user","content":user_content },
     ],
-    "max_output_tokens":4096 ,
-    "text":{
-    "format":{
-    "type":"json_schema",
-    "name":"StructuredQuizSet",
-    "strict":True ,
-    "schema":schema ,
-    }
-    },
-    }
+    part ,
+    focus =focus_text or None ,
+    count =part .count ,
     )
+    for part in parts 
+    ]
+    return run ,source ,parts ,openai_payloads 
 
-    if model_info .supports_temperature :
-        openai_payload ["temperature"]=float (0.3 )
 
-    try :
-        data =await openai_client .responses_complete (openai_payload ,timeout =90.0 )
-    except RuntimeError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =str (exc ))
+def _quiz_items (
+run :GenerationRun [schemas.StructuredQuizSet ],
+payload :schemas.QuizGenerateRequest ,
+parts :List [Partition ],
+openai_payloads :List [dict ],
+)->AsyncIterator [tuple [Optional [schemas.StructuredQuizSet ],List [schemas.StructuredQuizQuestion ]]]:
+    return run .gather_items (
+    parts ,
+    openai_payloads ,
+    items ="questions",
+    key =lambda item :item .question ,
+    total =payload .count or 10 ,
+    required ="questions",
+    empty_detail ="生成测验失败：模型未返回任何题目，请重试",
+    invalid_detail ="解析测验结构化输出失败",
+    )
 
-    structured_payload =extract_structured_output (data )
 
-    if not isinstance (structured_payload ,dict ):
-        structured_payload ={}
+@router .post (
+"/{notebook_id}/quizzes/generate",
+response_model =schemas.QuizGenerateResponse ,
+status_code =status .HTTP_201_CREATED ,
+dependencies =[Depends (require_csrf ),Depends (query_budget (12 ))],
+)
+async def generate_quizzes_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.QuizGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->schemas.QuizGenerateResponse :
+    """Use OpenAI Responses API + selected attachments to generate quiz questions into a folder."""
+    run ,source ,parts ,openai_payloads =await _run_plan (_plan_quizzes ,notebook_id ,payload ,user ,db )
+
+    generated_name =None 
+    items :list [schemas.StructuredQuizQuestion ]=[]
+    async for result ,batch in _quiz_items (run ,payload ,parts ,openai_payloads ):
+        if result is not None :
+            generated_name =generated_name or result .folder_name 
+        items .extend (batch )
+
+    folder_name =_generated_folder_name (payload .folder_name ,generated_name ,source .notebook_title or "AI 测验")
+    question_rows =_quiz_rows (user .id ,source .notebook_id ,items )
+
+    def write ()->schemas.QuizGenerateResponse :
+        folder =bulk .insert_one_returning (
+        db ,
+        models .QuizFolder ,
+        {"user_id":user .id ,"notebook_id":source .notebook_id ,"name":folder_name },
+        bulk .QUIZ_FOLDER_COLUMNS ,
+        )
+        questions =bulk .insert_quiz_questions (db ,question_rows ,[[folder .id ]]*len (question_rows ))
+        return schemas.QuizGenerateResponse (
+        folder =_quiz_folder_to_schema (folder ,[q .id for q in questions ]),
+        questions =[_quiz_question_to_schema (q ,[folder .id ])for q in questions ],
+        )
 
-    if not structured_payload .get ("questions"):
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail ="生成测验失败：模型未返回任何题目，请重试")
+    response =run .persist (write )
+    run .finish ()
+    return response 
 
-    try :
-        result :schemas.StructuredQuizSet =schemas.StructuredQuizSet .model_validate (structured_payload )
-    except ValidationError as exc :
-        raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail =f"解析测验结构化输出失败: {exc}")
 
-        # Create folder name
-    folder_name =(payload .folder_name or result .folder_name or notebook .title or "AI 测验").strip ()
-    if len (folder_name )>255 :
-        folder_name =folder_name [:255 ]
+def _append_quiz_questions (
+folder :Any ,new_folder :dict [str ,Any ],rows :list [dict [str ,Any ]]
+)->tuple [Any ,List [Any ]]:
+    """Append `rows` to `folder`, creating it from `new_folder` first when it is None; one transaction."""
+    with session_scope ()as db :
+        if folder is None :
+            folder =bulk .insert_one_returning (db ,models .QuizFolder ,new_folder ,bulk .QUIZ_FOLDER_COLUMNS )
+        seqs =bulk .next_seq (db ,models .QuizFolderItem ,[folder .id ])
+        questions =bulk .insert_quiz_questions (db ,rows ,[[folder .id ]]*len (rows ),seqs =seqs )
+    return folder ,questions 
 
-        # Create the quiz folder
-    target_folder =models .QuizFolder (
-    user_id =user .id ,
-    notebook_id =notebook .id ,
-    name =folder_name ,
-    )
 
-    new_questions :list [models .QuizQuestion ]=[]
-    for item in result .questions :
-        options =[opt .text for opt in item .options ]
-        correct_index =next (
-        (i for i ,opt in enumerate (item .options )if opt .is_correct ),
-        0 ,
-        )
-        question =models .QuizQuestion (
-        user_id =user .id ,
-        notebook_id =notebook .id ,
-        question =item .question .strip (),
-        options =options ,
-        correct_index =correct_index ,
-        hint =item .hint .strip (),
-        explaination =item .explaination .strip (),
-        meta ={"sources":item .sources }if item .sources else None ,
-        is_favorite =False ,
-        )
-        new_questions .append (question )
-        target_folder .questions .append (question )
+def _quiz_folder_members (folder_id :uuid .UUID )->schemas.QuizFolderOut :
+    with session_scope ()as db :
+        folder =db .execute (select (*bulk .QUIZ_FOLDER_COLUMNS ).where (models .QuizFolder .id ==folder_id )).one ()
+        return _quiz_folder_to_schema (folder ,bulk .member_ids (db ,models .QuizFolderItem ,[folder_id ])[folder_id ])
 
-    db .add (target_folder )
-    db .commit ()
-    db .refresh (target_folder )
-    for q in new_questions :
-        db .refresh (q )
 
-    return schemas.QuizGenerateResponse (
-    folder =_quiz_folder_to_schema (target_folder ),
-    questions =[_quiz_question_to_schema (q )for q in new_questions ],
-    )
+@router .post ("/{notebook_id}/quizzes/generate/stream",dependencies =[Depends (require_csrf ),Depends (query_budget (6 ))])
+async def stream_quizzes_from_openai (
+notebook_id :uuid .UUID ,
+payload :schemas.QuizGenerateRequest ,
+user :models .User =Depends (get_current_user ),
+db :Session =Depends (get_db ),
+)->StreamingResponse :
+    """Server-sent-event variant of quiz generation; same events as the flashcard stream."""
+    run ,source ,parts ,openai_payloads =await _run_plan (_plan_quizzes ,notebook_id ,payload ,user ,db )
+    await usage .enforce_quota (user .id )
+    user_id =user .id 
+
+    async def events ()->AsyncIterator [str ]:
+        folder =None 
+        generated_name =None 
+        yield sse_event ({"type":"generation.started","partitions":len (parts ),"count":payload .count or 10 })
+        try :
+            async for path ,value in run .stream_items (
+            openai_payloads ,
+            fields =("$.folder_name",),
+            quotas =[part .quota for part in parts ],
+            key =lambda item :item .question ,
+            total =payload .count or 10 ,
+            invalid_detail ="解析测验结构化输出失败",
+            ):
+                if path =="$.folder_name":
+                    generated_name =generated_name or value 
+                    continue 
+                new_folder ={
+                "user_id":user_id ,
+                "notebook_id":source .notebook_id ,
+                "name":_generated_folder_name (payload .folder_name ,generated_name ,source .notebook_title or "AI 测验"),
+                }
+                rows =_quiz_rows (user_id ,source .notebook_id ,[value ])
+                with run .stage ("persist"):
+                    folder ,questions =await asyncio .to_thread (_append_quiz_questions ,folder ,new_folder ,rows )
+                yield sse_event (
+                {
+                "type":"generation.items",
+                "folder_id":folder .id ,
+                "questions":[_quiz_question_to_schema (q ,[folder .id ]).model_dump (mode ="json")for q in questions ],
+                }
+                )
+            if folder is None :
+                raise HTTPException (status_code =status .HTTP_502_BAD_GATEWAY ,detail ="生成测验失败：模型未返回任何题目，请重试")
+            summary =await asyncio .to_thread (_quiz_folder_members ,folder .id )
+            yield sse_event ({"type":"generation.completed","folder":summary .model_dump (mode ="json")})
+        except HTTPException as exc :
+            yield sse_event ({"type":"generation.error","status":exc .status_code ,"detail":exc .detail })
+        run .finish ()
+
+    return StreamingResponse (events (),media_type ="text/event-stream")
@@ -3,18 +3,24 @@
 from __future__ import annotations
 
 import uuid
-from typing import Any, Dict, List, Sequence
+from typing import Any, Collection, Dict, List, Literal, Optional, Sequence, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session, selectinload
 
 from api.dependencies import get_current_user, require_csrf
-from api.db import models
+from api.db import bulk, models
 from api.db.database import get_db
+from api.db.instrumentation import query_budget
 from api.schemas import (
+    BatchItemResult,
+    BatchResult,
+    QuizQuestionBatchUpdate,
+    QuizQuestionBulkCreate,
     QuizQuestionCreate,
     QuizQuestionOut,
+    QuizQuestionSummaryOut,
     QuizQuestionUpdate,
     QuizFolderCreate,
     QuizFolderOut,
@@ -24,11 +30,18 @@ from api.schemas import (
 )
 from api.services import openai_client
 from api.services.ai_registry import resolve_model_key
+from api.services.app_logging import get_logger
 from api .settings import settings 
 from api.services.openai_utils import build_responses_payload, extract_text_from_response
+from api.services.http_cache import PRIVATE_REVALIDATE, cache_control, conditional, etag
+from api.services.pagination import NEXT_CURSOR_HEADER, Keyset, text_filter
 
 
 router = APIRouter(prefix="/quizzes", tags=["quiz"])
+logger = get_logger(__name__)
+
+# Backed by idx_quiz_questions_user_created / idx_quiz_questions_user_nb_created.
+_QUESTION_KEYSET = Keyset((models.QuizQuestion.created_at, models.QuizQuestion.id), descending=True)
 
 
 def _ensure_notebook_owned(db: Session, user: models.User, notebook_id: uuid.UUID) -> models.Notebook:
@@ -38,7 +51,10 @@ def _ensure_notebook_owned(db: Session, user: models.User, notebook_id: uuid.UUI
     return notebook
 
 
-def _question_to_schema(question: models.QuizQuestion) -> QuizQuestionOut:
+def _question_to_schema(
+    question: models.QuizQuestion, folder_ids: Optional[Sequence[uuid.UUID]] = None
+) -> QuizQuestionOut:
+    """Accepts an ORM question, or a `bulk.QUIZ_QUESTION_COLUMNS` row together with its `folder_ids`."""
     return QuizQuestionOut(
         id=question.id,
         notebook_id=question.notebook_id,
@@ -51,18 +67,18 @@ def _question_to_schema(question: models.QuizQuestion) -> QuizQuestionOut:
         is_favorite=question.is_favorite,
         created_at=question.created_at,
         updated_at=question.updated_at,
-        folder_ids=[folder.id for folder in question.folders],
+        folder_ids=list(folder_ids) if folder_ids is not None else [folder.id for folder in question.folders],
     )
 
 
-def _folder_to_schema(folder: models.QuizFolder) -> QuizFolderOut:
+def _folder_to_schema(folder: models.QuizFolder, question_ids: Sequence[uuid.UUID]) -> QuizFolderOut:
     return QuizFolderOut(
         id=folder.id,
         notebook_id=folder.notebook_id,
         name=folder.name,
         created_at=folder.created_at,
         updated_at=folder.updated_at,
-        question_ids=[q.id for q in folder.questions],
+        question_ids=list(question_ids),
     )
 
 
@@ -74,31 +90,91 @@ def _get_question(question_id: uuid.UUID, user: models.User, db: Session) -> mod
 
 
 def _get_folder(folder_id: uuid.UUID, user: models.User, db: Session) -> models.QuizFolder:
-    folder = (
-        db.execute(
-            select(models.QuizFolder)
-            .where(models.QuizFolder.id == folder_id, models.QuizFolder.user_id == user.id)
-            .options(selectinload(models.QuizFolder.questions))
-        )
-        .scalars()
-        .first()
-    )
-    if not folder:
+    folder = db.get(models.QuizFolder, folder_id)
+    if not folder or folder.user_id != user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quiz folder not found")
     return folder
 
 
+def _owned_question_ids(db: Session, user: models.User, question_ids: Sequence[uuid.UUID]) -> List[uuid.UUID]:
+    """`question_ids` deduplicated and in order, keeping only the user's questions (ids only)."""
+    owned = bulk.owned_notebooks(db, models.QuizQuestion, user.id, question_ids)
+    return [question_id for question_id in dict.fromkeys(question_ids) if question_id in owned]
+
+
 def _validate_index(options: Sequence[str], correct_index: int) -> None:
     if correct_index < 0 or correct_index >= len(options):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="correct_index is out of range")
 
 
+def _check_bulk_size(count: int) -> None:
+    if count > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BULK_MAX_ITEMS} items per request",
+        )
+
+
+def _ensure_notebooks_owned(db: Session, user: models.User, notebook_ids: Collection[uuid.UUID]) -> None:
+    owned = set(
+        db.scalars(
+            select(models.Notebook.id).where(
+                models.Notebook.user_id == user.id,
+                models.Notebook.id.in_(notebook_ids),
+            )
+        )
+    )
+    if len(owned) != len(notebook_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found")
+
+
+def _folder_notebooks(db: Session, user: models.User, folder_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, uuid.UUID]:
+    """Map folder id -> notebook id; 400 if any folder is missing or not the user's."""
+    notebook_of = bulk.owned_notebooks(db, models.QuizFolder, user.id, folder_ids)
+    missing = [str(folder_id) for folder_id in folder_ids if folder_id not in notebook_of]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Quiz folders not found: {', '.join(missing)}",
+        )
+    return notebook_of
+
+
+def _batch_result(ids: Sequence[uuid.UUID], errors: Dict[uuid.UUID, str]) -> BatchResult:
+    results = [BatchItemResult(id=item_id, ok=item_id not in errors, error=errors.get(item_id)) for item_id in ids]
+    return BatchResult(succeeded=len(ids) - len(errors), failed=len(errors), results=results)
+
+
+def _check_folder_links(
+    db: Session,
+    user: models.User,
+    links: Sequence[Tuple[uuid.UUID, Sequence[uuid.UUID]]],
+) -> Dict[uuid.UUID, int]:
+    """Validate (notebook_id, folder_ids) pairs in one query; returns the next seq per folder."""
+    ids = list(dict.fromkeys(folder_id for _, folder_ids in links for folder_id in folder_ids))
+    if not ids:
+        return {}
+    notebook_of = _folder_notebooks(db, user, ids)
+    invalid = {
+        str(folder_id)
+        for notebook_id, folder_ids in links
+        for folder_id in folder_ids
+        if notebook_of[folder_id] != notebook_id
+    }
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Folders belong to a different notebook: {', '.join(sorted(invalid))}",
+        )
+    return bulk.next_seq(db, models.QuizFolderItem, ids)
+
+
 # ---------------------------------------------------------------------------
 # Quiz Folders
 # ---------------------------------------------------------------------------
 
 
-@router.get("/folders", response_model=List[QuizFolderOut])
+@router.get("/folders", response_model=List[QuizFolderOut], dependencies=[Depends(query_budget(5))])
 def list_quiz_folders(
     notebook_id: uuid.UUID | None = Query(default=None),
     user: models.User = Depends(get_current_user),
@@ -108,21 +184,21 @@ def list_quiz_folders(
     query = (
         select(models.QuizFolder)
         .where(models.QuizFolder.user_id == user.id)
-        .options(selectinload(models.QuizFolder.questions))
         .order_by(models.QuizFolder.created_at.desc())
     )
     if notebook_id is not None:
         query = query.where(models.QuizFolder.notebook_id == notebook_id)
 
     folders = db.execute(query).scalars().all()
-    return [_folder_to_schema(folder) for folder in folders]
+    members = bulk.member_ids(db, models.QuizFolderItem, [folder.id for folder in folders])
+    return [_folder_to_schema(folder, members[folder.id]) for folder in folders]
 
 
 @router.post(
     "/folders",
     response_model=QuizFolderOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(10))],
 )
 def create_quiz_folder(
     payload: QuizFolderCreate,
@@ -138,29 +214,20 @@ def create_quiz_folder(
         name=payload.name,
     )
 
-    if payload.question_ids:
-        questions = (
-            db.execute(
-                select(models.QuizQuestion).where(
-                    models.QuizQuestion.id.in_(payload.question_ids),
-                    models.QuizQuestion.user_id == user.id,
-                )
-            )
-            .scalars()
-            .all()
-        )
-        folder.questions = list(questions)
+    question_ids = _owned_question_ids(db, user, payload.question_ids or [])
 
     db.add(folder)
+    db.flush()
+    bulk.replace_members(db, models.QuizFolderItem, folder.id, question_ids)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    return _folder_to_schema(folder, question_ids)
 
 
 @router.put(
     "/folders/{folder_id}",
     response_model=QuizFolderOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(10))],
 )
 def update_quiz_folder(
     folder_id: uuid.UUID,
@@ -173,29 +240,23 @@ def update_quiz_folder(
 
     if payload.name is not None:
         folder.name = payload.name
+    question_ids = None
     if payload.question_ids is not None:
-        questions = (
-            db.execute(
-                select(models.QuizQuestion).where(
-                    models.QuizQuestion.id.in_(payload.question_ids),
-                    models.QuizQuestion.user_id == user.id,
-                )
-            )
-            .scalars()
-            .all()
-        )
-        folder.questions = list(questions)
+        question_ids = _owned_question_ids(db, user, payload.question_ids)
+        bulk.replace_members(db, models.QuizFolderItem, folder.id, question_ids)
 
     db.add(folder)
     db.commit()
     db.refresh(folder)
-    return _folder_to_schema(folder)
+    if question_ids is None:
+        question_ids = bulk.member_ids(db, models.QuizFolderItem, [folder.id])[folder.id]
+    return _folder_to_schema(folder, question_ids)
 
 
 @router.delete(
     "/folders/{folder_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(8))],
 )
 def delete_quiz_folder(
     folder_id: uuid.UUID,
@@ -205,6 +266,7 @@ def delete_quiz_folder(
     """Delete a quiz folder owned by the user."""
     folder = _get_folder(folder_id, user, db)
     db.delete(folder)
+    bulk.record_deletions(db, user.id, models.QuizFolder, [folder.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -214,31 +276,93 @@ def delete_quiz_folder(
 # ---------------------------------------------------------------------------
 
 
-@router.get("", response_model=List[QuizQuestionOut])
+def _list_etag(request: Request, db: Session, user: models.User, notebook_id: Optional[uuid.UUID]) -> str:
+    """ETag for a quiz questions listing: count and latest update of the items and of their folders.
+
+    Folder membership changes bump the folders' `updated_at` (see api.db.bulk), so the
+    links in full responses are covered too. Other filters only narrow the result,
+    and the query string is part of the tag.
+    """
+    items = select(models.QuizQuestion).where(models.QuizQuestion.user_id == user.id)
+    folders = select(models.QuizFolder).where(models.QuizFolder.user_id == user.id)
+    if notebook_id is not None:
+        items = items.where(models.QuizQuestion.notebook_id == notebook_id)
+        folders = folders.where(models.QuizFolder.notebook_id == notebook_id)
+    fingerprint = db.execute(
+        select(
+            items.with_only_columns(func.count()).scalar_subquery(),
+            items.with_only_columns(func.max(models.QuizQuestion.updated_at)).scalar_subquery(),
+            folders.with_only_columns(func.count()).scalar_subquery(),
+            folders.with_only_columns(func.max(models.QuizFolder.updated_at)).scalar_subquery(),
+        )
+    ).one()
+    return etag(str(request.url.query), *fingerprint)
+
+
+@router.get(
+    "",
+    response_model=List[Union[QuizQuestionOut, QuizQuestionSummaryOut]],
+    dependencies=[Depends(cache_control(PRIVATE_REVALIDATE)), Depends(query_budget(6))],
+)
 def list_quiz_questions(
+    request: Request,
+    response: Response,
     notebook_id: uuid.UUID | None = Query(default=None),
+    folder_id: uuid.UUID | None = Query(default=None),
+    is_favorite: bool | None = Query(default=None),
+    q: str | None = Query(default=None, max_length=200),
+    fields: Literal["full", "summary"] = Query(default="full"),
+    limit: int | None = Query(default=None, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: str | None = Query(default=None),
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> List[QuizQuestionOut]:
-    """List quiz questions for the user; optionally filter by notebook id."""
-    query = (
-        select(models.QuizQuestion)
-        .where(models.QuizQuestion.user_id == user.id)
-        .options(selectinload(models.QuizQuestion.folders))
-        .order_by(models.QuizQuestion.created_at.desc())
-    )
+) -> List[QuizQuestionOut] | List[QuizQuestionSummaryOut]:
+    """List the user's quiz questions, newest first, filtered by notebook, folder, favorite and text (`q`).
+
+    With `limit`, one page is returned and the next page's cursor is sent in the
+    `X-Next-Cursor` header. `fields=summary` drops options, hints, explanations and folder links.
+    """
+    cached = conditional(request, response, _list_etag(request, db, user, notebook_id))
+    if cached:
+        return cached
+
+    if fields == "summary":
+        query = select(
+            models.QuizQuestion.id,
+            models.QuizQuestion.notebook_id,
+            models.QuizQuestion.question,
+            models.QuizQuestion.is_favorite,
+            models.QuizQuestion.created_at,
+            models.QuizQuestion.updated_at,
+        )
+    else:
+        query = select(models.QuizQuestion).options(selectinload(models.QuizQuestion.folders))
+    query = query.where(models.QuizQuestion.user_id == user.id)
     if notebook_id is not None:
         query = query.where(models.QuizQuestion.notebook_id == notebook_id)
-
-    questions = db.execute(query).scalars().all()
-    return [_question_to_schema(question) for question in questions]
+    if folder_id is not None:
+        query = query.join(
+            models.QuizFolderItem, models.QuizFolderItem.question_id == models.QuizQuestion.id
+        ).where(models.QuizFolderItem.folder_id == folder_id)
+    if is_favorite is not None:
+        query = query.where(models.QuizQuestion.is_favorite == is_favorite)
+    if q and q.strip():
+        query = query.where(text_filter([models.QuizQuestion.question], q.strip()))
+
+    result = db.execute(_QUESTION_KEYSET.apply(query, cursor, limit))
+    rows, next_cursor = _QUESTION_KEYSET.page(result.all() if fields == "summary" else result.scalars().all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fields == "summary":
+        return [QuizQuestionSummaryOut.model_validate(row) for row in rows]
+    return [_question_to_schema(question) for question in rows]
 
 
 @router.post(
     "",
     response_model=QuizQuestionOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(7))],
 )
 def create_quiz_question(
     payload: QuizQuestionCreate,
@@ -264,10 +388,111 @@ def create_quiz_question(
     return _question_to_schema(question)
 
 
+@router.post(
+    "/bulk",
+    response_model=List[QuizQuestionOut],
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_csrf), Depends(query_budget(5))],
+)
+def bulk_create_quiz_questions(
+    payload: QuizQuestionBulkCreate,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[QuizQuestionOut]:
+    """Create many quiz questions (and their folder links) with set-based inserts in one transaction."""
+    _check_bulk_size(len(payload.items))
+    for item in payload.items:
+        _validate_index(item.options, item.correct_index)
+    _ensure_notebooks_owned(db, user, {item.notebook_id for item in payload.items})
+    folder_ids = [list(dict.fromkeys(item.folder_ids)) for item in payload.items]
+    seqs = _check_folder_links(db, user, [(item.notebook_id, ids) for item, ids in zip(payload.items, folder_ids)])
+    rows = bulk.insert_quiz_questions(
+        db,
+        [
+            {
+                "user_id": user.id,
+                "notebook_id": item.notebook_id,
+                "question": item.question,
+                "options": item.options,
+                "correct_index": item.correct_index,
+                "hint": item.hint,
+                "explaination": item.explaination,
+                "meta": item.meta,
+                "is_favorite": item.is_favorite,
+            }
+            for item in payload.items
+        ],
+        folder_ids,
+        seqs=seqs,
+    )
+    db.commit()
+    return [_question_to_schema(row, ids) for row, ids in zip(rows, folder_ids)]
+
+
+@router.patch(
+    "/batch",
+    response_model=BatchResult,
+    dependencies=[Depends(require_csrf), Depends(query_budget(9))],
+)
+def batch_update_quiz_questions(
+    payload: QuizQuestionBatchUpdate,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> BatchResult:
+    """Favorite/unfavorite and add/remove folders for many questions in one transaction.
+
+    Unknown ids and questions from another notebook than an added folder are skipped
+    and reported; the rest are applied.
+    """
+    ids = list(dict.fromkeys(payload.ids))
+    _check_bulk_size(len(ids))
+    add = list(dict.fromkeys(payload.add_folder_ids))
+    remove = list(dict.fromkeys(payload.remove_folder_ids))
+    notebook_of = bulk.owned_notebooks(db, models.QuizQuestion, user.id, ids)
+    folder_notebooks = _folder_notebooks(db, user, list(dict.fromkeys([*add, *remove])))
+
+    errors: Dict[uuid.UUID, str] = {}
+    for question_id in ids:
+        notebook_id = notebook_of.get(question_id)
+        if notebook_id is None:
+            errors[question_id] = "Quiz question not found"
+        elif any(folder_notebooks[folder_id] != notebook_id for folder_id in add):
+            errors[question_id] = "Folder belongs to a different notebook"
+    applied = [question_id for question_id in ids if question_id not in errors]
+    if applied and payload.is_favorite is not None:
+        db.execute(
+            update(models.QuizQuestion)
+            .where(models.QuizQuestion.id.in_(applied))
+            .values(is_favorite=payload.is_favorite)
+            .execution_options(synchronize_session=False)
+        )
+    bulk.relink(db, models.QuizFolderItem, applied, add=add, remove=remove)
+    db.commit()
+    return _batch_result(ids, errors)
+
+
+@router.delete(
+    "/batch",
+    response_model=BatchResult,
+    dependencies=[Depends(require_csrf), Depends(query_budget(5))],
+)
+def batch_delete_quiz_questions(
+    ids: List[uuid.UUID] = Query(min_length=1),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> BatchResult:
+    """Delete many quiz questions with one statement (`?ids=...&ids=...`), reporting the outcome per id."""
+    ids = list(dict.fromkeys(ids))
+    _check_bulk_size(len(ids))
+    deleted = bulk.delete_owned(db, models.QuizQuestion, user.id, ids)
+    db.commit()
+    return _batch_result(ids, {question_id: "Quiz question not found" for question_id in ids if question_id not in deleted})
+
+
 @router.put(
     "/{question_id}",
     response_model=QuizQuestionOut,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(7))],
 )
 def update_quiz_question(
     question_id: uuid.UUID,
@@ -306,7 +531,7 @@ def update_quiz_question(
 @router.delete(
     "/{question_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(7))],
 )
 def delete_quiz_question(
     question_id: uuid.UUID,
@@ -316,6 +541,7 @@ def delete_quiz_question(
     """Delete a quiz question owned by the user."""
     question = _get_question(question_id, user, db)
     db.delete(question)
+    bulk.record_deletions(db, user.id, models.QuizQuestion, [question.id])
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -343,6 +569,7 @@ def _attempt_to_schema(attempt: models.QuizAttempt) -> QuizAttemptOut:
 @router.get(
     "/folders/{folder_id}/attempt",
     response_model=QuizAttemptOut,
+    dependencies=[Depends(query_budget(5))],
 )
 def get_quiz_attempt(
     folder_id: uuid.UUID,
@@ -368,7 +595,7 @@ def get_quiz_attempt(
     "/folders/{folder_id}/attempt",
     response_model=QuizAttemptOut,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(require_csrf)],
+    dependencies=[Depends(require_csrf), Depends(query_budget(7))],
 )
 async def submit_quiz_attempt(
     folder_id: uuid.UUID,
@@ -422,11 +649,11 @@ async def submit_quiz_attempt(
                 wrong_questions=wrong_questions,
                 model_name = model_name,
                 supports_temperature = model_info.supports_temperature,
+                user_id=user.id,
             )
         except Exception as exc:
             # Log error but don't fail the request
-            import logging
-            logging.warning(f"Failed to generate quiz summary: {exc}")
+            logger.warning("Failed to generate quiz summary: %s", exc, extra={"folder_id": str(folder.id)})
 
     # Upsert the attempt (replace existing if any)
     existing_attempt = db.execute(
@@ -466,6 +693,7 @@ async def _generate_attempt_summary(
     wrong_questions: List[models.QuizQuestion],
     model_name: str,
     supports_temperature: bool,
+    user_id: Optional[uuid.UUID] = None,
 ) -> str:
     """Generate personalized AI feedback for quiz attempt."""
     accuracy_pct = round(accuracy * 100)
@@ -506,5 +734,7 @@ async def _generate_attempt_summary(
     if supports_temperature:
         openai_payload ["temperature"]=float (0.3 )
 
-    data = await openai_client.responses_complete(openai_payload, timeout=30.0)
+    data = await openai_client.responses_complete(
+        openai_payload, timeout=30.0, scene="quizSummary", user_id=user_id
+    )
     return extract_text_from_response(data) or "测验完成！继续加油！"
@@ -1,69 +1,183 @@
+import asyncio
+import json
 import logging
-from pathlib import Path
+import time
+import uuid
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
-from typing import Any, Dict, List
-from api.services import openai_client
-from api.services.openai_utils import build_responses_payload
+from typing import Any, Dict, List, Optional
+from api.db import models
+from api.db.database import session_scope
+from api.db.instrumentation import query_budget
+from api.dependencies import get_optional_user
+from api.services import conversations, openai_client, retrieval, usage
+from api.services.app_logging import get_logger
+from api.services.openai_utils import build_responses_payload, chat_query_text
 from api.settings import settings
 
 router = APIRouter(tags=["responses"])
+logger = get_logger(__name__)
 
-LOG_DIR = Path(__file__).resolve().parent.parent / "services" / "logs"
-LOG_FILE = LOG_DIR / "openai_responses.log"
 
+def _log_fields(
+    payload: Dict[str, Any], user: models.User | None, turn: conversations.Turn | None = None
+) -> Dict[str, Any]:
+    return {
+        "model": payload.get("model"),
+        "user_id": str(user.id) if user else None,
+        "previous_response_id": payload.get("previous_response_id"),
+        "conversation_id": str(turn.conversation_id) if turn else None,
+    }
 
-def _responses_logger() -> logging.Logger:
-    logger = logging.getLogger("openai_responses")
-    if logger.handlers:
-        return logger
-
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
-    handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
-    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
-
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-    logger.propagate = False
-    return logger
 
 def _check_auth(request: Request):
     if settings.INTERNAL_TOKEN and request.headers.get("X-API-KEY") != settings.INTERNAL_TOKEN:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
-@router.post("/responses")
-async def responses_complete_route(request: Request):
-    """Proxy a single Responses API request to OpenAI and return the full JSON payload."""
+def _notebook_context(user_id: uuid.UUID, notebook_id: uuid.UUID, query: str) -> Optional[List[Dict[str, Any]]]:
+    with session_scope() as db:
+        return retrieval.chat_context(db, user_id, notebook_id, query)
+
+
+async def _retrieval_context(payload: Dict[str, Any], user: models.User | None) -> Optional[List[Dict[str, Any]]]:
+    """Local retrieval blocks when the payload names a notebook in `bm25`/`hybrid` mode, else None."""
+    raw_id = payload.get("notebook_id") or payload.get("notebookId")
+    if not raw_id or user is None:
+        return None
+    try:
+        notebook_id = uuid.UUID(str(raw_id))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid notebook_id")
+    started = time.perf_counter()
+    context = await asyncio.to_thread(_notebook_context, user.id, notebook_id, chat_query_text(payload))
+    if context is not None:
+        logger.info(
+            "Local retrieval completed",
+            extra={
+                "notebook_id": str(notebook_id),
+                "chunks": len(context),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+    return context
+
+
+async def _conversation_turn(
+    payload: Dict[str, Any], user: models.User | None
+) -> tuple[Dict[str, Any], conversations.Turn | None]:
+    """With a `conversation_id`, chain the request onto the conversation's last response.
+
+    Returns the payload to send (the chain id from the server, never the client) and
+    the turn to record once the reply completes.
+    """
+    conversation_id = conversations.parse_id(payload)
+    if conversation_id is None:
+        return payload, None
+    if user is None:
+        raise HTTPException(status_code=401, detail="Sign in to use conversations")
+    # A turn this process is still recording must land before its id is read.
+    await conversations.settled(conversation_id)
+    head = await asyncio.to_thread(conversations.chain_head, user.id, conversation_id)
+    chained = {
+        key: value
+        for key, value in payload.items()
+        if key not in ("conversation_id", "conversationId", "previous_response_id", "previousResponseId")
+    }
+    if head:
+        chained["previous_response_id"] = head
+    turn = conversations.Turn(
+        conversation_id=conversation_id,
+        previous_response_id=head,
+        text=chat_query_text(payload),
+        meta=conversations.user_meta(payload),
+    )
+    return chained, turn
+
+
+@router.post("/responses", dependencies=[Depends(query_budget(14))])
+async def responses_complete_route(
+    request: Request,
+    user: models.User | None = Depends(get_optional_user),
+):
+    """Proxy a single Responses API request to OpenAI and return the full JSON payload.
+
+    With `conversation_id`, the request continues that conversation and the turn is recorded.
+    """
     _check_auth(request)
     payload: Dict[str, Any] = await request.json()
+    payload, turn = await _conversation_turn(payload or {}, user)
     try:
-        normalized = build_responses_payload(payload or {})
-        data = await openai_client.responses_complete(normalized)
+        context = await _retrieval_context(payload, user)
+        normalized = build_responses_payload(payload, context)
+        started = time.perf_counter()
+        data = await openai_client.responses_complete(normalized, user_id=user.id if user else None)
     except RuntimeError as exc:
+        logger.warning("Responses request failed: %s", exc, extra=_log_fields(payload, user, turn))
         raise HTTPException(status_code=502, detail=str(exc))
     except HTTPException:
         raise
+    if turn is not None and data.get("status") != "failed":
+        conversations.schedule(turn, data)
+    logger.info(
+        "Responses request completed",
+        extra={
+            **_log_fields(normalized, user, turn),
+            "response_id": data.get("id"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    )
     return JSONResponse(content=data)
 
 
-@router.post("/responses/stream")
-async def responses_stream_route(request: Request):
-    """Proxy a streaming Responses API request to OpenAI and relay SSE chunks."""
+@router.post("/responses/stream", dependencies=[Depends(query_budget(14))])
+async def responses_stream_route(
+    request: Request,
+    user: models.User | None = Depends(get_optional_user),
+):
+    """Proxy a streaming Responses API request to OpenAI and relay SSE chunks.
+
+    With `conversation_id`, the request continues that conversation; the turn is
+    recorded in the background when its terminal event arrives.
+    """
     _check_auth(request)
     payload: Dict[str, Any] = await request.json()
+    user_id = user.id if user else None
 
+    payload, turn = await _conversation_turn(payload or {}, user)
+    context = await _retrieval_context(payload, user)
     try:
-        normalized = build_responses_payload(payload or {})
+        normalized = build_responses_payload(payload, context)
     except HTTPException:
         raise
+    # Check the quota before the stream starts; afterwards a 429 can no longer be sent.
+    await usage.enforce_quota(user_id)
+
+    fields = _log_fields(normalized, user, turn)
+    # Checked once per stream so disabled per-chunk logging costs a single branch.
+    log_chunks = logger.isEnabledFor(logging.DEBUG)
 
     async def event_gen():
+        started = time.perf_counter()
+        chunks = 0
         try:
-            async for chunk in openai_client.responses_stream(normalized):
+            async for chunk in openai_client.responses_stream(normalized, user_id=user_id):
+                chunks += 1
+                if log_chunks:
+                    logger.debug("stream chunk", extra={**fields, "event": "stream_delta", "seq": chunks})
+                # Only a terminal event is parsed; the substring test skips every delta.
+                if turn is not None and ('"response.completed"' in chunk or '"response.incomplete"' in chunk):
+                    event = json.loads(chunk)
+                    if event.get("type") in conversations.RECORDED_EVENTS:
+                        conversations.schedule(turn, event.get("response") or {})
                 yield chunk + "\n\n"  # newline delimited
-        except Exception as exc:
+        except Exception:
+            logger.exception("Responses stream failed", extra={**fields, "chunks": chunks})
             raise
+        logger.info(
+            "Responses stream completed",
+            extra={**fields, "chunks": chunks, "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+        )
 
     return StreamingResponse(event_gen(), media_type="text/event-stream")
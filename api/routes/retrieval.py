@@ -0,0 +1,43 @@
+"""Local retrieval over a notebook's materials (the index behind bm25/hybrid chat)."""
+
+from __future__ import annotations
+
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from api.dependencies import get_current_user
+from api.db import models
+from api.db.database import get_db
+from api.db.instrumentation import query_budget
+from api.schemas import RetrievalModeValue, RetrievedChunkOut
+from api.services import retrieval
+from api.settings import settings
+
+
+router = APIRouter(prefix="/notebooks", tags=["retrieval"])
+
+
+@router.get("/{notebook_id}/retrieve", response_model=List[RetrievedChunkOut], dependencies=[Depends(query_budget(12))])
+def retrieve_chunks(
+    notebook_id: uuid.UUID,
+    q: str = Query(min_length=1, max_length=2000),
+    k: int = Query(default=settings.RETRIEVAL_TOP_K, ge=1, le=50),
+    mode: Optional[RetrievalModeValue] = Query(default=None, description="Defaults to the notebook's mode"),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[RetrievedChunkOut]:
+    """The chunks a chat turn asking `q` would get, best first.
+
+    Brings the notebook's index up to date first, so the first call after an edit
+    re-chunks the changed sources. A notebook in `file_search` mode is ranked with
+    BM25 unless `mode` says otherwise.
+    """
+    notebook_mode = retrieval.notebook_mode(db, notebook_id, user.id)
+    effective = models.RetrievalMode(mode) if mode else notebook_mode
+    if effective == models.RetrievalMode.FILE_SEARCH:
+        effective = models.RetrievalMode.BM25
+    chunks = retrieval.retrieve(db, notebook_id, q, mode=effective, k=k)
+    return [RetrievedChunkOut.model_validate(chunk) for chunk in chunks]
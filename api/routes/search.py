@@ -0,0 +1,64 @@
+"""Ranked full-text search across the user's notebooks."""
+
+from __future__ import annotations
+
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.dependencies import get_current_user
+from api.db import models
+from api.db.database import get_db
+from api.db.instrumentation import query_budget
+from api.schemas import SearchHit, SearchKind
+from api.services.pagination import NEXT_CURSOR_HEADER, Keyset
+from api.services.search import SEARCH_KINDS, Highlighter, search_subquery, tsquery_text
+from api.settings import settings
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("", response_model=List[SearchHit], dependencies=[Depends(query_budget(4))])
+def search(
+    response: Response,
+    q: str = Query(min_length=1, max_length=200),
+    types: Optional[List[SearchKind]] = Query(default=None, description="Sources to search; all by default"),
+    notebook_id: Optional[uuid.UUID] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=settings.LIST_PAGE_MAX),
+    cursor: Optional[str] = Query(default=None),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[SearchHit]:
+    """Notes, flashcards, quiz questions, attachment summaries and transcript segments matching `q`.
+
+    Every term must match; Latin words match as prefixes and CJK text as substrings.
+    Hits are ordered by `ts_rank`, best first. The next page's cursor is sent in the
+    `X-Next-Cursor` header.
+    """
+    tsquery = tsquery_text(q)
+    if tsquery is None:
+        return []
+
+    hits = search_subquery(user.id, tsquery, types or SEARCH_KINDS, notebook_id)
+    keyset = Keyset((hits.c.rank, hits.c.kind, hits.c.id), descending=True)
+    rows = db.execute(keyset.apply(select(hits), cursor, limit)).all()
+    rows, next_cursor = keyset.page(rows, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    highlighter = Highlighter(q)
+    return [
+        SearchHit(
+            kind=row.kind,
+            id=row.id,
+            notebook_id=row.notebook_id,
+            title=row.title,
+            snippet=highlighter.snippet(row.body or row.title),
+            rank=row.rank,
+        )
+        for row in rows
+    ]
@@ -0,0 +1,136 @@
+"""Incremental sync: everything the user owns that changed since a cursor."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Sequence, Type, TypeVar
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import DateTime, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from api.dependencies import get_current_user
+from api.db import bulk, models
+from api.db.database import get_db
+from api.db.instrumentation import query_budget
+from api.schemas import (
+    FlashcardFolderOut,
+    FlashcardOut,
+    MindMapOut,
+    NotebookFolderOut,
+    QuizFolderOut,
+    QuizQuestionOut,
+    SyncAttachmentOut,
+    SyncNotebookOut,
+    SyncNoteOut,
+    SyncOut,
+    SyncTombstoneOut,
+)
+from api.settings import settings
+
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+
+def _encode_cursor(at: datetime) -> str:
+    return base64.urlsafe_b64encode(at.isoformat().encode()).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> datetime:
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _schema(schema: Type[SchemaT], row: Any, **extra: Any) -> SchemaT:
+    out = schema.model_validate(row)
+    return out.model_copy(update=extra) if extra else out
+
+
+@router.get("", response_model=SyncOut, dependencies=[Depends(query_budget(18))])
+def sync(
+    since: Optional[str] = Query(default=None, description="`cursor` from the previous response"),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> SyncOut:
+    """Rows created or updated since `since`, plus tombstones for rows deleted since then.
+
+    Without `since`, every row is returned (`full=true`). Each table is read through
+    its `(user_id, updated_at)` index. Reads start `SYNC_OVERLAP_SECONDS` before the
+    cursor so that transactions still open when the cursor was issued are not missed.
+    Rows may therefore come back more than once, and clients should upsert by id.
+
+    Folder membership is carried by the folders (`*_ids`), whose `updated_at` moves
+    with every membership change. Deleting a row drops its links without touching the
+    folders, so clients remove tombstoned ids from member lists themselves. A deleted
+    notebook's tombstone also covers every row scoped to it.
+    """
+    cursor_at = db.scalar(select(type_coerce(func.now(), DateTime(timezone=True))))
+    after = _decode_cursor(since) - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS) if since else None
+
+    def changed(model: Any, *where: Any) -> Sequence[Any]:
+        stmt = select(model).where(*where)
+        if after is not None:
+            stmt = stmt.where(model.updated_at > after)
+        return db.execute(stmt.order_by(model.updated_at)).scalars().all()
+
+    notebooks = changed(models.Notebook, models.Notebook.user_id == user.id)
+    notes = changed(
+        models.Note,
+        models.Note.notebook_id.in_(select(models.Notebook.id).where(models.Notebook.user_id == user.id)),
+    )
+    attachments = changed(models.Attachment, models.Attachment.user_id == user.id)
+    notebook_folders = changed(models.NotebookFolder, models.NotebookFolder.user_id == user.id)
+    flashcard_folders = changed(models.FlashcardFolder, models.FlashcardFolder.user_id == user.id)
+    flashcards = changed(models.Flashcard, models.Flashcard.user_id == user.id)
+    quiz_folders = changed(models.QuizFolder, models.QuizFolder.user_id == user.id)
+    quiz_questions = changed(models.QuizQuestion, models.QuizQuestion.user_id == user.id)
+    mindmaps = changed(models.MindMap, models.MindMap.user_id == user.id)
+
+    deleted: List[SyncTombstoneOut] = []
+    if after is not None:
+        tombstones = db.execute(
+            select(models.SyncTombstone)
+            .where(models.SyncTombstone.user_id == user.id, models.SyncTombstone.deleted_at > after)
+            .order_by(models.SyncTombstone.deleted_at)
+        ).scalars()
+        deleted = [
+            SyncTombstoneOut(entity=row.entity, id=row.entity_id, deleted_at=row.deleted_at) for row in tombstones
+        ]
+
+    notebook_members = bulk.member_ids(db, models.NotebookFolderItem, [folder.id for folder in notebook_folders])
+    card_members = bulk.member_ids(db, models.FlashcardFolderItem, [folder.id for folder in flashcard_folders])
+    question_members = bulk.member_ids(db, models.QuizFolderItem, [folder.id for folder in quiz_folders])
+    card_folders = bulk.folder_ids_of(db, models.FlashcardFolderItem, [card.id for card in flashcards])
+    question_folders = bulk.folder_ids_of(db, models.QuizFolderItem, [question.id for question in quiz_questions])
+
+    return SyncOut(
+        cursor=_encode_cursor(cursor_at),
+        full=after is None,
+        notebooks=[_schema(SyncNotebookOut, notebook) for notebook in notebooks],
+        notes=[_schema(SyncNoteOut, note) for note in notes],
+        attachments=[
+            _schema(SyncAttachmentOut, att, transcription_status=att.transcription_status.value) for att in attachments
+        ],
+        notebook_folders=[
+            _schema(NotebookFolderOut, folder, notebook_ids=notebook_members[folder.id]) for folder in notebook_folders
+        ],
+        flashcard_folders=[
+            _schema(FlashcardFolderOut, folder, flashcard_ids=card_members[folder.id]) for folder in flashcard_folders
+        ],
+        flashcards=[_schema(FlashcardOut, card, folder_ids=card_folders[card.id]) for card in flashcards],
+        quiz_folders=[
+            _schema(QuizFolderOut, folder, question_ids=question_members[folder.id]) for folder in quiz_folders
+        ],
+        quiz_questions=[
+            _schema(QuizQuestionOut, question, folder_ids=question_folders[question.id]) for question in quiz_questions
+        ],
+        mindmaps=[_schema(MindMapOut, mindmap) for mindmap in mindmaps],
+        deleted=deleted,
+    )
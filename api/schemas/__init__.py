@@ -15,16 +15,25 @@ from .note import (
     NotebookOut,
     NotebookUpdate,
     NotebooksListOut,
+    BatchItemResult,
+    BatchResult,
+    FlashcardBatchUpdate,
+    FlashcardBulkCreate,
     FlashcardCreate,
     FlashcardOut,
+    FlashcardSummaryOut,
     FlashcardUpdate,
     FlashcardFolderCreate,
     FlashcardFolderOut,
     FlashcardFolderUpdate,
     FlashcardGenerateRequest,
     FlashcardGenerateResponse,
+    QuizQuestionBatchUpdate,
+    QuizQuestionBulkCreate,
+    QuizQuestionBulkItem,
     QuizQuestionCreate,
     QuizQuestionOut,
+    QuizQuestionSummaryOut,
     QuizQuestionUpdate,
     QuizFolderCreate,
     QuizFolderOut,
@@ -37,7 +46,23 @@ from .note import (
     MindMapGenerateRequest,
     MindMapCreate,
     MindMapOut,
+    MindMapSummaryOut,
     MindMapUpdate,
+    MindMapPatch,
+    MindMapPatchOut,
+    JsonPatchOperation,
+    ConversationCreate,
+    ConversationMessageOut,
+    ConversationOut,
+    SyncAttachmentOut,
+    SyncNotebookOut,
+    SyncNoteOut,
+    SyncOut,
+    SyncTombstoneOut,
+    SearchHit,
+    SearchKind,
+    RetrievalModeValue,
+    RetrievedChunkOut,
     StructuredFlashcard,
     StructuredFlashcardSet,
     StructuredMindMap,
@@ -71,17 +96,26 @@ __all__ = [
     "NotebookOut",
     "NotebookUpdate",
     "NotebooksListOut",
+    "BatchItemResult",
+    "BatchResult",
+    "FlashcardBatchUpdate",
+    "FlashcardBulkCreate",
     "FlashcardCreate",
     "FlashcardUpdate",
     "FlashcardOut",
+    "FlashcardSummaryOut",
     "FlashcardFolderCreate",
     "FlashcardFolderUpdate",
     "FlashcardFolderOut",
     "FlashcardGenerateRequest",
     "FlashcardGenerateResponse",
+    "QuizQuestionBatchUpdate",
+    "QuizQuestionBulkCreate",
+    "QuizQuestionBulkItem",
     "QuizQuestionCreate",
     "QuizQuestionUpdate",
     "QuizQuestionOut",
+    "QuizQuestionSummaryOut",
     "QuizFolderCreate",
     "QuizFolderUpdate",
     "QuizFolderOut",
@@ -93,7 +127,23 @@ __all__ = [
     "MindMapGenerateRequest",
     "MindMapCreate",
     "MindMapUpdate",
+    "MindMapPatch",
+    "MindMapPatchOut",
+    "JsonPatchOperation",
+    "ConversationCreate",
+    "ConversationMessageOut",
+    "ConversationOut",
+    "SyncAttachmentOut",
+    "SyncNotebookOut",
+    "SyncNoteOut",
+    "SyncOut",
+    "SyncTombstoneOut",
+    "SearchHit",
+    "SearchKind",
+    "RetrievalModeValue",
+    "RetrievedChunkOut",
     "MindMapOut",
+    "MindMapSummaryOut",
     "StructuredFlashcard",
     "StructuredFlashcardSet",
     "StructuredMindMap",
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Literal, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -58,6 +58,9 @@ class NotebookFolderRef(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+RetrievalModeValue = Literal["file_search", "bm25", "hybrid"]
+
+
 class NotebookBase(BaseModel):
     title: Optional[str] = None
     summary: Optional[str] = None
@@ -65,6 +68,8 @@ class NotebookBase(BaseModel):
     color: Optional[str] = None
     openai_vector_store_id: Optional[str] = None
     vector_store_expires_at: Optional[datetime] = None
+    # Chat context source; None on create/update keeps the current mode (default file_search).
+    retrieval_mode: Optional[RetrievalModeValue] = None
 
 
 class NotebookCreate(NotebookBase):
@@ -150,6 +155,28 @@ class FlashcardCreate(FlashcardBase):
     folder_ids: List[UUID] = Field(default_factory=list)
 
 
+class FlashcardBulkCreate(BaseModel):
+    items: List[FlashcardCreate] = Field(min_length=1)
+
+
+class BatchItemResult(BaseModel):
+    id: UUID
+    ok: bool
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+class FlashcardBatchUpdate(BaseModel):
+    ids: List[UUID] = Field(min_length=1)
+    add_folder_ids: List[UUID] = Field(default_factory=list)
+    remove_folder_ids: List[UUID] = Field(default_factory=list)
+
+
 class FlashcardUpdate(BaseModel):
     question: Optional[str] = None
     answer: Optional[str] = None
@@ -165,9 +192,20 @@ class FlashcardOut(FlashcardBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class FlashcardSummaryOut(BaseModel):
+    id: UUID
+    notebook_id: UUID
+    question: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class FlashcardGenerateRequest(BaseModel):
     attachment_ids: List[UUID] = Field(default_factory=list)
+    note_ids: List[UUID] = Field(default_factory=list)
     count: Optional[int] = Field(default=None, ge=1, le=60)
+    # None: split large selections into concurrent partitions; True/False force it.
+    fan_out: Optional[bool] = None
     focus: Optional[str] = Field(default=None, max_length=600)
     folder_name: Optional[str] = Field(default=None, max_length=255)
     folder_id: Optional[UUID] = None
@@ -183,6 +221,7 @@ class FlashcardGenerateResponse(BaseModel):
 
 class MindMapGenerateRequest(BaseModel):
     attachment_ids: List[UUID] = Field(default_factory=list)
+    note_ids: List[UUID] = Field(default_factory=list)
     focus: Optional[str] = Field(default=None, max_length=600)
     title: Optional[str] = Field(default=None, max_length=255)
     model_key: Optional[str] = Field(default=None, max_length=100)
@@ -192,7 +231,10 @@ class MindMapGenerateRequest(BaseModel):
 
 class QuizGenerateRequest(BaseModel):
     attachment_ids: List[UUID] = Field(default_factory=list)
+    note_ids: List[UUID] = Field(default_factory=list)
     count: Optional[int] = Field(default=None, ge=1, le=30)
+    # None: split large selections into concurrent partitions; True/False force it.
+    fan_out: Optional[bool] = None
     focus: Optional[str] = Field(default=None, max_length=600)
     model_key: Optional[str] = Field(default=None, max_length=100)
     folder_name: Optional[str] = Field(default=None, max_length=255)
@@ -270,6 +312,21 @@ class QuizQuestionCreate(NotebookQuizBase):
     pass
 
 
+class QuizQuestionBulkItem(QuizQuestionCreate):
+    folder_ids: List[UUID] = Field(default_factory=list)
+
+
+class QuizQuestionBulkCreate(BaseModel):
+    items: List[QuizQuestionBulkItem] = Field(min_length=1)
+
+
+class QuizQuestionBatchUpdate(BaseModel):
+    ids: List[UUID] = Field(min_length=1)
+    is_favorite: Optional[bool] = None
+    add_folder_ids: List[UUID] = Field(default_factory=list)
+    remove_folder_ids: List[UUID] = Field(default_factory=list)
+
+
 class QuizQuestionUpdate(BaseModel):
     notebook_id: Optional[UUID] = None
     question: Optional[str] = None
@@ -289,6 +346,17 @@ class QuizQuestionOut(NotebookQuizBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class QuizQuestionSummaryOut(BaseModel):
+    id: UUID
+    notebook_id: UUID
+    question: str
+    is_favorite: bool
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class QuizFolderBase(BaseModel):
     notebook_id: UUID
     name: str = Field(max_length=255)
@@ -360,16 +428,140 @@ class MindMapUpdate(BaseModel):
     notebook_id: Optional[UUID] = None
     title: Optional[str] = Field(default=None, max_length=255)
     data: Optional[dict] = None
+    version: Optional[int] = Field(default=None, description="If set, the update fails with 409 unless it matches")
+
+
+class JsonPatchOperation(BaseModel):
+    """One RFC 6902 operation; `value` and `from` are required by the ops that use them."""
+
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(default=None, alias="from")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class MindMapPatch(BaseModel):
+    version: int = Field(description="Version the ops were computed against")
+    ops: List[JsonPatchOperation] = Field(min_length=1)
 
 
 class MindMapOut(MindMapBase):
     id: UUID
+    version: int
     created_at: datetime
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class MindMapPatchOut(BaseModel):
+    id: UUID
+    version: int
+    updated_at: datetime
+
+
+class MindMapSummaryOut(BaseModel):
+    id: UUID
+    notebook_id: UUID
+    title: str
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationCreate(BaseModel):
+    notebook_id: Optional[UUID] = None
+    title: Optional[str] = Field(default=None, max_length=255)
+
+
+class ConversationOut(BaseModel):
+    id: UUID
+    notebook_id: Optional[UUID] = None
+    title: Optional[str] = None
+    message_count: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationMessageOut(BaseModel):
+    seq: int
+    role: Literal["user", "assistant"]
+    text: str
+    response_id: Optional[str] = None
+    meta: Optional[dict] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncNotebookOut(NotebookBase):
+    """Notebook row without its notes, attachments and folders, which sync as their own entities."""
+
+    id: UUID
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncNoteOut(NoteOut):
+    notebook_id: UUID
+    updated_at: datetime
+
+
+class SyncAttachmentOut(AttachmentOut):
+    notebook_id: UUID
+
+
+class SyncTombstoneOut(BaseModel):
+    entity: str = Field(description="Table of the deleted row, e.g. `flashcards`")
+    id: UUID
+    deleted_at: datetime
+
+
+class SyncOut(BaseModel):
+    cursor: str = Field(description="Pass as `since` on the next call")
+    full: bool = Field(description="True when `since` was omitted and every row was returned")
+    notebooks: List[SyncNotebookOut] = Field(default_factory=list)
+    notes: List[SyncNoteOut] = Field(default_factory=list)
+    attachments: List[SyncAttachmentOut] = Field(default_factory=list)
+    notebook_folders: List[NotebookFolderOut] = Field(default_factory=list)
+    flashcard_folders: List[FlashcardFolderOut] = Field(default_factory=list)
+    flashcards: List[FlashcardOut] = Field(default_factory=list)
+    quiz_folders: List[QuizFolderOut] = Field(default_factory=list)
+    quiz_questions: List[QuizQuestionOut] = Field(default_factory=list)
+    mindmaps: List[MindMapOut] = Field(default_factory=list)
+    deleted: List[SyncTombstoneOut] = Field(default_factory=list)
+
+
+SearchKind = Literal["note", "flashcard", "quiz_question", "attachment", "transcript"]
+
+
+class SearchHit(BaseModel):
+    kind: SearchKind
+    id: UUID = Field(description="Row id; for `transcript` hits, the transcription segment")
+    notebook_id: UUID
+    title: Optional[str] = None
+    snippet: str = Field(description="HTML-escaped excerpt with matches wrapped in <mark>")
+    rank: float
+
+
+class RetrievedChunkOut(BaseModel):
+    id: UUID
+    source: Literal["note", "attachment", "transcript"]
+    source_id: UUID = Field(description="Note, attachment or transcription session id")
+    title: Optional[str] = None
+    text: str
+    score: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class NotebooksListOut(BaseModel):
     notebooks: List[NotebookOut]
 
@@ -1,13 +1,34 @@
 from __future__ import annotations
 
+import json
+import threading
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
 
 from fastapi import HTTPException
 
-from api.settings import settings
+from api.settings import Settings, settings
 
 _TOOL_META_KEYS = {"label", "include", "allow_overrides"}
+# Settings that feed the registry; `reload_registry` refreshes exactly these.
+_AI_SETTINGS = (
+    "AI_MODELS",
+    "AI_MODEL_DEFAULTS",
+    "AI_MODEL_OPTIONS",
+    "AI_TOOLS",
+    "AI_TOOL_DEFAULTS",
+    "AI_DEFAULT_CONTEXT_WINDOW",
+)
+
+
+@dataclass(frozen=True)
+class ModelPricing:
+    # USD per 1M tokens.
+    input: float
+    cached_input: float
+    output: float
 
 
 @dataclass(frozen=True)
@@ -15,6 +36,12 @@ class ModelInfo:
     key: str
     model: str
     supports_temperature: bool
+    # Input + output tokens the model accepts per request.
+    context_window: int
+    # Provider cap on max_output_tokens; None when not configured.
+    max_output_tokens: Optional[int] = None
+    # For usage cost estimates; None when the entry has no `pricing`.
+    pricing: Optional[ModelPricing] = None
 
 
 def _normalize_key(value: Optional[str]) -> Optional[str]:
@@ -28,15 +55,184 @@ def _normalize_key(value: Optional[str]) -> Optional[str]:
     return cleaned or None
 
 
-def _load_model_entry(key: str) -> Dict[str, Any]:
-    entry = settings.AI_MODELS.get(key)
-    if entry is None:
-        raise HTTPException(status_code=400, detail=f"Unsupported model_key: {key}")
+@dataclass(frozen=True)
+class _ToolSpec:
+    # Provider payload with meta keys already stripped; copied per call.
+    payload: Mapping[str, Any]
+    includes: Tuple[str, ...]
+    allow_overrides: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class AIRegistry:
+    """Immutable snapshot of the AI model/tool settings, compiled once."""
+
+    # Model key -> ModelInfo, or the 400 detail for a misconfigured entry.
+    models: Mapping[str, Union[ModelInfo, str]]
+    # Provider id -> ModelInfo of the first key that maps to it.
+    models_by_id: Mapping[str, ModelInfo]
+    tools: Mapping[str, _ToolSpec]
+    # Pre-encoded `GET /api/ai/config` body.
+    config_json: bytes
+    version: int
+    loaded_at: datetime
+
+
+def _token_limit(value: Any) -> Optional[int]:
+    # Positive int, or None when unset; anything else is a config error.
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(value)
+    return value
+
+
+def _pricing(value: Any) -> Optional[ModelPricing]:
+    # Cached input defaults to the input price; anything but a dict of numbers is a config error.
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError(value)
+    input_price = float(value.get("input", 0.0))
+    return ModelPricing(
+        input=input_price,
+        cached_input=float(value.get("cached_input", input_price)),
+        output=float(value.get("output", 0.0)),
+    )
+
+
+def _compile_model(key: str, entry: Any, default_context_window: int) -> Union[ModelInfo, str]:
     if isinstance(entry, str):
-        return {"id": entry}
-    if isinstance(entry, dict):
-        return entry
-    raise HTTPException(status_code=400, detail=f"Invalid model config for key: {key}")
+        entry = {"id": entry}
+    if not isinstance(entry, dict):
+        return f"Invalid model config for key: {key}"
+    model_id = _normalize_key(entry.get("id") or entry.get("model"))
+    if not model_id:
+        return f"Missing model id for key: {key}"
+    try:
+        context_window = _token_limit(entry.get("context_window")) or default_context_window
+        max_output_tokens = _token_limit(entry.get("max_output_tokens"))
+    except ValueError:
+        return f"Invalid token limits for model key: {key}"
+    try:
+        pricing = _pricing(entry.get("pricing"))
+    except (TypeError, ValueError):
+        return f"Invalid pricing for model key: {key}"
+    return ModelInfo(
+        key=key,
+        model=model_id,
+        supports_temperature=bool(entry.get("supports_temperature", True)),
+        context_window=context_window,
+        max_output_tokens=max_output_tokens,
+        pricing=pricing,
+    )
+
+
+def _compile_tool(entry: Dict[str, Any]) -> _ToolSpec:
+    include = entry.get("include") or []
+    includes = tuple(filter(None, (_normalize_key(item) for item in include))) if isinstance(include, list) else ()
+    allow_overrides = entry.get("allow_overrides") or []
+    return _ToolSpec(
+        payload=MappingProxyType({k: v for k, v in entry.items() if k not in _TOOL_META_KEYS}),
+        includes=includes,
+        allow_overrides=tuple(allow_overrides) if isinstance(allow_overrides, list) else (),
+    )
+
+
+def _model_options(models: Dict[str, Any]) -> List[Dict[str, str]]:
+    options: List[Dict[str, str]] = []
+    for key, entry in models.items():
+        label = key
+        if isinstance(entry, dict):
+            entry_label = entry.get("label")
+            if isinstance(entry_label, str) and entry_label.strip():
+                label = entry_label.strip()
+        options.append({"key": key, "label": label})
+    return options
+
+
+def _tool_options(tools: Dict[str, Any]) -> List[Dict[str, str]]:
+    options: List[Dict[str, str]] = []
+    for key, entry in tools.items():
+        if not isinstance(entry, dict):
+            continue
+        label = entry.get("label") if isinstance(entry.get("label"), str) else key
+        tool_type = entry.get("type")
+        option: Dict[str, str] = {"key": key, "label": label or key}
+        if isinstance(tool_type, str):
+            option["type"] = tool_type
+        options.append(option)
+    return options
+
+
+def _config_payload(source: Settings) -> Dict[str, Any]:
+    # Expose model/tool keys and defaults to the frontend for selection + storage.
+    options = _model_options(source.AI_MODELS)
+    allowed = [key for key in source.AI_MODEL_OPTIONS if key]
+    if allowed:
+        # Preserve the configured order and filter out unlisted keys.
+        option_map = {opt.get("key"): opt for opt in options if opt.get("key")}
+        options = [option_map[key] for key in allowed if key in option_map]
+    return {
+        "model_options": options,
+        "model_defaults": source.AI_MODEL_DEFAULTS,
+        "tool_options": _tool_options(source.AI_TOOLS),
+        "tool_defaults": source.AI_TOOL_DEFAULTS,
+    }
+
+
+def build_registry(source: Settings, *, version: int = 1) -> AIRegistry:
+    models = {
+        key: _compile_model(key, entry, source.AI_DEFAULT_CONTEXT_WINDOW) for key, entry in source.AI_MODELS.items()
+    }
+    by_id: Dict[str, ModelInfo] = {}
+    for info in models.values():
+        if isinstance(info, ModelInfo) and info.model not in by_id:
+            by_id[info.model] = info
+    return AIRegistry(
+        models=MappingProxyType(models),
+        models_by_id=MappingProxyType(by_id),
+        tools=MappingProxyType(
+            {key: _compile_tool(entry) for key, entry in source.AI_TOOLS.items() if isinstance(entry, dict)}
+        ),
+        config_json=json.dumps(_config_payload(source), ensure_ascii=False, separators=(",", ":")).encode(),
+        version=version,
+        loaded_at=datetime.now(timezone.utc),
+    )
+
+
+_registry: Optional[AIRegistry] = None
+_reload_lock = threading.Lock()
+
+
+def get_registry() -> AIRegistry:
+    # Normally built by load_registry() at startup; scripts get it lazily on first use.
+    registry = _registry
+    if registry is None:
+        registry = load_registry()
+    return registry
+
+
+def load_registry() -> AIRegistry:
+    """Compile the registry from the current `settings` and swap it in atomically."""
+    global _registry
+    with _reload_lock:
+        version = _registry.version + 1 if _registry is not None else 1
+        _registry = build_registry(settings, version=version)
+        return _registry
+
+
+def reload_registry() -> AIRegistry:
+    """Re-read the AI_* settings from the environment/.env and rebuild the registry.
+
+    The new values are validated and compiled before anything is swapped, so a broken
+    config leaves the running registry untouched.
+    """
+    fresh = Settings()
+    build_registry(fresh)
+    for name in _AI_SETTINGS:
+        setattr(settings, name, getattr(fresh, name))
+    return load_registry()
 
 
 def resolve_model_key(model_key: Optional[str], *, default_key: Optional[str]) -> ModelInfo:
@@ -44,25 +240,31 @@ def resolve_model_key(model_key: Optional[str], *, default_key: Optional[str]) -
     resolved_key = _normalize_key(model_key) or _normalize_key(default_key)
     if not resolved_key:
         raise HTTPException(status_code=400, detail="Missing model_key")
-    entry = _load_model_entry(resolved_key)
-    model_id = _normalize_key(entry.get("id") or entry.get("model"))
-    if not model_id:
-        raise HTTPException(status_code=400, detail=f"Missing model id for key: {resolved_key}")
-    supports_temperature = bool(entry.get("supports_temperature", True))
-    return ModelInfo(key=resolved_key, model=model_id, supports_temperature=supports_temperature)
+    info = get_registry().models.get(resolved_key)
+    if info is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported model_key: {resolved_key}")
+    if isinstance(info, str):
+        raise HTTPException(status_code=400, detail=info)
+    return info
 
 
 def resolve_model_value(model_value: Optional[str]) -> ModelInfo:
     value = _normalize_key(model_value)
     if not value:
         raise HTTPException(status_code=400, detail="Missing model")
-    for key, entry in settings.AI_MODELS.items():
-        entry_dict = entry if isinstance(entry, dict) else {"id": entry}
-        model_id = _normalize_key(entry_dict.get("id") or entry_dict.get("model"))
-        if model_id == value:
-            supports_temperature = bool(entry_dict.get("supports_temperature", True))
-            return ModelInfo(key=key, model=model_id, supports_temperature=supports_temperature)
-    raise HTTPException(status_code=400, detail=f"Unsupported model: {value}")
+    info = get_registry().models_by_id.get(value)
+    if info is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {value}")
+    return info
+
+
+def model_key_for(model_value: Optional[str]) -> str:
+    """Best-effort reverse lookup of a provider model id to its public key (for labels/logging)."""
+    value = _normalize_key(model_value)
+    if not value:
+        return "unknown"
+    info = get_registry().models_by_id.get(value)
+    return info.key if info is not None else value
 
 
 def resolve_tools(
@@ -73,70 +275,27 @@ def resolve_tools(
 ) -> Tuple[List[Dict[str, Any]], List[str]]:
     # Build tool payloads from keys and apply allowlisted overrides.
     keys_source = tool_keys if tool_keys is not None else default_keys or []
-    normalized_keys = []
-    for key in keys_source:
-        cleaned = _normalize_key(key)
-        if cleaned:
-            normalized_keys.append(cleaned)
-
-    unique_keys = []
-    seen = set()
-    for key in normalized_keys:
-        if key in seen:
-            continue
-        seen.add(key)
-        unique_keys.append(key)
+    # dict.fromkeys keeps first-seen order while dropping duplicates.
+    unique_keys = dict.fromkeys(filter(None, map(_normalize_key, keys_source)))
 
     tools: List[Dict[str, Any]] = []
     includes: List[str] = []
     overrides = overrides if isinstance(overrides, dict) else {}
+    specs = get_registry().tools
 
     for key in unique_keys:
-        entry = settings.AI_TOOLS.get(key)
-        if not isinstance(entry, dict):
+        spec = specs.get(key)
+        if spec is None:
             raise HTTPException(status_code=400, detail=f"Unsupported tool_key: {key}")
-        include = entry.get("include") or []
-        if isinstance(include, list):
-            for item in include:
-                cleaned = _normalize_key(item)
-                if cleaned:
-                    includes.append(cleaned)
-
-        allow_overrides = entry.get("allow_overrides") or []
-        tool_payload = {k: v for k, v in entry.items() if k not in _TOOL_META_KEYS}
+        includes.extend(spec.includes)
 
+        tool_payload = dict(spec.payload)
         override_payload = overrides.get(key)
-        if isinstance(override_payload, dict) and isinstance(allow_overrides, list):
-            for field in allow_overrides:
+        if isinstance(override_payload, dict):
+            for field in spec.allow_overrides:
                 if field in override_payload:
                     tool_payload[field] = override_payload[field]
 
         tools.append(tool_payload)
 
     return tools, includes
-
-
-def list_model_options() -> List[Dict[str, str]]:
-    options: List[Dict[str, str]] = []
-    for key, entry in settings.AI_MODELS.items():
-        label = key
-        if isinstance(entry, dict):
-            entry_label = entry.get("label")
-            if isinstance(entry_label, str) and entry_label.strip():
-                label = entry_label.strip()
-        options.append({"key": key, "label": label})
-    return options
-
-
-def list_tool_options() -> List[Dict[str, str]]:
-    options: List[Dict[str, str]] = []
-    for key, entry in settings.AI_TOOLS.items():
-        if not isinstance(entry, dict):
-            continue
-        label = entry.get("label") if isinstance(entry.get("label"), str) else key
-        tool_type = entry.get("type")
-        option: Dict[str, str] = {"key": key, "label": label or key}
-        if isinstance(tool_type, str):
-            option["type"] = tool_type
-        options.append(option)
-    return options
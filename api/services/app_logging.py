@@ -0,0 +1,181 @@
+"""Non-blocking JSON-lines logging for the `api.*` logger tree.
+
+Callers only pay for building a LogRecord and a `put_nowait` onto a size-capped queue;
+a QueueListener thread formats the records and writes them to a size-rotated file
+(and optionally stderr). The current request id is captured from a contextvar on the
+emitting side, so it survives the hop to the listener thread.
+
+High-volume events (stream deltas, audio frames) are tagged with
+`extra={"event": "<name>"}` and sampled according to `LOG_SAMPLE_RATES`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from api.settings import settings
+
+ROOT_LOGGER = "api"
+DEFAULT_LOG_DIR = Path(__file__).resolve().parent / "logs"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger under the `api` tree (module `__name__` values already are)."""
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records per `event` tag; untagged records always pass.
+
+    Counter-based rather than random; `next()` on an itertools.count is atomic under
+    the GIL, so no lock is taken on the hot path.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self._every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if rate > 0}
+        self._muted = {event for event, rate in rates.items() if rate <= 0}
+        self._counters = {event: itertools.count() for event in self._every}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None:
+            return True
+        if event in self._muted:
+            return False
+        every = self._every.get(event)
+        if every is None or every == 1:
+            return True
+        if next(self._counters[event]) % every:
+            return False
+        record.sampled_every = every
+        return True
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that captures the request id and never blocks when the queue is full.
+
+    Backed by a SimpleQueue (cheaper `put` than queue.Queue) with a soft size cap.
+    """
+
+    dropped = 0
+
+    def __init__(self, log_queue: "queue.SimpleQueue[logging.LogRecord]", max_size: int = 0) -> None:
+        super().__init__(log_queue)
+        self.max_size = max(0, max_size)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the stock prepare(), keep `extra` fields structured and skip formatting.
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.max_size and self.queue.qsize() >= self.max_size:
+            # Shedding log lines beats stalling the event loop on a slow disk.
+            type(self).dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def _build_targets() -> List[logging.Handler]:
+    formatter = JsonFormatter()
+    targets: List[logging.Handler] = []
+    log_dir = Path(settings.LOG_DIR) if settings.LOG_DIR else DEFAULT_LOG_DIR
+    if settings.LOG_FILE_NAME:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_dir / settings.LOG_FILE_NAME,
+            maxBytes=settings.LOG_MAX_BYTES,
+            backupCount=settings.LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(formatter)
+        targets.append(file_handler)
+    if settings.LOG_TO_STDERR:
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(formatter)
+        targets.append(stream_handler)
+    return targets
+
+
+def setup_logging() -> None:
+    """Attach the queue handler to the `api` logger and start the listener (idempotent)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler = _ContextQueueHandler(log_queue, settings.LOG_QUEUE_SIZE)
+        handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATES))
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.handlers.clear()
+        logger.addHandler(handler)
+        logger.setLevel(settings.LOG_LEVEL.upper())
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, *_build_targets(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Drain the queue and stop the listener thread."""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for target in listener.handlers:
+            target.close()
+
+
+def dropped_records() -> int:
+    return _ContextQueueHandler.dropped
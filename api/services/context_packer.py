@@ -0,0 +1,160 @@
+"""Fit a generation request's material (notes, extracted attachment text) into its token budget.
+
+    budget   `input_budget`: the model's context window minus max_output_tokens, the
+             instructions and a safety margin, capped at GENERATION_CONTEXT_TOKENS
+    pack     `pack`: sends every passage when the material fits. Otherwise, passages
+             matching the request's focus go first (BM25 over the candidates). Passages
+             spread evenly across all material then fill what is left, so no file or
+             note is dropped entirely.
+
+Material arrives already cut into passages: attachment text at extraction time
+(api.services.document_text), notes when the request is resolved. Token counts come
+from api.services.tokens, which is cheap enough to run on every passage per request.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from api.services.ai_registry import ModelInfo
+from api.services.retrieval import analyze
+from api.services.search import CJK_CHARS
+from api.services.tokens import estimate_tokens
+from api.settings import settings
+
+# Share of the context window kept free for estimation error and request framing.
+SAFETY_MARGIN = 0.05
+# BM25 parameters, as in the retrieval index.
+_K1 = 1.2
+_B = 0.75
+_CJK = re.compile(rf"[{CJK_CHARS}]")
+_WORD = re.compile(rf"[^\W_{CJK_CHARS}]")
+
+
+@dataclass
+class Material:
+    # Shown to the model above the passages, e.g. "资料：lecture.pdf".
+    label: str
+    passages: Sequence[str]
+
+
+@dataclass
+class PackedContext:
+    blocks: List[Dict[str, Any]]
+    budget: int
+    tokens: int
+    passages: int
+    total_passages: int
+
+
+def output_tokens(model: ModelInfo, requested: int) -> int:
+    """`requested` max_output_tokens, capped at what the model allows."""
+    return min(requested, model.max_output_tokens) if model.max_output_tokens else requested
+
+
+def input_budget(model: ModelInfo, *, instruction_tokens: int, max_output_tokens: int) -> int:
+    """Tokens left for material once instructions and the reply are reserved (never negative)."""
+    available = int(model.context_window * (1 - SAFETY_MARGIN)) - max_output_tokens - instruction_tokens
+    return max(0, min(settings.GENERATION_CONTEXT_TOKENS, available))
+
+
+def _spread_order(count: int) -> List[int]:
+    """0..count-1 in bit-reversed order, so every prefix is spread evenly over the range."""
+    bits = max(1, (count - 1).bit_length())
+    return sorted(range(count), key=lambda i: int(format(i, f"0{bits}b")[::-1], 2))
+
+
+def _term_counter(terms: Set[str]) -> Callable[[str], Counter]:
+    """Occurrences of `terms` in lowercased text, matching how `analyze` would split it.
+
+    Counting the query terms directly is much cheaper than analysing every passage:
+    CJK bigrams are plain substrings, and words need a boundary that is neither a
+    word character nor CJK (CJK runs are separate terms).
+    """
+    bigrams = [term for term in terms if _CJK.match(term)]
+    words = sorted((term for term in terms if not _CJK.match(term)), key=len, reverse=True)
+    # The left boundary is checked by hand: a leading lookbehind would stop `re` from
+    # scanning for the literal words, which is several times slower.
+    pattern = re.compile(rf"(?:{'|'.join(map(re.escape, words))})(?![^\W_{CJK_CHARS}])") if words else None
+
+    def count(text: str) -> Counter:
+        found: Counter = Counter()
+        if pattern is not None and any(word in text for word in words):
+            for match in pattern.finditer(text):
+                start = match.start()
+                if not start or not _WORD.match(text, start - 1):
+                    found[match.group()] += 1
+        for term in bigrams:
+            occurrences = text.count(term)
+            if occurrences:
+                found[term] = occurrences
+        return found
+
+    return count
+
+
+def _match_order(passages: Sequence[str], query: str) -> List[int]:
+    """Indexes of passages containing terms of `query`, best BM25 score first.
+
+    Length normalisation uses characters rather than terms, so passages without a
+    match are never analysed.
+    """
+    terms = set(analyze(query))
+    if not terms:
+        return []
+    count_terms = _term_counter(terms)
+    counts = {index: count_terms(passage.lower()) for index, passage in enumerate(passages)}
+    counts = {index: found for index, found in counts.items() if found}
+    avg_length = sum(map(len, passages)) / len(passages) or 1.0
+    df = Counter(term for found in counts.values() for term in found)
+    scores: Dict[int, float] = {}
+    for index, found in counts.items():
+        for term, tf in found.items():
+            idf = math.log(1 + (len(passages) - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + _K1 * (1 - _B + _B * len(passages[index]) / avg_length)
+            scores[index] = scores.get(index, 0.0) + idf * tf * (_K1 + 1) / norm
+    return sorted(scores, key=lambda index: scores[index], reverse=True)
+
+
+def pack(materials: Sequence[Material], *, focus: Optional[str], budget: int) -> PackedContext:
+    """One `input_text` block per material with its chosen passages, in document order."""
+    passages: List[Tuple[int, str]] = [
+        (position, passage)
+        for position, material in enumerate(materials)
+        for passage in material.passages
+        if passage
+    ]
+    tokens = [estimate_tokens(passage) for _, passage in passages]
+    if sum(tokens) <= budget:
+        chosen: Sequence[int] = range(len(passages))
+    else:
+        order = _match_order([passage for _, passage in passages], focus) if focus else []
+        order += _spread_order(len(passages))
+        chosen_set: Set[int] = set()
+        remaining = budget
+        for index in order:
+            if index not in chosen_set and tokens[index] <= remaining:
+                chosen_set.add(index)
+                remaining -= tokens[index]
+        chosen = sorted(chosen_set)
+
+    selected: List[List[str]] = [[] for _ in materials]
+    for index in chosen:
+        position, passage = passages[index]
+        selected[position].append(passage)
+    blocks = [
+        {"type": "input_text", "text": f"【{material.label}】\n" + "\n\n".join(texts)}
+        for material, texts in zip(materials, selected)
+        if texts
+    ]
+    return PackedContext(
+        blocks=blocks,
+        budget=budget,
+        tokens=sum(tokens[index] for index in chosen),
+        passages=len(chosen),
+        total_passages=len(passages),
+    )
@@ -0,0 +1,193 @@
+"""Server-side chat conversations: the `previous_response_id` chain and message history.
+
+A chat request that names a `conversation_id` is sent upstream with the
+conversation's `last_response_id` as `previous_response_id`. Any chain id from the
+client is ignored. When the reply's terminal event arrives (`response.completed` or
+`response.incomplete`), `schedule` records the turn in a background task and does not
+hold up the stream:
+
+    the user message     text plus attachment names and image count (file text,
+                         image data and retrieval context are not stored)
+    the reply            text plus status, model, usage and file citations
+    the conversation     `last_response_id` moves to the reply, `message_count` += 2
+
+A turn's writes wait for the previous turn in the same conversation to be recorded.
+`settled` lets the next request wait for them too, so a quick follow-up in this
+process always sees the new chain head. History reads are keyset pages over the
+`(conversation_id, seq)` primary key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from api.db import models
+from api.db.database import session_scope
+from api.services.app_logging import get_logger
+from api.services.openai_utils import extract_text_from_response
+
+logger = get_logger(__name__)
+
+# Terminal stream events whose response is recorded; a failed reply leaves the chain as it was.
+RECORDED_EVENTS = frozenset({"response.completed", "response.incomplete"})
+TITLE_CHARS = 60
+
+# Latest recording task per conversation; only touched on the event loop thread.
+_pending: Dict[uuid.UUID, asyncio.Task] = {}
+_background_tasks: Set[asyncio.Task] = set()
+
+
+@dataclass(frozen=True)
+class Turn:
+    conversation_id: uuid.UUID
+    # The chain head the request was sent with.
+    previous_response_id: Optional[str]
+    text: str
+    meta: Optional[Dict[str, Any]] = None
+
+
+def parse_id(payload: Dict[str, Any]) -> Optional[uuid.UUID]:
+    raw_id = payload.get("conversation_id") or payload.get("conversationId")
+    if not raw_id:
+        return None
+    try:
+        return uuid.UUID(str(raw_id))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid conversation_id")
+
+
+def chain_head(user_id: uuid.UUID, conversation_id: uuid.UUID) -> Optional[str]:
+    """The conversation's `last_response_id`; 404 unless it belongs to the user."""
+    with session_scope() as db:
+        row = db.execute(
+            select(models.Conversation.user_id, models.Conversation.last_response_id).where(
+                models.Conversation.id == conversation_id
+            )
+        ).one_or_none()
+    if row is None or row.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return row.last_response_id
+
+
+def user_meta(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """What the client shows besides the text of a user message."""
+    meta: Dict[str, Any] = {}
+    files = payload.get("files")
+    if isinstance(files, list):
+        names = [str(item.get("name") or "file") for item in files if isinstance(item, dict)]
+        if names:
+            meta["files"] = names
+    images = payload.get("images")
+    if isinstance(images, list) and images:
+        meta["images"] = len(images)
+    return meta or None
+
+
+def _citations(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    citations: List[Dict[str, Any]] = []
+    for item in response.get("output") or []:
+        if not isinstance(item, dict):
+            continue
+        for content in item.get("content") or []:
+            if not isinstance(content, dict):
+                continue
+            for annotation in content.get("annotations") or []:
+                if isinstance(annotation, dict) and annotation.get("type") == "file_citation":
+                    citations.append(
+                        {
+                            key: annotation[key]
+                            for key in ("type", "file_id", "filename", "index")
+                            if annotation.get(key) is not None
+                        }
+                    )
+    return citations
+
+
+def reply_meta(response: Dict[str, Any]) -> Dict[str, Any]:
+    meta: Dict[str, Any] = {"status": response.get("status"), "model": response.get("model")}
+    usage = response.get("usage")
+    if isinstance(usage, dict):
+        meta["usage"] = {key: usage.get(key) for key in ("input_tokens", "output_tokens")}
+    citations = _citations(response)
+    if citations:
+        meta["annotations"] = citations
+    return {key: value for key, value in meta.items() if value is not None}
+
+
+def record_turn(turn: Turn, response: Dict[str, Any]) -> None:
+    """Append the user message and the reply, and move the chain head to the reply."""
+    with session_scope() as db:
+        conversation = db.execute(
+            select(models.Conversation).where(models.Conversation.id == turn.conversation_id).with_for_update()
+        ).scalar_one_or_none()
+        if conversation is None:  # deleted while the reply was streaming
+            return
+        seq = conversation.message_count
+        response_id = response.get("id")
+        db.add_all(
+            [
+                models.ConversationMessage(
+                    conversation_id=conversation.id, seq=seq + 1, role="user", text=turn.text, meta=turn.meta
+                ),
+                models.ConversationMessage(
+                    conversation_id=conversation.id,
+                    seq=seq + 2,
+                    role="assistant",
+                    text=extract_text_from_response(response),
+                    response_id=response_id,
+                    meta=reply_meta(response),
+                ),
+            ]
+        )
+        conversation.message_count = seq + 2
+        if response_id:
+            conversation.last_response_id = response_id
+        if not conversation.title and turn.text:
+            conversation.title = turn.text[:TITLE_CHARS]
+
+
+async def _record(turn: Turn, response: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+    if previous is not None:
+        await asyncio.gather(previous, return_exceptions=True)
+    try:
+        await asyncio.to_thread(record_turn, turn, response)
+    except Exception:
+        logger.exception(
+            "Conversation turn not recorded",
+            extra={"conversation_id": str(turn.conversation_id), "response_id": response.get("id")},
+        )
+
+
+def schedule(turn: Turn, response: Dict[str, Any]) -> None:
+    """Record the turn in the background, after the conversation's earlier turns."""
+    conversation_id = turn.conversation_id
+    task = asyncio.get_running_loop().create_task(_record(turn, response, _pending.get(conversation_id)))
+    _pending[conversation_id] = task
+    # Keep a reference so the task is not garbage collected mid-flight.
+    _background_tasks.add(task)
+
+    def _done(finished: asyncio.Task) -> None:
+        _background_tasks.discard(finished)
+        if _pending.get(conversation_id) is finished:
+            del _pending[conversation_id]
+
+    task.add_done_callback(_done)
+
+
+async def settled(conversation_id: uuid.UUID) -> None:
+    """Wait until this process has recorded every turn it has seen in the conversation."""
+    task = _pending.get(conversation_id)
+    if task is not None:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def drain() -> None:
+    """Finish recording in-flight turns (on shutdown)."""
+    if _background_tasks:
+        await asyncio.gather(*list(_background_tasks), return_exceptions=True)
@@ -0,0 +1,200 @@
+"""Plain-text extraction for PDF, DOCX, PPTX and text/Markdown attachments.
+
+Everything here runs in extraction worker processes (see api.services.extraction), so
+this module imports nothing from the app beyond the standard library and pypdf.
+DOCX and PPTX are read straight from their OOXML parts with zipfile + ElementTree;
+only the paragraph text is needed, not a document model.
+
+    extract(data, kind)  ->  ExtractedDocument(kind, text, chunks, pages)
+
+`text` is NFKC-normalised with collapsed whitespace, one paragraph per line and at
+most one blank line in a row. `chunks` are [start, end) offsets into `text` of
+passages of at most CHUNK_CHARS characters, cut at line and then sentence breaks.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import unicodedata
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# Same passage size as the retrieval index, which reuses these chunks for attachments.
+CHUNK_CHARS = 800
+
+KIND_BY_SUFFIX = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".pptx": "pptx",
+    ".txt": "text",
+    ".md": "text",
+    ".markdown": "text",
+}
+KIND_BY_MIME = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+    "text/plain": "text",
+    "text/markdown": "text",
+}
+
+# Refuse OOXML parts that inflate past this (zip bombs); real documents are far smaller.
+_MAX_PART_BYTES = 64 * 1024 * 1024
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_SLIDE = re.compile(r"ppt/slides/slide(\d+)\.xml")
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_SPACES = re.compile(r"[^\S\n]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_LINE = re.compile(r"[^\n]+")
+_SENTENCE_END = re.compile(r"[。！？；!?;.]+\s*")
+
+
+class DocumentError(ValueError):
+    """The file could not be parsed; retrying the same bytes will not help."""
+
+
+@dataclass
+class ExtractedDocument:
+    kind: str
+    text: str
+    chunks: List[List[int]]
+    pages: Optional[int]
+
+
+def document_kind(filename: Optional[str], mime: Optional[str]) -> Optional[str]:
+    """Extractor for a file, by extension and then content type; None when unsupported."""
+    suffix = PurePosixPath(filename or "").suffix.lower()
+    content_type = (mime or "").split(";")[0].strip().lower()
+    return KIND_BY_SUFFIX.get(suffix) or KIND_BY_MIME.get(content_type)
+
+
+# ---------------------------------------------------------------------------
+# Extractors: bytes -> (raw text, page/slide count)
+# ---------------------------------------------------------------------------
+
+
+def _pdf(data: bytes) -> Tuple[str, Optional[int]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return "\n\n".join(pages), len(pages)
+
+
+def _xml_part(archive: zipfile.ZipFile, name: str) -> ElementTree.Element:
+    if archive.getinfo(name).file_size > _MAX_PART_BYTES:
+        raise ValueError(f"{name} is larger than {_MAX_PART_BYTES} bytes")
+    return ElementTree.fromstring(archive.read(name))
+
+
+def _docx(data: bytes) -> Tuple[str, Optional[int]]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = _xml_part(archive, "word/document.xml")
+    paragraphs: List[str] = []
+    for paragraph in root.iter(f"{_W}p"):
+        parts: List[str] = []
+        for node in paragraph.iter():
+            if node.tag == f"{_W}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{_W}tab":
+                parts.append(" ")
+            elif node.tag in (f"{_W}br", f"{_W}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs), None
+
+
+def _pptx(data: bytes) -> Tuple[str, Optional[int]]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        # Slide part numbers follow the deck order unless slides were reordered by hand.
+        names = sorted(
+            (name for name in archive.namelist() if _SLIDE.fullmatch(name)),
+            key=lambda name: int(_SLIDE.fullmatch(name).group(1)),
+        )
+        slides: List[str] = []
+        for name in names:
+            root = _xml_part(archive, name)
+            lines = ("".join(node.text or "" for node in paragraph.iter(f"{_A}t")) for paragraph in root.iter(f"{_A}p"))
+            slides.append("\n".join(lines))
+    return "\n\n".join(slides), len(names)
+
+
+def _text(data: bytes) -> Tuple[str, Optional[int]]:
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return data.decode(encoding), None
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace"), None
+
+
+_EXTRACTORS: Dict[str, Callable[[bytes], Tuple[str, Optional[int]]]] = {
+    "pdf": _pdf,
+    "docx": _docx,
+    "pptx": _pptx,
+    "text": _text,
+}
+
+
+# ---------------------------------------------------------------------------
+# Normalisation and chunking
+# ---------------------------------------------------------------------------
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL.sub("", text)
+    lines = (_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _pieces(text: str, size: int) -> Iterator[Tuple[int, int]]:
+    """Lines of `text`; lines longer than `size` are cut at sentence ends, and hard cut if still too long."""
+    for line in _LINE.finditer(text):
+        start, end = line.span()
+        if end - start <= size:
+            yield start, end
+            continue
+        breaks = [match.end() for match in _SENTENCE_END.finditer(text, start, end)]
+        position = start
+        for stop in [*breaks, end]:
+            while stop - position > size:
+                yield position, position + size
+                position += size
+            if stop > position:
+                yield position, stop
+                position = stop
+
+
+def chunk_boundaries(text: str, size: int = CHUNK_CHARS) -> List[List[int]]:
+    """[start, end) offsets of consecutive passages of at most `size` characters."""
+    bounds: List[List[int]] = []
+    start: Optional[int] = None
+    end = 0
+    for piece_start, piece_end in _pieces(text, size):
+        if start is not None and piece_end - start > size:
+            bounds.append([start, end])
+            start = None
+        if start is None:
+            start = piece_start
+        end = piece_end
+    if start is not None:
+        bounds.append([start, end])
+    return bounds
+
+
+def extract(data: bytes, kind: str) -> ExtractedDocument:
+    """Normalised text and chunk offsets of a file; raises DocumentError when it cannot be parsed."""
+    try:
+        raw, pages = _EXTRACTORS[kind](data)
+    except Exception as exc:
+        # pypdf, zipfile and ElementTree raise many types; the caller only needs to know it is permanent.
+        raise DocumentError(f"{type(exc).__name__}: {exc}") from None
+    text = normalize_text(raw)
+    return ExtractedDocument(kind=kind, text=text, chunks=chunk_boundaries(text), pages=pages)
@@ -0,0 +1,211 @@
+"""Attachment text extraction in a process pool, cached in attachment_texts by sha256.
+
+    extract   download from S3, hash, parse in a worker process (api.services.document_text)
+    store     one attachment_texts row per distinct file, then attachments.sha256
+    read      `ready_texts` for the generation scenes (packed by api.services.context_packer)
+
+Extraction starts when an upload is linked (POST /attachments/{id}/link-openai), and
+in the background when a generation selects an attachment that has not been
+extracted yet, so older uploads catch up after their first use. Identical files
+uploaded twice are parsed once. Generation scenes send the packed passages as
+`input_text` and keep an `input_file` reference only for attachments with no usable
+text (images, scanned PDFs, files still being extracted), so the model no longer
+re-reads whole files on every request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db import models
+from api.db.database import session_scope
+from api.services import document_text, s3_client
+from api.services.app_logging import get_logger
+from api.settings import settings
+
+logger = get_logger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Attachments being extracted by this process; only touched on the event loop thread.
+_in_flight: Set[uuid.UUID] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs threads (uvicorn, SQLAlchemy pool) is unsafe.
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=100,
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+
+def _load_target(attachment_id: uuid.UUID) -> Optional[Tuple[str, str]]:
+    """(S3 key, extractor kind) when the attachment still needs extracting, else None."""
+    with session_scope() as db:
+        row = db.execute(
+            select(
+                models.Attachment.s3_object_key,
+                models.Attachment.filename,
+                models.Attachment.mime,
+                models.Attachment.bytes,
+                models.AttachmentText.sha256.label("extracted"),
+            )
+            .outerjoin(models.AttachmentText, models.AttachmentText.sha256 == models.Attachment.sha256)
+            .where(models.Attachment.id == attachment_id)
+        ).one_or_none()
+    if row is None or not row.s3_object_key or row.extracted:
+        return None
+    if row.bytes and row.bytes > settings.EXTRACTION_MAX_BYTES:
+        return None
+    kind = document_text.document_kind(row.filename, row.mime)
+    return (row.s3_object_key, kind) if kind else None
+
+
+def _is_cached(digest: str) -> bool:
+    with session_scope() as db:
+        return db.get(models.AttachmentText, digest) is not None
+
+
+def _store(
+    attachment_id: uuid.UUID,
+    digest: str,
+    kind: str,
+    document: Optional[document_text.ExtractedDocument],
+    error: Optional[str],
+) -> None:
+    if document is not None or error is not None:
+        try:
+            with session_scope() as db:
+                db.execute(
+                    insert(models.AttachmentText).values(
+                        sha256=digest,
+                        kind=kind,
+                        text=document.text if document else "",
+                        chunks=document.chunks if document else [],
+                        pages=document.pages if document else None,
+                        error=error,
+                    )
+                )
+        except IntegrityError:
+            # The same file was extracted concurrently for another attachment.
+            pass
+    with session_scope() as db:
+        db.execute(update(models.Attachment).where(models.Attachment.id == attachment_id).values(sha256=digest))
+
+
+async def _extract(attachment_id: uuid.UUID) -> None:
+    target = await asyncio.to_thread(_load_target, attachment_id)
+    if target is None:
+        return
+    key, kind = target
+    started = time.perf_counter()
+    data = await asyncio.to_thread(s3_client.download_object, key, settings.EXTRACTION_MAX_BYTES)
+    digest = hashlib.sha256(data).hexdigest()
+
+    document: Optional[document_text.ExtractedDocument] = None
+    error: Optional[str] = None
+    cached = await asyncio.to_thread(_is_cached, digest)
+    if not cached:
+        loop = asyncio.get_running_loop()
+        try:
+            document = await loop.run_in_executor(_get_pool(), document_text.extract, data, kind)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool and retry on the next use.
+            shutdown_pool()
+            raise
+        except document_text.DocumentError as exc:
+            error = str(exc)[:1000]
+
+    await asyncio.to_thread(_store, attachment_id, digest, kind, document, error)
+    logger.info(
+        "Attachment text extracted",
+        extra={
+            "attachment_id": str(attachment_id),
+            "kind": kind,
+            "bytes": len(data),
+            "cached": cached,
+            "chars": len(document.text) if document else None,
+            "chunks": len(document.chunks) if document else None,
+            "error": error,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    )
+
+
+async def extract_attachment(attachment_id: uuid.UUID) -> None:
+    """Extract and store an attachment's text unless already done; never raises."""
+    if attachment_id in _in_flight:
+        return
+    _in_flight.add(attachment_id)
+    try:
+        await _extract(attachment_id)
+    except Exception:
+        logger.exception("Attachment text extraction failed", extra={"attachment_id": str(attachment_id)})
+    finally:
+        _in_flight.discard(attachment_id)
+
+
+def schedule(attachment_ids: Iterable[uuid.UUID]) -> None:
+    """Start extracting attachments in the background; a no-op outside the event loop."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    for attachment_id in attachment_ids:
+        if attachment_id in _in_flight:
+            continue
+        # Keep a reference so the task is not garbage collected mid-flight.
+        task = loop.create_task(extract_attachment(attachment_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+# ---------------------------------------------------------------------------
+# Generation context
+# ---------------------------------------------------------------------------
+
+
+def ready_texts(db: Session, digests: Iterable[Optional[str]]) -> Dict[str, models.AttachmentText]:
+    """Extracted texts with usable content for the given sha256 digests, in one query."""
+    wanted = {digest for digest in digests if digest}
+    if not wanted:
+        return {}
+    rows = db.execute(
+        select(models.AttachmentText).where(
+            models.AttachmentText.sha256.in_(wanted),
+            models.AttachmentText.error.is_(None),
+            models.AttachmentText.text != "",
+        )
+    ).scalars()
+    return {row.sha256: row for row in rows}
@@ -0,0 +1,251 @@
+"""Map-reduce planning for flashcard and quiz generation over large selections.
+
+    plan    `partition`: the passages of all notes and attachments in document order
+            (input_file attachments count as one partition's worth each), cut into
+            up to GENERATION_MAX_PARTITIONS consecutive runs of about
+            GENERATION_PARTITION_TOKENS; a source that spans runs is labelled (k/n)
+    count   each partition's share (`quota`) of the requested total, by size; it is
+            asked for a little more so near-duplicates can be dropped
+    merge   `Merger`: keeps up to each partition's share of the items that are not
+            near-duplicates (character-bigram Jaccard over normalised text), then
+            tops up from what partitions produced beyond their share
+
+Partition calls run concurrently; `limit` caps how many are in flight per process
+across all requests (GENERATION_FANOUT_CONCURRENCY).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from api.services.context_packer import Material
+from api.services.tokens import estimate_tokens
+from api.settings import settings
+
+I = TypeVar("I")
+
+# Fewest items worth a separate call; smaller requests are not split.
+MIN_ITEMS_PER_PARTITION = 3
+# Partitions ask for this much more than their share, to make up for dropped duplicates.
+OVERSHOOT = 0.2
+# Items at least this similar (Jaccard over character bigrams) are duplicates.
+DUPLICATE_SIMILARITY = 0.8
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+_slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+
+@dataclass
+class Partition:
+    materials: List[Material]
+    file_blocks: List[Dict[str, Any]]
+    labels: List[str]
+    tokens: int = 0
+    # Items to ask the model for, and how many of them to keep before topping up.
+    count: Optional[int] = None
+    quota: Optional[int] = None
+
+    @property
+    def file_names(self) -> str:
+        return ", ".join(self.labels) or "已选资料"
+
+
+def limit() -> asyncio.Semaphore:
+    """Process-wide semaphore for partition calls, created on the running loop."""
+    global _slots
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots[0] is not loop:
+        _slots = (loop, asyncio.Semaphore(settings.GENERATION_FANOUT_CONCURRENCY))
+    return _slots[1]
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+
+def _contiguous(sizes: Sequence[int], parts: int) -> List[List[int]]:
+    """Indexes 0..len(sizes)-1 cut into up to `parts` consecutive runs of roughly equal total size."""
+    target = sum(sizes) / parts
+    groups: List[List[int]] = [[]]
+    filled = 0
+    for index, size in enumerate(sizes):
+        # Start the next run once this item would sit mostly past the boundary.
+        if groups[-1] and filled + size / 2 > target * len(groups) and len(groups) < parts:
+            groups.append([])
+        groups[-1].append(index)
+        filled += size
+    return groups
+
+
+def _shares(total: int, weights: Sequence[int]) -> List[int]:
+    """`total` split in proportion to `weights` (largest remainder), at least one each."""
+    weight_sum = sum(weights) or 1
+    exact = [max(1.0, total * weight / weight_sum) for weight in weights]
+    shares = [int(value) for value in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for index in by_remainder[: max(0, total - sum(shares))]:
+        shares[index] += 1
+    return shares
+
+
+def partition(
+    materials: Sequence[Material],
+    files: Sequence[Tuple[str, Dict[str, Any]]],
+    *,
+    count: Optional[int],
+    fan_out: Optional[bool],
+) -> Optional[List[Partition]]:
+    """Partitions for a map-reduce run, or None when the request should stay one call.
+
+    `fan_out` None splits when the material is more than one partition's worth;
+    True also gives every source (note, attachment) its own partition where it can;
+    False never splits.
+    `files` are (label, input_file block) for attachments without extracted text.
+    """
+    if fan_out is False:
+        return None
+    target = max(1, settings.GENERATION_PARTITION_TOKENS)
+    # Units in document order: (material index or None for a file, passage or file index, tokens).
+    units: List[Tuple[Optional[int], int, int]] = [
+        (position, index, estimate_tokens(passage))
+        for position, material in enumerate(materials)
+        for index, passage in enumerate(material.passages)
+        if passage
+    ]
+    # A file's size is unknown until the model reads it; count it as a full partition.
+    units += [(None, index, target) for index in range(len(files))]
+    total = sum(tokens for _, _, tokens in units)
+    sources = len({position for position, _, _ in units if position is not None}) + len(files)
+    wanted = math.ceil(total / target)
+    if fan_out:
+        wanted = max(wanted, sources)
+    parts = min(wanted, len(units), settings.GENERATION_MAX_PARTITIONS)
+    if count:
+        parts = min(parts, count // MIN_ITEMS_PER_PARTITION)
+    if parts < 2:
+        return None
+
+    # Consecutive runs, so each call sees whole stretches of material.
+    groups = [[units[index] for index in group] for group in _contiguous([tokens for _, _, tokens in units], parts)]
+    spans: Dict[int, List[int]] = {}
+    for number, group in enumerate(groups):
+        for position in dict.fromkeys(position for position, _, _ in group if position is not None):
+            spans.setdefault(position, []).append(number)
+
+    loads = [sum(tokens for _, _, tokens in group) for group in groups]
+    quotas: List[Optional[int]] = list(_shares(count, loads)) if count else [None] * parts
+    partitions = []
+    for number, (group, load, quota) in enumerate(zip(groups, loads, quotas)):
+        picked: Dict[int, List[str]] = {}
+        for position, index, _ in group:
+            if position is not None:
+                picked.setdefault(position, []).append(materials[position].passages[index])
+        parted = []
+        for position, passages in picked.items():
+            label = materials[position].label
+            if len(spans[position]) > 1:
+                label = f"{label}（{spans[position].index(number) + 1}/{len(spans[position])}）"
+            parted.append(Material(label=label, passages=passages))
+        file_indexes = [index for position, index, _ in group if position is None]
+        partitions.append(
+            Partition(
+                materials=parted,
+                file_blocks=[files[index][1] for index in file_indexes],
+                labels=[material.label for material in parted] + [files[index][0] for index in file_indexes],
+                tokens=load,
+                count=quota + math.ceil(quota * OVERSHOOT) if quota else None,
+                quota=quota,
+            )
+        )
+    return partitions
+
+
+# ---------------------------------------------------------------------------
+# Merging
+# ---------------------------------------------------------------------------
+
+
+def _bigrams(text: str) -> Set[str]:
+    normalized = _NON_WORD.sub("", unicodedata.normalize("NFKC", text).casefold())
+    if len(normalized) < 2:
+        return {normalized}
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+class NearDuplicates:
+    """Texts seen so far; `add` rejects one too similar to any of them."""
+
+    def __init__(self, threshold: float = DUPLICATE_SIMILARITY) -> None:
+        self.threshold = threshold
+        self._seen: List[Set[str]] = []
+
+    def add(self, text: str) -> bool:
+        grams = _bigrams(text)
+        for seen in self._seen:
+            smaller, larger = sorted((len(grams), len(seen)))
+            # Jaccard can reach the threshold only if the sizes are close enough.
+            if smaller < self.threshold * larger:
+                continue
+            if len(grams & seen) / len(grams | seen) >= self.threshold:
+                return False
+        self._seen.append(grams)
+        return True
+
+
+@dataclass
+class Merger(Generic[I]):
+    """Merges partition results into at most `total` distinct items.
+
+    `add` returns the items of one partition that are kept right away (within its
+    quota); `finish` returns the top-up from the surplus, spread over partitions.
+    """
+
+    quotas: Sequence[Optional[int]]
+    key: Callable[[I], str]
+    total: Optional[int] = None
+    duplicates: NearDuplicates = field(default_factory=NearDuplicates)
+    kept: int = 0
+    dropped: int = 0
+
+    def __post_init__(self) -> None:
+        self._taken = [0] * len(self.quotas)
+        self._surplus: List[List[I]] = [[] for _ in self.quotas]
+
+    def _full(self) -> bool:
+        return self.total is not None and self.kept >= self.total
+
+    def _keep(self, item: I) -> bool:
+        if not self.duplicates.add(self.key(item)):
+            self.dropped += 1
+            return False
+        self.kept += 1
+        return True
+
+    def add(self, index: int, items: Sequence[I]) -> List[I]:
+        quota = self.quotas[index]
+        kept: List[I] = []
+        for item in items:
+            if self._full() or (quota is not None and self._taken[index] >= quota):
+                self._surplus[index].append(item)
+            elif self._keep(item):
+                self._taken[index] += 1
+                kept.append(item)
+        return kept
+
+    def finish(self) -> List[I]:
+        queues = [list(reversed(surplus)) for surplus in self._surplus]
+        kept: List[I] = []
+        while not self._full() and any(queues):
+            for queue in queues:
+                if queue and not self._full() and self._keep(queue[-1]):
+                    kept.append(queue[-1])
+                if queue:
+                    queue.pop()
+        return kept
@@ -0,0 +1,632 @@
+"""Shared pipeline for structured generation scenes (flashcards, quizzes, mind maps).
+
+A `GenerationRun` walks one request through five stages:
+
+    resolve   notebook title + selected notes and attachments + extracted text, one query each
+    prompt    user prompt + note/attachment passages packed into the model's budget
+              (api.services.context_packer), input_file refs for attachments without
+              extracted text, max_output_tokens scaled to the requested item count
+    dispatch  the Responses API call; flashcards and quizzes over large selections make
+              one call per partition, concurrently, and merge the items
+              (api.services.fanout)
+    validate  structured output -> pydantic model
+    persist   scene writer (bulk INSERT ... RETURNING) + one commit
+
+Streamed runs (`stream_items`) make the same calls with `stream: true` and parse the
+text deltas as they arrive (api.services.json_stream). Each item is validated and
+handed to the scene as soon as its closing brace arrives, so the scene can persist
+and send it while the model is still writing the rest.
+
+Every stage is timed into `generation_stage_seconds{scene,stage,outcome}` and the
+per-stage breakdown is logged when the run finishes. Scene-specific code only builds
+the prompt lines and the rows to write.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from contextlib import aclosing, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.db import models
+from api.services import context_packer, extraction, fanout, metrics, openai_client
+from api.services.ai_registry import ModelInfo, resolve_model_key
+from api.services.app_logging import get_logger
+from api.services.context_packer import Material, PackedContext
+from api.services.document_text import chunk_boundaries, normalize_text
+from api.services.fanout import Partition
+from api.services.json_stream import JsonStream, JsonStreamError
+from api.services.openai_utils import build_responses_payload, extract_structured_output
+from api.services.retrieval import plain_text
+from api.services.structured_outputs import StructuredTemplate
+from api.services.tokens import estimate_messages
+from api.settings import settings
+
+logger = get_logger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+R = TypeVar("R")
+
+
+@dataclass
+class GenerationSource:
+    notebook_id: uuid.UUID
+    notebook_title: Optional[str]
+    attachments: List[models.Attachment]
+    # Extracted text by sha256, for the attachments that have it.
+    texts: Dict[str, models.AttachmentText] = field(default_factory=dict)
+    # Selected notes as (title, passages).
+    notes: List[Tuple[Optional[str], List[str]]] = field(default_factory=list)
+    # Attachments never parsed locally; the caller hands them to `extraction.schedule`.
+    unextracted: List[uuid.UUID] = field(default_factory=list)
+
+    @property
+    def names(self) -> List[str]:
+        names = [att.filename or "" for att in self.attachments] + [title or "未命名笔记" for title, _ in self.notes]
+        return [name for name in names if name]
+
+    @property
+    def file_names(self) -> str:
+        return ", ".join(self.names) or "已选资料"
+
+    @property
+    def materials(self) -> List[Material]:
+        """Notes, then attachments with extracted text, as passages for the context packer."""
+        materials = [Material(label=f"笔记：{title or '未命名笔记'}", passages=passages) for title, passages in self.notes]
+        for att in self.attachments:
+            text = self.texts.get(att.sha256 or "")
+            if text is not None:
+                passages = [text.text[start:end] for start, end in text.chunks]
+                materials.append(Material(label=f"资料：{att.filename or att.id}", passages=passages))
+        return materials
+
+    @property
+    def files(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(label, input_file reference) for attachments without extracted text."""
+        return [
+            (att.filename or str(att.id), {"type": "input_file", "file_id": att.openai_file_id})
+            for att in self.attachments
+            if att.openai_file_id and (att.sha256 or "") not in self.texts
+        ]
+
+    @property
+    def file_blocks(self) -> List[Dict[str, Any]]:
+        return [block for _, block in self.files]
+
+    @property
+    def source_labels(self) -> List[str]:
+        labels = [att.filename or att.s3_object_key or str(att.id) for att in self.attachments]
+        return labels + [title or "未命名笔记" for title, _ in self.notes]
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """One server-sent event; `event["type"]` doubles as the SSE event name."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+def _note_passages(content: Optional[str]) -> List[str]:
+    text = normalize_text(plain_text(content))
+    return [text[start:end] for start, end in chunk_boundaries(text)]
+
+
+class GenerationRun(Generic[T]):
+    def __init__(
+        self,
+        template: StructuredTemplate[T],
+        *,
+        user: models.User,
+        db: Session,
+        model_key: Optional[str] = None,
+    ) -> None:
+        self.template = template
+        self.user = user
+        self.db = db
+        self.model_key = model_key
+        self.timings: Dict[str, float] = {}
+        # One entry per model call (several when the run fans out).
+        self.contexts: List[PackedContext] = []
+        self.output_tokens: List[int] = []
+        self.failed_partitions = 0
+        self.duplicates_dropped = 0
+        # Streamed runs: seconds from the start of the run to the first item handed out.
+        self.first_item_seconds: Optional[float] = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self._record(name, outcome, time.perf_counter() - started)
+
+    def _record(self, name: str, outcome: str, seconds: float) -> None:
+        # Stages that run once per partition add up.
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        metrics.observe_generation_stage(self.template.scene, name, outcome, seconds)
+
+    # --- resolve ---
+
+    def resolve_sources(
+        self,
+        notebook_id: uuid.UUID,
+        attachment_ids: Optional[Sequence[uuid.UUID]],
+        note_ids: Optional[Sequence[uuid.UUID]] = None,
+    ) -> GenerationSource:
+        """Check notebook ownership and load only the notes and attachments being sent to the model.
+
+        With neither attachment_ids nor note_ids, every attachment synced to OpenAI is
+        used. Selected attachments that were never extracted are queued for
+        extraction, so later runs can send their text instead of the whole file.
+        """
+        with self.stage("resolve"):
+            row = self.db.execute(
+                select(models.Notebook.id, models.Notebook.title).where(
+                    models.Notebook.id == notebook_id,
+                    models.Notebook.user_id == self.user.id,
+                )
+            ).one_or_none()
+            if row is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found")
+
+            notes: List[Tuple[Optional[str], List[str]]] = []
+            requested_notes = list(dict.fromkeys(note_ids or ()))
+            if requested_notes:
+                found_notes = {
+                    note.id: note
+                    for note in self.db.execute(
+                        select(models.Note.id, models.Note.title, models.Note.content).where(
+                            models.Note.notebook_id == notebook_id, models.Note.id.in_(requested_notes)
+                        )
+                    )
+                }
+                for note_id in requested_notes:
+                    note = found_notes.get(note_id)
+                    if note is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST, detail=f"笔记不存在或不属于该笔记本: {note_id}"
+                        )
+                    notes.append((note.title, _note_passages(note.content)))
+
+            stmt = select(models.Attachment).where(models.Attachment.notebook_id == notebook_id)
+            requested = list(dict.fromkeys(attachment_ids or ()))
+            selected: List[models.Attachment] = []
+            if requested:
+                found = {att.id: att for att in self.db.execute(stmt.where(models.Attachment.id.in_(requested))).scalars()}
+                for att_id in requested:
+                    att = found.get(att_id)
+                    if not att:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST, detail=f"附件不存在或不属于该笔记本: {att_id}"
+                        )
+                    if not att.openai_file_id:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"附件 {att.filename or att.id} 尚未同步到 OpenAI（缺少 openai_file_id）",
+                        )
+                    selected.append(att)
+            elif not requested_notes:
+                selected = list(
+                    self.db.execute(
+                        stmt.where(
+                            models.Attachment.openai_file_id.is_not(None),
+                            models.Attachment.openai_file_id != "",
+                        ).order_by(models.Attachment.created_at)
+                    ).scalars()
+                )
+
+            if not selected and not notes:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="至少需要一个已上传到 OpenAI 的附件")
+            return GenerationSource(
+                notebook_id=row.id,
+                notebook_title=row.title,
+                attachments=selected,
+                texts=extraction.ready_texts(self.db, (att.sha256 for att in selected)),
+                notes=notes,
+                unextracted=[att.id for att in selected if att.sha256 is None],
+            )
+
+    # --- prompt ---
+
+    def model_info(self) -> ModelInfo:
+        return resolve_model_key(self.model_key, default_key=settings.AI_MODEL_DEFAULTS.get(self.template.scene))
+
+    def partitions(self, source: GenerationSource, *, count: Optional[int], fan_out: Optional[bool]) -> List[Partition]:
+        """The model calls to make: fan-out partitions (api.services.fanout), or the whole source as one."""
+        with self.stage("prompt"):
+            parts = fanout.partition(source.materials, source.files, count=count, fan_out=fan_out)
+        if parts is not None:
+            return parts
+        return [
+            Partition(
+                materials=source.materials,
+                file_blocks=source.file_blocks,
+                labels=source.names,
+                count=count,
+                quota=count,
+            )
+        ]
+
+    def build_payload(
+        self,
+        prompt_lines: Sequence[str],
+        source: Union[GenerationSource, Partition],
+        *,
+        focus: Optional[str] = None,
+        count: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Responses payload with as much of the source material as fits the model's budget.
+
+        `count` is the number of items asked for; it sizes max_output_tokens, so the
+        reserve for the reply grows with the request instead of a fixed worst case.
+        """
+        with self.stage("prompt"):
+            model_info = self.model_info()
+            prompt = "\n".join(prompt_lines)
+            max_output_tokens = context_packer.output_tokens(model_info, self.template.output_tokens(count))
+            budget = context_packer.input_budget(
+                model_info,
+                instruction_tokens=estimate_messages([self.template.system_prompt, prompt]),
+                max_output_tokens=max_output_tokens,
+            )
+            context = context_packer.pack(source.materials, focus=focus, budget=budget)
+            self.contexts.append(context)
+            self.output_tokens.append(max_output_tokens)
+            user_content = [{"type": "input_text", "text": prompt}, *context.blocks, *source.file_blocks]
+            payload = build_responses_payload(
+                {
+                    "model": model_info.model,
+                    "input": [
+                        {"role": "system", "content": [{"type": "input_text", "text": self.template.system_prompt}]},
+                        {"role": "user", "content": user_content},
+                    ],
+                    "max_output_tokens": max_output_tokens,
+                    "text": self.template.payload_text(),
+                }
+            )
+            if model_info.supports_temperature:
+                payload["temperature"] = self.template.temperature
+            return payload
+
+    # --- dispatch ---
+
+    async def _call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return await openai_client.responses_complete(
+                payload,
+                timeout=self.template.timeout,
+                scene=self.template.scene,
+                user_id=self.user.id,
+            )
+        except RuntimeError as exc:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc))
+
+    async def dispatch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self.stage("dispatch"):
+            return await self._call(payload)
+
+    async def _dispatch_partition(self, payload: Dict[str, Any], validate_kwargs: Mapping[str, Any]) -> T:
+        async with fanout.limit():
+            data = await self._call(payload)
+        return self.validate(data, **validate_kwargs)
+
+    async def _dispatch_each(
+        self, payloads: Sequence[Dict[str, Any]], validate_kwargs: Mapping[str, Any]
+    ) -> AsyncIterator[Tuple[int, T]]:
+        if len(payloads) == 1:
+            data = await self.dispatch(payloads[0])
+            yield 0, self.validate(data, **validate_kwargs)
+            return
+
+        started = finished = time.perf_counter()
+        tasks = [asyncio.ensure_future(self._dispatch_partition(payload, validate_kwargs)) for payload in payloads]
+        index_of = {task: index for index, task in enumerate(tasks)}
+        pending = set(tasks)
+        error: Optional[HTTPException] = None
+        outcome = "error"
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = time.perf_counter()
+                for task in sorted(done, key=index_of.__getitem__):
+                    try:
+                        result = task.result()
+                    except HTTPException as exc:
+                        error = exc
+                        self.failed_partitions += 1
+                        logger.warning(
+                            "Generation partition failed",
+                            extra={
+                                "scene": self.template.scene,
+                                "partition": index_of[task],
+                                "status": exc.status_code,
+                                "detail": exc.detail,
+                            },
+                        )
+                        continue
+                    yield index_of[task], result
+            if error is None or self.failed_partitions < len(tasks):
+                outcome = "ok"
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wall time of the calls, excluding what the consumer did after the last one.
+            self._record("dispatch", outcome, finished - started)
+        if outcome == "error" and error is not None:
+            raise error
+
+    async def gather_items(
+        self,
+        parts: Sequence[Partition],
+        payloads: Sequence[Dict[str, Any]],
+        *,
+        items: str,
+        key: Callable[[Any], str],
+        total: Optional[int],
+        **validate_kwargs: Any,
+    ) -> AsyncIterator[Tuple[Optional[T], List[Any]]]:
+        """Run one call per partition and yield (result, new items) as each finishes, then (None, top-up).
+
+        `items` names the result's list field. Items are merged by fanout.Merger:
+        near-duplicates (by `key`) are dropped and at most `total` are yielded in all.
+        With one partition this is dispatch + validate. With several, every call
+        waits for the process-wide limiter, and a failed partition is logged and
+        skipped; only when all of them fail is the last error raised.
+        """
+        merger: fanout.Merger[Any] = fanout.Merger([part.quota for part in parts], key, total=total)
+        # The count is kept current before each yield, since the consumer may stop early.
+        async for index, result in self._dispatch_each(payloads, validate_kwargs):
+            added = merger.add(index, getattr(result, items))
+            self.duplicates_dropped = merger.dropped
+            yield result, added
+        top_up = merger.finish()
+        self.duplicates_dropped = merger.dropped
+        yield None, top_up
+
+    # --- streamed dispatch ---
+
+    async def _stream_call(
+        self, payload: Dict[str, Any], fields: Sequence[str], invalid_detail: str
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """One streamed call: (path, value) for every field and every validated item as soon as it is complete.
+
+        A reply cut short (e.g. at max_output_tokens) keeps the items that did
+        complete; only a reply without any item is an error.
+        """
+        item_path = self.template.item_path
+        parser = JsonStream(*fields, item_path)
+        items = 0
+        try:
+            async with aclosing(
+                openai_client.responses_stream(payload, scene=self.template.scene, user_id=self.user.id)
+            ) as events:
+                async for raw in events:
+                    event = json.loads(raw)
+                    kind = event.get("type")
+                    if kind in ("response.failed", "error"):
+                        error = (event.get("response") or {}).get("error") or event
+                        raise HTTPException(
+                            status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail=f"OpenAI responses stream failed: {error.get('message') or kind}",
+                        )
+                    if kind != "response.output_text.delta":
+                        continue
+                    for path, value in parser.feed(event.get("delta") or ""):
+                        if path == item_path:
+                            try:
+                                with self.stage("validate"):
+                                    value = self.template.validate_item(value)
+                            except ValidationError as exc:
+                                logger.warning(
+                                    "Generated item rejected", extra={"scene": self.template.scene, "error": str(exc)}
+                                )
+                                continue
+                            items += 1
+                        yield path, value
+            parser.close()
+        except RuntimeError as exc:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc))
+        except JsonStreamError as exc:
+            if not items:
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"{invalid_detail}: {exc}")
+            logger.warning(
+                "Generation stream ended early",
+                extra={"scene": self.template.scene, "items": items, "error": str(exc)},
+            )
+
+    async def stream_items(
+        self,
+        payloads: Sequence[Dict[str, Any]],
+        *,
+        invalid_detail: str,
+        fields: Sequence[str] = (),
+        quotas: Optional[Sequence[Optional[int]]] = None,
+        key: Optional[Callable[[Any], str]] = None,
+        total: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Streamed counterpart of `gather_items`: (path, value) as soon as each is complete.
+
+        Items arrive as (template.item_path, validated item). `fields` are further
+        paths to report as they are parsed, e.g. `$.folder_name`; with several calls
+        each call reports its own. With `key`, items are merged as in `gather_items`
+        (per-partition `quotas`, near-duplicates dropped, at most `total`), and the
+        top-up from the surplus follows once every call has finished.
+        """
+        item_path = self.template.item_path
+        merger: Optional[fanout.Merger[Any]] = (
+            fanout.Merger(list(quotas or [None] * len(payloads)), key, total=total) if key else None
+        )
+        several = len(payloads) > 1
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce(index: int, payload: Dict[str, Any]) -> None:
+            error: Optional[Exception] = None
+            try:
+                async with fanout.limit() if several else nullcontext():
+                    async for path, value in self._stream_call(payload, fields, invalid_detail):
+                        queue.put_nowait((index, path, value))
+            except Exception as exc:
+                error = exc
+            finally:
+                queue.put_nowait((index, None, error))
+
+        started = finished = time.perf_counter()
+        tasks = [asyncio.ensure_future(produce(index, payload)) for index, payload in enumerate(payloads)]
+        running = len(tasks)
+        error: Optional[HTTPException] = None
+        outcome = "error"
+        try:
+            while running:
+                index, path, value = await queue.get()
+                if path is None:
+                    running -= 1
+                    finished = time.perf_counter()
+                    if value is None:
+                        continue
+                    if not isinstance(value, HTTPException):
+                        raise value
+                    error = value
+                    self.failed_partitions += 1
+                    if several:
+                        logger.warning(
+                            "Generation partition failed",
+                            extra={
+                                "scene": self.template.scene,
+                                "partition": index,
+                                "status": value.status_code,
+                                "detail": value.detail,
+                            },
+                        )
+                    continue
+                if path != item_path:
+                    yield path, value
+                    continue
+                if merger is None:
+                    added = [value]
+                else:
+                    added = merger.add(index, [value])
+                    self.duplicates_dropped = merger.dropped
+                for item in added:
+                    if self.first_item_seconds is None:
+                        self.first_item_seconds = time.perf_counter() - self._started
+                    yield item_path, item
+            if merger is not None:
+                top_up = merger.finish()
+                self.duplicates_dropped = merger.dropped
+                for item in top_up:
+                    yield item_path, item
+            if error is None or self.failed_partitions < len(tasks):
+                outcome = "ok"
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wall time of the calls; it overlaps whatever the scene does with each item.
+            self._record("dispatch", outcome, finished - started)
+        if outcome == "error" and error is not None:
+            raise error
+
+    # --- validate ---
+
+    def validate(
+        self,
+        data: Dict[str, Any],
+        *,
+        invalid_detail: str,
+        required: Optional[str] = None,
+        empty_detail: str = "",
+        defaults: Optional[Mapping[str, Any]] = None,
+    ) -> T:
+        """Extract and validate the structured reply.
+
+        `defaults` fill missing/empty top-level fields; `required` names a field that
+        must be non-empty, otherwise `empty_detail` is raised as a 502.
+        """
+        with self.stage("validate"):
+            structured = extract_structured_output(data)
+            if not isinstance(structured, dict):
+                structured = {}
+            for key, value in (defaults or {}).items():
+                if not structured.get(key):
+                    structured[key] = value
+            if required and not structured.get(required):
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=empty_detail)
+            try:
+                return self.template.validate(structured)
+            except ValidationError as exc:
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"{invalid_detail}: {exc}")
+
+    # --- persist ---
+
+    def persist(self, write: Callable[[], R]) -> R:
+        """Run `write` and commit once, timed as the persist stage; returns what `write` returns.
+
+        `write` should build its response from `INSERT ... RETURNING` rows (see
+        api.db.bulk) rather than ORM instances, which expire on commit and would reload
+        one SELECT at a time.
+        """
+        with self.stage("persist"):
+            result = write()
+            self.db.commit()
+            return result
+
+    def _context_stats(self) -> Dict[str, Any]:
+        if not self.contexts:
+            return {}
+        stats: Dict[str, Any] = {
+            "input_tokens_est": sum(context.tokens for context in self.contexts),
+            "input_budget": max(context.budget for context in self.contexts),
+            "passages": sum(context.passages for context in self.contexts),
+            "passages_total": sum(context.total_passages for context in self.contexts),
+            "max_output_tokens": sum(self.output_tokens),
+        }
+        if len(self.contexts) > 1:
+            stats.update(
+                partitions=len(self.contexts),
+                partitions_failed=self.failed_partitions,
+                duplicates_dropped=self.duplicates_dropped,
+            )
+        return stats
+
+    def finish(self) -> None:
+        total = time.perf_counter() - self._started
+        logger.info(
+            "Generation finished",
+            extra={
+                "scene": self.template.scene,
+                "total_ms": round(total * 1000, 1),
+                **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+                **self._context_stats(),
+                **(
+                    {"first_item_ms": round(self.first_item_seconds * 1000, 1)}
+                    if self.first_item_seconds is not None
+                    else {}
+                ),
+            },
+        )
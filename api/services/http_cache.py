@@ -0,0 +1,59 @@
+"""ETags, conditional GETs and per-route Cache-Control.
+
+A route computes a strong ETag from a cheap fingerprint query (versions, `updated_at`
+maxima and row counts, never the payload itself) and asks `conditional` whether the
+client's copy is still current:
+
+    @router.get("/{id}", dependencies=[Depends(cache_control(PRIVATE_REVALIDATE))])
+    def get_thing(id, request: Request, response: Response, ...):
+        cached = conditional(request, response, etag(id, version))
+        if cached:
+            return cached
+        ...
+
+A match costs the fingerprint query and a bodiless 304. `no_cache_middleware` only
+adds `no-store` when the route has not set its own Cache-Control.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response, status
+
+# The browser keeps the body but must revalidate before every use.
+PRIVATE_REVALIDATE = "private, no-cache"
+
+_CACHE_HEADERS = ("Cache-Control", "ETag", "Vary")
+
+
+def etag(*parts: Any) -> str:
+    """Strong ETag over `parts` (ids, versions, timestamps, counts, the query string)."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def cache_control(value: str) -> Callable[[Response], None]:
+    """Route dependency that sets `Cache-Control` on the response."""
+
+    def dependency(response: Response) -> None:
+        response.headers["Cache-Control"] = value
+
+    return dependency
+
+
+def _matches(header: str, tag: str) -> bool:
+    # If-None-Match uses the weak comparison (RFC 9110 13.1.2), so W/ prefixes are ignored.
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == tag for candidate in candidates)
+
+
+def conditional(request: Request, response: Response, tag: str) -> Optional[Response]:
+    """Set `ETag` on `response`; returns a 304 to send instead when `If-None-Match` matches."""
+    response.headers["ETag"] = tag
+    header = request.headers.get("if-none-match")
+    if not header or not _matches(header, tag):
+        return None
+    headers = {name: response.headers[name] for name in _CACHE_HEADERS if name in response.headers}
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,165 @@
+"""RFC 6902 JSON Patch applied in Python.
+
+`apply_patch(document, ops)` returns a patched copy of `document`; the input is not
+modified. Only the containers along each op's path are copied, so the cost depends
+on the path length and on what each op touches, not on the size of the document.
+Ops are applied in order and the patch is all-or-nothing: any failure raises before
+a result is returned.
+
+Errors are raised as HTTP errors:
+
+    422  malformed op or a path that does not resolve
+    409  a `test` op whose value does not match (the client's copy is stale)
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Mapping, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+
+def _invalid(message: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid patch: {message}")
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise _invalid(f"path must start with '/': {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: List[Any], token: str, pointer: str, *, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise _invalid(f"bad array index {token!r} in {pointer!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise _invalid(f"array index out of range in {pointer!r}")
+    return index
+
+
+def _child(container: Any, token: str, pointer: str) -> Any:
+    if isinstance(container, dict):
+        if token not in container:
+            raise _invalid(f"path not found: {pointer!r}")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token, pointer, allow_end=False)]
+    raise _invalid(f"path not found: {pointer!r}")
+
+
+def _get(document: Any, tokens: Sequence[str], pointer: str) -> Any:
+    node = document
+    for token in tokens:
+        node = _child(node, token, pointer)
+    return node
+
+
+def _copy(node: Any) -> Any:
+    return dict(node) if isinstance(node, dict) else list(node)
+
+
+def _parent(root: Any, tokens: Sequence[str], pointer: str) -> Tuple[Any, str]:
+    """Copy the containers down to the parent of `tokens` inside `root` (itself a copy); returns the parent."""
+    node = root
+    for token in tokens[:-1]:
+        child = _child(node, token, pointer)
+        if not isinstance(child, (dict, list)):
+            raise _invalid(f"path not found: {pointer!r}")
+        child = _copy(child)
+        if isinstance(node, dict):
+            node[token] = child
+        else:
+            node[int(token)] = child
+        node = child
+    return node, tokens[-1]
+
+
+def _add(root: Any, tokens: Sequence[str], value: Any, pointer: str) -> Any:
+    if not tokens:
+        return value
+    parent, token = _parent(root, tokens, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, token, pointer, allow_end=True), value)
+    else:
+        raise _invalid(f"path not found: {pointer!r}")
+    return root
+
+
+def _remove(root: Any, tokens: Sequence[str], pointer: str) -> Tuple[Any, Any]:
+    """Remove the value at `tokens`; returns (new root, removed value)."""
+    if not tokens:
+        raise _invalid("cannot remove the whole document")
+    parent, token = _parent(root, tokens, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise _invalid(f"path not found: {pointer!r}")
+        return root, parent.pop(token)
+    if isinstance(parent, list):
+        return root, parent.pop(_index(parent, token, pointer, allow_end=False))
+    raise _invalid(f"path not found: {pointer!r}")
+
+
+def _replace(root: Any, tokens: Sequence[str], value: Any, pointer: str) -> Any:
+    if not tokens:
+        return value
+    parent, token = _parent(root, tokens, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise _invalid(f"path not found: {pointer!r}")
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent[_index(parent, token, pointer, allow_end=False)] = value
+    else:
+        raise _invalid(f"path not found: {pointer!r}")
+    return root
+
+
+def _shallow(document: Any) -> Any:
+    return _copy(document) if isinstance(document, (dict, list)) else document
+
+
+def apply_patch(document: Any, ops: Sequence[Mapping[str, Any]]) -> Any:
+    """Apply `ops` (dicts with `op`, `path` and `value`/`from` as needed) and return the new document."""
+    result = _shallow(document)
+    for position, op in enumerate(ops):
+        name = op.get("op")
+        path = op.get("path")
+        if not isinstance(path, str):
+            raise _invalid(f"op {position} has no path")
+        tokens = parse_pointer(path)
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise _invalid(f"op {position} ({name}) has no value")
+        if name in ("move", "copy") and not isinstance(op.get("from"), str):
+            raise _invalid(f"op {position} ({name}) has no from")
+
+        if name == "add":
+            result = _add(result, tokens, op["value"], path)
+        elif name == "remove":
+            result, _ = _remove(result, tokens, path)
+        elif name == "replace":
+            result = _replace(result, tokens, op["value"], path)
+        elif name == "move":
+            source = parse_pointer(op["from"])
+            if tokens[: len(source)] == source and len(tokens) > len(source):
+                raise _invalid(f"op {position} moves a value into itself")
+            result, value = _remove(result, source, op["from"])
+            result = _add(result, tokens, value, path)
+        elif name == "copy":
+            value = _get(result, parse_pointer(op["from"]), op["from"])
+            result = _add(result, tokens, value, path)
+        elif name == "test":
+            if _get(result, tokens, path) != op["value"]:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Patch test failed at {path!r}")
+        else:
+            raise _invalid(f"op {position} has unknown op {name!r}")
+        # A whole-document add/replace/copy may alias the input; keep the root ours to mutate.
+        result = _shallow(result)
+    return result
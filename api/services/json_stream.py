@@ -0,0 +1,321 @@
+"""Incremental JSON parsing for streamed structured output.
+
+The Responses API streams a structured reply as `response.output_text.delta` text
+fragments of one JSON document. `JsonStream` is fed those fragments and returns the
+values found at chosen paths as soon as each one is complete. For example,
+`$.flashcards[*]` returns every card while the rest of the array is still being
+written:
+
+    stream = JsonStream("$.folder_name", "$.flashcards[*]")
+    for delta in deltas:
+        for path, value in stream.feed(delta):
+            ...
+    stream.close()
+
+Paths are `$` followed by `.name` and `[*]` (any array element) or `[n]` segments.
+
+Every character is scanned once. String bodies, whitespace and number/literal runs
+are skipped with a regex search (in C) rather than character by character. Fragments
+are kept only while a value being returned, or a key or literal being read, still
+needs them. Each returned value is then decoded once with `json.loads`. The cost is
+O(total length) however the text is split, and the parser is as strict as
+`json.loads` apart from accepting lone `\\uXXXX` surrogates like it does, and rejecting
+`NaN`/`Infinity`, which are not JSON. `python -m bench.json_stream` fuzzes it against
+`json.loads` and reports throughput.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+Segment = Union[str, int, None]  # object key, array index, or None for [*]
+
+_SEGMENT = re.compile(r"\.([^.\[\]]+)|\[(\*|\d+)\]")
+# Where a string body stops being plain text: its end, an escape, or an invalid control character.
+_STRING_STOP = re.compile(r'["\\\x00-\x1f]')
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SCALAR_RUN = re.compile(r"[-+.0-9a-zA-Z]*")
+_SCALAR = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null")
+_SCALAR_START = frozenset("-0123456789tfn")
+_HEX = frozenset("0123456789abcdefABCDEF")
+_ESCAPES = frozenset('"\\/bfnrt')
+
+# Container states: what the next significant character may be.
+_KEY_OR_END = 0  # after "{"
+_KEY = 1  # after "," in an object
+_COLON = 2
+_VALUE = 3  # after ":" or "," in an array
+_VALUE_OR_END = 4  # after "["
+_COMMA_OR_END = 5
+
+# String escape states: none, right after a backslash, or 1-4 hex digits of \uXXXX to go.
+_NO_ESCAPE = 0
+_AFTER_BACKSLASH = -1
+
+
+class JsonStreamError(ValueError):
+    """The text is not (the start of) a well-formed JSON document."""
+
+
+def parse_path(path: str) -> Tuple[Segment, ...]:
+    """`$.a.b[*]` -> ("a", "b", None)."""
+    if not path.startswith("$"):
+        raise ValueError(f"JSON path must start with '$': {path!r}")
+    segments: List[Segment] = []
+    position = 1
+    while position < len(path):
+        match = _SEGMENT.match(path, position)
+        if match is None:
+            raise ValueError(f"Unsupported JSON path: {path!r}")
+        name, index = match.groups()
+        segments.append(name if name is not None else (None if index == "*" else int(index)))
+        position = match.end()
+    return tuple(segments)
+
+
+class _Container:
+    __slots__ = ("is_object", "key", "state")
+
+    def __init__(self, is_object: bool) -> None:
+        self.is_object = is_object
+        # Current key (objects) or element index (arrays).
+        self.key: Union[str, int, None] = None if is_object else 0
+        self.state = _KEY_OR_END if is_object else _VALUE_OR_END
+
+
+class JsonStream:
+    """Parses one JSON document fed in pieces; `feed` returns (path, value) for each completed match.
+
+    Offsets below are absolute positions in the whole document.
+    """
+
+    def __init__(self, *paths: str) -> None:
+        self.paths = paths
+        self._targets: Sequence[Tuple[str, Tuple[Segment, ...]]] = [(path, parse_path(path)) for path in paths]
+        self._depths = {len(segments) for _, segments in self._targets}
+        self._stack: List[_Container] = []
+        self._done = False
+        # Retained fragments; `_kept_from` is the offset of the first one.
+        self._chunks: List[str] = []
+        self._kept_from = 0
+        self._length = 0
+        self._string_start: Optional[int] = None
+        self._string_is_key = False
+        self._string_escaped = False
+        self._escape = _NO_ESCAPE
+        self._scalar_start: Optional[int] = None
+        # (path, start offset, depth) of values being returned, innermost last.
+        self._captures: List[Tuple[str, int, int]] = []
+        self._found: List[Tuple[str, Any]] = []
+
+    # --- retained text ---
+
+    def _text(self, start: int, end: int) -> str:
+        # Join only the fragments the slice spans, counting back from the newest.
+        pieces: List[str] = []
+        offset = self._length
+        for chunk in reversed(self._chunks):
+            offset -= len(chunk)
+            pieces.append(chunk)
+            if offset <= start:
+                break
+        joined = pieces[0] if len(pieces) == 1 else "".join(reversed(pieces))
+        return joined[start - offset : end - offset]
+
+    def _trim(self) -> None:
+        """Drop fragments no open capture, string or literal still needs."""
+        keep = self._length
+        if self._captures:
+            keep = self._captures[0][1]
+        if self._string_start is not None:
+            keep = min(keep, self._string_start)
+        if self._scalar_start is not None:
+            keep = min(keep, self._scalar_start)
+        if keep == self._length:
+            self._chunks = []
+            self._kept_from = keep
+            return
+        dropped = 0
+        while self._kept_from + len(self._chunks[dropped]) <= keep:
+            self._kept_from += len(self._chunks[dropped])
+            dropped += 1
+        if dropped:
+            del self._chunks[:dropped]
+
+    # --- values ---
+
+    def _match(self) -> Optional[str]:
+        depth = len(self._stack)
+        if depth not in self._depths:
+            return None
+        for path, segments in self._targets:
+            if len(segments) != depth:
+                continue
+            for segment, container in zip(segments, self._stack):
+                if segment is None:
+                    if container.is_object:
+                        break
+                elif segment != container.key:
+                    break
+            else:
+                return path
+        return None
+
+    def _begin_value(self, start: int) -> None:
+        if self._stack:
+            if self._stack[-1].state not in (_VALUE, _VALUE_OR_END):
+                raise JsonStreamError(f"Unexpected value at offset {start}")
+        elif self._done:
+            raise JsonStreamError(f"Extra data at offset {start}")
+        path = self._match()
+        if path is not None:
+            self._captures.append((path, start, len(self._stack)))
+
+    def _end_value(self, end: int) -> None:
+        depth = len(self._stack)
+        if self._captures and self._captures[-1][2] == depth:
+            path, start, _ = self._captures.pop()
+            try:
+                self._found.append((path, json.loads(self._text(start, end))))
+            except ValueError as exc:  # e.g. an integer beyond sys.get_int_max_str_digits()
+                raise JsonStreamError(str(exc)) from exc
+        if self._stack:
+            self._stack[-1].state = _COMMA_OR_END
+        else:
+            self._done = True
+
+    def _end_string(self, end: int) -> None:
+        start = self._string_start
+        self._string_start = None
+        if not self._string_is_key:
+            self._end_value(end)
+            return
+        raw = self._text(start + 1, end - 1)
+        container = self._stack[-1]
+        try:
+            container.key = json.loads(f'"{raw}"') if self._string_escaped else raw
+        except ValueError as exc:
+            raise JsonStreamError(str(exc)) from exc
+        container.state = _COLON
+
+    def _end_scalar(self, end: int) -> None:
+        start = self._scalar_start
+        self._scalar_start = None
+        literal = self._text(start, end)
+        if _SCALAR.fullmatch(literal) is None:
+            raise JsonStreamError(f"Invalid literal {literal!r} at offset {start}")
+        self._end_value(end)
+
+    # --- scanning ---
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume the next piece of the document; returns the matches it completed."""
+        base = self._length
+        self._chunks.append(text)
+        self._length += len(text)
+        position = 0
+        length = len(text)
+        while position < length:
+            if self._string_start is not None:
+                if self._escape:
+                    char = text[position]
+                    if self._escape == _AFTER_BACKSLASH:
+                        if char == "u":
+                            self._escape = 4
+                        elif char in _ESCAPES:
+                            self._escape = _NO_ESCAPE
+                        else:
+                            raise JsonStreamError(f"Invalid escape at offset {base + position}")
+                    elif char in _HEX:
+                        self._escape -= 1
+                    else:
+                        raise JsonStreamError(f"Invalid \\u escape at offset {base + position}")
+                    position += 1
+                    continue
+                match = _STRING_STOP.search(text, position)
+                if match is None:
+                    break
+                position = match.start()
+                char = text[position]
+                if char == '"':
+                    self._end_string(base + position + 1)
+                elif char == "\\":
+                    self._string_escaped = True
+                    # Most escapes arrive whole; only one split across fragments goes through `_escape`.
+                    following = text[position + 1 : position + 2]
+                    if following in _ESCAPES:
+                        position += 2
+                        continue
+                    if following == "u" and position + 6 <= length and _HEX.issuperset(text[position + 2 : position + 6]):
+                        position += 6
+                        continue
+                    self._escape = _AFTER_BACKSLASH
+                else:
+                    raise JsonStreamError(f"Control character in string at offset {base + position}")
+                position += 1
+                continue
+
+            if self._scalar_start is not None:
+                position = _SCALAR_RUN.match(text, position).end()
+                if position == length:
+                    break
+                self._end_scalar(base + position)
+
+            char = text[position]
+            if char in " \t\r\n":
+                position = _WHITESPACE.match(text, position).end()
+                continue
+            container = self._stack[-1] if self._stack else None
+            if char == '"':
+                if container is not None and container.is_object and container.state in (_KEY_OR_END, _KEY):
+                    self._string_is_key = True
+                else:
+                    self._begin_value(base + position)
+                    self._string_is_key = False
+                self._string_start = base + position
+                self._string_escaped = False
+            elif char == "{" or char == "[":
+                self._begin_value(base + position)
+                self._stack.append(_Container(char == "{"))
+            elif char == "}" or char == "]":
+                if (
+                    container is None
+                    or container.is_object != (char == "}")
+                    or container.state not in (_KEY_OR_END, _VALUE_OR_END, _COMMA_OR_END)
+                ):
+                    raise JsonStreamError(f"Unexpected {char!r} at offset {base + position}")
+                self._stack.pop()
+                self._end_value(base + position + 1)
+            elif char == ":":
+                if container is None or container.state != _COLON:
+                    raise JsonStreamError(f"Unexpected ':' at offset {base + position}")
+                container.state = _VALUE
+            elif char == ",":
+                if container is None or container.state != _COMMA_OR_END:
+                    raise JsonStreamError(f"Unexpected ',' at offset {base + position}")
+                if container.is_object:
+                    container.state = _KEY
+                else:
+                    container.key += 1  # type: ignore[operator]
+                    container.state = _VALUE
+            elif char in _SCALAR_START:
+                self._begin_value(base + position)
+                self._scalar_start = base + position
+            else:
+                raise JsonStreamError(f"Unexpected {char!r} at offset {base + position}")
+            position += 1
+
+        self._trim()
+        found, self._found = self._found, []
+        return found
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """End of input; returns any last match, raises JsonStreamError if the document is incomplete."""
+        if self._scalar_start is not None and not self._stack:
+            self._end_scalar(self._length)
+        if not self._done:
+            raise JsonStreamError("Incomplete JSON document")
+        found, self._found = self._found, []
+        return found
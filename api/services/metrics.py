@@ -0,0 +1,297 @@
+"""Lightweight Prometheus-style metrics with lock-free hot-path writes.
+
+Each metric keeps one shard per writer thread, so `inc`/`observe` never take a
+lock: a shard only ever has one writer, and shards are summed at scrape time.
+Shards of threads that have exited are folded into a retired shard on scrape.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import weakref
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; covers fast DB-only routes through long model generations.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+class _ShardSet:
+    """Per-thread dicts of label values -> mutable cells."""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live: List[Tuple[weakref.ref, Dict[LabelValues, List[float]]]] = []
+        self._retired: Dict[LabelValues, List[float]] = {}
+
+    def local(self) -> Dict[LabelValues, List[float]]:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells: Dict[LabelValues, List[float]] = {}
+            with self._lock:
+                self._live.append((weakref.ref(threading.current_thread()), cells))
+            self._local.cells = cells
+            return cells
+
+    def merged(self) -> Dict[LabelValues, List[float]]:
+        with self._lock:
+            alive = []
+            for thread_ref, cells in self._live:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    _merge_into(self._retired, cells)
+                else:
+                    alive.append((thread_ref, cells))
+            self._live = alive
+            total: Dict[LabelValues, List[float]] = {}
+            _merge_into(total, self._retired)
+            for _, cells in alive:
+                # Copy the keys first: the owning thread may add a label set concurrently.
+                _merge_into(total, dict(cells))
+            return total
+
+
+def _merge_into(target: Dict[LabelValues, List[float]], source: Dict[LabelValues, List[float]]) -> None:
+    for labels, values in source.items():
+        existing = target.get(labels)
+        if existing is None:
+            target[labels] = list(values)
+        else:
+            for i, value in enumerate(values):
+                existing[i] += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = _ShardSet()
+        REGISTRY.register(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        cells = self._shards.local()
+        cell = cells.get(labels)
+        if cell is None:
+            cells[labels] = [amount]
+        else:
+            cell[0] += amount
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for labels, (value,) in sorted(self._shards.merged().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Up/down gauge; increments and decrements may happen on different threads."""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # Cell layout: one slot per bucket, then +Inf, then sum.
+        self._width = len(self.buckets) + 2
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, *labels: str) -> None:
+        cells = self._shards.local()
+        cell = cells.get(labels)
+        if cell is None:
+            cell = cells[labels] = [0.0] * self._width
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for labels, cell in sorted(self._shards.merged().items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, cell):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}"
+                )
+            cumulative += cell[-2]
+            label_str = _format_labels(self.labelnames, labels)
+            inf_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{label_str} {_format_value(cell[-1])}")
+            lines.append(f"{self.name}_count{label_str} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Register a callback producing exposition lines at scrape time (e.g. pool gauges)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Application metrics ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    ("method",),
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Model provider call latency by scene, model key and outcome.",
+    ("scene", "model_key", "outcome"),
+)
+UPSTREAM_TIME_TO_FIRST_TOKEN = Histogram(
+    "upstream_time_to_first_token_seconds",
+    "Time from dispatch to the first streamed output token.",
+    ("scene", "model_key"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 40.0),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while handling a request.",
+    ("route",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent in SQL statements while handling a request.",
+    ("route",),
+)
+DB_QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded_total",
+    "Requests that executed more queries than their declared budget.",
+    ("route",),
+)
+
+GENERATION_STAGE_DURATION = Histogram(
+    "generation_stage_seconds",
+    "Time spent in each stage of the structured generation pipeline.",
+    ("scene", "stage", "outcome"),
+)
+
+
+def observe_upstream(scene: str, model_key: str, outcome: str, seconds: float) -> None:
+    UPSTREAM_REQUEST_DURATION.observe(seconds, scene or "unknown", model_key or "unknown", outcome)
+
+
+def observe_time_to_first_token(scene: str, model_key: str, seconds: float) -> None:
+    UPSTREAM_TIME_TO_FIRST_TOKEN.observe(seconds, scene or "unknown", model_key or "unknown")
+
+
+def observe_generation_stage(scene: str, stage: str, outcome: str, seconds: float) -> None:
+    GENERATION_STAGE_DURATION.observe(seconds, scene or "unknown", stage, outcome)
+
+
+def _db_pool_lines() -> List[str]:
+    from api.db.database import engine
+
+    pool = engine.pool
+    lines: List[str] = []
+    for name, attr, doc in (
+        ("db_pool_size", "size", "Configured connection pool size."),
+        ("db_pool_checked_out", "checkedout", "Connections currently checked out of the pool."),
+        ("db_pool_checked_in", "checkedin", "Idle connections held by the pool."),
+        ("db_pool_overflow", "overflow", "Connections opened beyond the pool size."),
+    ):
+        getter = getattr(pool, attr, None)
+        if not callable(getter):
+            continue
+        lines.extend([f"# HELP {name} {doc}", f"# TYPE {name} gauge", f"{name} {_format_value(float(getter()))}"])
+    return lines
+
+
+def _log_queue_lines() -> List[str]:
+    from api.services.app_logging import dropped_records
+
+    name = "log_records_dropped_total"
+    return [
+        f"# HELP {name} Log records dropped because the logging queue was full.",
+        f"# TYPE {name} counter",
+        f"{name} {dropped_records()}",
+    ]
+
+
+REGISTRY.register_collector(_db_pool_lines)
+REGISTRY.register_collector(_log_queue_lines)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
@@ -2,18 +2,32 @@ from __future__ import annotations
 
 import inspect
 import json
+import time
+import uuid
 from contextlib import asynccontextmanager, contextmanager
 from typing import Any, AsyncIterator, Dict, Iterator, Optional
 
 import httpx
 from openai import APIStatusError, AsyncOpenAI, OpenAI
 
+from api.services import metrics, usage
+from api.services.ai_registry import model_key_for
 from api.services.utils import get_proxy
 from api.settings import settings
 
 OPENAI_REALTIME_TRANSCRIBE_URL = "wss://api.openai.com/v1/realtime?intent=transcription"
 
 
+def realtime_transcribe_url() -> str:
+    """Realtime transcription endpoint, following OPENAI_BASE_URL when it is set."""
+    base = (settings.OPENAI_BASE_URL or "").rstrip("/")
+    if not base:
+        return OPENAI_REALTIME_TRANSCRIBE_URL
+    if base.startswith("http"):
+        base = "ws" + base[len("http"):]
+    return f"{base}/realtime?intent=transcription"
+
+
 def _ensure_api_key() -> str:
     if not settings.API_KEY:
         raise RuntimeError("Missing API_KEY. Set it in api/.env (API_KEY=sk-...)")
@@ -44,7 +58,7 @@ def _sync_http_client(timeout: float) -> httpx.Client:
 async def _async_client(timeout: float = 120.0) -> AsyncIterator[AsyncOpenAI]:
     api_key = _ensure_api_key()
     http_client = _async_http_client(timeout)
-    client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+    client = AsyncOpenAI(api_key=api_key, http_client=http_client, base_url=settings.OPENAI_BASE_URL)
     try:
         yield client
     finally:
@@ -55,7 +69,7 @@ async def _async_client(timeout: float = 120.0) -> AsyncIterator[AsyncOpenAI]:
 def _sync_client(timeout: float = 60.0) -> Iterator[OpenAI]:
     api_key = _ensure_api_key()
     http_client = _sync_http_client(timeout)
-    client = OpenAI(api_key=api_key, http_client=http_client)
+    client = OpenAI(api_key=api_key, http_client=http_client, base_url=settings.OPENAI_BASE_URL)
     try:
         yield client
     finally:
@@ -81,28 +95,64 @@ def _event_to_json(data: Any) -> str:
 
 # --- Responses API ---
 
-async def responses_stream(payload: Optional[Dict[str, Any]] = None, **kwargs: Any) -> AsyncIterator[str]:
+_FIRST_TOKEN_EVENT = "response.output_text.delta"
+# Terminal stream events carry the final response object, including `usage`.
+_USAGE_EVENTS = frozenset({"response.completed", "response.incomplete", "response.failed"})
+
+
+async def responses_stream(
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    scene: str = "chat",
+    user_id: Optional[uuid.UUID] = None,
+    **kwargs: Any,
+) -> AsyncIterator[str]:
     data = {**(payload or {}), **kwargs}
     data.pop("stream", None)
+    model_key = model_key_for(data.get("model"))
+    await usage.enforce_quota(user_id)
+    started = time.perf_counter()
+    outcome = "error"
 
     async with _async_client() as client:
         try:
             stream = await client.responses.create(stream=True, **data)
         except Exception as exc:
+            metrics.observe_upstream(scene, model_key, outcome, time.perf_counter() - started)
             raise RuntimeError(f"OpenAI responses stream failed: {exc}") from exc
 
         closer = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+        first_token_seen = False
         try:
             async for event in stream:  # type: ignore[async-iterator]
+                event_type = getattr(event, "type", None)
+                if not first_token_seen and event_type == _FIRST_TOKEN_EVENT:
+                    first_token_seen = True
+                    metrics.observe_time_to_first_token(scene, model_key, time.perf_counter() - started)
+                elif event_type in _USAGE_EVENTS:
+                    response_obj = getattr(event, "response", None)
+                    usage.record_usage(user_id, scene, model_key, getattr(response_obj, "usage", None))
                 yield _event_to_json(event)
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "cancelled"
+            raise
         finally:
+            metrics.observe_upstream(scene, model_key, outcome, time.perf_counter() - started)
             if callable(closer):
                 result = closer()
                 if inspect.isawaitable(result):
                     await result
 
 
-async def responses_complete(payload: Optional[Dict[str, Any]] = None, *, timeout: float = 60.0, **kwargs: Any) -> Dict[str, Any]:
+async def responses_complete(
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    timeout: float = 60.0,
+    scene: str = "chat",
+    user_id: Optional[uuid.UUID] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
     """
     Call the OpenAI Responses API once and return the parsed JSON body.
     Forces non-streaming mode so callers get the full reply in one shot.
@@ -110,17 +160,24 @@ async def responses_complete(payload: Optional[Dict[str, Any]] = None, *, timeou
     data = {**(payload or {}), **kwargs}
     data.pop("stream", None)
     data.setdefault("stream", False)
+    model_key = model_key_for(data.get("model"))
+    await usage.enforce_quota(user_id)
+    started = time.perf_counter()
 
     async with _async_client(timeout=timeout) as client:
         try:
             response = await client.responses.create(**data)
         except Exception as exc:
+            metrics.observe_upstream(scene, model_key, "error", time.perf_counter() - started)
             raise RuntimeError(f"OpenAI responses request failed: {exc}") from exc
+    metrics.observe_upstream(scene, model_key, "ok", time.perf_counter() - started)
 
     try:
-        return response.model_dump()
+        body = response.model_dump()
     except Exception as exc:
         raise RuntimeError("Failed to parse OpenAI responses payload") from exc
+    usage.record_usage(user_id, scene, model_key, body.get("usage"))
+    return body
 
 
 def _audio_extra_body(
@@ -160,6 +217,8 @@ async def transcribe_audio(
     timeout: float = 120.0,
 ) -> Dict[str, Any]:
     extra_body = _audio_extra_body(include, timestamp_granularities, stream=False) or None
+    model_key = model_key_for(model)
+    started = time.perf_counter()
 
     async with _async_client(timeout=timeout) as client:
         try:
@@ -173,7 +232,9 @@ async def transcribe_audio(
                 extra_body=extra_body,
             )
         except Exception as exc:
+            metrics.observe_upstream("audioTranscribe", model_key, "error", time.perf_counter() - started)
             raise RuntimeError(f"OpenAI audio transcription failed: {exc}") from exc
+    metrics.observe_upstream("audioTranscribe", model_key, "ok", time.perf_counter() - started)
 
     raw: Dict[str, Any] | None = None
     text_result: Optional[str] = None
@@ -182,6 +243,7 @@ async def transcribe_audio(
         text_candidate = raw.get("text")
         if isinstance(text_candidate, str):
             text_result = text_candidate
+        usage.record_usage(None, "audioTranscribe", model_key, raw.get("usage"))
     except Exception:
         pass
 
@@ -212,7 +274,9 @@ async def stream_audio_transcription(
 ) -> AsyncIterator[str]:
     extra_body = _audio_extra_body(include, timestamp_granularities, stream=True) or None
     http_client = _async_http_client(timeout)
-    client = AsyncOpenAI(api_key=_ensure_api_key(), http_client=http_client)
+    client = AsyncOpenAI(api_key=_ensure_api_key(), http_client=http_client, base_url=settings.OPENAI_BASE_URL)
+    model_key = model_key_for(model)
+    started = time.perf_counter()
 
     try:
         response = await client.audio.transcriptions.with_streaming_response.create(
@@ -226,7 +290,9 @@ async def stream_audio_transcription(
         )
     except Exception as exc:
         await http_client.aclose()
+        metrics.observe_upstream("audioTranscribe", model_key, "error", time.perf_counter() - started)
         raise RuntimeError(f"OpenAI audio transcription stream failed: {exc}") from exc
+    metrics.observe_time_to_first_token("audioTranscribe", model_key, time.perf_counter() - started)
 
     async def _iterate() -> AsyncIterator[str]:
         try:
@@ -262,6 +328,7 @@ async def stream_audio_transcription(
                 if inspect.isawaitable(res):
                     await res
             await http_client.aclose()
+            metrics.observe_upstream("audioTranscribe", model_key, "ok", time.perf_counter() - started)
 
     async for chunk in _iterate():
         yield chunk
@@ -400,7 +467,7 @@ async def stream_file_content(
     timeout: float = 120.0,
 ) -> tuple[AsyncIterator[bytes], str]:
     http_client = _async_http_client(timeout)
-    client = AsyncOpenAI(api_key=_ensure_api_key(), http_client=http_client)
+    client = AsyncOpenAI(api_key=_ensure_api_key(), http_client=http_client, base_url=settings.OPENAI_BASE_URL)
     try:
         response = await client.files.content(file_id)
     except Exception as exc:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import json
+from typing import Any, Dict, List, Optional, Sequence
 
 from fastapi import HTTPException
 
@@ -8,27 +9,87 @@ from api.settings import settings
 from api.services.ai_registry import resolve_model_key, resolve_model_value, resolve_tools
 
 
+def _has_text(value: str) -> bool:
+    # Same truth value as `value.strip()`, without copying long model outputs.
+    return bool(value) and not value.isspace()
+
+
 def _coerce_str_list(value: Any) -> List[str]:
     if value is None:
         return []
     if isinstance(value, str):
-        return [value.strip()] if value.strip() else []
+        cleaned = value.strip()
+        return [cleaned] if cleaned else []
     if isinstance(value, list):
         out: List[str] = []
         for item in value:
-            if isinstance(item, str) and item.strip():
-                out.append(item.strip())
+            if isinstance(item, str):
+                cleaned = item.strip()
+                if cleaned:
+                    out.append(cleaned)
         return out
     return []
 
 
-def build_responses_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
+def chat_query_text(raw: Dict[str, Any]) -> str:
+    """The user's question in a chat payload: `text`/`message`, or the last user `input_text`."""
+    text = str(raw.get("text") or raw.get("message") or "").strip()
+    if text or not isinstance(raw.get("input"), list):
+        return text
+    for block in reversed(raw["input"]):
+        if isinstance(block, dict) and block.get("role") == "user":
+            content = block.get("content")
+            if isinstance(content, str):
+                return content.strip()
+            if isinstance(content, list):
+                return "\n".join(
+                    part["text"]
+                    for part in content
+                    if isinstance(part, dict) and part.get("type") == "input_text" and isinstance(part.get("text"), str)
+                ).strip()
+    return ""
+
+
+def _without_file_search(tools: List[Dict[str, Any]], includes: set) -> List[Dict[str, Any]]:
+    # Local retrieval replaces the hosted tool for this turn.
+    includes.difference_update({item for item in includes if item.startswith("file_search_call")})
+    return [tool for tool in tools if tool.get("type") != "file_search"]
+
+
+def _with_context(input_value: Any, context: Sequence[Dict[str, Any]]) -> List[Any]:
+    """Append `context` to the last user message (copied), or add a user message for it."""
+    if isinstance(input_value, str):
+        return [{"role": "user", "content": [{"type": "input_text", "text": input_value}, *context]}]
+    blocks = list(input_value or [])
+    for index in range(len(blocks) - 1, -1, -1):
+        block = blocks[index]
+        if isinstance(block, dict) and block.get("role") == "user":
+            content = block.get("content")
+            if isinstance(content, str):
+                content = [{"type": "input_text", "text": content}]
+            blocks[index] = {**block, "content": [*(content or []), *context]}
+            return blocks
+    blocks.append({"role": "user", "content": list(context)})
+    return blocks
+
+
+def build_responses_payload(
+    raw: Dict[str, Any], context: Optional[Sequence[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
     """
     Normalize a simplified payload into the OpenAI Responses API schema.
     If `input` already exists, it will be returned as-is (with minimal decoration).
+
+    `context` holds `input_text` blocks from local retrieval (api.services.retrieval).
+    They are appended to the user's message, and the `file_search` tool is dropped
+    for the turn. An empty list still drops the tool.
     """
     if "input" in raw:
         payload = dict(raw)
+        payload.pop("notebook_id", None)
+        payload.pop("notebookId", None)
+        if context:
+            payload["input"] = _with_context(payload["input"], context)
         raw_tool_keys = payload.get("tool_keys") if "tool_keys" in payload else payload.get("toolKeys")
         tool_keys = _coerce_str_list(raw_tool_keys)
         tool_overrides = payload.get("tool_overrides") or payload.get("toolOverrides")
@@ -57,8 +118,11 @@ def build_responses_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
             overrides=tool_overrides,
         )
         if tools:
-            payload["tools"] = tools
             include_set.update(tool_includes)
+            if context is not None:
+                tools = _without_file_search(tools, include_set)
+        if tools:
+            payload["tools"] = tools
 
         if include_set:
             payload["include"] = list(include_set)
@@ -100,10 +164,12 @@ def build_responses_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
         if isinstance(file_id, str) and file_id.strip():
             user_content.append({"type": "input_file", "file_id": file_id.strip()})
         file_text = f.get("text")
-        if isinstance(file_text, str) and file_text.strip():
+        if isinstance(file_text, str) and _has_text(file_text):
             name = f.get("name") or "file"
             label = f"[截断] {name}" if f.get("truncated") else str(name)
             user_content.append({"type": "input_text", "text": f"【文件：{label}】\n{file_text}"})
+    if context:
+        user_content.extend(context)
 
     if not user_content and not input_blocks:
         raise ValueError("请求体缺少内容")
@@ -118,6 +184,8 @@ def build_responses_payload(raw: Dict[str, Any]) -> Dict[str, Any]:
         overrides=tool_overrides,
     )
     include_set.update(tool_includes)
+    if context is not None:
+        tools = _without_file_search(tools, include_set)
 
     model_info = resolve_model_key(model_key, default_key=settings.AI_MODEL_DEFAULTS.get("chat"))
     payload: Dict[str, Any] = {
@@ -164,11 +232,11 @@ def extract_text_from_response(payload: dict) -> str:
     if isinstance(output_text, list):
         for item in output_text:
             text_val = _coerce_text_value(item)
-            if text_val.strip():
+            if _has_text(text_val):
                 return text_val
     else:
         text_val = _coerce_text_value(output_text)
-        if text_val.strip():
+        if _has_text(text_val):
             return text_val
 
     output = payload.get("output") or []
@@ -177,19 +245,19 @@ def extract_text_from_response(payload: dict) -> str:
             if not isinstance(item, dict):
                 continue
             text_val = _coerce_text_value(item.get("text"))
-            if text_val.strip():
+            if _has_text(text_val):
                 return text_val
             content_list = item.get("content") or []
             if isinstance(content_list, dict):
                 text_val = _coerce_text_value(content_list)
-                if text_val.strip():
+                if _has_text(text_val):
                     return text_val
             elif isinstance(content_list, list):
                 for content in content_list:
                     if not isinstance(content, dict):
                         continue
                     text_val = _coerce_text_value(content)
-                    if text_val.strip():
+                    if _has_text(text_val):
                         return text_val
     return ""
 
@@ -236,10 +304,8 @@ def extract_structured_output(payload: dict) -> dict:
                     if isinstance(json_val, dict):
                         return json_val
                     text_val = content.get("text")
-                    if isinstance(text_val, str) and text_val.strip():
+                    if isinstance(text_val, str) and _has_text(text_val):
                         try:
-                            import json
-
                             return json.loads(text_val)
                         except Exception:
                             continue
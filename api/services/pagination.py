@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination and text filters for list endpoints.
+
+A `Keyset` is the ORDER BY of a listing. It ends in a unique column (`id`), so the
+order is total. A cursor is an opaque, URL-safe encoding of the last row's key. The
+next page is `WHERE (sort, id) < (:sort, :id)` (`>` when ascending). Each keyset is
+backed by a composite index that starts with `user_id`, so a page is one index range
+scan whatever its depth.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy import ColumnElement, Select, literal, or_, tuple_
+
+RowT = TypeVar("RowT")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _decode_value(column: Any, raw: Any) -> Any:
+    # Cursors come from clients: anything but the JSON type `_encode_value` writes is invalid.
+    python_type = column.type.python_type
+    if python_type in (int, float):
+        if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+            raise ValueError("cursor value is not a number")
+        return python_type(raw)
+    if not isinstance(raw, str):
+        raise ValueError("cursor value is not a string")
+    if python_type is datetime:
+        return datetime.fromisoformat(raw)
+    if python_type is uuid.UUID:
+        return uuid.UUID(raw)
+    return python_type(raw)
+
+
+@dataclass(frozen=True)
+class Keyset:
+    columns: Tuple[Any, ...]
+    descending: bool = False
+
+    def encode(self, row: Any) -> str:
+        key = [_encode_value(getattr(row, column.key)) for column in self.columns]
+        return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).rstrip(b"=").decode()
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(raw, list) or len(raw) != len(self.columns):
+                raise ValueError("cursor length mismatch")
+            return [_decode_value(column, value) for column, value in zip(self.columns, raw)]
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    def apply(self, stmt: Select, cursor: Optional[str], limit: Optional[int]) -> Select:
+        """Order `stmt` by the keyset, start after `cursor`, and fetch one row past `limit`."""
+        stmt = stmt.order_by(*(column.desc() if self.descending else column.asc() for column in self.columns))
+        if cursor:
+            key = tuple_(*self.columns)
+            bound = tuple_(
+                *(literal(value, column.type) for column, value in zip(self.columns, self.decode(cursor)))
+            )
+            stmt = stmt.where(key < bound if self.descending else key > bound)
+        if limit is not None:
+            stmt = stmt.limit(limit + 1)
+        return stmt
+
+    def page(self, rows: Sequence[RowT], limit: Optional[int]) -> Tuple[Sequence[RowT], Optional[str]]:
+        """Trim the look-ahead row; returns the page and the cursor for the next one (None when done)."""
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.encode(rows[-1])
+
+
+def text_filter(columns: Sequence[Any], text: str) -> ColumnElement[bool]:
+    """Case-insensitive substring match of `text` against any of `columns`."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return or_(*(column.ilike(f"%{escaped}%", escape="\\") for column in columns))
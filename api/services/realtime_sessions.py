@@ -0,0 +1,139 @@
+"""In-memory state for resumable realtime transcription bridges."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from api.settings import settings
+
+
+class AudioRingBuffer:
+    """Bounded FIFO of `input_audio_buffer.append` frames awaiting an upstream commit."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self._frames: Deque[str] = deque()
+        self._size = 0
+
+    def append(self, frame: str) -> None:
+        if self.max_bytes <= 0:
+            return
+        self._frames.append(frame)
+        self._size += len(frame)
+        # Drop the oldest audio first; replay only needs the most recent window.
+        while self._size > self.max_bytes and self._frames:
+            self._size -= len(self._frames.popleft())
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self._size = 0
+
+    def snapshot(self) -> List[str]:
+        return list(self._frames)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+def audio_buffer_bytes(sample_rate: int) -> int:
+    # pcm16 mono is 2 bytes/sample; base64 inflates it by 4/3 plus the JSON envelope.
+    seconds = max(0.0, settings.REALTIME_AUDIO_BUFFER_SECONDS)
+    return int(sample_rate * 2 * seconds * 4 / 3) + 4096
+
+
+@dataclass
+class RealtimeSession:
+    id: str
+    session_update: Dict[str, Any]
+    model: str
+    sample_rate: int
+    buffer: AudioRingBuffer
+    user_id: Optional[uuid.UUID] = None
+    attachment_id: Optional[uuid.UUID] = None
+    transcription_session_id: Optional[uuid.UUID] = None
+    language: Optional[str] = None
+    next_seq: int = 0
+    persisted_items: set[str] = field(default_factory=set)
+    # Segment writes not yet committed; finalisation waits for them.
+    pending_writes: set[asyncio.Task] = field(default_factory=set)
+    started_at: float = field(default_factory=time.monotonic)
+    detached_at: Optional[float] = None
+    attached: bool = False
+
+    def elapsed_seconds(self) -> int:
+        return int(time.monotonic() - self.started_at)
+
+    def claim_seq(self) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+
+_SESSIONS: Dict[str, RealtimeSession] = {}
+
+
+def purge_expired(now: Optional[float] = None) -> List[RealtimeSession]:
+    """Drop detached sessions whose resume window elapsed and return them for finalisation."""
+    now = time.monotonic() if now is None else now
+    ttl = settings.REALTIME_RESUME_TTL_SECONDS
+    expired = [
+        session
+        for session in _SESSIONS.values()
+        if not session.attached and session.detached_at is not None and now - session.detached_at > ttl
+    ]
+    for session in expired:
+        _SESSIONS.pop(session.id, None)
+    return expired
+
+
+def create_session(
+    *,
+    session_update: Dict[str, Any],
+    model: str,
+    sample_rate: int,
+    language: Optional[str] = None,
+) -> RealtimeSession:
+    session = RealtimeSession(
+        id=uuid.uuid4().hex,
+        session_update=session_update,
+        model=model,
+        sample_rate=sample_rate,
+        language=language,
+        buffer=AudioRingBuffer(audio_buffer_bytes(sample_rate)),
+        attached=True,
+    )
+    _SESSIONS[session.id] = session
+    return session
+
+
+def resume_session(session_id: Optional[str], *, user_id: Optional[uuid.UUID]) -> Optional[RealtimeSession]:
+    """Re-attach a detached session; returns None if unknown, expired, busy, or owned by someone else."""
+    if not session_id:
+        return None
+    session = _SESSIONS.get(session_id.strip())
+    if session is None or session.attached:
+        return None
+    if session.user_id is not None and session.user_id != user_id:
+        return None
+    ttl = settings.REALTIME_RESUME_TTL_SECONDS
+    if session.detached_at is not None and time.monotonic() - session.detached_at > ttl:
+        _SESSIONS.pop(session.id, None)
+        return None
+    session.attached = True
+    session.detached_at = None
+    return session
+
+
+def detach_session(session: RealtimeSession) -> None:
+    """Keep the session resumable after the browser socket goes away."""
+    session.attached = False
+    session.detached_at = time.monotonic()
+
+
+def discard_session(session: RealtimeSession) -> None:
+    _SESSIONS.pop(session.id, None)
@@ -0,0 +1,441 @@
+"""Local retrieval over notebook materials: BM25, optionally fused with hashed n-gram vectors.
+
+Notebooks whose `retrieval_mode` is `bm25` or `hybrid` answer chat turns from their
+own index instead of the hosted `file_search` tool. The top chunks are sent to the
+model as `input_text` blocks, so there is no remote retrieval hop and nothing expires.
+
+    sources   note title + content, attachment summary + extracted text, transcript full text
+    chunks    retrieval_chunks: ~CHUNK_CHARS passages cut at paragraph/sentence breaks
+              (attachments reuse the passages stored in attachment_texts)
+    postings  retrieval_postings(notebook_id, term, chunk_id, tf): the BM25 inverted index
+    vectors   VECTOR_DIM float32 per chunk: character 2/3-grams hashed with a sign bit
+
+The index is maintained lazily. Each retrieval first compares the sources'
+`updated_at` with what the chunks were cut from (two queries), re-chunks only what
+changed and drops chunks of deleted sources. Terms are lowercased words plus CJK
+bigrams, the same analysis as GET /search. `hybrid` fuses the BM25 and vector
+rankings with reciprocal rank fusion; vector matrices are cached per notebook and
+keyed by the chunk set, so they are reloaded only after the index changes.
+"""
+
+from __future__ import annotations
+
+import html
+import math
+import re
+import threading
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db import models
+from api.services.app_logging import get_logger
+from api.services.document_text import CHUNK_CHARS
+from api.services.search import CJK_CHARS
+from api.settings import settings
+
+logger = get_logger(__name__)
+
+VECTOR_DIM = 256
+
+# BM25 parameters (Robertson/Sparck Jones defaults).
+_K1 = 1.2
+_B = 0.75
+# Reciprocal rank fusion constant and the depth of each ranking that is fused.
+_RRF_K = 60
+_FUSE_DEPTH = 50
+
+_TERM = re.compile(rf"[{CJK_CHARS}]+|[^\W_{CJK_CHARS}]+")
+_CJK_RUN = re.compile(rf"[{CJK_CHARS}]")
+_TAG = re.compile(r"<[^>]+>")
+_PARAGRAPHS = re.compile(r"\n\s*\n|\n")
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;.])\s*")
+_MAX_TERM = 64
+
+# (source kind, source row id)
+SourceKey = Tuple[str, uuid.UUID]
+
+
+@dataclass
+class RetrievedChunk:
+    id: uuid.UUID
+    source: str
+    source_id: uuid.UUID
+    title: Optional[str]
+    text: str
+    score: float
+
+
+# ---------------------------------------------------------------------------
+# Analysis
+# ---------------------------------------------------------------------------
+
+
+def analyze(text: str) -> List[str]:
+    """Index terms of `text`: lowercased words, and CJK bigrams (a lone CJK character is its own term)."""
+    terms: List[str] = []
+    for token in _TERM.findall(text):
+        if not _CJK_RUN.match(token):
+            terms.append(token.lower()[:_MAX_TERM])
+        elif len(token) == 1:
+            terms.append(token)
+        else:
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return terms
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed character 2/3-gram vector of `text`, L2-normalised (all zeros for very short text)."""
+    normalized = " ".join(text.lower().split())
+    grams = [normalized[i:i + n].encode() for n in (2, 3) for i in range(len(normalized) - n + 1)]
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    if not grams:
+        return vector
+    hashes = np.fromiter((zlib.crc32(gram) for gram in grams), dtype=np.uint32, count=len(grams))
+    signs = np.where(hashes >> 31, -1.0, 1.0)
+    vector += np.bincount(hashes % VECTOR_DIM, weights=signs, minlength=VECTOR_DIM).astype(np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def plain_text(value: Optional[str]) -> str:
+    """Note bodies are editor HTML; index the text, not the markup."""
+    if not value:
+        return ""
+    if "<" in value:
+        value = html.unescape(_TAG.sub("\n", value))
+    return value
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Split `text` into passages of at most `size` characters, at paragraph and then sentence breaks."""
+    pieces: List[str] = []
+    for paragraph in _PARAGRAPHS.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= size:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            pieces.extend(sentence[start:start + size] for start in range(0, len(sentence), size) if sentence)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > size:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ---------------------------------------------------------------------------
+# Index maintenance
+# ---------------------------------------------------------------------------
+
+
+def _source_versions(db: Session, notebook_id: uuid.UUID) -> Dict[SourceKey, datetime]:
+    note, attachment, session = models.Note, models.Attachment, models.TranscriptionSession
+    rows = db.execute(
+        union_all(
+            select(literal("note").label("source"), note.id, note.updated_at).where(note.notebook_id == notebook_id),
+            select(literal("attachment").label("source"), attachment.id, attachment.updated_at).where(
+                attachment.notebook_id == notebook_id,
+                or_(attachment.summary.is_not(None), attachment.sha256.is_not(None)),
+            ),
+            select(literal("transcript").label("source"), session.id, session.updated_at)
+            .join(attachment, attachment.id == session.attachment_id)
+            .where(attachment.notebook_id == notebook_id, session.full_text.is_not(None)),
+        )
+    )
+    return {(source, source_id): updated_at for source, source_id, updated_at in rows}
+
+
+def _load_sources(db: Session, keys: Iterable[SourceKey]) -> Dict[SourceKey, Tuple[Optional[str], List[str]]]:
+    """(title, passages) of each source, one query per source kind."""
+    ids: Dict[str, List[uuid.UUID]] = {"note": [], "attachment": [], "transcript": []}
+    for source, source_id in keys:
+        ids[source].append(source_id)
+
+    out: Dict[SourceKey, Tuple[Optional[str], List[str]]] = {}
+    if ids["note"]:
+        for row in db.execute(
+            select(models.Note.id, models.Note.title, models.Note.content).where(models.Note.id.in_(ids["note"]))
+        ):
+            text = "\n".join(filter(None, [row.title, plain_text(row.content)]))
+            out[("note", row.id)] = (row.title, chunk_text(text))
+    if ids["attachment"]:
+        extracted = models.AttachmentText
+        for row in db.execute(
+            select(
+                models.Attachment.id,
+                models.Attachment.filename,
+                models.Attachment.summary,
+                extracted.text,
+                extracted.chunks,
+            )
+            .outerjoin(extracted, extracted.sha256 == models.Attachment.sha256)
+            .where(models.Attachment.id.in_(ids["attachment"]))
+        ):
+            passages = chunk_text(row.summary or "")
+            passages += [row.text[start:end] for start, end in row.chunks or ()]
+            out[("attachment", row.id)] = (row.filename, passages)
+    if ids["transcript"]:
+        for row in db.execute(
+            select(models.TranscriptionSession.id, models.Attachment.filename, models.TranscriptionSession.full_text)
+            .join(models.Attachment, models.Attachment.id == models.TranscriptionSession.attachment_id)
+            .where(models.TranscriptionSession.id.in_(ids["transcript"]))
+        ):
+            out[("transcript", row.id)] = (row.filename, chunk_text(row.full_text or ""))
+    return out
+
+
+def _drop_sources(db: Session, notebook_id: uuid.UUID, source_ids: Sequence[uuid.UUID]) -> None:
+    if not source_ids:
+        return
+    chunk_ids = select(models.RetrievalChunk.id).where(
+        models.RetrievalChunk.notebook_id == notebook_id, models.RetrievalChunk.source_id.in_(source_ids)
+    )
+    db.execute(delete(models.RetrievalPosting).where(models.RetrievalPosting.chunk_id.in_(chunk_ids)))
+    db.execute(
+        delete(models.RetrievalChunk).where(
+            models.RetrievalChunk.notebook_id == notebook_id, models.RetrievalChunk.source_id.in_(source_ids)
+        )
+    )
+
+
+def refresh_index(db: Session, notebook_id: uuid.UUID) -> int:
+    """Bring the notebook's chunks and postings up to date with its sources; returns sources re-chunked."""
+    sources = _source_versions(db, notebook_id)
+    indexed = {
+        (row.source, row.source_id): row.source_updated_at
+        for row in db.execute(
+            select(
+                models.RetrievalChunk.source, models.RetrievalChunk.source_id, models.RetrievalChunk.source_updated_at
+            )
+            .where(models.RetrievalChunk.notebook_id == notebook_id, models.RetrievalChunk.seq == 0)
+        )
+    }
+    stale = [key for key, updated_at in sources.items() if indexed.get(key) != updated_at]
+    removed = [key for key in indexed if key not in sources]
+    if not stale and not removed:
+        return 0
+
+    # Source ids are UUIDs, unique across source kinds.
+    _drop_sources(db, notebook_id, [key[1] for key in stale + removed if key in indexed])
+    chunk_rows: List[Dict[str, Any]] = []
+    chunk_terms: List[Counter] = []
+    for key, (title, passages) in _load_sources(db, stale).items():
+        source, source_id = key
+        # A source with no text still gets an empty marker chunk, so it is not re-read every time.
+        for seq, passage in enumerate(passages or [""]):
+            terms = Counter(analyze(passage))
+            chunk_rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "notebook_id": notebook_id,
+                    "source": source,
+                    "source_id": source_id,
+                    "source_updated_at": sources[key],
+                    "seq": seq,
+                    "title": title[:255] if title else None,
+                    "text": passage,
+                    "length": sum(terms.values()),
+                    "vector": embed(passage).tobytes() if passage else None,
+                }
+            )
+            chunk_terms.append(terms)
+
+    try:
+        if chunk_rows:
+            db.execute(insert(models.RetrievalChunk), chunk_rows)
+            postings = [
+                {"notebook_id": notebook_id, "term": term, "chunk_id": row["id"], "tf": tf}
+                for row, terms in zip(chunk_rows, chunk_terms)
+                for term, tf in terms.items()
+            ]
+            if postings:
+                db.execute(insert(models.RetrievalPosting), postings)
+        db.commit()
+    except IntegrityError:
+        # A concurrent request indexed the same sources first; its chunks are as good as ours.
+        db.rollback()
+        logger.info("Retrieval index refresh lost a race", extra={"notebook_id": str(notebook_id)})
+        return 0
+    return len(stale)
+
+
+# ---------------------------------------------------------------------------
+# Ranking
+# ---------------------------------------------------------------------------
+
+
+def _bm25(db: Session, notebook_id: uuid.UUID, terms: Sequence[str]) -> List[Tuple[uuid.UUID, float]]:
+    if not terms:
+        return []
+    total, avg_length = db.execute(
+        select(func.count(), func.avg(models.RetrievalChunk.length)).where(
+            models.RetrievalChunk.notebook_id == notebook_id, models.RetrievalChunk.length > 0
+        )
+    ).one()
+    if not total:
+        return []
+    avg_length = float(avg_length or 0) or 1.0
+
+    postings = db.execute(
+        select(
+            models.RetrievalPosting.term,
+            models.RetrievalPosting.chunk_id,
+            models.RetrievalPosting.tf,
+            models.RetrievalChunk.length,
+        )
+        .join(models.RetrievalChunk, models.RetrievalChunk.id == models.RetrievalPosting.chunk_id)
+        .where(models.RetrievalPosting.notebook_id == notebook_id, models.RetrievalPosting.term.in_(set(terms)))
+    ).all()
+    df = Counter(term for term, _, _, _ in postings)
+    scores: Dict[uuid.UUID, float] = {}
+    for term, chunk_id, tf, length in postings:
+        idf = math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+        norm = tf + _K1 * (1 - _B + _B * length / avg_length)
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (_K1 + 1) / norm
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class _VectorCache:
+    """Per-notebook (chunk ids, vector matrix), keyed by the chunk set's (count, latest created_at)."""
+
+    def __init__(self, capacity: int = 32) -> None:
+        self.capacity = capacity
+        self._entries: "OrderedDict[uuid.UUID, Tuple[Any, List[uuid.UUID], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, db: Session, notebook_id: uuid.UUID) -> Tuple[List[uuid.UUID], np.ndarray]:
+        fingerprint = tuple(
+            db.execute(
+                select(func.count(), func.max(models.RetrievalChunk.created_at)).where(
+                    models.RetrievalChunk.notebook_id == notebook_id
+                )
+            ).one()
+        )
+        with self._lock:
+            entry = self._entries.get(notebook_id)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(notebook_id)
+                return entry[1], entry[2]
+
+        rows = db.execute(
+            select(models.RetrievalChunk.id, models.RetrievalChunk.vector).where(
+                models.RetrievalChunk.notebook_id == notebook_id, models.RetrievalChunk.vector.is_not(None)
+            )
+        ).all()
+        ids = [row.id for row in rows]
+        matrix = (
+            np.frombuffer(b"".join(row.vector for row in rows), dtype=np.float32).reshape(len(rows), VECTOR_DIM)
+            if rows
+            else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        )
+        with self._lock:
+            self._entries[notebook_id] = (fingerprint, ids, matrix)
+            self._entries.move_to_end(notebook_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return ids, matrix
+
+
+_vectors = _VectorCache()
+
+
+def _dense(db: Session, notebook_id: uuid.UUID, query: str) -> List[Tuple[uuid.UUID, float]]:
+    query_vector = embed(query)
+    if not query_vector.any():
+        return []
+    ids, matrix = _vectors.matrix(db, notebook_id)
+    if not ids:
+        return []
+    similarities = matrix @ query_vector
+    depth = min(_FUSE_DEPTH, len(ids))
+    top = np.argpartition(-similarities, depth - 1)[:depth]
+    top = top[np.argsort(-similarities[top])]
+    return [(ids[i], float(similarities[i])) for i in top if similarities[i] > 0]
+
+
+def _fuse(*rankings: Sequence[Tuple[uuid.UUID, float]]) -> List[Tuple[uuid.UUID, float]]:
+    scores: Dict[uuid.UUID, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking[:_FUSE_DEPTH]):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (_RRF_K + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def retrieve(
+    db: Session, notebook_id: uuid.UUID, query: str, *, mode: models.RetrievalMode, k: int
+) -> List[RetrievedChunk]:
+    """Top `k` chunks of the notebook for `query`, after bringing the index up to date."""
+    refresh_index(db, notebook_id)
+    ranking = _bm25(db, notebook_id, analyze(query))
+    if mode == models.RetrievalMode.HYBRID:
+        ranking = _fuse(ranking, _dense(db, notebook_id, query))
+    ranking = ranking[:k]
+    if not ranking:
+        return []
+
+    chunks = {
+        chunk.id: chunk
+        for chunk in db.execute(
+            select(models.RetrievalChunk).where(models.RetrievalChunk.id.in_([chunk_id for chunk_id, _ in ranking]))
+        ).scalars()
+    }
+    return [
+        RetrievedChunk(
+            id=chunk.id,
+            source=chunk.source,
+            source_id=chunk.source_id,
+            title=chunk.title,
+            text=chunk.text,
+            score=score,
+        )
+        for chunk_id, score in ranking
+        if (chunk := chunks.get(chunk_id)) is not None
+    ]
+
+
+def notebook_mode(db: Session, notebook_id: uuid.UUID, user_id: uuid.UUID) -> models.RetrievalMode:
+    mode = db.scalar(
+        select(models.Notebook.retrieval_mode).where(
+            models.Notebook.id == notebook_id, models.Notebook.user_id == user_id
+        )
+    )
+    if mode is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found")
+    return mode
+
+
+def context_blocks(chunks: Sequence[RetrievedChunk]) -> List[Dict[str, Any]]:
+    """`input_text` blocks for `build_responses_payload`, labelled like attached file text."""
+    return [
+        {"type": "input_text", "text": f"【资料：{chunk.title or chunk.source}】\n{chunk.text}"}
+        for chunk in chunks
+        if chunk.text
+    ]
+
+
+def chat_context(db: Session, user_id: uuid.UUID, notebook_id: uuid.UUID, query: str) -> Optional[List[Dict[str, Any]]]:
+    """Context blocks for a notebook chat turn, or None when the notebook uses hosted file_search."""
+    mode = notebook_mode(db, notebook_id, user_id)
+    if mode == models.RetrievalMode.FILE_SEARCH:
+        return None
+    if not query:
+        return []
+    return context_blocks(retrieve(db, notebook_id, query, mode=mode, k=settings.RETRIEVAL_TOP_K))
@@ -75,3 +75,19 @@ def delete_object(key: str) -> None:
         client.delete_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
     except ClientError as exc:
         raise RuntimeError(f"Failed to delete S3 object '{key}': {exc}") from exc
+
+
+def download_object(key: str, max_bytes: Optional[int] = None) -> bytes:
+    """Read an object's bytes; raises RuntimeError when missing or larger than `max_bytes`."""
+
+    client = get_s3_client()
+    if not settings.AWS_S3_BUCKET:
+        raise RuntimeError("AWS_S3_BUCKET must be configured to use downloads")
+    try:
+        obj = client.get_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
+        size = obj.get("ContentLength")
+        if max_bytes is not None and size is not None and size > max_bytes:
+            raise RuntimeError(f"S3 object '{key}' is {size} bytes, over the {max_bytes} byte limit")
+        return obj["Body"].read()
+    except ClientError as exc:
+        raise RuntimeError(f"Failed to download S3 object '{key}': {exc}") from exc
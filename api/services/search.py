@@ -0,0 +1,175 @@
+"""Full-text search over notes, flashcards, quiz questions, attachments and transcripts.
+
+Each searchable table has a generated, GIN-indexed `search_vector` column computed by
+the `search_tsvector()` SQL function (migration f2c6a0d4e718): 'simple' word lexemes,
+plus every CJK character and every pair of adjacent CJK characters. Chinese and
+Japanese text has no spaces, so a word parser would index whole sentences as single
+lexemes. With bigrams, a CJK query of n characters becomes the AND of its n-1 bigrams
+(a single character matches its unigram), and any substring of the indexed text can be
+found through the index.
+
+Latin words are matched as prefixes ('simple' config, no stemming), so notes written
+in several languages behave the same way. Snippets are cut in Python from the matching
+row: `ts_headline` splits text with the word parser and cannot highlight inside CJK runs.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import Float, Select, String, cast, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import TSQUERY
+
+from api.db import models
+
+# Keep in sync with the character class in search_tsvector().
+CJK_CHARS = "\u3400-\u9fff\uf900-\ufaff"
+_TERM = re.compile(rf"[{CJK_CHARS}]+|[^\W_{CJK_CHARS}]+")
+
+SEARCH_KINDS = ("note", "flashcard", "quiz_question", "attachment", "transcript")
+
+SNIPPET_CHARS = 160
+
+
+def _is_cjk(term: str) -> bool:
+    return re.match(rf"[{CJK_CHARS}]", term) is not None
+
+
+def _terms(q: str) -> List[str]:
+    return [term.lower() for term in _TERM.findall(q)]
+
+
+def tsquery_text(q: str) -> Optional[str]:
+    """tsquery source for `q` (all terms ANDed), or None when `q` has nothing searchable.
+
+    Terms only contain word characters, so no quoting inside the lexemes is needed.
+    """
+    parts: List[str] = []
+    for term in _terms(q):
+        if not _is_cjk(term):
+            parts.append(f"'{term}':*")
+        elif len(term) == 1:
+            parts.append(f"'{term}'")
+        else:
+            parts.extend(f"'{term[i:i + 2]}'" for i in range(len(term) - 1))
+    return " & ".join(dict.fromkeys(parts)) or None
+
+
+def _sources(user_id: uuid.UUID, query: Any) -> Dict[str, Select]:
+    def ranked(kind: str, vector: Any, *columns: Any) -> Select:
+        rank = cast(func.ts_rank(vector, query, 1), Float)
+        return select(literal(kind, String).label("kind"), *columns, rank.label("rank")).where(
+            vector.bool_op("@@")(query)
+        )
+
+    note, card, question = models.Note, models.Flashcard, models.QuizQuestion
+    attachment, segment = models.Attachment, models.TranscriptionSegment
+    return {
+        "note": ranked(
+            "note",
+            note.search_vector,
+            note.id.label("id"),
+            note.notebook_id.label("notebook_id"),
+            note.title.label("title"),
+            note.content.label("body"),
+        )
+        .join(models.Notebook, models.Notebook.id == note.notebook_id)
+        .where(models.Notebook.user_id == user_id),
+        "flashcard": ranked(
+            "flashcard",
+            card.search_vector,
+            card.id.label("id"),
+            card.notebook_id.label("notebook_id"),
+            card.question.label("title"),
+            card.answer.label("body"),
+        ).where(card.user_id == user_id),
+        "quiz_question": ranked(
+            "quiz_question",
+            question.search_vector,
+            question.id.label("id"),
+            question.notebook_id.label("notebook_id"),
+            literal(None, String).label("title"),
+            question.question.label("body"),
+        ).where(question.user_id == user_id),
+        "attachment": ranked(
+            "attachment",
+            attachment.search_vector,
+            attachment.id.label("id"),
+            attachment.notebook_id.label("notebook_id"),
+            attachment.filename.label("title"),
+            attachment.summary.label("body"),
+        ).where(attachment.user_id == user_id),
+        "transcript": ranked(
+            "transcript",
+            segment.search_vector,
+            segment.id.label("id"),
+            attachment.notebook_id.label("notebook_id"),
+            attachment.filename.label("title"),
+            segment.text.label("body"),
+        )
+        .join(models.TranscriptionSession, models.TranscriptionSession.id == segment.session_id)
+        .join(attachment, attachment.id == models.TranscriptionSession.attachment_id)
+        .where(attachment.user_id == user_id),
+    }
+
+
+def search_subquery(
+    user_id: uuid.UUID,
+    tsquery: str,
+    kinds: Sequence[str] = SEARCH_KINDS,
+    notebook_id: Optional[uuid.UUID] = None,
+) -> Any:
+    """One UNION ALL over the requested sources with columns kind, id, notebook_id, title, body, rank."""
+    query = cast(literal(tsquery), TSQUERY)
+    sources = _sources(user_id, query)
+    selects = []
+    for kind in dict.fromkeys(kinds):
+        stmt = sources[kind]
+        if notebook_id is not None:
+            stmt = stmt.where(stmt.selected_columns.notebook_id == notebook_id)
+        selects.append(stmt)
+    return union_all(*selects).subquery("hits")
+
+
+def _highlight_pattern(q: str) -> Optional[re.Pattern[str]]:
+    alternatives: List[str] = []
+    for term in _terms(q):
+        if _is_cjk(term):
+            # Whole run first so it wins over its own bigrams at the same position.
+            alternatives.append(re.escape(term))
+            alternatives.extend(re.escape(term[i:i + 2]) for i in range(len(term) - 1))
+        else:
+            # search_tsvector() splits words at CJK characters too.
+            alternatives.append(rf"(?<![^\W_{CJK_CHARS}]){re.escape(term)}[^\W_{CJK_CHARS}]*")
+    if not alternatives:
+        return None
+    return re.compile("|".join(dict.fromkeys(alternatives)), re.IGNORECASE)
+
+
+class Highlighter:
+    """Cuts a window around the first match of `q` in a text and marks every match in it."""
+
+    def __init__(self, q: str, width: int = SNIPPET_CHARS) -> None:
+        self.pattern = _highlight_pattern(q)
+        self.width = width
+
+    def snippet(self, text: Optional[str]) -> str:
+        if not text:
+            return ""
+        first = self.pattern.search(text) if self.pattern else None
+        start = 0 if first is None else max(0, first.start() - self.width // 4)
+        end = min(len(text), start + self.width)
+        window = text[start:end]
+
+        parts: List[str] = []
+        position = 0
+        if self.pattern:
+            for match in self.pattern.finditer(window):
+                parts.append(html.escape(window[position:match.start()]))
+                parts.append(f"<mark>{html.escape(match.group())}</mark>")
+                position = match.end()
+        parts.append(html.escape(window[position:]))
+        return ("…" if start else "") + "".join(parts) + ("…" if end < len(text) else "")
@@ -0,0 +1,213 @@
+"""Compiled structured-output templates for the generation scenes.
+
+Each template turns a pydantic model into the strict JSON schema and `text.format`
+block that the Responses API expects, once, at import time. It also holds a prebuilt
+`TypeAdapter` for validating the model's reply. Register new scenes with
+`register_template`.
+
+The schema and format blocks are shared by every request, so they are frozen
+(`MappingProxyType` and tuples, as in api.services.ai_registry). `payload_text`
+returns a plain-dict copy of `text` for request payloads; it is thawed once per
+template and shared, so callers must not mutate it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Generic, Mapping, Optional, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+
+from api.schemas import note as note_schemas
+
+T = TypeVar("T", bound=BaseModel)
+
+
+def enforce_no_additional_properties(schema: dict) -> None:
+    """Recursively set additionalProperties=False for every object schema, and ensure required lists are present."""
+
+    def walk(node: object) -> None:
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                node.setdefault("additionalProperties", False)
+                props = node.get("properties")
+                if isinstance(props, dict):
+                    node["required"] = list(props.keys())
+            for val in node.values():
+                if isinstance(val, (dict, list)):
+                    walk(val)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(schema)
+
+
+def strict_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    schema = model.model_json_schema()
+    enforce_no_additional_properties(schema)
+    return schema
+
+
+def _freeze(node: Any) -> Any:
+    if isinstance(node, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in node.items()})
+    if isinstance(node, list):
+        return tuple(_freeze(item) for item in node)
+    return node
+
+
+def _thaw(node: Any) -> Any:
+    if isinstance(node, Mapping):
+        return {key: _thaw(value) for key, value in node.items()}
+    if isinstance(node, tuple):
+        return [_thaw(item) for item in node]
+    return node
+
+
+@dataclass(frozen=True)
+class StructuredTemplate(Generic[T]):
+    scene: str
+    model: Type[T]
+    system_prompt: str
+    # max_output_tokens when the request has no item count (or the scene has no items).
+    max_output_tokens: int = 2048
+    # With a count: output_tokens_base + output_tokens_per_item * count.
+    output_tokens_base: int = 1024
+    output_tokens_per_item: int = 0
+    temperature: float = 0.2
+    timeout: float = 60.0
+    name: str = ""
+    # Streamed generation: where the items sit in the reply (api.services.json_stream
+    # path) and the model each one is validated against as soon as it is complete.
+    item_path: Optional[str] = None
+    item_model: Optional[Type[BaseModel]] = None
+    schema: Mapping[str, Any] = field(init=False, repr=False)
+    # `{"format": {...}}`; `payload_text` is the JSON-serialisable form for payloads.
+    text: Mapping[str, Any] = field(init=False, repr=False)
+    _payload_text: Dict[str, Any] = field(init=False, repr=False, compare=False)
+    adapter: TypeAdapter = field(init=False, repr=False)
+    item_adapter: Optional[TypeAdapter] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        name = self.name or self.model.__name__
+        schema = _freeze(strict_schema(self.model))
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "schema", schema)
+        object.__setattr__(
+            self,
+            "text",
+            _freeze({"format": {"type": "json_schema", "name": name, "strict": True, "schema": schema}}),
+        )
+        object.__setattr__(self, "_payload_text", _thaw(self.text))
+        object.__setattr__(self, "adapter", TypeAdapter(self.model))
+        object.__setattr__(self, "item_adapter", TypeAdapter(self.item_model) if self.item_model else None)
+
+    def payload_text(self) -> Dict[str, Any]:
+        """`text` as plain dicts for a request payload.
+
+        Built once and shared by every request: callers must not mutate it. Payload
+        builders copy the top-level payload dict they change, never the `text` block.
+        """
+        return self._payload_text
+
+    def output_tokens(self, count: Optional[int] = None) -> int:
+        """max_output_tokens for a request asking for `count` items."""
+        if not count or not self.output_tokens_per_item:
+            return self.max_output_tokens
+        return self.output_tokens_base + self.output_tokens_per_item * count
+
+    def validate(self, payload: Any) -> T:
+        """Validate a structured reply; raises pydantic.ValidationError."""
+        return self.adapter.validate_python(payload)
+
+    def validate_json(self, raw: str) -> T:
+        return self.adapter.validate_json(raw)
+
+    def validate_item(self, payload: Any) -> BaseModel:
+        """Validate one streamed item; raises pydantic.ValidationError."""
+        if self.item_adapter is None:
+            raise TypeError(f"Template {self.scene!r} has no item_model")
+        return self.item_adapter.validate_python(payload)
+
+
+_TEMPLATES: Dict[str, StructuredTemplate[Any]] = {}
+
+
+def register_template(template: StructuredTemplate[T]) -> StructuredTemplate[T]:
+    _TEMPLATES[template.scene] = template
+    return template
+
+
+def get_template(scene: str) -> StructuredTemplate[Any]:
+    template = _TEMPLATES.get(scene)
+    if template is None:
+        raise KeyError(f"No structured output template for scene: {scene}")
+    return template
+
+
+FLASHCARDS: StructuredTemplate[note_schemas.StructuredFlashcardSet] = register_template(
+    StructuredTemplate(
+        scene="flashcard",
+        model=note_schemas.StructuredFlashcardSet,
+        system_prompt=(
+            "You are a bilingual study coach that creates concise Q/A flashcards in Chinese. "
+            "Ground every card in the provided material: the input_text passages labelled 【笔记：…】 or 【资料：…】, "
+            "plus attached files (input_file) only for sources whose text has not been extracted. "
+            "Each question should be clear and the answer compact (1-3 sentences). "
+            "Prefer high-yield concepts, formulas, or definitions. "
+            "If a count is provided, generate exactly that many cards; otherwise choose a balanced set. "
+            "Always fill the structured output schema precisely."
+        ),
+        max_output_tokens=2048,
+        output_tokens_per_item=128,
+        temperature=0.2,
+        timeout=60.0,
+        item_path="$.flashcards[*]",
+        item_model=note_schemas.StructuredFlashcard,
+    )
+)
+
+MINDMAP: StructuredTemplate[note_schemas.StructuredMindMap] = register_template(
+    StructuredTemplate(
+        scene="mindmap",
+        model=note_schemas.StructuredMindMap,
+        system_prompt=(
+            "You are a bilingual study assistant that creates concise mind maps in Chinese. "
+            "Build the map from the provided material: the input_text passages labelled 【笔记：…】 or 【资料：…】, "
+            "plus attached files (input_file) only for sources whose text has not been extracted. "
+            "Return a clean hierarchical structure with a single root and 3-8 main branches, depth 2-3. "
+            "Keep titles short, add optional summaries when helpful, and avoid markdown. "
+            "Always follow the JSON schema strictly."
+        ),
+        max_output_tokens=2048,
+        temperature=0.2,
+        timeout=60.0,
+        item_path="$.root.children[*]",
+        item_model=note_schemas.StructuredMindMapNode,
+    )
+)
+
+QUIZZES: StructuredTemplate[note_schemas.StructuredQuizSet] = register_template(
+    StructuredTemplate(
+        scene="quiz",
+        model=note_schemas.StructuredQuizSet,
+        system_prompt=(
+            "You are a bilingual quiz generator that creates multiple-choice questions in Chinese. "
+            "Ground every question in the provided material: the input_text passages labelled 【笔记：…】 or 【资料：…】, "
+            "plus attached files (input_file) only for sources whose text has not been extracted. "
+            "Each question should be clear and have exactly 4 options (A, B, C, D) with only one correct answer. "
+            "Options should be plausible but only one should be definitively correct based on the source material. "
+            "Prefer high-yield concepts, definitions, formulas, or key relationships. "
+            "Generate exactly the requested number of questions. "
+            "Always fill the structured output schema precisely."
+        ),
+        max_output_tokens=4096,
+        output_tokens_per_item=320,
+        temperature=0.3,
+        timeout=90.0,
+        item_path="$.questions[*]",
+        item_model=note_schemas.StructuredQuizQuestion,
+    )
+)
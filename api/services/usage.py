@@ -0,0 +1,305 @@
+"""Token usage capture, in-memory aggregation, and batched persistence.
+
+Every Responses call reports its usage here (see `openai_client`). Usage is summed
+in memory per (user, scene, model key) and flushed to `usage_events` by a background
+task, so the request path never waits on an INSERT.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+
+from api.db import models
+from api.db.database import session_scope
+from api.services import ai_registry
+from api.services.app_logging import get_logger
+from api.settings import settings
+
+logger = get_logger(__name__)
+
+UsageKey = Tuple[Optional[uuid.UUID], str, str]
+
+# Cell layout shared by the aggregator, the flush rows and the admin report.
+USAGE_FIELDS = (
+    "requests",
+    "input_tokens",
+    "cached_tokens",
+    "output_tokens",
+    "reasoning_tokens",
+    "total_tokens",
+)
+
+
+@dataclass(frozen=True)
+class TokenUsage:
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    total_tokens: int = 0
+
+
+def _as_int(value: Any) -> int:
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return max(0, int(value))
+    return 0
+
+
+def parse_usage(usage: Any) -> Optional[TokenUsage]:
+    """Normalise a Responses/transcription `usage` block (dict or SDK model)."""
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        try:
+            usage = usage.model_dump()
+        except Exception:
+            return None
+    if not isinstance(usage, dict):
+        return None
+
+    input_tokens = _as_int(usage.get("input_tokens", usage.get("prompt_tokens")))
+    output_tokens = _as_int(usage.get("output_tokens", usage.get("completion_tokens")))
+    input_details = usage.get("input_tokens_details") or usage.get("prompt_tokens_details") or {}
+    output_details = usage.get("output_tokens_details") or usage.get("completion_tokens_details") or {}
+    cached = _as_int(input_details.get("cached_tokens")) if isinstance(input_details, dict) else 0
+    reasoning = _as_int(output_details.get("reasoning_tokens")) if isinstance(output_details, dict) else 0
+    total = _as_int(usage.get("total_tokens")) or input_tokens + output_tokens
+    return TokenUsage(
+        input_tokens=input_tokens,
+        cached_tokens=cached,
+        output_tokens=output_tokens,
+        reasoning_tokens=reasoning,
+        total_tokens=total,
+    )
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+class UsageAggregator:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: Dict[UsageKey, List[int]] = {}
+        self._period_start = _utcnow()
+        # user_id -> (UTC day, tokens used that day) for quota checks.
+        self._daily: Dict[uuid.UUID, Tuple[date, int]] = {}
+
+    def record(self, user_id: Optional[uuid.UUID], scene: str, model_key: str, usage: TokenUsage) -> None:
+        key = (user_id, scene or "unknown", model_key or "unknown")
+        with self._lock:
+            cell = self._pending.get(key)
+            if cell is None:
+                cell = self._pending[key] = [0] * len(USAGE_FIELDS)
+            cell[0] += 1
+            cell[1] += usage.input_tokens
+            cell[2] += usage.cached_tokens
+            cell[3] += usage.output_tokens
+            cell[4] += usage.reasoning_tokens
+            cell[5] += usage.total_tokens
+            if user_id is not None:
+                daily = self._daily.get(user_id)
+                if daily is not None and daily[0] == _utcnow().date():
+                    self._daily[user_id] = (daily[0], daily[1] + usage.total_tokens)
+
+    def drain(self) -> Tuple[datetime, datetime, Dict[UsageKey, List[int]]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            period_start, self._period_start = self._period_start, _utcnow()
+            return period_start, self._period_start, pending
+
+    def restore(self, period_start: datetime, pending: Dict[UsageKey, List[int]]) -> None:
+        """Put back a drained batch whose flush failed so it is retried next time."""
+        with self._lock:
+            for key, values in pending.items():
+                cell = self._pending.get(key)
+                if cell is None:
+                    self._pending[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        cell[i] += value
+            self._period_start = min(self._period_start, period_start)
+
+    def snapshot(self) -> Dict[UsageKey, List[int]]:
+        with self._lock:
+            return {key: list(values) for key, values in self._pending.items()}
+
+    def daily_total(self, user_id: uuid.UUID, day: date) -> Optional[int]:
+        with self._lock:
+            daily = self._daily.get(user_id)
+            return daily[1] if daily is not None and daily[0] == day else None
+
+    def set_daily_baseline(self, user_id: uuid.UUID, day: date, persisted: int) -> int:
+        with self._lock:
+            unflushed = sum(cell[5] for key, cell in self._pending.items() if key[0] == user_id)
+            total = persisted + unflushed
+            self._daily[user_id] = (day, total)
+            return total
+
+
+tracker = UsageAggregator()
+
+
+def record_usage(user_id: Optional[uuid.UUID], scene: str, model_key: str, usage: Any) -> None:
+    parsed = usage if isinstance(usage, TokenUsage) else parse_usage(usage)
+    if parsed is not None:
+        tracker.record(user_id, scene, model_key, parsed)
+
+
+def _load_daily_usage(user_id: uuid.UUID, day: date) -> int:
+    with session_scope() as db:
+        total = db.execute(
+            select(func.coalesce(func.sum(models.UsageEvent.total_tokens), 0)).where(
+                models.UsageEvent.user_id == user_id,
+                models.UsageEvent.period_start >= _day_start(day),
+            )
+        ).scalar()
+    return int(total or 0)
+
+
+async def enforce_quota(user_id: Optional[uuid.UUID]) -> None:
+    """Reject a dispatch when the user already spent their daily token quota."""
+    limit = settings.AI_USER_DAILY_TOKEN_QUOTA
+    if not limit or user_id is None:
+        return
+    today = _utcnow().date()
+    used = tracker.daily_total(user_id, today)
+    if used is None:
+        persisted = await asyncio.to_thread(_load_daily_usage, user_id, today)
+        used = tracker.set_daily_baseline(user_id, today, persisted)
+    if used >= limit:
+        raise HTTPException(status_code=429, detail="Daily AI token quota exceeded")
+
+
+# --- Batched persistence ---
+
+def flush_usage() -> int:
+    """Write the pending aggregates as one multi-row INSERT; returns the number of rows."""
+    period_start, period_end, pending = tracker.drain()
+    if not pending:
+        return 0
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "scene": scene,
+            "model_key": model_key,
+            "period_start": period_start,
+            "period_end": period_end,
+            **dict(zip(USAGE_FIELDS, values)),
+        }
+        for (user_id, scene, model_key), values in pending.items()
+    ]
+    try:
+        with session_scope() as db:
+            db.execute(insert(models.UsageEvent), rows)
+    except Exception:
+        tracker.restore(period_start, pending)
+        raise
+    return len(rows)
+
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(max(1.0, settings.USAGE_FLUSH_INTERVAL_SECONDS))
+        try:
+            await asyncio.to_thread(flush_usage)
+        except Exception:
+            logger.exception("Usage flush failed")
+
+
+def start_usage_flusher() -> None:
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_usage_flusher() -> None:
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        await asyncio.gather(_flush_task, return_exceptions=True)
+        _flush_task = None
+    try:
+        await asyncio.to_thread(flush_usage)
+    except Exception:
+        logger.exception("Usage flush failed")
+
+
+# --- Reporting ---
+
+def estimate_cost(model_key: str, totals: Dict[str, int]) -> Optional[float]:
+    """USD estimate from the model's `pricing` (per 1M tokens) in the current AI registry."""
+    info = ai_registry.get_registry().models.get(model_key)
+    pricing = info.pricing if isinstance(info, ai_registry.ModelInfo) else None
+    if pricing is None:
+        return None
+    cached = totals.get("cached_tokens", 0)
+    uncached = max(0, totals.get("input_tokens", 0) - cached)
+    cost = uncached * pricing.input + cached * pricing.cached_input + totals.get("output_tokens", 0) * pricing.output
+    return round(cost / 1_000_000, 6)
+
+
+def usage_report(
+    *,
+    since: datetime,
+    user_id: Optional[uuid.UUID] = None,
+    scene: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Aggregate persisted usage since `since`, merged with the not-yet-flushed window."""
+    columns = [func.sum(getattr(models.UsageEvent, field)) for field in USAGE_FIELDS]
+    query = (
+        select(models.UsageEvent.user_id, models.UsageEvent.scene, models.UsageEvent.model_key, *columns)
+        .where(models.UsageEvent.period_start >= since)
+        .group_by(models.UsageEvent.user_id, models.UsageEvent.scene, models.UsageEvent.model_key)
+    )
+    if user_id is not None:
+        query = query.where(models.UsageEvent.user_id == user_id)
+    if scene:
+        query = query.where(models.UsageEvent.scene == scene)
+
+    merged: Dict[UsageKey, List[int]] = {}
+    with session_scope() as db:
+        for row in db.execute(query).all():
+            merged[(row[0], row[1], row[2])] = [int(value or 0) for value in row[3:]]
+
+    for key, values in tracker.snapshot().items():
+        if user_id is not None and key[0] != user_id:
+            continue
+        if scene and key[1] != scene:
+            continue
+        cell = merged.setdefault(key, [0] * len(USAGE_FIELDS))
+        for i, value in enumerate(values):
+            cell[i] += value
+
+    report: List[Dict[str, Any]] = []
+    for (row_user, row_scene, row_model), values in merged.items():
+        totals = dict(zip(USAGE_FIELDS, values))
+        report.append(
+            {
+                "user_id": str(row_user) if row_user else None,
+                "scene": row_scene,
+                "model_key": row_model,
+                **totals,
+                "cost_usd": estimate_cost(row_model, totals),
+            }
+        )
+    report.sort(key=lambda item: item["total_tokens"], reverse=True)
+    return report
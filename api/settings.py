@@ -9,12 +9,44 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=ENV_FILE, case_sensitive=True)
 
     API_KEY: Optional[str] = None
+    # OpenAI-compatible base URL (e.g. http://127.0.0.1:9100/v1 for the bench fake); None = SDK default.
+    OPENAI_BASE_URL: Optional[str] = None
     HTTPS_PROXY: Optional[str] = None
     INTERNAL_TOKEN: Optional[str] = None
 
     DATABASE_URL: Optional[str] = None
     SQLALCHEMY_ECHO: bool = False
     SQLALCHEMY_DISABLE_POOL: bool = False
+    # Per-request query counting (Server-Timing header, metrics, N+1 warnings).
+    DB_QUERY_STATS: bool = True
+    # Same statement run this many times in one request is logged as a likely N+1.
+    DB_N_PLUS_ONE_THRESHOLD: int = 5
+    # Query budget for routes that do not declare one via `query_budget(n)`; None = unlimited.
+    DB_QUERY_BUDGET_DEFAULT: Optional[int] = None
+    # Fail requests that exceed their budget with a 500 (for tests/CI) instead of logging.
+    DB_QUERY_BUDGET_STRICT: bool = False
+    # Upper bound on items accepted by one bulk create/batch request.
+    BULK_MAX_ITEMS: int = 1000
+    # Largest `limit` accepted by the cursor-paginated list endpoints.
+    LIST_PAGE_MAX: int = 200
+    # GET /sync re-reads this many seconds before `since`, to pick up rows from
+    # transactions that were still open when the previous cursor was issued.
+    SYNC_OVERLAP_SECONDS: int = 30
+    # Chunks from the local index injected into a notebook chat turn (retrieval_mode bm25/hybrid).
+    RETRIEVAL_TOP_K: int = 6
+    # Worker processes for attachment text extraction (PDF/DOCX/PPTX parsing is CPU-bound).
+    EXTRACTION_WORKERS: int = 2
+    # Attachments larger than this are not downloaded for extraction.
+    EXTRACTION_MAX_BYTES: int = 50 * 1024 * 1024
+    # Upper bound on note and attachment text tokens in one generation request. The
+    # model's context window can lower it further (see api.services.context_packer).
+    GENERATION_CONTEXT_TOKENS: int = 48_000
+    # Flashcard/quiz generation splits material larger than this many tokens into
+    # partitions generated concurrently (see api.services.fanout).
+    GENERATION_PARTITION_TOKENS: int = 16_000
+    GENERATION_MAX_PARTITIONS: int = 6
+    # Partition calls in flight per process, across all requests.
+    GENERATION_FANOUT_CONCURRENCY: int = 8
 
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:5173",
@@ -32,6 +64,38 @@ class Settings(BaseSettings):
     CSRF_HEADER_NAME: str = "X-CSRF-Token"
     CSRF_TOKEN_TTL_SECONDS: int = 60 * 60 * 8
 
+    # --- Realtime transcription bridge ---
+    # Seconds of uncommitted audio kept for replay after an upstream reconnect.
+    REALTIME_AUDIO_BUFFER_SECONDS: float = 15.0
+    # Upstream reconnect attempts before the bridge gives up on a session.
+    REALTIME_MAX_RECONNECTS: int = 5
+    # How long a detached session can be resumed by the browser.
+    REALTIME_RESUME_TTL_SECONDS: int = 120
+
+    # --- Token usage accounting ---
+    # How often in-memory usage aggregates are written to usage_events.
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 30.0
+    # Optional per-user daily token cap (input + output); None disables the check.
+    AI_USER_DAILY_TOKEN_QUOTA: Optional[int] = None
+    # Accounts allowed to read admin endpoints (in addition to INTERNAL_TOKEN callers).
+    ADMIN_EMAILS: List[str] = []
+
+    # --- Logging (JSON lines via a background queue listener) ---
+    LOG_LEVEL: str = "INFO"
+    # Defaults to api/services/logs; set LOG_FILE_NAME empty to log to stderr only.
+    LOG_DIR: Optional[str] = None
+    LOG_FILE_NAME: str = "app.log"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_TO_STDERR: bool = True
+    # Records beyond this backlog are dropped instead of blocking the caller.
+    LOG_QUEUE_SIZE: int = 10000
+    # Fraction of records kept per `event` tag (1 in round(1/rate); 0 mutes the event).
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "stream_delta": 0.01,
+        "audio_frame": 0.01,
+    }
+
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_S3_BUCKET: Optional[str] = None
@@ -40,22 +104,53 @@ class Settings(BaseSettings):
 
     # --- AI model/tool registry (centralized configuration) ---
     # AI_MODELS maps public model keys to provider ids and UI labels.
+    # An optional "pricing" dict (USD per 1M tokens: input, cached_input, output)
+    # enables cost estimates in the usage report. "context_window" and
+    # "max_output_tokens" size generation requests (see api.services.context_packer).
     AI_MODELS: Dict[str, Dict[str, Any]] = {
-        "gpt-4.1": {"id": "gpt-4.1", "label": "gpt-4.1", "supports_temperature": True},
-        "gpt-5": {"id": "gpt-5", "label": "gpt-5", "supports_temperature": False},
-        "gpt-5.1": {"id": "gpt-5.1", "label": "gpt-5.1", "supports_temperature": False},
+        "gpt-4.1": {
+            "id": "gpt-4.1",
+            "label": "gpt-4.1",
+            "supports_temperature": True,
+            "context_window": 1_047_576,
+            "max_output_tokens": 32_768,
+        },
+        "gpt-5": {
+            "id": "gpt-5",
+            "label": "gpt-5",
+            "supports_temperature": False,
+            "context_window": 400_000,
+            "max_output_tokens": 128_000,
+        },
+        "gpt-5.1": {
+            "id": "gpt-5.1",
+            "label": "gpt-5.1",
+            "supports_temperature": False,
+            "context_window": 400_000,
+            "max_output_tokens": 128_000,
+        },
         "gpt-5-mini": {
             "id": "gpt-5-mini-2025-08-07",
             "label": "gpt-5-mini-2025-08-07",
             "supports_temperature": False,
+            "context_window": 400_000,
+            "max_output_tokens": 128_000,
+        },
+        "gpt-4.1-nano": {
+            "id": "gpt-4.1-nano",
+            "label": "gpt-4.1-nano",
+            "supports_temperature": True,
+            "context_window": 1_047_576,
+            "max_output_tokens": 32_768,
         },
-        "gpt-4.1-nano": {"id": "gpt-4.1-nano", "label": "gpt-4.1-nano", "supports_temperature": True},
         "gpt-4o-transcribe": {
             "id": "gpt-4o-transcribe",
             "label": "gpt-4o-transcribe",
             "supports_temperature": True,
         },
     }
+    # Context window assumed for AI_MODELS entries that do not set one.
+    AI_DEFAULT_CONTEXT_WINDOW: int = 128_000
     # Defaults are scene keys -> model keys (not provider ids).
     AI_MODEL_DEFAULTS: Dict[str, str] = {
         "chat": "gpt-5-mini",
@@ -0,0 +1 @@
+"""Benchmarks and load tests; run modules from the repo root, e.g. `python -m bench.log_overhead`."""
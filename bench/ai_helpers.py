@@ -0,0 +1,197 @@
+"""Microbenchmarks for the per-request AI helpers in openai_utils and ai_registry.
+
+    python -m bench.ai_helpers                      # print ns/call
+    python -m bench.ai_helpers --save               # record a local baseline
+    python -m bench.ai_helpers --check [--threshold 0.2]
+
+`--check` compares against the saved baseline (bench/results/ai_helpers.json) and
+exits 1 if any case got slower by more than the threshold. Baselines are per machine,
+so save one on the branch point before comparing a change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from api.services import ai_registry, openai_utils
+from api.settings import settings
+
+BASELINE = Path(__file__).resolve().parent / "results" / "ai_helpers.json"
+
+_PARAGRAPH = "间隔重复把复习安排在遗忘之前。Spaced repetition schedules reviews just before forgetting. " * 8
+
+
+def _chat_payload() -> Dict[str, Any]:
+    return {
+        "model_key": "gpt-5-mini",
+        "system_prompt": "You are a helpful study assistant.",
+        "text": "总结这一章的重点，并给出三个例子。",
+        "images": ["https://example.com/a.png", "https://example.com/b.png"],
+        "tool_keys": ["file_search", "image_generation"],
+        "tool_overrides": {"file_search": {"vector_store_ids": ["vs_123"]}},
+        "include": ["reasoning.encrypted_content"],
+        "max_output_tokens": 2048,
+    }
+
+
+def _multi_file_payload(files: int = 24) -> Dict[str, Any]:
+    return {
+        "model_key": "gpt-4.1",
+        "text": "Compare these lecture notes.",
+        "temperature": 0.3,
+        "files": [
+            {"file_id": f"file-{i:04d}", "name": f"lecture-{i}.pdf", "text": _PARAGRAPH * 30, "truncated": i % 3 == 0}
+            for i in range(files)
+        ],
+        "tool_keys": ["file_search"],
+    }
+
+
+def _passthrough_payload() -> Dict[str, Any]:
+    return {
+        "model": "gpt-5-mini-2025-08-07",
+        "input": [{"role": "user", "content": [{"type": "input_text", "text": _PARAGRAPH}]}],
+        "toolKeys": ["file_search"],
+        "temperature": 0.2,
+    }
+
+
+def _quiz_items(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "question": f"第 {i} 题：{_PARAGRAPH[:120]}",
+            "options": [f"选项 {c}" for c in "ABCD"],
+            "answer": "A",
+            "explanation": _PARAGRAPH,
+        }
+        for i in range(count)
+    ]
+
+
+def _text_response(chars: int = 40_000) -> Dict[str, Any]:
+    body = (_PARAGRAPH * (chars // len(_PARAGRAPH) + 1))[:chars]
+    return {
+        "id": "resp_bench",
+        "output": [
+            {"type": "reasoning", "summary": []},
+            {"type": "file_search_call", "results": [{"text": _PARAGRAPH} for _ in range(10)]},
+            {"type": "message", "content": [{"type": "output_text", "text": "\n\n   " + body}]},
+        ],
+    }
+
+
+def _structured_response(items: int = 60) -> Dict[str, Any]:
+    text = json.dumps({"items": _quiz_items(items)}, ensure_ascii=False)
+    return {
+        "id": "resp_bench",
+        "output": [
+            {"type": "reasoning", "summary": []},
+            {"type": "message", "content": [{"type": "output_text", "text": text}]},
+        ],
+    }
+
+
+def _parsed_response(items: int = 60) -> Dict[str, Any]:
+    return {
+        "id": "resp_bench",
+        "output": [
+            {"type": "reasoning", "summary": []},
+            {"type": "message", "content": [{"type": "output_text", "parsed": {"items": _quiz_items(items)}}]},
+        ],
+    }
+
+
+def _cases() -> Dict[str, Callable[[], Any]]:
+    chat = _chat_payload()
+    multi_file = _multi_file_payload()
+    passthrough = _passthrough_payload()
+    text_response = _text_response()
+    structured = _structured_response()
+    parsed = _parsed_response()
+    overrides = chat["tool_overrides"]
+    default_chat = settings.AI_MODEL_DEFAULTS.get("chat")
+    return {
+        "build_responses_payload.chat": lambda: openai_utils.build_responses_payload(chat),
+        "build_responses_payload.multi_file": lambda: openai_utils.build_responses_payload(multi_file),
+        "build_responses_payload.passthrough": lambda: openai_utils.build_responses_payload(passthrough),
+        "resolve_tools": lambda: ai_registry.resolve_tools(
+            ["file_search", "image_generation", "file_search"], overrides=overrides
+        ),
+        "resolve_model_key": lambda: ai_registry.resolve_model_key("gpt-4.1-nano", default_key=default_chat),
+        "resolve_model_value": lambda: ai_registry.resolve_model_value("gpt-4o-transcribe"),
+        "extract_text_from_response.40k": lambda: openai_utils.extract_text_from_response(text_response),
+        "extract_structured_output.json_text": lambda: openai_utils.extract_structured_output(structured),
+        "extract_structured_output.parsed": lambda: openai_utils.extract_structured_output(parsed),
+    }
+
+
+def _measure(fn: Callable[[], Any], min_time: float, repeats: int) -> float:
+    """Median ns/call over `repeats` rounds, each long enough to exceed `min_time`."""
+    fn()
+    loops = 1
+    while True:
+        started = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter_ns() - started >= min_time * 1e9:
+            break
+        loops *= 2
+    rounds: List[float] = []
+    for _ in range(repeats):
+        started = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter_ns() - started) / loops)
+    return statistics.median(rounds)
+
+
+def _regressions(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Tuple[str, float, float]]:
+    return [
+        (name, baseline[name], ns)
+        for name, ns in results.items()
+        if name in baseline and ns > baseline[name] * (1 + threshold)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round (default 0.2)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("--save", action="store_true", help=f"write results to {BASELINE.name}")
+    parser.add_argument("--check", action="store_true", help="fail on regression against the saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.20)
+    args = parser.parse_args()
+
+    baseline: Dict[str, float] = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results: Dict[str, float] = {}
+    for name, fn in _cases().items():
+        if args.filter not in name:
+            continue
+        results[name] = _measure(fn, args.min_time, args.repeats)
+        old = baseline.get(name)
+        delta = f"  ({results[name] / old - 1:+.0%} vs baseline)" if old else ""
+        print(f"{name:<42} {results[name]:>12,.0f} ns/call{delta}")
+
+    if args.save:
+        BASELINE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE.write_text(json.dumps({**baseline, **results}, indent=2))
+        print(f"baseline written to {BASELINE}")
+    if args.check:
+        if not baseline:
+            sys.exit(f"no baseline at {BASELINE}; run with --save first")
+        regressions = _regressions(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:,.0f} -> {new:,.0f} ns/call (+{new / old - 1:.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Per-item vs batch requests for the flashcard/quiz multi-select actions.
+
+    python -m bench.batch_ops [--sizes 1 100 1000] [--db auto|postgres|sqlite]
+
+For each size N, seeds N flashcards and N quiz questions through the bulk-create
+endpoints. It then times each UI action two ways: N single-item requests (what the
+UI did before) and one batch request. Query counts come from the `Server-Timing`
+header.
+
+    favorite  PUT /quizzes/{id}            vs  PATCH /quizzes/batch
+    move      PUT /flashcards/{id}         vs  PATCH /flashcards/batch
+    delete    DELETE /flashcards/{id}      vs  DELETE /flashcards/batch?ids=...
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+import httpx
+
+from bench.harness import BenchEnvironment
+from bench.loadgen import BenchUser, Recorder
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class Timing:
+    requests: int = 0
+    queries: int = 0
+    seconds: float = 0.0
+
+    def add(self, resp: httpx.Response, seconds: float) -> None:
+        resp.raise_for_status()
+        match = _QUERIES.search(resp.headers.get("server-timing", ""))
+        self.requests += 1
+        self.queries += int(match.group(1)) if match else 0
+        self.seconds += seconds
+
+
+async def _timed(user: BenchUser, timing: Timing, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    started = time.perf_counter()
+    resp = await user.request("batch_ops", method, url, **kwargs)
+    timing.add(resp, time.perf_counter() - started)
+    return resp
+
+
+async def _seed(user: BenchUser, size: int) -> Dict[str, Any]:
+    resp = await user.request("seed", "POST", "/api/notebooks", json={"title": f"batch-{size}"})
+    resp.raise_for_status()
+    notebook_id = resp.json()["id"]
+    folders = []
+    for name in ("A", "B"):
+        resp = await user.request(
+            "seed", "POST", "/api/flashcards/folders", json={"notebook_id": notebook_id, "name": f"{name}-{size}"}
+        )
+        resp.raise_for_status()
+        folders.append(resp.json()["id"])
+
+    async def create(path: str, items: List[Dict[str, Any]]) -> List[str]:
+        resp = await user.request("seed", "POST", path, json={"items": items})
+        resp.raise_for_status()
+        return [item["id"] for item in resp.json()]
+
+    cards = await create(
+        "/api/flashcards/bulk",
+        [{"notebook_id": notebook_id, "question": f"q{i}", "answer": "a", "folder_ids": [folders[0]]} for i in range(size)],
+    )
+    questions = await create(
+        "/api/quizzes/bulk",
+        [
+            {"notebook_id": notebook_id, "question": f"q{i}", "options": ["a", "b", "c", "d"], "correct_index": 0}
+            for i in range(size)
+        ],
+    )
+    return {"folders": folders, "cards": cards, "questions": questions}
+
+
+async def _per_item(user: BenchUser, seed: Dict[str, Any]) -> Dict[str, Timing]:
+    timings = {name: Timing() for name in ("favorite", "move", "delete")}
+    for question_id in seed["questions"]:
+        await _timed(user, timings["favorite"], "PUT", f"/api/quizzes/{question_id}", json={"is_favorite": True})
+    for card_id in seed["cards"]:
+        await _timed(user, timings["move"], "PUT", f"/api/flashcards/{card_id}", json={"folder_ids": [seed["folders"][1]]})
+    for card_id in seed["cards"]:
+        await _timed(user, timings["delete"], "DELETE", f"/api/flashcards/{card_id}")
+    return timings
+
+
+async def _batch(user: BenchUser, seed: Dict[str, Any]) -> Dict[str, Timing]:
+    timings = {name: Timing() for name in ("favorite", "move", "delete")}
+    await _timed(
+        user, timings["favorite"], "PATCH", "/api/quizzes/batch", json={"ids": seed["questions"], "is_favorite": True}
+    )
+    await _timed(
+        user,
+        timings["move"],
+        "PATCH",
+        "/api/flashcards/batch",
+        json={"ids": seed["cards"], "add_folder_ids": [seed["folders"][1]], "remove_folder_ids": [seed["folders"][0]]},
+    )
+    resp = await _timed(user, timings["delete"], "DELETE", "/api/flashcards/batch", params={"ids": seed["cards"]})
+    assert resp.json()["failed"] == 0, resp.text
+    return timings
+
+
+async def _run(base_url: str, sizes: Sequence[int]) -> List[Dict[str, Any]]:
+    user = BenchUser(base_url, Recorder(), 0)
+    rows: List[Dict[str, Any]] = []
+    try:
+        await user.sign_up()
+        for size in sizes:
+            per_item = await _per_item(user, await _seed(user, size))
+            batch = await _batch(user, await _seed(user, size))
+            for action in per_item:
+                rows.append({"size": size, "action": action, "per_item": per_item[action], "batch": batch[action]})
+    finally:
+        await user.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--db", choices=["auto", "postgres", "sqlite"], default="auto")
+    args = parser.parse_args()
+
+    with BenchEnvironment(db=args.db) as env:
+        rows = asyncio.run(_run(env.base_url, args.sizes))
+        print(f"db={env.db_kind}")
+    print(f"{'size':>5} {'action':<9} {'per-item ms':>12} {'queries':>8} {'batch ms':>10} {'queries':>8} {'speedup':>8}")
+    for row in rows:
+        per_item: Timing = row["per_item"]
+        batch: Timing = row["batch"]
+        print(
+            f"{row['size']:>5} {row['action']:<9} {per_item.seconds * 1000:>12.1f} {per_item.queries:>8}"
+            f" {batch.seconds * 1000:>10.1f} {batch.queries:>8} {per_item.seconds / batch.seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""CPU cost of budgeting generation input: token estimates and passage packing.
+
+    python -m bench.context_packing [--rounds 50]
+
+Builds synthetic mixed Chinese/English material (notes plus attachment text, cut into
+passages as at extraction time) at several sizes and reports estimate_tokens
+throughput and `context_packer.pack` latency with and without a focus query. When
+tiktoken and its o200k_base vocabulary can be loaded locally, the estimate is also
+compared against real token counts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import List, Optional
+
+from api.services import context_packer
+from api.services.context_packer import Material
+from api.services.document_text import chunk_boundaries, normalize_text
+from api.services.tokens import estimate_tokens
+
+_ZH = "矩阵的特征值决定了线性变换在特征向量方向上的伸缩比例。行列式非零等价于矩阵可逆，也等价于满秩。"
+_EN = (
+    "Gradient descent updates the parameters in the direction of the negative gradient. "
+    "The learning rate controls the step size and must be tuned for convergence. "
+)
+_TOPICS = ["特征值", "eigenvalue", "行列式", "convergence", "正交基", "regularization", "概率分布", "entropy"]
+# (materials, characters per material)
+_SIZES = [(3, 20_000), (10, 60_000), (30, 120_000)]
+_BUDGET = 48_000
+
+
+def _document(rng: random.Random, chars: int) -> str:
+    lines: List[str] = []
+    total = 0
+    while total < chars:
+        topic = rng.choice(_TOPICS)
+        base = _ZH if rng.random() < 0.6 else _EN
+        line = f"{topic}: " + base * rng.randint(1, 4)
+        lines.append(line)
+        total += len(line)
+    return normalize_text("\n".join(lines))
+
+
+def _materials(rng: random.Random, count: int, chars: int) -> List[Material]:
+    materials = []
+    for index in range(count):
+        text = _document(rng, chars)
+        passages = [text[start:end] for start, end in chunk_boundaries(text)]
+        materials.append(Material(label=f"资料：doc-{index}.pdf", passages=passages))
+    return materials
+
+
+def _o200k():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def _percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def _pack_ms(materials: List[Material], focus: Optional[str], rounds: int) -> List[float]:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        context_packer.pack(materials, focus=focus, budget=_BUDGET)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    encoding = _o200k()
+
+    for count, chars in _SIZES:
+        materials = _materials(rng, count, chars)
+        passages = [passage for material in materials for passage in material.passages]
+        text = "\n\n".join(passages)
+
+        started = time.perf_counter()
+        estimated = sum(estimate_tokens(passage) for passage in passages)
+        estimate_s = time.perf_counter() - started
+        packed = context_packer.pack(materials, focus="特征值 eigenvalue", budget=_BUDGET)
+
+        print(
+            f"{count:>3} materials {len(text) / 1e6:5.2f} Mchar  {len(passages):>5} passages  "
+            f"~{estimated:>8} tokens  estimate {len(text) / estimate_s / 1e6:6.1f} Mchar/s  "
+            f"packed {packed.passages}/{packed.total_passages} ({packed.tokens} tokens)"
+        )
+        for focus in (None, "特征值 eigenvalue"):
+            timings = _pack_ms(materials, focus, args.rounds)
+            label = "focus" if focus else "no focus"
+            print(
+                f"    pack {label:<9} p50 {statistics.median(timings):7.2f} ms   p95 {_percentile(timings, 0.95):7.2f} ms"
+            )
+        if encoding is not None:
+            actual = len(encoding.encode(text))
+            print(f"    o200k_base {actual} tokens, estimate error {(estimated - actual) / actual:+.1%}")
+
+    if encoding is None:
+        print("tiktoken/o200k_base not available; skipped estimate accuracy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""Deterministic stand-in for the OpenAI endpoints the API calls.
+
+Covers Responses (JSON and SSE), Files, vector stores, audio transcriptions and the
+realtime transcription WebSocket. Latency, token rate and error injection are set by
+`FakeOpenAIConfig`. Each request gets its own RNG seeded from (seed, request number),
+so a run with the same seed and request order produces the same bodies.
+
+Structured outputs are synthesised from the `text.format.json_schema` the API sends,
+so generation endpoints get schema-valid JSON without special casing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+_WORDS = (
+    "知识 结构 模型 数据 学习 复习 概念 定义 公式 关系 system memory cache latency token "
+    "graph vector index query schema stream buffer signal energy cell protein market"
+).split()
+
+_COUNT_RE = re.compile(r"(?:生成数量|count)\s*[:：]\s*(\d+)", re.IGNORECASE)
+
+
+@dataclass
+class FakeOpenAIConfig:
+    # Delay before the first byte of any response.
+    first_byte_ms: float = 150.0
+    # Streaming speed; also used to pace non-streamed bodies when `pace_complete` is set.
+    tokens_per_second: float = 120.0
+    tokens_per_delta: int = 4
+    pace_complete: bool = True
+    # Length of free-text answers, in tokens (~4 chars each).
+    text_tokens: int = 160
+    # Extra delay when the request carries a `file_search` tool: the hosted retrieval hop.
+    file_search_ms: float = 0.0
+    # Array length for schema-driven outputs when the prompt does not ask for a count.
+    array_items: int = 6
+    # Fraction of HTTP requests answered with `error_status`.
+    error_rate: float = 0.0
+    error_status: int = 500
+    # Realtime: commit + transcribe every N appended audio frames.
+    realtime_commit_every: int = 10
+    # Realtime: drop the socket after this many frames (exercise reconnects); None = never.
+    realtime_drop_after_frames: Optional[int] = None
+    seed: int = 1234
+
+
+class FakeOpenAI:
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None) -> None:
+        self.config = config or FakeOpenAIConfig()
+        self._counter = itertools.count()
+        self.requests: Dict[str, int] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.vector_stores: Dict[str, Dict[str, Any]] = {}
+
+    # --- helpers ---
+
+    def _rng(self) -> random.Random:
+        return random.Random(self.config.seed * 1_000_003 + next(self._counter))
+
+    def _count(self, name: str) -> None:
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    async def _first_byte(self, rng: random.Random) -> None:
+        base = self.config.first_byte_ms / 1000
+        if base > 0:
+            # +-20% jitter, deterministic per request.
+            await asyncio.sleep(base * (0.8 + 0.4 * rng.random()))
+
+    def _maybe_error(self, rng: random.Random) -> Optional[Response]:
+        if self.config.error_rate > 0 and rng.random() < self.config.error_rate:
+            status = self.config.error_status
+            return JSONResponse(
+                {"error": {"message": f"Injected fake error ({status})", "type": "server_error", "code": None}},
+                status_code=status,
+            )
+        return None
+
+    def _text(self, rng: random.Random, tokens: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(max(1, tokens)))
+
+    # --- schema-driven structured output ---
+
+    def _from_schema(
+        self,
+        node: Dict[str, Any],
+        defs: Dict[str, Any],
+        rng: random.Random,
+        *,
+        depth: int,
+        index: int,
+        wanted: Optional[int],
+    ) -> Any:
+        ref = node.get("$ref")
+        if isinstance(ref, str):
+            node = defs.get(ref.rsplit("/", 1)[-1], {})
+        for key in ("anyOf", "oneOf"):
+            if key in node:
+                options = [opt for opt in node[key] if opt.get("type") != "null"] or node[key]
+                return self._from_schema(options[0], defs, rng, depth=depth, index=index, wanted=wanted)
+        if "enum" in node:
+            return node["enum"][0]
+        kind = node.get("type")
+        if kind == "object" or "properties" in node:
+            # `index` flows into properties so e.g. only the first quiz option is correct.
+            return {
+                name: self._from_schema(prop, defs, rng, depth=depth + 1, index=index, wanted=wanted)
+                for name, prop in node.get("properties", {}).items()
+            }
+        if kind == "array":
+            if depth > 4:
+                size = 0
+            elif depth <= 1 and wanted:
+                size = wanted
+            elif depth <= 1:
+                size = self.config.array_items
+            else:
+                # Nested object lists (quiz options, mind map children) get four entries.
+                size = 4 if "$ref" in node.get("items", {}) or "properties" in node.get("items", {}) else rng.randint(1, 3)
+            size = max(size, node.get("minItems", 0))
+            if "maxItems" in node:
+                size = min(size, node["maxItems"])
+            item = node.get("items", {"type": "string"})
+            return [
+                self._from_schema(item, defs, rng, depth=depth + 1, index=i, wanted=wanted) for i in range(size)
+            ]
+        if kind == "integer":
+            return int(node.get("minimum", 0))
+        if kind == "number":
+            return float(node.get("minimum", 0.0))
+        if kind == "boolean":
+            return index == 0
+        return self._text(rng, rng.randint(3, 14))
+
+    def _answer(self, body: Dict[str, Any], rng: random.Random) -> str:
+        fmt = ((body.get("text") or {}).get("format") or {}) if isinstance(body.get("text"), dict) else {}
+        if fmt.get("type") == "json_schema" and isinstance(fmt.get("schema"), dict):
+            schema = fmt["schema"]
+            match = _COUNT_RE.search(json.dumps(body.get("input"), ensure_ascii=False))
+            wanted = int(match.group(1)) if match else None
+            value = self._from_schema(schema, schema.get("$defs", {}), rng, depth=0, index=0, wanted=wanted)
+            return json.dumps(value, ensure_ascii=False)
+        tokens = min(self.config.text_tokens, int(body.get("max_output_tokens") or self.config.text_tokens))
+        return self._text(rng, tokens)
+
+    # --- Responses ---
+
+    def _response_object(self, body: Dict[str, Any], text: str, status: str = "completed") -> Dict[str, Any]:
+        input_tokens = max(1, len(json.dumps(body.get("input"), ensure_ascii=False)) // 4)
+        output_tokens = max(1, len(text) // 4)
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": status,
+            "model": body.get("model") or "fake-model",
+            "output": [
+                {
+                    "type": "message",
+                    "id": f"msg_{uuid.uuid4().hex}",
+                    "status": "completed",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                }
+            ],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "text": body.get("text") or {"format": {"type": "text"}},
+            "previous_response_id": body.get("previous_response_id"),
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    async def responses(self, request: Request) -> Response:
+        self._count("responses")
+        body = await request.json()
+        rng = self._rng()
+        await self._first_byte(rng)
+        if self.config.file_search_ms > 0 and any(
+            isinstance(tool, dict) and tool.get("type") == "file_search" for tool in body.get("tools") or []
+        ):
+            await asyncio.sleep(self.config.file_search_ms / 1000 * (0.8 + 0.4 * rng.random()))
+        error = self._maybe_error(rng)
+        if error is not None:
+            return error
+        text = self._answer(body, rng)
+        if body.get("stream"):
+            return StreamingResponse(self._sse(body, text), media_type="text/event-stream")
+        if self.config.pace_complete and self.config.tokens_per_second > 0:
+            await asyncio.sleep((len(text) / 4) / self.config.tokens_per_second)
+        return JSONResponse(self._response_object(body, text))
+
+    async def _sse(self, body: Dict[str, Any], text: str) -> AsyncIterator[bytes]:
+        final = self._response_object(body, text)
+        item_id = final["output"][0]["id"]
+        seq = itertools.count()
+
+        def frame(event: Dict[str, Any]) -> bytes:
+            event["sequence_number"] = next(seq)
+            return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode()
+
+        yield frame({"type": "response.created", "response": {**final, "status": "in_progress", "output": [], "usage": None}})
+        step = max(1, self.config.tokens_per_delta) * 4
+        delay = self.config.tokens_per_delta / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0
+        for start in range(0, len(text), step):
+            yield frame(
+                {
+                    "type": "response.output_text.delta",
+                    "item_id": item_id,
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": text[start : start + step],
+                    "logprobs": [],
+                }
+            )
+            if delay:
+                await asyncio.sleep(delay)
+        yield frame(
+            {
+                "type": "response.output_text.done",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "text": text,
+                "logprobs": [],
+            }
+        )
+        yield frame({"type": "response.completed", "response": final})
+
+    # --- Files and vector stores ---
+
+    async def upload_file(self, request: Request) -> Response:
+        self._count("files.create")
+        form = await request.form()
+        upload = form.get("file")
+        content = await upload.read() if hasattr(upload, "read") else b""
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": getattr(upload, "filename", None) or "upload.bin",
+            "purpose": form.get("purpose") or "assistants",
+            "status": "processed",
+        }
+        self.files[file_id] = record
+        return JSONResponse(record)
+
+    async def list_files(self, request: Request) -> Response:
+        self._count("files.list")
+        return JSONResponse({"object": "list", "data": list(self.files.values()), "has_more": False})
+
+    async def file_detail(self, request: Request) -> Response:
+        file_id = request.path_params["file_id"]
+        record = self.files.get(file_id)
+        if request.method == "DELETE":
+            self._count("files.delete")
+            self.files.pop(file_id, None)
+            return JSONResponse({"id": file_id, "object": "file", "deleted": True})
+        self._count("files.retrieve")
+        if record is None:
+            return JSONResponse({"error": {"message": "No such file"}}, status_code=404)
+        return JSONResponse(record)
+
+    async def create_vector_store(self, request: Request) -> Response:
+        self._count("vector_stores.create")
+        body = await request.json() if await request.body() else {}
+        store_id = f"vs_{uuid.uuid4().hex[:24]}"
+        record = {
+            "id": store_id,
+            "object": "vector_store",
+            "created_at": int(time.time()),
+            "name": body.get("name"),
+            "usage_bytes": 0,
+            "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+            "status": "completed",
+            "last_active_at": None,
+            "metadata": {},
+        }
+        self.vector_stores[store_id] = record
+        return JSONResponse(record)
+
+    async def vector_store_file(self, request: Request) -> Response:
+        store_id = request.path_params["store_id"]
+        if request.method == "DELETE":
+            self._count("vector_stores.files.delete")
+            file_id = request.path_params.get("file_id")
+            return JSONResponse({"id": file_id, "object": "vector_store.file.deleted", "deleted": True})
+        self._count("vector_stores.files.create")
+        body = await request.json()
+        return JSONResponse(
+            {
+                "id": body.get("file_id"),
+                "object": "vector_store.file",
+                "created_at": int(time.time()),
+                "vector_store_id": store_id,
+                "status": "completed",
+                "usage_bytes": 0,
+                "last_error": None,
+            }
+        )
+
+    # --- Audio ---
+
+    async def transcriptions(self, request: Request) -> Response:
+        self._count("audio.transcriptions")
+        form = await request.form()
+        upload = form.get("file")
+        content = await upload.read() if hasattr(upload, "read") else b""
+        rng = self._rng()
+        await self._first_byte(rng)
+        error = self._maybe_error(rng)
+        if error is not None:
+            return error
+        # Assume ~16 kB/s of compressed audio and ~2.5 words per second of speech.
+        seconds = max(1.0, len(content) / 16_000)
+        text = self._text(rng, int(seconds * 2.5))
+        if (form.get("response_format") or "json") == "text":
+            return PlainTextResponse(text)
+        words = text.split()
+        return JSONResponse(
+            {
+                "text": text,
+                "language": "zh",
+                "duration": seconds,
+                "segments": [{"id": 0, "start": 0.0, "end": seconds, "text": text}],
+                "words": [
+                    {"word": word, "start": i * seconds / len(words), "end": (i + 1) * seconds / len(words)}
+                    for i, word in enumerate(words)
+                ],
+                "usage": {"type": "tokens", "input_tokens": int(seconds * 10), "output_tokens": len(words), "total_tokens": int(seconds * 10) + len(words)},
+            }
+        )
+
+    async def realtime(self, websocket: WebSocket) -> None:
+        self._count("realtime.connect")
+        await websocket.accept()
+        rng = self._rng()
+        await websocket.send_text(
+            json.dumps({"type": "transcription_session.created", "session": {"id": f"sess_{uuid.uuid4().hex[:16]}"}})
+        )
+        frames = 0
+        pending = 0
+        try:
+            while True:
+                message = await websocket.receive_text()
+                if '"input_audio_buffer.append"' not in message:
+                    continue
+                frames += 1
+                pending += 1
+                drop_after = self.config.realtime_drop_after_frames
+                if drop_after and frames >= drop_after:
+                    await websocket.close(code=1011)
+                    return
+                if pending < self.config.realtime_commit_every:
+                    continue
+                pending = 0
+                item_id = f"item_{uuid.uuid4().hex[:16]}"
+                await websocket.send_text(json.dumps({"type": "input_audio_buffer.committed", "item_id": item_id}))
+                await self._first_byte(rng)
+                transcript = self._text(rng, rng.randint(4, 12))
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "conversation.item.input_audio_transcription.delta",
+                            "item_id": item_id,
+                            "content_index": 0,
+                            "delta": transcript,
+                        },
+                        ensure_ascii=False,
+                    )
+                )
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "conversation.item.input_audio_transcription.completed",
+                            "item_id": item_id,
+                            "content_index": 0,
+                            "transcript": transcript,
+                            "logprobs": [{"token": word, "logprob": -0.05} for word in transcript.split()],
+                        },
+                        ensure_ascii=False,
+                    )
+                )
+        except WebSocketDisconnect:
+            return
+
+    def app(self) -> Starlette:
+        return Starlette(
+            routes=[
+                Route("/v1/responses", self.responses, methods=["POST"]),
+                Route("/v1/files", self.upload_file, methods=["POST"]),
+                Route("/v1/files", self.list_files, methods=["GET"]),
+                Route("/v1/files/{file_id}", self.file_detail, methods=["GET", "DELETE"]),
+                Route("/v1/vector_stores", self.create_vector_store, methods=["POST"]),
+                Route("/v1/vector_stores/{store_id}/files", self.vector_store_file, methods=["POST"]),
+                Route("/v1/vector_stores/{store_id}/files/{file_id}", self.vector_store_file, methods=["DELETE"]),
+                Route("/v1/audio/transcriptions", self.transcriptions, methods=["POST"]),
+                WebSocketRoute("/v1/realtime", self.realtime),
+            ]
+        )
+
+
+def build_app(config: Optional[FakeOpenAIConfig] = None) -> Starlette:
+    return FakeOpenAI(config).app()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI server standalone.")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--first-byte-ms", type=float, default=FakeOpenAIConfig.first_byte_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOpenAIConfig.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    config = FakeOpenAIConfig(
+        first_byte_ms=args.first_byte_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+    )
+    uvicorn.run(build_app(config), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Generation latency: the JSON endpoints vs their streamed (SSE) variants.
+
+    python -m bench.generation_stream [--counts 10 30] [--rounds 3] [--tokens-per-second 120] [--db auto|postgres|sqlite]
+
+Creates a notebook with a few notes, then for flashcards and quizzes at each count,
+and for a mind map, measures:
+
+    json    POST .../generate, time until the whole response arrives
+    first   POST .../generate/stream, time to the first `generation.items` event
+    done    the same stream, time to `generation.completed`
+
+The fake OpenAI server writes replies at `--tokens-per-second` (streamed or not), so
+`json` is about as long as the whole reply takes to write and `first` is about one
+item's worth.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bench.fake_openai import FakeOpenAIConfig
+from bench.harness import BenchEnvironment
+from bench.loadgen import BenchUser, Recorder
+
+_NOTE = "<p>矩阵的特征值决定了线性变换在特征向量方向上的伸缩比例。行列式非零等价于矩阵可逆。</p>" * 20
+
+
+async def _stream(user: BenchUser, url: str, body: Dict[str, Any]) -> Tuple[Optional[float], float, int]:
+    """(ms to first item, ms to completion, items) for one streamed generation."""
+    started = time.perf_counter()
+    first: Optional[float] = None
+    items = 0
+    async with user.client.stream("POST", url, json=body, headers=user.csrf_headers) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[5:])
+            if event["type"] == "generation.items":
+                if first is None:
+                    first = (time.perf_counter() - started) * 1000
+                items += len(event.get("flashcards") or event.get("questions") or event.get("nodes") or [])
+            elif event["type"] == "generation.error":
+                raise RuntimeError(f"{url}: {event['detail']}")
+            elif event["type"] == "generation.completed":
+                return first, (time.perf_counter() - started) * 1000, items
+    raise RuntimeError(f"{url}: stream ended without generation.completed")
+
+
+async def _run(base_url: str, counts: Sequence[int], rounds: int) -> List[Dict[str, Any]]:
+    user = BenchUser(base_url, Recorder(), 0)
+    rows: List[Dict[str, Any]] = []
+    try:
+        await user.sign_up()
+        resp = await user.request(
+            "seed",
+            "POST",
+            "/api/notebooks",
+            json={"title": "generation-stream", "notes": [{"title": f"第 {i} 章", "content": _NOTE, "seq": i} for i in range(4)]},
+        )
+        resp.raise_for_status()
+        notebook = resp.json()
+        base = {"note_ids": [note["id"] for note in notebook["notes"]]}
+        prefix = f"/api/notebooks/{notebook['id']}"
+
+        cases: List[Tuple[str, Optional[int]]] = [(scene, count) for count in counts for scene in ("flashcards", "quizzes")]
+        cases.append(("mindmaps", None))
+        for scene, count in cases:
+            body = {**base, **({"count": count, "fan_out": False} if count else {})}
+            row: Dict[str, Any] = {"scene": scene, "count": count, "json": [], "first": [], "done": [], "items": 0}
+            for _ in range(rounds):
+                started = time.perf_counter()
+                resp = await user.request(scene, "POST", f"{prefix}/{scene}/generate", json=body)
+                resp.raise_for_status()
+                row["json"].append((time.perf_counter() - started) * 1000)
+                first, done, items = await _stream(user, f"{prefix}/{scene}/generate/stream", body)
+                row["first"].append(first if first is not None else done)
+                row["done"].append(done)
+                row["items"] = items
+            rows.append(row)
+    finally:
+        await user.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 30])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tokens-per-second", type=float, default=120.0)
+    parser.add_argument("--db", choices=["auto", "postgres", "sqlite"], default="auto")
+    args = parser.parse_args()
+
+    fake = FakeOpenAIConfig(tokens_per_second=args.tokens_per_second)
+    with BenchEnvironment(db=args.db, fake_config=fake) as env:
+        rows = asyncio.run(_run(env.base_url, args.counts, args.rounds))
+        print(f"db={env.db_kind} rounds={args.rounds} tokens_per_second={fake.tokens_per_second:.0f}")
+    print(f"{'scene':<11} {'count':>5} {'items':>5} {'json ms':>9} {'first ms':>9} {'done ms':>9}")
+    for row in rows:
+        print(
+            f"{row['scene']:<11} {row['count'] or '-':>5} {row['items']:>5} {statistics.median(row['json']):>9.0f}"
+            f" {statistics.median(row['first']):>9.0f} {statistics.median(row['done']):>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
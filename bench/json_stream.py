@@ -0,0 +1,353 @@
+"""Incremental JSON parser (api.services.json_stream): fuzzing against json.loads, and throughput.
+
+    python -m bench.json_stream [--fuzz 3000] [--rounds 5] [--seed 7]
+
+Fuzzing generates random documents (nested objects and arrays, escapes, non-ASCII
+and astral characters, numbers in every JSON form) serialised in random styles, picks
+paths that occur in them and feeds each document in random fragments, down to one
+character at a time. It checks that:
+
+    valid      the values returned, in completion order, are what json.loads finds at
+               those paths
+    truncated  a cut-off document fails in `close` unless json.loads accepts the prefix
+    mutated    a document with a character inserted, deleted or replaced is accepted or
+               rejected exactly as json.loads (without NaN/Infinity) decides
+
+Throughput is measured on replies synthesised from the generation templates' schemas
+by the fake OpenAI server, fed in 16-character deltas (what the Responses API sends
+for a few tokens), 256-character deltas and whole. It is compared with json.loads of
+the whole text, and with re-parsing the accumulated text after every delta. That
+re-parsing is the quadratic alternative to an incremental parser and is skipped for
+the largest replies.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from api.services import structured_outputs
+from api.services.json_stream import JsonStream, JsonStreamError, Segment, parse_path
+from bench.fake_openai import FakeOpenAI
+
+_KEY_CHARS = "abcxyz_题目选项\"\\/\n\t é😀"
+_STRING_CHARS = "abc XYZ 012 特征值矩阵，。\"\\/\b\f\n\r\t\x7f é€😀𝄞"
+_MUTATIONS = "{}[],:\"\\ 0123456789-+.eEtrufalsnNIgxu\x01é"
+_QUADRATIC_LIMIT = 60_000
+
+
+# ---------------------------------------------------------------------------
+# Fuzzing
+# ---------------------------------------------------------------------------
+
+
+def _string(rng: random.Random, chars: str, longest: int) -> str:
+    return "".join(rng.choice(chars) for _ in range(rng.randint(0, longest)))
+
+
+def _number(rng: random.Random) -> Any:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return rng.randint(-10, 10)
+    if kind == 1:
+        return rng.randint(-(10**20), 10**20)
+    if kind == 2:
+        return rng.uniform(-1e3, 1e3)
+    return rng.choice([1e-7, -2.5e21, 0.0, -0.0, 1e300])
+
+
+def _value(rng: random.Random, depth: int) -> Any:
+    kind = rng.randrange(8 if depth < 4 else 5)
+    if kind == 0:
+        return _string(rng, _STRING_CHARS, 12)
+    if kind == 1:
+        return _number(rng)
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind in (3, 4):
+        return _string(rng, "abc 题", 4)
+    if kind in (5, 6):
+        return {_string(rng, _KEY_CHARS, 6): _value(rng, depth + 1) for _ in range(rng.randint(0, 5))}
+    return [_value(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+
+
+def _document(rng: random.Random) -> Any:
+    if rng.random() < 0.3:
+        # Shaped like a generation reply, so the scene paths occur.
+        return {
+            "folder_name": _string(rng, _STRING_CHARS, 8),
+            "flashcards": [{"question": _value(rng, 3), "answer": _value(rng, 2)} for _ in range(rng.randint(0, 6))],
+            "root": {"title": "t", "children": [_value(rng, 2) for _ in range(rng.randint(0, 4))]},
+        }
+    return _value(rng, 0)
+
+
+def _serialise(rng: random.Random, value: Any) -> str:
+    style = rng.randrange(4)
+    ensure_ascii = rng.random() < 0.5
+    if style == 0:
+        return json.dumps(value, ensure_ascii=ensure_ascii)
+    if style == 1:
+        return json.dumps(value, ensure_ascii=ensure_ascii, separators=(",", ":"))
+    if style == 2:
+        return json.dumps(value, ensure_ascii=ensure_ascii, indent=rng.choice([1, 2, "\t"]))
+    return " \n" + json.dumps(value, ensure_ascii=ensure_ascii, indent=2).replace("\n", "\r\n") + "\t "
+
+
+def _concrete_paths(value: Any, path: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+    paths = [path]
+    if isinstance(value, dict):
+        for key, child in value.items():
+            paths += _concrete_paths(child, path + (key,))
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            paths += _concrete_paths(child, path + (index,))
+    return paths
+
+
+def _path_string(segments: Sequence[Segment]) -> Optional[str]:
+    """The path as `$...` text, or None when a key cannot be written in the path syntax."""
+    text = "$"
+    for segment in segments:
+        if segment is None:
+            text += "[*]"
+        elif isinstance(segment, int):
+            text += f"[{segment}]"
+        elif not segment or any(char in segment for char in ".[]"):
+            return None
+        else:
+            text += f".{segment}"
+    return text
+
+
+def _pick_paths(rng: random.Random, value: Any) -> List[str]:
+    paths = ["$.flashcards[*]", "$.root.children[*]"]
+    candidates = _concrete_paths(value)
+    for segments in rng.sample(candidates, min(len(candidates), rng.randint(1, 3))):
+        generalised = [None if isinstance(s, int) and rng.random() < 0.7 else s for s in segments]
+        text = _path_string(generalised)
+        if text is not None and text not in paths:
+            paths.append(text)
+    return paths
+
+
+def _expected(value: Any, paths: Sequence[str]) -> List[Tuple[str, Any]]:
+    """(path, value) in completion order: children before the container holding them."""
+    targets = [(path, parse_path(path)) for path in paths]
+    found: List[Tuple[str, Any]] = []
+
+    def matches(concrete: Tuple[Any, ...], segments: Tuple[Segment, ...]) -> bool:
+        return len(concrete) == len(segments) and all(
+            (isinstance(c, int) if s is None else c == s and type(c) is type(s)) for c, s in zip(concrete, segments)
+        )
+
+    def walk(node: Any, concrete: Tuple[Any, ...]) -> None:
+        if isinstance(node, dict):
+            for key, child in node.items():
+                walk(child, concrete + (key,))
+        elif isinstance(node, list):
+            for index, child in enumerate(node):
+                walk(child, concrete + (index,))
+        for path, segments in targets:
+            if matches(concrete, segments):
+                found.append((path, node))
+                break
+
+    walk(value, ())
+    return found
+
+
+def _fragments(rng: random.Random, text: str) -> List[str]:
+    if rng.random() < 0.1:
+        return list(text)
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 12)))) if len(text) > 1 else []
+    bounds = [0, *cuts, len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def _stream(paths: Sequence[str], fragments: Sequence[str]) -> List[Tuple[str, Any]]:
+    stream = JsonStream(*paths)
+    found: List[Tuple[str, Any]] = []
+    for fragment in fragments:
+        found += stream.feed(fragment)
+    return found + stream.close()
+
+
+def _strict_loads(text: str) -> Any:
+    def reject(name: str) -> Any:
+        raise ValueError(name)
+
+    def unique(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        keys = [key for key, _ in pairs]
+        if len(set(keys)) != len(keys):
+            raise _DuplicateKeys()
+        return dict(pairs)
+
+    return json.loads(text, parse_constant=reject, object_pairs_hook=unique)
+
+
+class _DuplicateKeys(Exception):
+    """json.loads keeps the last duplicate; the streamed values differ, so such cases are skipped."""
+
+
+def _agrees(rng: random.Random, text: str, paths: Sequence[str]) -> Optional[str]:
+    """None when the parser and json.loads agree on `text`, else what went wrong."""
+    try:
+        value = _strict_loads(text)
+    except _DuplicateKeys:
+        return None
+    except (ValueError, RecursionError):
+        value = _INVALID
+    try:
+        found: Any = _stream(paths, _fragments(rng, text))
+    except JsonStreamError:
+        found = _INVALID
+    except Exception as exc:
+        return f"the parser raised {exc!r}"
+    if value is _INVALID or found is _INVALID:
+        if value is not found:
+            return "json.loads rejects it" if value is _INVALID else "the parser rejects it"
+        return None
+    expected = _expected(value, paths)
+    if found != expected:
+        return f"values differ: {found!r:.300} != {expected!r:.300}"
+    return None
+
+
+_INVALID = object()
+
+
+def fuzz(cases: int, seed: int) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    counts = {"valid": 0, "truncated": 0, "mutated": 0}
+    for case in range(cases):
+        value = _document(rng)
+        text = _serialise(rng, value)
+        paths = _pick_paths(rng, value)
+        checks = [("valid", text)]
+        if len(text) > 1:
+            checks.append(("truncated", text[: rng.randrange(1, len(text))]))
+        position = rng.randrange(len(text))
+        escapes = [index for index, char in enumerate(text) if char == "\\"]
+        if escapes and rng.random() < 0.3:
+            # Escapes are where a scanner is most likely to be lenient.
+            position = min(len(text) - 1, rng.choice(escapes) + rng.randrange(6))
+        mutation = rng.randrange(3)
+        if mutation == 0:
+            mutated = text[:position] + rng.choice(_MUTATIONS) + text[position:]
+        elif mutation == 1:
+            mutated = text[:position] + text[position + 1 :]
+        else:
+            mutated = text[:position] + rng.choice(_MUTATIONS) + text[position + 1 :]
+        checks.append(("mutated", mutated))
+        for kind, candidate in checks:
+            counts[kind] += 1
+            problem = _agrees(rng, candidate, paths)
+            if problem is not None:
+                failures += 1
+                if failures <= 5:
+                    print(f"  case {case} {kind}: {problem}\n    paths {paths}\n    text {candidate!r:.300}")
+    print(
+        f"fuzz: {cases} documents, {counts['valid']} valid / {counts['truncated']} truncated /"
+        f" {counts['mutated']} mutated checks, {failures} failures"
+    )
+    return failures
+
+
+# ---------------------------------------------------------------------------
+# Throughput
+# ---------------------------------------------------------------------------
+
+
+def _reply(template: structured_outputs.StructuredTemplate[Any], count: Optional[int], rng: random.Random) -> str:
+    schema = template.payload_text()["format"]["schema"]
+    value = FakeOpenAI()._from_schema(schema, schema.get("$defs", {}), rng, depth=0, index=0, wanted=count)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _incremental(text: str, step: int, path: str) -> Callable[[], int]:
+    fragments = [text[start : start + step] for start in range(0, len(text), step)]
+
+    def run() -> int:
+        stream = JsonStream(path)
+        found = 0
+        for fragment in fragments:
+            found += len(stream.feed(fragment))
+        return found + len(stream.close())
+
+    return run
+
+
+def _reparse(text: str, step: int) -> Callable[[], int]:
+    fragments = [text[start : start + step] for start in range(0, len(text), step)]
+
+    def run() -> int:
+        seen = ""
+        for fragment in fragments:
+            seen += fragment
+            try:
+                json.loads(seen)
+            except ValueError:
+                pass
+        return 0
+
+    return run
+
+
+def _best_seconds(run: Callable[[], Any], rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def throughput(rounds: int, seed: int) -> None:
+    rng = random.Random(seed)
+    cases = [
+        ("flashcards x30", structured_outputs.FLASHCARDS, 30),
+        ("flashcards x300", structured_outputs.FLASHCARDS, 300),
+        ("quizzes x30", structured_outputs.QUIZZES, 30),
+        ("mind map", structured_outputs.MINDMAP, None),
+        ("flashcards x5000", structured_outputs.FLASHCARDS, 5000),
+    ]
+    print(f"{'reply':<17} {'chars':>9} {'delta':>6} {'stream Mchar/s':>15} {'us/delta':>9} {'re-parse Mchar/s':>17}")
+    for label, template, count in cases:
+        text = _reply(template, count, rng)
+        items = _incremental(text, len(text), template.item_path)()
+        for step in (16, 256, len(text)):
+            seconds = _best_seconds(_incremental(text, step, template.item_path), rounds)
+            deltas = -(-len(text) // step)
+            if len(text) <= _QUADRATIC_LIMIT or step == len(text):
+                reparse = f"{len(text) / _best_seconds(_reparse(text, step), rounds) / 1e6:>17.2f}"
+            else:
+                reparse = f"{'skipped':>17}"
+            print(
+                f"{label:<17} {len(text):>9} {'whole' if step == len(text) else step:>6}"
+                f" {len(text) / seconds / 1e6:>15.2f} {seconds / deltas * 1e6:>9.1f} {reparse}"
+            )
+        loads = statistics.median(_best_seconds(lambda: json.loads(text), rounds) for _ in range(3))
+        print(f"{'':<17} {items} items at {template.item_path}; json.loads of the whole text {len(text) / loads / 1e6:.1f} Mchar/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=3000, help="documents to fuzz (0 to skip)")
+    parser.add_argument("--rounds", type=int, default=5, help="timing rounds per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    failures = fuzz(args.fuzz, args.seed) if args.fuzz else 0
+    throughput(args.rounds, args.seed)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
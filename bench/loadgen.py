@@ -0,0 +1,134 @@
+"""Virtual users, timing capture and the closed-loop runner."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+
+@dataclass
+class Recorder:
+    samples: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    started: float = 0.0
+    ended: float = 0.0
+    # Samples taken during warm-up are dropped.
+    recording: bool = True
+
+    def record(self, op: str, seconds: float, ok: bool = True) -> None:
+        if not self.recording:
+            return
+        if ok:
+            self.samples.setdefault(op, []).append(seconds)
+        else:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    @property
+    def elapsed(self) -> float:
+        return max(1e-9, (self.ended or time.perf_counter()) - self.started)
+
+
+class BenchUser:
+    """One signed-in browser: cookie jar, CSRF header and timed requests."""
+
+    def __init__(self, base_url: str, recorder: Recorder, index: int) -> None:
+        self.base_url = base_url
+        self.recorder = recorder
+        self.index = index
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=120.0)
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def csrf_headers(self) -> Dict[str, str]:
+        # Imported lazily: api.settings must not load before the harness exports its env.
+        from api.settings import settings
+
+        token = self.client.cookies.get(settings.CSRF_COOKIE_NAME)
+        return {settings.CSRF_HEADER_NAME: token} if token else {}
+
+    async def sign_up(self) -> None:
+        await self.client.get("/api/auth/csrf")
+        resp = await self.client.post(
+            "/api/auth/register",
+            json={"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": "bench-password", "name": "bench"},
+            headers=self.csrf_headers,
+        )
+        resp.raise_for_status()
+
+    async def request(self, op: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        if method.upper() not in ("GET", "HEAD"):
+            kwargs["headers"] = {**self.csrf_headers, **kwargs.get("headers", {})}
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(op, time.perf_counter() - started, ok=False)
+            raise
+        self.recorder.record(op, time.perf_counter() - started, ok=resp.status_code < 400)
+        return resp
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+ScenarioStep = Callable[[BenchUser], Awaitable[None]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    setup: ScenarioStep
+    step: ScenarioStep
+    # Optional pause between iterations of one user (seconds).
+    think_time: float = 0.0
+
+
+async def run_scenario(
+    scenario: Scenario,
+    base_url: str,
+    *,
+    users: int,
+    duration: float,
+    warmup: float = 2.0,
+    recorder: Optional[Recorder] = None,
+) -> Recorder:
+    """Closed loop: each virtual user repeats `step` until the deadline."""
+    recorder = recorder or Recorder()
+    bench_users = [BenchUser(base_url, recorder, i) for i in range(users)]
+    recorder.recording = False
+    try:
+        for user in bench_users:
+            await user.sign_up()
+        await asyncio.gather(*(scenario.setup(user) for user in bench_users))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + warmup + duration
+
+        def start_recording() -> None:
+            # Flip on a timer, not at an iteration boundary: long steps (a 5 s audio
+            # session) would otherwise keep the whole run in warm-up.
+            recorder.recording = True
+            recorder.started = time.perf_counter()
+
+        loop.call_later(warmup, start_recording)
+
+        async def drive(user: BenchUser) -> None:
+            while loop.time() < deadline:
+                try:
+                    await scenario.step(user)
+                except (httpx.HTTPError, OSError, asyncio.TimeoutError):
+                    pass
+                if scenario.think_time:
+                    await asyncio.sleep(scenario.think_time)
+
+        await asyncio.gather(*(drive(user) for user in bench_users))
+        recorder.ended = time.perf_counter()
+    finally:
+        await asyncio.gather(*(user.close() for user in bench_users), return_exceptions=True)
+    return recorder
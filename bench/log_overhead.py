@@ -0,0 +1,70 @@
+"""Per-call cost of logging on the caller's thread (what the event loop pays).
+
+    python -m bench.log_overhead [--calls 200000]
+
+Compares the queue-backed JSON logger against writing JSON synchronously through a
+RotatingFileHandler, plus the sampled and disabled fast paths.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import logging.handlers
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from api.services import app_logging
+from api.settings import settings
+
+
+def _ns_per_call(fn: Callable[[int], None], calls: int) -> float:
+    started = time.perf_counter_ns()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter_ns() - started) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.LOG_DIR = tmp
+        settings.LOG_TO_STDERR = False
+        settings.LOG_LEVEL = "DEBUG"
+        settings.LOG_QUEUE_SIZE = 0  # unbounded, so nothing is dropped mid-run
+        app_logging.setup_logging()
+        queued = app_logging.get_logger("bench.queued")
+
+        sync = logging.getLogger("bench.sync")
+        sync.propagate = False
+        sync_handler = logging.handlers.RotatingFileHandler(
+            Path(tmp) / "sync.log", maxBytes=settings.LOG_MAX_BYTES, backupCount=1, encoding="utf-8"
+        )
+        sync_handler.setFormatter(app_logging.JsonFormatter())
+        sync.addHandler(sync_handler)
+        sync.setLevel(logging.DEBUG)
+
+        extra = {"model": "gpt-5-mini", "user_id": "00000000-0000-0000-0000-000000000000"}
+        cases = {
+            "sync file + json": lambda i: sync.info("request %d", i, extra=extra),
+            "queue + json": lambda i: queued.info("request %d", i, extra=extra),
+            "queue, sampled event": lambda i: queued.debug("delta", extra={"event": "stream_delta", "seq": i}),
+            "disabled level": lambda i: queued.log(5, "noop %d", i),
+        }
+        print(f"{'case':<24}{'ns/call':>12}")
+        for name, fn in cases.items():
+            print(f"{name:<24}{_ns_per_call(fn, args.calls):>12.0f}")
+
+        drain_started = time.perf_counter()
+        app_logging.shutdown_logging()
+        print(f"listener drain: {(time.perf_counter() - drain_started) * 1000:.1f} ms")
+        sync_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Mind map edit latency vs document size: full-document PUT vs JSON Patch.
+
+    python -m bench.mindmap_patch [--nodes 10 100 1000 5000] [--edits 30] [--db auto|postgres|sqlite]
+
+For each size, creates a Mind Elixir-shaped map with that many nodes (each with a
+short note), then renames one node per edit, `--edits` times:
+
+    put    PUT /mindmaps/{id}    the whole `data` document, as the editor autosave did
+    patch  PATCH /mindmaps/{id}  one `replace` op on the node's topic, with `version`
+
+Reports p50/p95 latency and the request body size for each.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+from bench.harness import BenchEnvironment
+from bench.loadgen import BenchUser, Recorder
+
+_NOTE = "Eigenvalues λ satisfy Av = λv; the characteristic polynomial det(A - λI) gives them all. " * 2
+
+
+def _build_map(nodes: int, fanout: int = 8) -> Tuple[Dict[str, Any], List[str]]:
+    """A breadth-first tree of `nodes` nodes; returns the document and the JSON Pointer of every node."""
+    root: Dict[str, Any] = {"id": "n0", "topic": "root", "root": True, "expanded": True, "children": []}
+    queue: List[Tuple[Dict[str, Any], str]] = [(root, "/nodeData")]
+    pointers = ["/nodeData"]
+    for index in range(1, nodes):
+        parent, pointer = queue[0]
+        child = {"id": f"n{index}", "topic": f"topic {index}", "note": _NOTE}
+        parent.setdefault("children", []).append(child)
+        child_pointer = f"{pointer}/children/{len(parent['children']) - 1}"
+        pointers.append(child_pointer)
+        queue.append((child, child_pointer))
+        if len(parent["children"]) == fanout:
+            queue.pop(0)
+    return {"nodeData": root, "linkData": {}, "template": "right", "direction": 1, "meta": {"title": "bench"}}, pointers
+
+
+def _node(document: Dict[str, Any], pointer: str) -> Dict[str, Any]:
+    node: Any = document
+    for token in pointer[1:].split("/"):
+        node = node[int(token)] if isinstance(node, list) else node[token]
+    return node
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _measure(user: BenchUser, notebook_id: str, nodes: int, edits: int) -> Dict[str, Any]:
+    document, pointers = _build_map(nodes)
+    resp = await user.request(
+        "seed", "POST", "/api/mindmaps", json={"notebook_id": notebook_id, "title": f"map-{nodes}", "data": document}
+    )
+    resp.raise_for_status()
+    mindmap = resp.json()
+    version = mindmap["version"]
+    url = f"/api/mindmaps/{mindmap['id']}"
+    targets = [pointers[(i * 7919) % len(pointers)] for i in range(edits)]
+
+    put_ms: List[float] = []
+    put_bytes = 0
+    for i, pointer in enumerate(targets):
+        _node(document, pointer)["topic"] = f"put {i}"
+        body = json.dumps({"data": document}, ensure_ascii=False).encode()
+        put_bytes = len(body)
+        started = time.perf_counter()
+        resp = await user.request(
+            "put", "PUT", url, content=body, headers={"content-type": "application/json"}
+        )
+        put_ms.append((time.perf_counter() - started) * 1000)
+        resp.raise_for_status()
+        version = resp.json()["version"]
+
+    patch_ms: List[float] = []
+    patch_bytes = 0
+    for i, pointer in enumerate(targets):
+        ops = [{"op": "replace", "path": f"{pointer}/topic", "value": f"patch {i}"}]
+        body = json.dumps({"version": version, "ops": ops}).encode()
+        patch_bytes = len(body)
+        started = time.perf_counter()
+        resp = await user.request(
+            "patch", "PATCH", url, content=body, headers={"content-type": "application/json"}
+        )
+        patch_ms.append((time.perf_counter() - started) * 1000)
+        resp.raise_for_status()
+        version = resp.json()["version"]
+
+    resp = await user.request("verify", "GET", url)
+    resp.raise_for_status()
+    assert _node(resp.json()["data"], targets[-1])["topic"] == f"patch {edits - 1}", "patched document mismatch"
+    return {"nodes": nodes, "put": (put_ms, put_bytes), "patch": (patch_ms, patch_bytes)}
+
+
+async def _run(base_url: str, sizes: Sequence[int], edits: int) -> List[Dict[str, Any]]:
+    user = BenchUser(base_url, Recorder(), 0)
+    rows: List[Dict[str, Any]] = []
+    try:
+        await user.sign_up()
+        resp = await user.request("seed", "POST", "/api/notebooks", json={"title": "mindmap-patch"})
+        resp.raise_for_status()
+        notebook_id = resp.json()["id"]
+        for nodes in sizes:
+            rows.append(await _measure(user, notebook_id, nodes, edits))
+    finally:
+        await user.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--edits", type=int, default=30)
+    parser.add_argument("--db", choices=["auto", "postgres", "sqlite"], default="auto")
+    args = parser.parse_args()
+
+    with BenchEnvironment(db=args.db) as env:
+        rows = asyncio.run(_run(env.base_url, args.nodes, args.edits))
+        print(f"db={env.db_kind} edits={args.edits}")
+    print(f"{'nodes':>6} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'body bytes':>11}")
+    for row in rows:
+        for mode in ("put", "patch"):
+            timings, size = row[mode]
+            print(
+                f"{row['nodes']:>6} {mode:<6} {statistics.median(timings):>8.1f} {_percentile(timings, 95):>8.1f}"
+                f" {statistics.fmean(timings):>8.1f} {size:>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Percentile reports and commit-to-commit comparison.
+
+    python -m bench.report BASE.json HEAD.json [--threshold 0.10]
+
+Reports are JSON files keyed by op name; `compare` flags ops whose p95 or
+throughput regressed by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from bench.loadgen import Recorder
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(recorder: Recorder) -> Dict[str, Dict[str, float]]:
+    elapsed = recorder.elapsed
+    ops: Dict[str, Dict[str, float]] = {}
+    for op in sorted(set(recorder.samples) | set(recorder.errors)):
+        values = sorted(recorder.samples.get(op, []))
+        errors = recorder.errors.get(op, 0)
+        row: Dict[str, float] = {
+            "count": len(values),
+            "errors": errors,
+            "error_rate": errors / max(1, len(values) + errors),
+            "rps": len(values) / elapsed,
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+            "max_ms": values[-1] * 1000 if values else 0.0,
+        }
+        for pct in PERCENTILES:
+            row[f"p{pct}_ms"] = percentile(values, pct) * 1000
+        ops[op] = row
+    return ops
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True, cwd=RESULTS_DIR.parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def build_report(scenario: str, recorder: Recorder, meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "scenario": scenario,
+            "commit": _git("rev-parse", "HEAD"),
+            "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "elapsed_s": round(recorder.elapsed, 3),
+            **meta,
+        },
+        "ops": summarize(recorder),
+    }
+
+
+def write_report(report: Dict[str, Any], out_dir: Path = RESULTS_DIR) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    short = (report["meta"].get("commit") or "nogit")[:10]
+    path = out_dir / f"{report['meta']['scenario']}-{short}.json"
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    return path
+
+
+def format_table(report: Dict[str, Any]) -> str:
+    meta = report["meta"]
+    header = (
+        f"{meta['scenario']} @ {(meta.get('commit') or 'nogit')[:10]}"
+        f"{' (dirty)' if meta.get('dirty') else ''} "
+        f"db={meta.get('db')} users={meta.get('users')} duration={meta.get('duration')}s"
+    )
+    columns = ["op", "count", "err", "rps", "p50 ms", "p95 ms", "p99 ms", "max ms"]
+    rows: List[List[str]] = [
+        [
+            op,
+            f"{row['count']:.0f}",
+            f"{row['errors']:.0f}",
+            f"{row['rps']:.1f}",
+            f"{row['p50_ms']:.1f}",
+            f"{row['p95_ms']:.1f}",
+            f"{row['p99_ms']:.1f}",
+            f"{row['max_ms']:.1f}",
+        ]
+        for op, row in report["ops"].items()
+    ]
+    widths = [max(len(c), *(len(r[i]) for r in rows)) if rows else len(c) for i, c in enumerate(columns)]
+    lines = [header, "  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in rows]
+    return "\n".join(lines)
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.10) -> List[str]:
+    """Human-readable regressions of `head` against `base`; empty means no regression."""
+    regressions: List[str] = []
+    for op, new in head["ops"].items():
+        old = base["ops"].get(op)
+        if not old:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if old[key] > 0 and new[key] > old[key] * (1 + threshold):
+                regressions.append(f"{op}: {key} {old[key]:.1f} -> {new[key]:.1f} (+{new[key] / old[key] - 1:.0%})")
+        if old["rps"] > 0 and new["rps"] < old["rps"] * (1 - threshold):
+            regressions.append(f"{op}: rps {old['rps']:.1f} -> {new['rps']:.1f} ({new['rps'] / old['rps'] - 1:.0%})")
+        if new["error_rate"] > old["error_rate"] + 0.01:
+            regressions.append(f"{op}: error rate {old['error_rate']:.1%} -> {new['error_rate']:.1%}")
+    return regressions
+
+
+def format_comparison(base: Dict[str, Any], head: Dict[str, Any]) -> str:
+    lines = [f"{'op':<28} {'p50 ms':>17} {'p95 ms':>17} {'rps':>15}"]
+    for op, new in head["ops"].items():
+        old = base["ops"].get(op)
+        if not old:
+            lines.append(f"{op:<28} (new)")
+            continue
+        lines.append(
+            f"{op:<28} "
+            f"{old['p50_ms']:>7.1f} -> {new['p50_ms']:>7.1f} "
+            f"{old['p95_ms']:>7.1f} -> {new['p95_ms']:>7.1f} "
+            f"{old['rps']:>6.1f} -> {new['rps']:>6.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two bench reports")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown (default 0.10)")
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    print(format_comparison(base, head))
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(f"  {line}" for line in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Notebook chat context: local retrieval (bm25 / hybrid) vs the hosted file_search tool.
+
+    python -m bench.retrieval [--notes 50 200 1000] [--queries 30] [--hosted-ms 700] [--db auto|postgres|sqlite]
+
+For each size, creates a notebook with that many notes (~1.5k characters of mixed
+Chinese and English study text each), then measures:
+
+    index        the first GET /notebooks/{id}/retrieve, which chunks and indexes every note
+    bm25         GET /notebooks/{id}/retrieve?mode=bm25, warm index, one per query
+    hybrid       the same with mode=hybrid (BM25 fused with hashed n-gram vectors)
+    chat:<mode>  /api/responses/stream time to first chunk with the notebook in that mode
+
+In file_search mode the fake OpenAI server sleeps `--hosted-ms` before answering, to
+stand in for the hosted retrieval hop. The fake cannot measure that hop itself, so set
+`--hosted-ms` to what you observe against the real API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from bench.fake_openai import FakeOpenAIConfig
+from bench.harness import BenchEnvironment
+from bench.loadgen import BenchUser, Recorder
+
+_TERMS = (
+    "特征值 特征向量 矩阵 行列式 线性变换 正交 投影 梯度 导数 积分 极限 概率 分布 期望 方差 "
+    "细胞 蛋白质 基因 转录 翻译 代谢 能量 市场 需求 供给 均衡 弹性 成本 "
+    "eigenvalue matrix gradient entropy protein enzyme market equilibrium latency cache kernel vector"
+).split()
+_FILLER = "我们 这里 可以 通过 因此 所以 其中 以及 the of and which is used to".split()
+_QUERY_DB = re.compile(r'desc="(\d+) queries"')
+
+
+def _note(rng: random.Random, chars: int = 1500) -> str:
+    paragraphs: List[str] = []
+    length = 0
+    while length < chars:
+        words = [rng.choice(_TERMS) if rng.random() < 0.35 else rng.choice(_FILLER) for _ in range(rng.randint(20, 40))]
+        paragraph = "".join(word if re.match("[\u3400-\u9fff]", word) else f" {word} " for word in words) + "。"
+        paragraphs.append(f"<p>{paragraph.strip()}</p>")
+        length += len(paragraph)
+    return "".join(paragraphs)
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _queries(resp: httpx.Response) -> Optional[int]:
+    match = _QUERY_DB.search(resp.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else None
+
+
+async def _first_chunk_ms(user: BenchUser, payload: Dict[str, Any]) -> float:
+    started = time.perf_counter()
+    async with user.client.stream("POST", "/api/responses/stream", json=payload, headers=user.csrf_headers) as resp:
+        resp.raise_for_status()
+        async for _ in resp.aiter_lines():
+            return (time.perf_counter() - started) * 1000
+    raise RuntimeError("empty chat stream")
+
+
+async def _measure(user: BenchUser, notes: int, queries: int, rng: random.Random) -> Dict[str, Any]:
+    resp = await user.request(
+        "seed",
+        "POST",
+        "/api/notebooks",
+        json={
+            "title": f"retrieval-{notes}",
+            "notes": [{"title": f"第 {i} 章", "content": _note(rng), "seq": i} for i in range(notes)],
+        },
+    )
+    resp.raise_for_status()
+    notebook_id = resp.json()["id"]
+    url = f"/api/notebooks/{notebook_id}/retrieve"
+    texts = [" ".join(rng.sample(_TERMS, rng.randint(1, 3))) for _ in range(queries)]
+
+    started = time.perf_counter()
+    resp = await user.request("index", "GET", url, params={"q": texts[0], "mode": "bm25"})
+    resp.raise_for_status()
+    row: Dict[str, Any] = {"notes": notes, "index": [(time.perf_counter() - started) * 1000], "db": {}}
+
+    for mode in ("bm25", "hybrid"):
+        timings: List[float] = []
+        for text in texts:
+            started = time.perf_counter()
+            resp = await user.request(mode, "GET", url, params={"q": text, "mode": mode})
+            timings.append((time.perf_counter() - started) * 1000)
+            resp.raise_for_status()
+            assert resp.json(), f"{mode} returned no chunks for {text!r}"
+            row["db"][mode] = _queries(resp)
+        row[mode] = timings
+
+    for mode in ("file_search", "bm25", "hybrid"):
+        resp = await user.request(
+            "mode", "PUT", f"/api/notebooks/{notebook_id}", json={"title": f"retrieval-{notes}", "retrieval_mode": mode}
+        )
+        resp.raise_for_status()
+        timings = []
+        for text in texts[: max(1, queries // 3)]:
+            payload = {
+                "model_key": "gpt-5-mini",
+                "text": text,
+                "notebook_id": notebook_id,
+                "tool_keys": ["file_search"],
+                "tool_overrides": {"file_search": {"vector_store_ids": ["vs_bench"]}},
+            }
+            timings.append(await _first_chunk_ms(user, payload))
+        row[f"chat:{mode}"] = timings
+    return row
+
+
+async def _run(base_url: str, sizes: Sequence[int], queries: int) -> List[Dict[str, Any]]:
+    user = BenchUser(base_url, Recorder(), 0)
+    rng = random.Random(7)
+    rows: List[Dict[str, Any]] = []
+    try:
+        await user.sign_up()
+        for notes in sizes:
+            rows.append(await _measure(user, notes, queries, rng))
+    finally:
+        await user.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--hosted-ms", type=float, default=700.0)
+    parser.add_argument("--db", choices=["auto", "postgres", "sqlite"], default="auto")
+    args = parser.parse_args()
+
+    fake = FakeOpenAIConfig(first_byte_ms=150.0, file_search_ms=args.hosted_ms)
+    with BenchEnvironment(db=args.db, fake_config=fake) as env:
+        rows = asyncio.run(_run(env.base_url, args.notes, args.queries))
+        print(f"db={env.db_kind} queries={args.queries} hosted_ms={args.hosted_ms:.0f} first_byte_ms={fake.first_byte_ms:.0f}")
+    print(f"{'notes':>6} {'op':<17} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'db q':>5}")
+    for row in rows:
+        for op in ("index", "bm25", "hybrid", "chat:file_search", "chat:bm25", "chat:hybrid"):
+            timings = row[op]
+            queries = row["db"].get(op)
+            print(
+                f"{row['notes']:>6} {op:<17} {statistics.median(timings):>8.1f} {_percentile(timings, 95):>8.1f}"
+                f" {statistics.fmean(timings):>8.1f} {'' if queries is None else queries:>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
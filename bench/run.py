@@ -0,0 +1,97 @@
+"""Run load scenarios against the API booted with fake upstreams.
+
+    python -m bench.run --scenario browse --users 20 --duration 30
+    python -m bench.run --scenario all --compare bench/results/
+
+Each scenario writes `bench/results/<scenario>-<commit>.json`. With `--compare`, the
+new report is diffed against the given file (or the newest report for the same
+scenario in the given directory) and the exit status is 1 on regression.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+from bench.fake_openai import FakeOpenAIConfig
+from bench.harness import BenchEnvironment
+from bench.loadgen import run_scenario
+from bench.report import RESULTS_DIR, build_report, compare, format_comparison, format_table, write_report
+from bench.scenarios import SCENARIOS
+
+
+def _baseline_for(target: Path, scenario: str) -> Optional[Path]:
+    if target.is_file():
+        return target
+    return max(target.glob(f"{scenario}-*.json"), key=lambda p: p.stat().st_mtime, default=None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--db", choices=["auto", "postgres", "sqlite"], default="auto")
+    parser.add_argument("--first-byte-ms", type=float, default=FakeOpenAIConfig.first_byte_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOpenAIConfig.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=FakeOpenAIConfig.seed)
+    parser.add_argument("--out", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--compare", type=Path, help="baseline report, or a directory of reports")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    fake_config = FakeOpenAIConfig(
+        first_byte_ms=args.first_byte_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    # Pick baselines before writing anything, so a same-commit rerun compares against the old file.
+    baselines: Dict[str, Optional[Dict]] = {}
+    if args.compare:
+        for name in names:
+            path = _baseline_for(args.compare, name)
+            baselines[name] = json.loads(path.read_text()) if path else None
+
+    failed = False
+    with BenchEnvironment(db=args.db, fake_config=fake_config) as env:
+        for name in names:
+            recorder = asyncio.run(
+                run_scenario(SCENARIOS[name], env.base_url, users=args.users, duration=args.duration, warmup=args.warmup)
+            )
+            report = build_report(
+                name,
+                recorder,
+                {
+                    "users": args.users,
+                    "duration": args.duration,
+                    "db": env.db_kind,
+                    "fake_openai": dataclasses.asdict(fake_config),
+                },
+            )
+            path = write_report(report, args.out)
+            print(format_table(report))
+            print(f"-> {path}\n")
+
+            baseline = baselines.get(name)
+            if baseline is not None:
+                print(format_comparison(baseline, report))
+                regressions = compare(baseline, report, args.threshold)
+                if regressions:
+                    failed = True
+                    print("Regressions:\n" + "\n".join(f"  {line}" for line in regressions))
+                print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Scripted user journeys. Op names (the first argument to `user.request`) are the report keys."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+
+from bench.loadgen import BenchUser, Scenario
+
+_LOREM = "学习笔记 spaced repetition 复习 memory consolidation 公式 推导 example "
+
+
+def _note_content(rng: random.Random, paragraphs: int = 6) -> str:
+    return "\n\n".join(_LOREM * rng.randint(8, 30) for _ in range(paragraphs))
+
+
+async def _create_notebook(user: BenchUser, rng: random.Random, notes: int) -> str:
+    resp = await user.request(
+        "notebook.create",
+        "POST",
+        "/api/notebooks",
+        json={
+            "title": f"Bench notebook {rng.randint(0, 1_000_000)}",
+            "notes": [{"title": f"Note {i}", "content": _note_content(rng), "seq": i} for i in range(notes)],
+        },
+    )
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+
+# --- Notebook-heavy browsing ---
+
+async def _browse_setup(user: BenchUser) -> None:
+    rng = random.Random(user.index)
+    user.state["rng"] = rng
+    user.state["notebooks"] = [await _create_notebook(user, rng, notes=5) for _ in range(20)]
+
+
+async def _browse_step(user: BenchUser) -> None:
+    rng: random.Random = user.state["rng"]
+    notebook_id = rng.choice(user.state["notebooks"])
+    await user.request("notebooks.list", "GET", "/api/notebooks")
+    await user.request("notebook.get", "GET", f"/api/notebooks/{notebook_id}")
+    params = {"notebook_id": notebook_id}
+    await user.request("flashcards.list", "GET", "/api/flashcards", params=params)
+    await user.request("quizzes.list", "GET", "/api/quizzes", params=params)
+    await user.request("mindmaps.list", "GET", "/api/mindmaps", params=params)
+
+
+# --- Note autosave storm ---
+
+async def _autosave_setup(user: BenchUser) -> None:
+    rng = random.Random(user.index)
+    user.state["rng"] = rng
+    notebook_id = await _create_notebook(user, rng, notes=10)
+    resp = await user.request("notebook.get", "GET", f"/api/notebooks/{notebook_id}")
+    user.state["notebook"] = resp.json()
+
+
+async def _autosave_step(user: BenchUser) -> None:
+    rng: random.Random = user.state["rng"]
+    notebook = user.state["notebook"]
+    notes: List[Dict] = notebook["notes"]
+    # One keystroke burst: append a few characters to one note and save the whole notebook.
+    target = rng.randrange(len(notes))
+    notes[target]["content"] = (notes[target]["content"] or "") + rng.choice("abcdefg学习 ")
+    resp = await user.request(
+        "notebook.autosave",
+        "PUT",
+        f"/api/notebooks/{notebook['id']}",
+        json={"title": notebook["title"], "notes": notes},
+    )
+    if resp.status_code < 400:
+        user.state["notebook"] = resp.json()
+
+
+# --- Chat streaming ---
+
+async def _chat_setup(user: BenchUser) -> None:
+    user.state["rng"] = random.Random(user.index)
+
+
+async def _chat_step(user: BenchUser) -> None:
+    rng: random.Random = user.state["rng"]
+    payload = {
+        "model_key": "gpt-5-mini",
+        "text": _LOREM * rng.randint(1, 20),
+    }
+    started = time.perf_counter()
+    first_chunk = None
+    try:
+        async with user.client.stream(
+            "POST", "/api/responses/stream", json=payload, headers=user.csrf_headers
+        ) as resp:
+            ok = resp.status_code < 400
+            async for _ in resp.aiter_lines():
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                    user.recorder.record("chat.first_chunk", first_chunk)
+    except httpx.HTTPError:
+        ok = False
+    user.recorder.record("chat.stream", time.perf_counter() - started, ok=ok)
+
+
+# --- Quiz generation bursts ---
+
+async def _quiz_setup(user: BenchUser) -> None:
+    rng = random.Random(user.index)
+    notebook_id = await _create_notebook(user, rng, notes=2)
+    content = (_LOREM * 400).encode()
+    presign = await user.request(
+        "attachment.presign",
+        "POST",
+        "/api/attachments/presign-upload",
+        json={"notebook_id": notebook_id, "filename": "lecture.txt", "content_type": "text/plain", "bytes": len(content)},
+    )
+    presign.raise_for_status()
+    body = presign.json()
+    upload = body["upload"]
+    async with httpx.AsyncClient(timeout=30.0) as s3:
+        (await s3.post(upload["url"], data=upload["fields"], files={"file": ("lecture.txt", content)})).raise_for_status()
+    uploaded = await user.request(
+        "files.upload",
+        "POST",
+        "/api/files/",
+        data={"purpose": "user_data"},
+        files={"file": ("lecture.txt", content, "text/plain")},
+    )
+    uploaded.raise_for_status()
+    linked = await user.request(
+        "attachment.link_openai",
+        "POST",
+        f"/api/attachments/{body['attachment_id']}/link-openai",
+        json={"openai_file_id": uploaded.json()["id"]},
+    )
+    linked.raise_for_status()
+    user.state["notebook_id"] = notebook_id
+
+
+async def _quiz_step(user: BenchUser) -> None:
+    await user.request(
+        "quiz.generate",
+        "POST",
+        f"/api/notebooks/{user.state['notebook_id']}/quizzes/generate",
+        json={"count": 10},
+    )
+
+
+# --- Live transcription ---
+
+_FRAME_MS = 100
+_SAMPLE_RATE = 24000
+
+
+async def _transcription_setup(user: BenchUser) -> None:
+    silence = b"\x00\x00" * (_SAMPLE_RATE * _FRAME_MS // 1000)
+    user.state["frame"] = json.dumps(
+        {"type": "input_audio_buffer.append", "audio": base64.b64encode(silence).decode()}
+    )
+
+
+async def _transcription_step(user: BenchUser) -> None:
+    import websockets
+
+    ws_url = user.base_url.replace("http", "ws", 1) + "/api/audio/transcriptions/live"
+    frames = 50  # 5 s of audio, sent at real-time pace
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            first = json.loads(await ws.recv())
+            if first.get("event") != "session_started":
+                user.recorder.record("transcription.session", time.perf_counter() - started, ok=False)
+                return
+            user.recorder.record("transcription.connect", time.perf_counter() - started)
+            sent_at: List[float] = []
+            completed = 0
+
+            async def reader() -> None:
+                nonlocal completed
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get("type") == "conversation.item.input_audio_transcription.completed":
+                        # Latency from the frame that triggered the commit to its transcript.
+                        if sent_at:
+                            user.recorder.record("transcription.segment", time.perf_counter() - sent_at[-1])
+                        completed += 1
+
+            read_task = asyncio.create_task(reader())
+            for _ in range(frames):
+                sent_at.append(time.perf_counter())
+                await ws.send(user.state["frame"])
+                await asyncio.sleep(_FRAME_MS / 1000)
+            await asyncio.sleep(0.5)
+            read_task.cancel()
+            await asyncio.gather(read_task, return_exceptions=True)
+        user.recorder.record("transcription.session", time.perf_counter() - started, ok=completed > 0)
+    except (OSError, websockets.exceptions.WebSocketException):
+        user.recorder.record("transcription.session", time.perf_counter() - started, ok=False)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("browse", "Notebook-heavy browsing: list/get notebooks and their study sets", _browse_setup, _browse_step),
+        Scenario("autosave", "Note autosave storm: full-notebook PUT per keystroke burst", _autosave_setup, _autosave_step),
+        Scenario("chat", "Chat streaming through /api/responses/stream", _chat_setup, _chat_step),
+        Scenario("quiz", "Quiz generation bursts (10 questions per call)", _quiz_setup, _quiz_step),
+        Scenario("transcription", "Live transcription over the realtime WebSocket bridge", _transcription_setup, _transcription_step),
+    )
+}
@@ -0,0 +1,93 @@
+"""Per-request CPU spent preparing and validating structured generation calls.
+
+    python -m bench.structured_outputs [--calls 2000]
+
+"per-request" rebuilds the strict schema and `text.format` block and validates with
+`model_validate`, as the generate_* handlers did. "template" uses the compiled
+`StructuredTemplate` from api.services.structured_outputs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Callable, Dict
+
+from api.services import structured_outputs
+from api.services.structured_outputs import StructuredTemplate, enforce_no_additional_properties
+
+
+def _sample_reply(scene: str) -> Dict[str, Any]:
+    if scene == "flashcard":
+        return {
+            "folder_name": "线性代数",
+            "flashcards": [
+                {"question": f"问题 {i}: 什么是特征值？", "answer": "使 Av = λv 成立的标量 λ。", "sources": ["lecture.pdf"]}
+                for i in range(20)
+            ],
+        }
+    if scene == "quiz":
+        return {
+            "folder_name": "线性代数测验",
+            "questions": [
+                {
+                    "question": f"第 {i} 题：矩阵可逆的充要条件是？",
+                    "options": [{"text": f"选项 {c}", "is_correct": c == "A"} for c in "ABCD"],
+                    "hint": "考虑行列式",
+                    "explaination": "行列式非零等价于满秩。",
+                    "sources": ["lecture.pdf"],
+                }
+                for i in range(10)
+            ],
+        }
+
+    def node(depth: int) -> Dict[str, Any]:
+        children = [node(depth + 1) for _ in range(5)] if depth < 2 else []
+        return {"title": f"节点 {depth}", "summary": "简短备注", "children": children}
+
+    return {"title": "线性代数", "root": node(0)}
+
+
+def _per_request(template: StructuredTemplate[Any], reply: Dict[str, Any]) -> Callable[[], Any]:
+    model = template.model
+
+    def run() -> Any:
+        schema = model.model_json_schema()
+        enforce_no_additional_properties(schema)
+        text = {"format": {"type": "json_schema", "name": model.__name__, "strict": True, "schema": schema}}
+        return text, model.model_validate(reply)
+
+    return run
+
+
+def _compiled(template: StructuredTemplate[Any], reply: Dict[str, Any]) -> Callable[[], Any]:
+    def run() -> Any:
+        return template.payload_text(), template.validate(reply)
+
+    return run
+
+
+def _us_per_call(fn: Callable[[], Any], calls: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    for scene in ("flashcard", "quiz", "mindmap"):
+        template = structured_outputs.get_template(scene)
+        reply = _sample_reply(scene)
+        assert isinstance(template.validate(reply), template.model)
+        before = _us_per_call(_per_request(template, reply), args.calls)
+        after = _us_per_call(_compiled(template, reply), args.calls)
+        print(f"{scene:<10} per-request {before:9.1f} us   template {after:9.1f} us   saved {before - after:9.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
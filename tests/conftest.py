@@ -0,0 +1,64 @@
+"""Shared fixtures: one bench server (fake OpenAI, moto S3, sqlite or Postgres) per session.
+
+Needs the api and bench requirements. Run from the repository root: `python -m pytest tests`.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Iterator
+
+import httpx
+import pytest
+
+ADMIN_EMAIL = "budget-admin@example.com"
+
+
+@pytest.fixture(scope="session")
+def bench_env() -> Iterator[Any]:
+    """The app served over HTTP, failing any request over its query budget with a 500."""
+    pytest.importorskip("moto")
+    from bench.fake_openai import FakeOpenAIConfig
+    from bench.harness import BenchEnvironment
+
+    # Settings load once, when the harness first imports the app.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("DB_QUERY_STATS", "true")
+        patch.setenv("DB_QUERY_BUDGET_STRICT", "true")
+        patch.setenv("ADMIN_EMAILS", json.dumps([ADMIN_EMAIL]))
+        with BenchEnvironment(db="auto", fake_config=FakeOpenAIConfig(tokens_per_second=50000)) as env:
+            yield env
+
+
+@pytest.fixture(scope="session")
+def client(bench_env: Any) -> Iterator[httpx.Client]:
+    """A signed-in admin account that sends the CSRF header on every unsafe request."""
+    from api.settings import settings
+
+    def add_csrf(request: httpx.Request) -> None:
+        token = session.cookies.get(settings.CSRF_COOKIE_NAME)
+        if request.method not in ("GET", "HEAD") and token:
+            request.headers[settings.CSRF_HEADER_NAME] = token
+
+    with httpx.Client(base_url=bench_env.base_url, timeout=60.0, event_hooks={"request": [add_csrf]}) as session:
+        session.get("/api/auth/csrf").raise_for_status()
+        session.post(
+            "/api/auth/register",
+            json={"email": ADMIN_EMAIL, "password": f"pw-{uuid.uuid4().hex}", "name": "budget"},
+        ).raise_for_status()
+        yield session
+
+
+@pytest.fixture
+def strict_queries(bench_env: Any) -> Callable[[int], ContextManager[Any]]:
+    """`with strict_queries(n):` fails the test if the block runs more than `n` queries."""
+    from api.db.instrumentation import track_queries
+
+    @contextmanager
+    def _strict(budget: int) -> Iterator[Any]:
+        with track_queries(budget, strict=True) as stats:
+            yield stats
+
+    return _strict
@@ -0,0 +1,178 @@
+"""Every route declares a query budget, and a walk through the API stays inside them."""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any, Dict, List, Set, Tuple
+
+import httpx
+
+# Enough rows that a per-row query pushes any list or batch route over its budget.
+ROWS = 6
+
+
+def _api_routes() -> List[Any]:
+    from fastapi.routing import APIRoute
+
+    from api.app import app
+
+    return [route for route in app.routes if isinstance(route, APIRoute)]
+
+
+class Walk:
+    """Calls routes by template and remembers which (method, template) pairs were hit."""
+
+    def __init__(self, client: httpx.Client) -> None:
+        self.client = client
+        self.visited: Set[Tuple[str, str]] = set()
+
+    def __call__(self, method: str, template: str, path: Dict[str, Any] | None = None, **kwargs: Any) -> httpx.Response:
+        resp = self.client.request(method, template.format(**(path or {})), **kwargs)
+        self.visited.add((method, template))
+        # Later steps need this response, so a budget failure stops the walk here.
+        assert not (resp.status_code == 500 and "Query budget exceeded" in resp.text), resp.json()["error"]["message"]
+        return resp
+
+
+def _walk(client: httpx.Client) -> Walk:
+    call = Walk(client)
+    notes = [{"title": f"第 {i} 章", "content": f"特征值 eigenvalue {i}", "seq": i} for i in range(ROWS)]
+
+    call("GET", "/")
+    call("GET", "/health")
+    call("GET", "/metrics")
+    call("GET", "/api/ai/config")
+    call("GET", "/api/auth/me")
+    # Admin routes first: the client signs in as a fresh account below.
+    call("GET", "/api/admin/usage")
+    call("POST", "/api/admin/usage/flush")
+    call("POST", "/api/admin/ai-registry/reload")
+    account = {"email": f"walk-{uuid.uuid4().hex[:8]}@example.com", "password": "walk-password", "name": "walk"}
+    call("GET", "/api/auth/csrf")
+    call("POST", "/api/auth/register", json=account)
+    call("POST", "/api/auth/logout")
+    call("POST", "/api/auth/login", json={"email": account["email"], "password": account["password"]})
+
+    books = [call("POST", "/api/notebooks", json={"title": f"nb {i}", "notes": notes}).json() for i in range(ROWS)]
+    nb = {"notebook_id": books[0]["id"]}
+    call("GET", "/api/notebooks")
+    call("GET", "/api/notebooks/{notebook_id}", nb)
+    call("PUT", "/api/notebooks/{notebook_id}", nb, json={"title": "renamed", "notes": books[0]["notes"]})
+    call("GET", "/api/notebooks/{notebook_id}/retrieve", nb, params={"q": "eigenvalue"})
+    call("POST", "/api/notebooks/title", json={"content": "特征值与特征向量"})
+
+    folder = call("POST", "/api/notebook-folders", json={"name": "f", "notebook_ids": [b["id"] for b in books]}).json()
+    call("GET", "/api/notebook-folders")
+    call("PUT", "/api/notebook-folders/{folder_id}", {"folder_id": folder["id"]}, json={"notebook_ids": [books[0]["id"]]})
+    call("DELETE", "/api/notebook-folders/{folder_id}", {"folder_id": folder["id"]})
+
+    call("POST", "/api/flashcards/bulk", json={"items": [{"notebook_id": nb["notebook_id"], "question": f"q{i}", "answer": "a"} for i in range(ROWS)]})
+    cards = [card["id"] for card in call("GET", "/api/flashcards").json()]
+    deck = call("POST", "/api/flashcards/folders", json={"notebook_id": nb["notebook_id"], "name": "d", "flashcard_ids": cards}).json()
+    call("GET", "/api/flashcards/folders")
+    call("PUT", "/api/flashcards/folders/{folder_id}", {"folder_id": deck["id"]}, json={"name": "d2", "flashcard_ids": cards})
+    card = call("POST", "/api/flashcards", json={"notebook_id": nb["notebook_id"], "question": "q", "answer": "a", "folder_ids": [deck["id"]]}).json()
+    call("PUT", "/api/flashcards/{card_id}", {"card_id": card["id"]}, json={"question": "q2", "answer": "a", "folder_ids": [deck["id"]]})
+    call("PATCH", "/api/flashcards/batch", json={"ids": cards, "add_folder_ids": [deck["id"]]})
+    call("DELETE", "/api/flashcards/{card_id}", {"card_id": card["id"]})
+    call("DELETE", "/api/flashcards/batch", params={"ids": cards[1:]})
+    call("DELETE", "/api/flashcards/folders/{folder_id}", {"folder_id": deck["id"]})
+
+    call("POST", "/api/quizzes/bulk", json={"items": [{"notebook_id": nb["notebook_id"], "question": f"q{i}", "options": ["a", "b"], "correct_index": 0} for i in range(ROWS)]})
+    questions = [q["id"] for q in call("GET", "/api/quizzes").json()]
+    quiz = call("POST", "/api/quizzes/folders", json={"notebook_id": nb["notebook_id"], "name": "q", "question_ids": questions}).json()
+    quiz_id = {"folder_id": quiz["id"]}
+    call("GET", "/api/quizzes/folders")
+    call("PUT", "/api/quizzes/folders/{folder_id}", quiz_id, json={"question_ids": questions})
+    question = call("POST", "/api/quizzes", json={"notebook_id": nb["notebook_id"], "question": "q", "options": ["a", "b"], "correct_index": 0}).json()
+    call("PUT", "/api/quizzes/{question_id}", {"question_id": question["id"]}, json={"question": "q2", "options": ["a", "b"], "correct_index": 1})
+    call("PATCH", "/api/quizzes/batch", json={"ids": questions, "add_folder_ids": [quiz["id"]]})
+    results = [{"question_id": q, "selected_answer": 0, "is_correct": True} for q in questions]
+    call("POST", "/api/quizzes/folders/{folder_id}/attempt", quiz_id, json={"results": results})
+    call("GET", "/api/quizzes/folders/{folder_id}/attempt", quiz_id)
+    call("DELETE", "/api/quizzes/{question_id}", {"question_id": question["id"]})
+    call("DELETE", "/api/quizzes/batch", params={"ids": questions[1:]})
+    call("DELETE", "/api/quizzes/folders/{folder_id}", quiz_id)
+
+    mindmap = call("POST", "/api/mindmaps", json={"notebook_id": nb["notebook_id"], "title": "m", "data": {"nodeData": {"id": "r", "topic": "t"}}}).json()
+    mindmap_id = {"mindmap_id": mindmap["id"]}
+    call("GET", "/api/mindmaps")
+    call("GET", "/api/mindmaps/{mindmap_id}", mindmap_id)
+    updated = call("PUT", "/api/mindmaps/{mindmap_id}", mindmap_id, json={"title": "m2"}).json()
+    patch = [{"op": "replace", "path": "/nodeData/topic", "value": "x"}]
+    call("PATCH", "/api/mindmaps/{mindmap_id}", mindmap_id, json={"version": updated["version"], "ops": patch})
+    call("DELETE", "/api/mindmaps/{mindmap_id}", mindmap_id)
+
+    content = b"eigenvalue " * 200
+    presigned = call("POST", "/api/attachments/presign-upload", json={"notebook_id": nb["notebook_id"], "filename": "a.txt", "content_type": "text/plain", "bytes": len(content)}).json()
+    with httpx.Client() as s3:
+        s3.post(presigned["upload"]["url"], data=presigned["upload"]["fields"], files={"file": ("a.txt", content)}).raise_for_status()
+    uploaded = call("POST", "/api/files/", data={"purpose": "user_data"}, files={"file": ("a.txt", content, "text/plain")}).json()
+    file_id = {"file_id": uploaded["id"]}
+    call("GET", "/api/files")
+    call("GET", "/api/files/{file_id}", file_id)
+    call("GET", "/api/files/{file_id}/content", file_id)
+    attachment_id = {"attachment_id": presigned["attachment_id"]}
+    call("POST", "/api/attachments/{attachment_id}/link-openai", attachment_id, json={"openai_file_id": uploaded["id"]})
+    call("GET", "/api/attachments/{attachment_id}/download-url", attachment_id)
+    call("PUT", "/api/attachments/{attachment_id}", attachment_id, json={"filename": "b.txt"})
+
+    for kind, body in (("flashcards", {"count": ROWS}), ("quizzes", {"count": ROWS}), ("mindmaps", {})):
+        call("POST", f"/api/notebooks/{{notebook_id}}/{kind}/generate", nb, json=body)
+        call("POST", f"/api/notebooks/{{notebook_id}}/{kind}/generate/stream", nb, json=body).read()
+
+    conversation = call("POST", "/api/conversations", json={"notebook_id": nb["notebook_id"], "title": "c"}).json()
+    conversation_id = {"conversation_id": conversation["id"]}
+    chat = {"input": "什么是特征值？", "conversation_id": conversation["id"], "notebook_id": nb["notebook_id"]}
+    call("POST", "/api/responses", json=chat)
+    call("POST", "/api/responses/stream", json=chat).read()
+    call("GET", "/api/conversations")
+    call("GET", "/api/conversations/{conversation_id}", conversation_id)
+    call("GET", "/api/conversations/{conversation_id}/messages", conversation_id)
+    call("DELETE", "/api/conversations/{conversation_id}", conversation_id)
+
+    audio = {"file": ("a.webm", b"\0" * 32000, "audio/webm")}
+    call("POST", "/api/audio/transcriptions", files=audio)
+    call("POST", "/api/audio/transcriptions/stream", files=audio).read()
+
+    call("GET", "/api/sync")
+    call("GET", "/api/search", params={"q": "eigenvalue"})
+
+    call("DELETE", "/api/attachments/{attachment_id}", attachment_id)
+    call("DELETE", "/api/files/{file_id}", file_id)
+    for book in books[1:]:
+        call("DELETE", "/api/notebooks/{notebook_id}", {"notebook_id": book["id"]})
+    return call
+
+
+def test_every_route_declares_a_budget(bench_env: Any) -> None:
+    from api.db.instrumentation import declared_budget
+
+    missing = [
+        f"{','.join(sorted(route.methods))} {route.path}"
+        for route in _api_routes()
+        if declared_budget(route.dependant) is None
+    ]
+    assert not missing, "routes without Depends(query_budget(n)): " + ", ".join(missing)
+
+
+def test_walk_stays_within_budgets(client: httpx.Client) -> None:
+    walk = _walk(client)
+    unvisited = {
+        (method, route.path) for route in _api_routes() for method in route.methods
+    } - walk.visited
+    assert not unvisited, f"add these routes to the walk: {sorted(unvisited)}"
+
+
+def test_retrieval_does_not_scale_with_notes(client: httpx.Client, strict_queries: Any) -> None:
+    from api.db import models
+    from api.db.database import session_scope
+    from api.services import retrieval
+
+    notes = [{"title": f"n{i}", "content": f"特征值 {i}", "seq": i} for i in range(ROWS * 4)]
+    notebook_id = uuid.UUID(client.post("/api/notebooks", json={"title": "retrieval", "notes": notes}).json()["id"])
+    with session_scope() as db:
+        retrieval.refresh_index(db, notebook_id)
+    with session_scope() as db, strict_queries(7):
+        chunks = retrieval.retrieve(db, notebook_id, "特征值", mode=models.RetrievalMode.HYBRID, k=len(notes))
+    assert len(chunks) == len(notes)
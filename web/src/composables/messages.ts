@@ -29,6 +29,10 @@ function createMessagesStore(storageKey: string) {
     `${storageKey}::last-response-id`,
     null,
   )
+  // 服务端对话 ID：设置后由服务端维护 previous_response_id 链
+  const conversationId = useStorage<string | null>(`${storageKey}::conversation-id`, null)
+  // 更早历史消息的分页游标（null 表示已到最早）
+  const historyCursor = useStorage<string | null>(`${storageKey}::history-cursor`, null)
   const preferredToolKeys = useStorage<ToolKey[] | null>(
     `${storageKey}::preferred-tool-keys`,
     null,
@@ -46,6 +50,11 @@ function createMessagesStore(storageKey: string) {
     messages.value.push(normalizeMessage(message))
   }
 
+  // 把从服务端读到的更早消息插到列表最前面（按时间正序传入）
+  const prependMessages = (list: Partial<TMessage>[]) => {
+    messages.value = [...list.map(normalizeMessage), ...messages.value]
+  }
+
   const addUserMessage = (payload: {
     text: string
     images?: string[]
@@ -135,6 +144,8 @@ function createMessagesStore(storageKey: string) {
   const clearMessages = () => {
     messages.value = []
     lastCompletedResponseId.value = null
+    conversationId.value = null
+    historyCursor.value = null
   }
 
   const getLastMessages = (num = 10) => messages.value.slice(-num)
@@ -147,6 +158,14 @@ function createMessagesStore(storageKey: string) {
     lastCompletedResponseId.value = null
   }
 
+  const setConversationId = (id: string | null) => {
+    conversationId.value = id
+  }
+
+  const setHistoryCursor = (cursor: string | null) => {
+    historyCursor.value = cursor
+  }
+
   const setPreferredToolKeys = (keys: ToolKey[] | null | undefined) => {
     if (keys === undefined) return
     preferredToolKeys.value = keys === null ? null : cloneToolKeys(keys)
@@ -159,8 +178,11 @@ function createMessagesStore(storageKey: string) {
   return {
     messages,
     lastCompletedResponseId,
+    conversationId,
+    historyCursor,
     preferredToolKeys,
     addMessage,
+    prependMessages,
     clearMessages,
     getLastMessages,
     addUserMessage,
@@ -171,6 +193,8 @@ function createMessagesStore(storageKey: string) {
     setLastAssistantText,
     setLastCompletedResponseId,
     resetLastCompletedResponseId,
+    setConversationId,
+    setHistoryCursor,
     setPreferredToolKeys,
     clearPreferredToolKeys,
   }
@@ -1,9 +1,12 @@
 // src/composables/useChat.ts
 import { ref, nextTick } from 'vue'
+import dayjs from 'dayjs'
 import useSetting, { getModelFor, type ModelKey } from '@/composables/setting'
 import useMessages, { type MessagesStore } from '@/composables/messages'
 import { useResponsesStream } from '@/composables/useResponsesStream'
-import type { TFileInMessage, ResponseUIState } from '@/types/chat'
+import { createConversation, listConversationMessages, listConversations } from '@/services/api/conversations'
+import type { ApiConversationMessage } from '@/services/api/types'
+import type { TFileInMessage, TMessage, ResponseUIState } from '@/types/chat'
 
 // ==================== 类型定义（保持原有导出） ====================
 
@@ -16,6 +19,9 @@ export interface UseChatOptions {
   toolOverrides?: Record<string, any> | null | (() => Record<string, any> | null | undefined)
   includes?: string | string[] | (() => string[] | null | undefined)
   modelKey?: ModelKey
+  // 笔记本 ID：后端按笔记本的 retrieval_mode 决定是否用本地检索替代 file_search；
+  // 同时启用服务端对话：消息由服务端保存，previous_response_id 链也由服务端维护
+  notebookId?: string | null | (() => string | null | undefined)
 }
 
 // 保持原有类型导出，供外部使用
@@ -411,6 +417,43 @@ function extractReasoningText(payload: any): string | null {
   return null
 }
 
+// 服务端历史消息 -> 本地消息格式
+function toChatMessage(message: ApiConversationMessage): Partial<TMessage> {
+  const meta = message.meta ?? {}
+  const time = dayjs(message.created_at).format('HH:mm')
+  if (message.role === 'user') {
+    return {
+      username: 'user',
+      msg: message.text,
+      type: 1,
+      time,
+      files: Array.isArray(meta.files) ? meta.files.map((name: string) => ({ name, type: '' })) : [],
+    }
+  }
+  const citations = Array.isArray(meta.annotations)
+    ? meta.annotations.map(normalizeAnnotation).filter((c: Citation | null): c is Citation => Boolean(c))
+    : []
+  return {
+    username: 'chatGPT',
+    msg: message.text,
+    type: 0,
+    time,
+    meta: {
+      responseId: message.response_id,
+      completed: meta.status === 'completed',
+      citations,
+      uiState: {
+        phase: 'finished',
+        statusKey: meta.status === 'incomplete' ? 'incomplete' : null,
+        statusText: null,
+        hasTextStarted: true,
+      },
+    },
+  }
+}
+
+const HISTORY_PAGE_SIZE = 30
+
 // ==================== 主函数 ====================
 
 export function useChat(options?: MessagesStore | UseChatOptions) {
@@ -526,12 +569,73 @@ export function useChat(options?: MessagesStore | UseChatOptions) {
     return resolved
   }
 
+  const resolveNotebookId = (): string | null => {
+    if (!options || 'addMessage' in (options as MessagesStore)) return null
+    const candidate = (options as UseChatOptions).notebookId
+    const resolved = typeof candidate === 'function' ? candidate() : candidate
+    return resolved || null
+  }
+
+  // 笔记本对话：首次发送时在服务端建立对话；失败时退回由前端维护 previous_response_id
+  const ensureConversation = async (): Promise<string | null> => {
+    const notebookId = resolveNotebookId()
+    if (!notebookId) return null
+    const existing = messagesStore.conversationId?.value
+    if (existing) return existing
+    try {
+      const conversation = await createConversation({ notebookId })
+      messagesStore.setConversationId?.(conversation.id)
+      return conversation.id
+    } catch {
+      return null
+    }
+  }
+
+  // 重新打开笔记本对话时，从服务端读取最新一页历史（本地已有缓存时不重复读取）
+  async function loadHistory() {
+    const notebookId = resolveNotebookId()
+    if (!notebookId || messagesStore.messages.value.length) return
+    try {
+      let conversationId = messagesStore.conversationId?.value ?? null
+      if (!conversationId) {
+        const [latest] = await listConversations({ notebookId, limit: 1 })
+        if (!latest) return
+        conversationId = latest.id
+      }
+      const { messages, nextCursor } = await listConversationMessages(conversationId, { limit: HISTORY_PAGE_SIZE })
+      // 读取期间用户已开始新的对话，放弃这次结果
+      if (messagesStore.messages.value.length) return
+      messagesStore.setConversationId?.(conversationId)
+      messagesStore.setHistoryCursor?.(nextCursor)
+      messagesStore.prependMessages?.(messages.slice().reverse().map(toChatMessage))
+      const lastReply = messages.find(m => m.role === 'assistant' && m.response_id)
+      messagesStore.setLastCompletedResponseId?.(lastReply?.response_id ?? null)
+    } catch {
+      // 历史读取失败不影响继续对话
+    }
+  }
+
+  // 向前翻页，加载更早的历史消息
+  async function loadOlder(): Promise<boolean> {
+    const conversationId = messagesStore.conversationId?.value
+    const cursor = messagesStore.historyCursor?.value
+    if (!conversationId || !cursor) return false
+    const { messages, nextCursor } = await listConversationMessages(conversationId, {
+      limit: HISTORY_PAGE_SIZE,
+      cursor,
+    })
+    messagesStore.setHistoryCursor?.(nextCursor)
+    messagesStore.prependMessages?.(messages.slice().reverse().map(toChatMessage))
+    return Boolean(nextCursor)
+  }
+
   const buildRequestBody = (
     content: string,
     imagesDataUrls: string[],
     files: TFileInMessage[],
     toolKeys?: ToolKey[] | null,
-    reasoning?: Record<string, any>
+    reasoning?: Record<string, any>,
+    conversationId?: string | null
   ): Record<string, any> => {
     const s = setting.value as any
     const selectedModel = getModelFor(modelKey)
@@ -558,8 +662,11 @@ export function useChat(options?: MessagesStore | UseChatOptions) {
       tool_keys: toolKeyPayload,
       tool_overrides: toolKeyPayload && toolOverrides ? toolOverrides : undefined,
       includes: includeSet.size ? Array.from(includeSet) : undefined,
-      previous_response_id: lastCompletedResponseId || undefined,
+      // 有服务端对话时由服务端接续 previous_response_id
+      conversation_id: conversationId || undefined,
+      previous_response_id: conversationId ? undefined : lastCompletedResponseId || undefined,
       reasoning: reasoning ?? undefined,
+      notebook_id: resolveNotebookId() || undefined,
     }
 
     body.temperature = Number(temperature)
@@ -691,7 +798,8 @@ export function useChat(options?: MessagesStore | UseChatOptions) {
     })
 
     // 构建请求
-    const body = buildRequestBody(content, imagesDataUrls, files, toolKeys, reasoning)
+    const conversationId = await ensureConversation()
+    const body = buildRequestBody(content, imagesDataUrls, files, toolKeys, reasoning, conversationId)
 
     // 占位 assistant
     messagesStore.addAssistantPlaceholder()
@@ -878,5 +986,5 @@ export function useChat(options?: MessagesStore | UseChatOptions) {
     })
   }
 
-  return { loadding, send, stop, messagesStore }
+  return { loadding, send, stop, messagesStore, loadHistory, loadOlder }
 }
@@ -1,4 +1,5 @@
-import { computed, getCurrentInstance, onBeforeUnmount, ref, shallowRef } from 'vue'
+import { computed, getCurrentInstance, onBeforeUnmount, ref, shallowRef, unref } from 'vue'
+import type { Ref } from 'vue'
 import { useStorage } from '@vueuse/core'
 import { TRANSCRIBE_REALTIME_WS_ENDPOINT } from '@/constants/audio'
 import type { TranscriptSegment } from '@/types/notes'
@@ -20,6 +21,9 @@ export interface RealtimeTranscriptionOptions {
   debug?: boolean
   storageKey?: string
   maxStoredSegments?: number
+  attachmentId?: string
+  // Signed-in sessions without `attachmentId` save their segments to a new transcript attachment here.
+  notebookId?: Ref<string | null | undefined>
 }
 
 type PendingBuffer = {
@@ -32,6 +36,7 @@ const DEFAULT_SAMPLE_RATE = 16000
 const MIN_SILENCE_MS = 200
 const DEFAULT_STORAGE_KEY = 'note-transcription'
 const DEFAULT_MAX_STORED_SEGMENTS = 500
+const MAX_RESUME_ATTEMPTS = 5
 
 const hasWindow = typeof window !== 'undefined'
 const AudioContextCtor =
@@ -153,6 +158,7 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
   const language = options?.language?.trim()
   const storageKey = options?.storageKey?.trim() || DEFAULT_STORAGE_KEY
   const maxStoredSegments = Math.max(1, options?.maxStoredSegments ?? DEFAULT_MAX_STORED_SEGMENTS)
+  const attachmentId = options?.attachmentId?.trim()
 
   const canRecord = ref(supportsRealtimeRecording())
   const isRecording = ref(false)
@@ -160,6 +166,8 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
   const isConnected = ref(false)
   const connectionReady = ref(false)
   const connectionId = ref<string | null>(null)
+  // Attachment the server is saving completed segments to, if any.
+  const transcriptAttachmentId = ref<string | null>(null)
   const duration = ref(0)
   const audioLevel = ref(0)
   const liveText = ref('')
@@ -183,6 +191,10 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
   let closeAfterStopTimer: number | null = null
   const minCommitBytes = Math.ceil(targetSampleRate * 0.1) * 2
   let pendingAudioBytes = 0
+  // Server-side session id used to resume the bridge after an unexpected disconnect.
+  let sessionId: string | null = null
+  let resumeAttempts = 0
+  let resumeTimer: number | null = null
 
   const debugLog = (...args: any[]) => {
     if (!options?.debug) return
@@ -420,9 +432,12 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
 
   const handleRealtimePayload = (payload: any) => {
     if (!payload) return
-    if (payload.event === 'session_started') {
+    if (payload.event === 'session_started' || payload.event === 'session_reconnected') {
       connectionReady.value = true
-      connectionId.value = payload.connection_id || null
+      sessionId = payload.session_id || sessionId
+      connectionId.value = sessionId
+      transcriptAttachmentId.value = payload.attachment_id || transcriptAttachmentId.value
+      resumeAttempts = 0
       return
     }
 
@@ -633,6 +648,15 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     if (INTERNAL_TOKEN) {
       url.searchParams.set('token', INTERNAL_TOKEN)
     }
+    const notebookId = unref(options?.notebookId)?.trim()
+    if (attachmentId) {
+      url.searchParams.set('attachment_id', attachmentId)
+    } else if (notebookId) {
+      url.searchParams.set('notebook_id', notebookId)
+    }
+    if (sessionId) {
+      url.searchParams.set('session_id', sessionId)
+    }
 
     return await new Promise<void>((resolve, reject) => {
       let settled = false
@@ -675,7 +699,9 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
           wsRef.value = null
           if (!settled) {
             fail(new Error('websocket closed before ready'))
+            return
           }
+          scheduleResume()
         }
         ws.onmessage = async message => {
           if (typeof message.data === 'string') {
@@ -704,6 +730,33 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     })
   }
 
+  const clearResumeTimer = () => {
+    if (resumeTimer !== null) {
+      window.clearTimeout(resumeTimer)
+      resumeTimer = null
+    }
+  }
+
+  // Reconnect with the same session id so the server replays buffered audio and keeps segments.
+  const scheduleResume = () => {
+    if (!isRecording.value || !sessionId) return
+    if (resumeAttempts >= MAX_RESUME_ATTEMPTS) {
+      setError('实时转写连接已断开，请重新开始录音')
+      return
+    }
+    clearResumeTimer()
+    const delay = Math.min(500 * 2 ** resumeAttempts, 8000)
+    resumeAttempts += 1
+    resumeTimer = window.setTimeout(() => {
+      resumeTimer = null
+      if (!isRecording.value) return
+      connectWebSocket().catch(err => {
+        debugLog('resume failed', err)
+        scheduleResume()
+      })
+    }, delay)
+  }
+
   const ensureAudioNodes = async () => {
     if (!AudioContextCtor) throw new Error('当前浏览器不支持 AudioContext')
     const constraints: MediaStreamConstraints = {
@@ -775,6 +828,10 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     liveText.value = ''
     resetDuration()
     resetBuffers()
+    clearResumeTimer()
+    sessionId = null
+    transcriptAttachmentId.value = null
+    resumeAttempts = 0
     await connectWebSocket()
     await ensureAudioNodes()
     isRecording.value = true
@@ -798,6 +855,7 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     finalizeDuration()
     isRecording.value = false
     isPaused.value = false
+    clearResumeTimer()
     cleanupAudioGraph()
     sendCommitAndScheduleClose()
     audioLevel.value = 0
@@ -825,6 +883,7 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     }
     isRecording.value = false
     isPaused.value = false
+    clearResumeTimer()
     cleanupAudioGraph()
     closeWebSocket(true)
     resetDuration()
@@ -844,6 +903,7 @@ export function useRealtimeTranscription(options?: RealtimeTranscriptionOptions)
     isConnected,
     connectionReady,
     connectionId,
+    transcriptAttachmentId,
     isRecording,
     isPaused,
     duration,
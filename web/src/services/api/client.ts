@@ -49,7 +49,7 @@ export const clearCsrfToken = () => {
   csrfToken = null
 }
 
-export async function apiFetch<T>(path: string, options: ApiOptions = {}): Promise<T> {
+async function request<T>(path: string, options: ApiOptions): Promise<{ data: T; response: Response }> {
   const method = options.method ?? 'GET'
   const headers: Record<string, string> = {
     Accept: 'application/json',
@@ -78,7 +78,7 @@ export async function apiFetch<T>(path: string, options: ApiOptions = {}): Promi
   })
 
   if (response.status === 204) {
-    return undefined as T
+    return { data: undefined as T, response }
   }
 
   const data = await response.json().catch(() => undefined)
@@ -89,5 +89,18 @@ export async function apiFetch<T>(path: string, options: ApiOptions = {}): Promi
     throw new Error(message)
   }
 
-  return data as T
+  return { data: data as T, response }
+}
+
+export async function apiFetch<T>(path: string, options: ApiOptions = {}): Promise<T> {
+  return (await request<T>(path, options)).data
+}
+
+// 分页列表：下一页游标在 X-Next-Cursor 响应头里，没有下一页时为 null
+export async function apiFetchPage<T>(
+  path: string,
+  options: ApiOptions = {},
+): Promise<{ data: T; nextCursor: string | null }> {
+  const { data, response } = await request<T>(path, options)
+  return { data, nextCursor: response.headers.get('X-Next-Cursor') }
 }
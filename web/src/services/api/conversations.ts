@@ -0,0 +1,45 @@
+/**
+ * Conversations API - 服务端保存的 AI 对话与历史消息
+ */
+
+import { apiFetch, apiFetchPage } from './client'
+import type { ApiConversation, ApiConversationMessage } from './types'
+
+export const createConversation = async (payload: { notebookId?: string | null }): Promise<ApiConversation> => {
+  return apiFetch<ApiConversation>('/conversations', {
+    method: 'POST',
+    body: { notebook_id: payload.notebookId || undefined },
+  })
+}
+
+export const listConversations = async (options?: {
+  notebookId?: string
+  limit?: number
+}): Promise<ApiConversation[]> => {
+  const params = new URLSearchParams()
+  if (options?.notebookId) params.set('notebook_id', options.notebookId)
+  if (options?.limit) params.set('limit', String(options.limit))
+  const query = params.toString() ? `?${params}` : ''
+  const data = await apiFetch<ApiConversation[]>(`/conversations${query}`, { method: 'GET', skipCsrf: true })
+  return data ?? []
+}
+
+// 按时间倒序返回一页消息（最新在前）；nextCursor 用于继续向前翻页
+export const listConversationMessages = async (
+  conversationId: string,
+  options?: { limit?: number; cursor?: string | null },
+): Promise<{ messages: ApiConversationMessage[]; nextCursor: string | null }> => {
+  const params = new URLSearchParams()
+  if (options?.limit) params.set('limit', String(options.limit))
+  if (options?.cursor) params.set('cursor', options.cursor)
+  const query = params.toString() ? `?${params}` : ''
+  const { data, nextCursor } = await apiFetchPage<ApiConversationMessage[]>(
+    `/conversations/${conversationId}/messages${query}`,
+    { method: 'GET', skipCsrf: true },
+  )
+  return { messages: data ?? [], nextCursor }
+}
+
+export const deleteConversation = async (conversationId: string): Promise<void> => {
+  await apiFetch<void>(`/conversations/${conversationId}`, { method: 'DELETE' })
+}
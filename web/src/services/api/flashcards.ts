@@ -80,7 +80,9 @@ export const generateFlashcardsForNotebook = async (
   notebookId: string,
   payload?: {
     attachmentIds?: string[]
+    noteIds?: string[]
     count?: number
+    fanOut?: boolean
     focus?: string
     folderName?: string
     modelKey?: string
@@ -89,7 +91,9 @@ export const generateFlashcardsForNotebook = async (
 ): Promise<{ folder: FlashcardFolder; flashcards: Flashcard[] }> => {
   const body: Record<string, unknown> = {}
   if (payload?.attachmentIds) body.attachment_ids = payload.attachmentIds
+  if (payload?.noteIds) body.note_ids = payload.noteIds
   if (payload?.count) body.count = payload.count
+  if (payload?.fanOut !== undefined) body.fan_out = payload.fanOut
   if (payload?.focus) body.focus = payload.focus
   if (payload?.folderName) body.folder_name = payload.folderName
   if (payload?.folderId) body.folder_id = payload.folderId
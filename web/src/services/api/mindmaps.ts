@@ -2,9 +2,9 @@
  * MindMaps API - 思维导图相关接口
  */
 
-import type { MindMap } from '@/types/mindmaps'
+import type { MindMap, MindMapPatchOp } from '@/types/mindmaps'
 import { apiFetch } from './client'
-import type { ApiMindMap } from './types'
+import type { ApiMindMap, ApiMindMapPatchResult } from './types'
 import { mapMindMap } from './types'
 
 export const listMindMaps = async (options?: { notebookId?: string }): Promise<MindMap[]> => {
@@ -40,16 +40,30 @@ export const updateMindMap = async (
   return mapMindMap(data)
 }
 
+// 只提交改动（JSON Patch），不上传整份文档；version 不匹配时服务端返回 409
+export const patchMindMap = async (
+  mindmapId: string,
+  version: number,
+  ops: MindMapPatchOp[],
+): Promise<{ version: number; updatedAt: string }> => {
+  const data = await apiFetch<ApiMindMapPatchResult>(`/mindmaps/${mindmapId}`, {
+    method: 'PATCH',
+    body: { version, ops },
+  })
+  return { version: data.version, updatedAt: data.updated_at }
+}
+
 export const deleteMindMap = async (mindmapId: string): Promise<void> => {
   await apiFetch<void>(`/mindmaps/${mindmapId}`, { method: 'DELETE' })
 }
 
 export const generateMindMapForNotebook = async (
   notebookId: string,
-  payload?: { attachmentIds?: string[]; focus?: string; title?: string; modelKey?: string },
+  payload?: { attachmentIds?: string[]; noteIds?: string[]; focus?: string; title?: string; modelKey?: string },
 ): Promise<MindMap> => {
   const body: Record<string, unknown> = {}
   if (payload?.attachmentIds) body.attachment_ids = payload.attachmentIds
+  if (payload?.noteIds) body.note_ids = payload.noteIds
   if (payload?.focus) body.focus = payload.focus
   if (payload?.title) body.title = payload.title
   if (payload?.modelKey) body.model_key = payload.modelKey
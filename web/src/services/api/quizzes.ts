@@ -130,7 +130,9 @@ export const generateQuizForNotebook = async (
   notebookId: string,
   payload?: {
     attachmentIds?: string[]
+    noteIds?: string[]
     count?: number
+    fanOut?: boolean
     focus?: string
     modelKey?: string
     folderName?: string
@@ -138,7 +140,9 @@ export const generateQuizForNotebook = async (
 ): Promise<{ folder: QuizFolder; questions: QuizQuestion[] }> => {
   const body: Record<string, unknown> = {}
   if (payload?.attachmentIds) body.attachment_ids = payload.attachmentIds
+  if (payload?.noteIds) body.note_ids = payload.noteIds
   if (payload?.count) body.count = payload.count
+  if (payload?.fanOut !== undefined) body.fan_out = payload.fanOut
   if (payload?.focus) body.focus = payload.focus
   if (payload?.modelKey) body.model_key = payload.modelKey
   if (payload?.folderName) body.folder_name = payload.folderName
@@ -76,6 +76,9 @@ export interface NotebookNotePayload {
   seq: number
 }
 
+// 笔记本对话的资料来源：托管 file_search 或本地检索索引
+export type RetrievalMode = 'file_search' | 'bm25' | 'hybrid'
+
 export interface NotebookPayload {
   title?: string | null
   summary?: string | null
@@ -83,6 +86,7 @@ export interface NotebookPayload {
   color?: string | null
   openai_vector_store_id?: string | null
   vector_store_expires_at?: string | null
+  retrieval_mode?: RetrievalMode
   folder_ids?: string[]
   notes?: NotebookNotePayload[]
 }
@@ -158,6 +162,7 @@ export interface ApiNotebook {
   color: string | null
   openai_vector_store_id: string | null
   vector_store_expires_at: string | null
+  retrieval_mode?: RetrievalMode
   created_at: string
   updated_at: string
   is_archived: boolean
@@ -190,10 +195,35 @@ export interface ApiMindMap {
   notebook_id: string
   title: string
   data: Record<string, unknown> | null
+  version: number
   created_at: string
   updated_at: string
 }
 
+export interface ApiMindMapPatchResult {
+  id: string
+  version: number
+  updated_at: string
+}
+
+export interface ApiConversation {
+  id: string
+  notebook_id: string | null
+  title: string | null
+  message_count: number
+  created_at: string
+  updated_at: string
+}
+
+export interface ApiConversationMessage {
+  seq: number
+  role: 'user' | 'assistant'
+  text: string
+  response_id: string | null
+  meta: Record<string, any> | null
+  created_at: string
+}
+
 export interface ApiQuizQuestion {
   id: string
   notebook_id: string
@@ -342,6 +372,7 @@ export const mapMindMap = (item: ApiMindMap): MindMap => {
     notebookId: item.notebook_id,
     title: item.title,
     data: normalizedData,
+    version: item.version,
     createdAt: item.created_at,
     updatedAt: item.updated_at,
   }
@@ -5,6 +5,15 @@ export type MindMap = {
   notebookId: string
   title: string
   data: MindElixirData
+  version: number
   createdAt: string
   updatedAt: string
 }
+
+// RFC 6902 operation applied to `data` by PATCH /mindmaps/{id}
+export type MindMapPatchOp = {
+  op: 'add' | 'remove' | 'replace' | 'move' | 'copy' | 'test'
+  path: string
+  value?: unknown
+  from?: string
+}